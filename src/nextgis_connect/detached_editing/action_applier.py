@@ -2,7 +2,7 @@ import sqlite3
 from contextlib import closing
 from copy import deepcopy
 from pathlib import Path
-from typing import List, Optional, Set, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
 
 from qgis.core import (
     QgsEditError,
@@ -13,12 +13,14 @@ from qgis.core import (
 )
 from qgis.PyQt.QtCore import QObject, pyqtSlot
 
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
 from nextgis_connect.detached_editing.serialization import deserialize_geometry
 from nextgis_connect.detached_editing.utils import (
     DetachedContainerMetaData,
     FeatureMetaData,
     detached_layer_uri,
-    make_connection,
 )
 from nextgis_connect.exceptions import (
     ContainerError,
@@ -43,39 +45,59 @@ from .actions import (
 
 
 class ActionApplier(QObject):
+    METADATA_BATCH_SIZE = 500
+
     __container_path: Path
     __layer: QgsVectorLayer
     __metadata: DetachedContainerMetaData
+    __connection_pool: ContainerConnectionPool
 
-    __commands: List[Tuple[str, Tuple]]
+    __commands: List[Optional[Tuple[str, Tuple]]]
     __create_command_ids: List
+    __features_metadata: Dict[FeatureId, FeatureMetaData]
 
     def __init__(
-        self, container_path: Path, metadata: DetachedContainerMetaData
+        self,
+        container_path: Path,
+        metadata: DetachedContainerMetaData,
+        connection_pool: ContainerConnectionPool,
     ) -> None:
         super().__init__()
 
         self.__container_path = container_path
         self.__metadata = metadata
+        self.__connection_pool = connection_pool
         self.__layer = QgsVectorLayer(
             detached_layer_uri(container_path, metadata)
         )
 
         self.__commands = []
         self.__create_command_ids = []
+        self.__features_metadata = {}
 
-    def apply(self, actions: List[FeatureAction]) -> None:
+    def apply(
+        self,
+        actions: List[FeatureAction],
+        on_commit: Optional[Callable[[sqlite3.Cursor], None]] = None,
+    ) -> None:
+        """
+        Applies actions to the container layer.
+
+        :param on_commit: Called in the transaction that writes features
+            metadata, so additional state is saved atomically with it.
+        """
         if len(actions) == 0:
             return
 
         self.__commands = []
         self.__create_command_ids = []
+        self.__features_metadata = {}
 
         try:
             self.__layer.committedFeaturesAdded.connect(
                 self.__update_create_commands
             )
-            self.__apply_actions(actions)
+            self.__apply_actions(actions, on_commit)
 
         except NgConnectError:
             raise
@@ -96,7 +118,11 @@ class ActionApplier(QObject):
                 self.__update_create_commands
             )
 
-    def __apply_actions(self, actions: List[FeatureAction]) -> None:
+    def __apply_actions(
+        self,
+        actions: List[FeatureAction],
+        on_commit: Optional[Callable[[sqlite3.Cursor], None]],
+    ) -> None:
         applier_for_action = {
             ActionType.FEATURE_CREATE: self.__create_feature,
             ActionType.FEATURE_UPDATE: self.__update_feature,
@@ -108,6 +134,14 @@ class ActionApplier(QObject):
             ActionType.CONTINUE: self.__continue,
         }
 
+        self.__features_metadata = self.__fetch_features_metadata(
+            set(
+                action.fid
+                for action in actions
+                if isinstance(action, FeatureAction)
+            )
+        )
+
         previously_added, previously_deleted = (
             self.__extract_previously_uploaded(actions)
         )
@@ -120,8 +154,7 @@ class ActionApplier(QObject):
                 if action_type == ActionType.FEATURE_RESTORE:
                     action_type = (
                         ActionType.FEATURE_UPDATE
-                        if self.__get_feature_metadata(ngw_fid=action.fid)
-                        is not None
+                        if action.fid in self.__features_metadata
                         else ActionType.FEATURE_CREATE
                     )
 
@@ -132,13 +165,16 @@ class ActionApplier(QObject):
 
                 applier_for_action[action_type](*params)
 
-        with closing(
-            make_connection(self.__container_path)
-        ) as connection, closing(connection.cursor()) as cursor:
+        with self.__connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
             for command in self.__commands:
+                if command is None:
+                    continue
                 cursor.execute(*command)
 
-            connection.commit()
+            if on_commit is not None:
+                on_commit(cursor)
 
     def __extract_previously_uploaded(
         self, actions: List[FeatureAction]
@@ -158,36 +194,16 @@ class ActionApplier(QObject):
         if len(added_ngw_fids) == 0 and len(deleted_ngw_fids) == 0:
             return (set(), set())
 
-        already_added = set()
-        already_deleted = set()
-
-        with closing(
-            make_connection(self.__container_path)
-        ) as connection, closing(connection.cursor()) as cursor:
-            if len(added_ngw_fids) > 0:
-                added_fids = ",".join(str(fid) for fid in added_ngw_fids)
-                already_added = set(
-                    row[0]
-                    for row in cursor.execute(
-                        f"""
-                        SELECT ngw_fid FROM ngw_features_metadata
-                            WHERE ngw_fid IN ({added_fids})
-                        """  # nosec B608
-                    )
-                )
-
-            if len(deleted_ngw_fids) > 0:
-                deleted_fids = ",".join(str(fid) for fid in deleted_ngw_fids)
-                still_existed = set(
-                    row[0]
-                    for row in cursor.execute(
-                        f"""
-                        SELECT ngw_fid FROM ngw_features_metadata
-                            WHERE ngw_fid IN ({deleted_fids})
-                        """  # nosec B608
-                    )
-                )
-                already_deleted = deleted_ngw_fids - still_existed
+        already_added = set(
+            ngw_fid
+            for ngw_fid in added_ngw_fids
+            if ngw_fid in self.__features_metadata
+        )
+        already_deleted = set(
+            ngw_fid
+            for ngw_fid in deleted_ngw_fids
+            if ngw_fid not in self.__features_metadata
+        )
 
         return (already_added, already_deleted)
 
@@ -197,7 +213,10 @@ class ActionApplier(QObject):
         previously_added: Set[FeatureId],
     ) -> None:
         # Update version if feature were added in previous sync
-        if action.fid in previously_added:
+        if (
+            action.fid in previously_added
+            and action.fid in self.__features_metadata
+        ):
             self.__commands.append(
                 (
                     "UPDATE ngw_features_metadata SET version=? WHERE ngw_fid=?",
@@ -219,6 +238,11 @@ class ActionApplier(QObject):
         if not is_success:
             raise SynchronizationError("Can't add feature")
 
+        # Feature id is temporary until changes are committed
+        self.__features_metadata[action.fid] = FeatureMetaData(
+            fid=new_feature.id(), ngw_fid=action.fid, version=action.vid
+        )
+
         # Create metadata for feature
         self.__create_command_ids.append(len(self.__commands))
         self.__commands.append(
@@ -270,7 +294,11 @@ class ActionApplier(QObject):
     def __delete_feature(
         self, action: FeatureDeleteAction, previously_deleted: Set[FeatureId]
     ) -> None:
-        if action.fid in previously_deleted:
+        # Feature could be created by the same delta before deletion
+        if (
+            action.fid in previously_deleted
+            and action.fid not in self.__features_metadata
+        ):
             return
 
         feature_metadata = self.__get_feature_metadata(ngw_fid=action.fid)
@@ -287,6 +315,13 @@ class ActionApplier(QObject):
                 f"Can't delete feature with fid={feature_metadata.fid}"
             )
 
+        del self.__features_metadata[action.fid]
+
+        # Feature was created by this delta and will not be committed
+        if feature_metadata.fid < 0:
+            self.__discard_create_command(action.fid)
+            return
+
         # Delete feature metadata
         self.__commands.append(
             (
@@ -328,21 +363,47 @@ class ActionApplier(QObject):
     def __get_feature_metadata(
         self, *, ngw_fid: FeatureId
     ) -> Optional[FeatureMetaData]:
-        query = f"SELECT * FROM ngw_features_metadata WHERE ngw_fid={ngw_fid}"  # nosec B608
+        return self.__features_metadata.get(ngw_fid)
+
+    def __fetch_features_metadata(
+        self, ngw_fids: Iterable[FeatureId]
+    ) -> Dict[FeatureId, FeatureMetaData]:
+        ngw_fids = list(ngw_fids)
+        result = {}
+
         try:
-            with closing(
-                make_connection(self.__container_path)
-            ) as connection, closing(connection.cursor()) as cursor:
-                result = [
-                    FeatureMetaData(*row) for row in cursor.execute(query)
-                ]
+            with self.__connection_pool.reader() as connection, closing(
+                connection.cursor()
+            ) as cursor:
+                for i in range(0, len(ngw_fids), self.METADATA_BATCH_SIZE):
+                    batch = ngw_fids[i : i + self.METADATA_BATCH_SIZE]
+                    placeholders = ",".join("?" * len(batch))
+                    query = f"""
+                        SELECT * FROM ngw_features_metadata
+                        WHERE ngw_fid IN ({placeholders})
+                    """  # nosec B608
+                    for row in cursor.execute(query, batch):
+                        feature_metadata = FeatureMetaData(*row)
+                        assert feature_metadata.ngw_fid not in result, (
+                            "More than one feature with one ngw_fid"
+                        )
+                        result[feature_metadata.ngw_fid] = feature_metadata
 
         except Exception as error:
             raise ContainerError from error
 
-        assert len(result) <= 1, "More than one feature with one ngw_fid"
+        return result
 
-        return result[0] if len(result) == 1 else None
+    def __discard_create_command(self, ngw_fid: FeatureId) -> None:
+        for i, command_id in enumerate(self.__create_command_ids):
+            command = self.__commands[command_id]
+            assert command is not None
+            if command[1][0] != ngw_fid:
+                continue
+
+            self.__commands[command_id] = None
+            del self.__create_command_ids[i]
+            return
 
     @pyqtSlot(str, "QgsFeatureList")
     def __update_create_commands(
@@ -350,6 +411,7 @@ class ActionApplier(QObject):
     ) -> None:
         for command_id, feature in zip(self.__create_command_ids, features):
             command = self.__commands[command_id]
+            assert command is not None
             self.__commands[command_id] = (
                 command[0],
                 (feature.id(), *command[1]),
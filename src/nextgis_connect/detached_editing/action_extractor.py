@@ -2,15 +2,37 @@ import itertools
 import sqlite3
 from contextlib import closing
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Set
+from typing import (
+    Any,
+    Collection,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
 
 from qgis.core import (
+    QgsFeature,
     QgsFeatureRequest,
     QgsGeometry,
     QgsVectorLayer,
 )
 from qgis.PyQt.QtCore import Qt, QTime
 
+from nextgis_connect.detached_editing.bulk_ids import (
+    JSON_IDS,
+    json_ids,
+    json_ids_subquery,
+)
+from nextgis_connect.detached_editing.column_changes import (
+    COLUMN_FEATURES_CONDITION,
+)
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
 from nextgis_connect.detached_editing.serialization import (
     serialize_geometry,
     simplify_value,
@@ -19,7 +41,6 @@ from nextgis_connect.detached_editing.utils import (
     DetachedContainerMetaData,
     FeatureMetaData,
     detached_layer_uri,
-    make_connection,
 )
 from nextgis_connect.exceptions import (
     ContainerError,
@@ -38,227 +59,381 @@ from .actions import (
     VersioningAction,
 )
 
+MIN_FID = -(2**63)
+
 
 class ActionExtractor:
     """
     Extracts various types of actions from a detached editing container.
     """
 
+    BATCH_SIZE = 1000
+
     __container_path: Path
     __metadata: DetachedContainerMetaData
+    __connection_pool: ContainerConnectionPool
     __layer: QgsVectorLayer
 
     def __init__(
-        self, container_path: Path, metadata: DetachedContainerMetaData
+        self,
+        container_path: Path,
+        metadata: DetachedContainerMetaData,
+        connection_pool: ContainerConnectionPool,
     ) -> None:
         self.__container_path = container_path
         self.__metadata = metadata
+        self.__connection_pool = connection_pool
         self.__layer = QgsVectorLayer(
             detached_layer_uri(container_path, metadata)
         )
 
     def extract_all(self) -> List[VersioningAction]:
-        added_features = self.extract_added_features()
-        deleted_features = self.extract_deleted_features()
-        restored_features = self.extract_restored_features()
-        updated_features = self.extract_updated_features()
-
-        actions = itertools.chain(
-            added_features,
-            deleted_features,
-            restored_features,
-            updated_features,
+        return list(itertools.chain.from_iterable(self.iterate_all()))
+
+    def iterate_all(
+        self, batch_size: int = BATCH_SIZE
+    ) -> Iterator[List[VersioningAction]]:
+        """
+        Yields all local changes as actions in bounded batches.
+
+        Features are read page by page in fid order, so only one batch of
+        serialized geometries is kept in memory.
+        """
+        yield from self.iterate_added_features(batch_size)
+        yield from self.iterate_deleted_features(batch_size)
+        yield from self.iterate_restored_features(batch_size)
+        yield from self.iterate_updated_features(batch_size)
+
+    def extract_features(
+        self, fids: Collection[FeatureId]
+    ) -> List[VersioningAction]:
+        """
+        Extracts actions of already synchronized features with given fids.
+
+        Added features are skipped since they can't be referenced by
+        remote changes.
+        """
+        if len(fids) == 0:
+            return []
+
+        return list(
+            itertools.chain(
+                *self.iterate_deleted_features(fids=fids),
+                *self.iterate_restored_features(fids=fids),
+                *self.iterate_updated_features(fids=fids),
+            )
         )
-        return list(actions)
 
-    def extract_added_features(self) -> List[FeatureCreateAction]:
-        try:
-            with closing(
-                make_connection(self.__container_path)
-            ) as connection, closing(connection.cursor()) as cursor:
-                added_features_id = [
-                    row[0]
-                    for row in cursor.execute(
-                        "SELECT fid from ngw_added_features"
+    def count_all(self) -> int:
+        """Returns actions count without reading features"""
+        query = """
+            SELECT
+                (SELECT COUNT(*) FROM ngw_added_features)
+                + (SELECT COUNT(*) FROM ngw_removed_features)
+                + (SELECT COUNT(*) FROM ngw_restored_features)
+                + (
+                    SELECT COUNT(*) FROM (
+                        SELECT fid FROM ngw_changed_attributes
+                        UNION SELECT fid FROM ngw_updated_geometries
                     )
-                ]
+                )
+            """
+
+        try:
+            with self.__connection_pool.reader() as connection, closing(
+                connection.cursor()
+            ) as cursor:
+                return cursor.execute(query).fetchone()[0]
+
         except Exception as error:
             raise ContainerError from error
 
-        create_actions = []
-        request = QgsFeatureRequest(added_features_id)
-        for feature in self.__layer.getFeatures(request):  # type: ignore
-            fid = feature.id()
-            geom = self.__serialize_geometry(feature.geometry())
-            fields_values = []
-            for field in self.__metadata.fields:
-                value = simplify_value(feature.attribute(field.attribute))
-                if value is None:
-                    continue
-                self.__check_value(field, value)
-                fields_values.append([field.ngw_id, value])
-
-            create_actions.append(
-                FeatureCreateAction(fid, None, geom, fields_values)
-            )
-
-        if len(added_features_id) != len(create_actions):
-            error = ContainerError("Not all actions were created")
-            error.add_note(f"New features count: {len(added_features_id)}")
-            error.add_note(f"Actions count: {len(create_actions)}")
-            raise error
+    def extract_added_features(self) -> List[FeatureCreateAction]:
+        return list(
+            itertools.chain.from_iterable(self.iterate_added_features())
+        )
 
-        return create_actions
+    def iterate_added_features(
+        self, batch_size: int = BATCH_SIZE
+    ) -> Iterator[List[FeatureCreateAction]]:
+        query = """
+            SELECT fid FROM ngw_added_features
+            WHERE fid > ?
+            ORDER BY fid
+            LIMIT ?
+            """
 
-    def extract_updated_features(self) -> List[FeatureUpdateAction]:
-        # Collect information about updated features
+        for rows in self.__rows_batches(query, batch_size):
+            added_features_id = [row[0] for row in rows]
+
+            create_actions = []
+            request = QgsFeatureRequest(added_features_id)
+            for feature in self.__layer.getFeatures(request):  # type: ignore
+                fid = feature.id()
+                geom = self.__serialize_geometry(feature.geometry())
+                fields_values = self.__fields_values(feature)
+                create_actions.append(
+                    FeatureCreateAction(fid, None, geom, fields_values)
+                )
 
-        attributes_query = "SELECT fid, attribute from ngw_updated_attributes"
-        geoms_query = "SELECT fid from ngw_updated_geometries"
+            if len(added_features_id) != len(create_actions):
+                error = ContainerError("Not all actions were created")
+                error.add_note(f"New features count: {len(added_features_id)}")
+                error.add_note(f"Actions count: {len(create_actions)}")
+                raise error
 
-        updated_feature_attributes: Dict[FeatureId, Set[int]] = {}
-        updated_feature_geoms: Set[FeatureId] = set()
+            yield create_actions
 
-        try:
-            with closing(
-                make_connection(self.__container_path)
-            ) as connection, closing(connection.cursor()) as cursor:
-                for fid, attribute in cursor.execute(attributes_query):
-                    if fid not in updated_feature_attributes:
-                        updated_feature_attributes[fid] = set()
-                    updated_feature_attributes[fid].add(attribute)
-
-                updated_feature_geoms = set(
-                    row[0] for row in cursor.execute(geoms_query)
-                )
+    def extract_updated_features(self) -> List[FeatureUpdateAction]:
+        return list(
+            itertools.chain.from_iterable(self.iterate_updated_features())
+        )
 
-                all_updated_fids = list(
-                    set(updated_feature_attributes.keys())
-                    | updated_feature_geoms
+    def iterate_updated_features(
+        self,
+        batch_size: int = BATCH_SIZE,
+        *,
+        fids: Optional[Collection[FeatureId]] = None,
+    ) -> Iterator[List[FeatureUpdateAction]]:
+        # Features of column records are paged separately, so a batch
+        # doesn't expand whole columns
+        query = f"""
+            SELECT fid FROM (
+                SELECT fid FROM ngw_updated_attributes
+                UNION SELECT fid FROM ngw_updated_geometries
+                UNION SELECT fid FROM (
+                    SELECT metadata.fid
+                    FROM ngw_features_metadata metadata
+                    WHERE metadata.fid > ?1
+                        {self.__fids_condition("metadata.fid", fids)}
+                        AND EXISTS (
+                            SELECT 1 FROM ngw_updated_columns columns
+                            WHERE metadata.fid
+                                BETWEEN columns.min_fid AND columns.max_fid
+                        )
+                        AND {COLUMN_FEATURES_CONDITION}
+                    ORDER BY metadata.fid
+                    LIMIT ?2
                 )
-                if len(all_updated_fids) == 0:
-                    return []
+            )
+            WHERE fid > ?1 {self.__fids_condition("fid", fids)}
+            ORDER BY fid
+            LIMIT ?2
+            """  # nosec B608
+
+        for rows in self.__rows_batches(query, batch_size, fids):
+            updated_fids = [row[0] for row in rows]
+            updated_fids_parameter = json_ids(updated_fids)
+
+            # Collect information about updated features
+            updated_feature_attributes: Dict[FeatureId, Set[int]] = {}
+            try:
+                with self.__connection_pool.reader() as connection, closing(
+                    connection.cursor()
+                ) as cursor:
+                    for fid, attribute in cursor.execute(
+                        f"""
+                        SELECT fid, attribute FROM ngw_changed_attributes
+                        WHERE fid IN ({JSON_IDS})
+                        """,  # nosec B608
+                        (updated_fids_parameter,),
+                    ):
+                        if fid not in updated_feature_attributes:
+                            updated_feature_attributes[fid] = set()
+                        updated_feature_attributes[fid].add(attribute)
+
+                    updated_feature_geoms = set(
+                        row[0]
+                        for row in cursor.execute(
+                            f"""
+                            SELECT fid FROM ngw_updated_geometries
+                            WHERE fid IN ({JSON_IDS})
+                            """,  # nosec B608
+                            (updated_fids_parameter,),
+                        )
+                    )
 
-                features_metadata = self.__features_metadata(
-                    cursor, all_updated_fids
-                )
+                    features_metadata = self.__features_metadata(
+                        cursor, updated_fids
+                    )
 
-        except Exception as error:
-            raise ContainerError from error
+            except Exception as error:
+                raise ContainerError from error
 
-        updated_actions: List[FeatureUpdateAction] = []
+            updated_actions: List[FeatureUpdateAction] = []
 
-        request = QgsFeatureRequest(all_updated_fids)
-        for feature in self.__layer.getFeatures(request):  # type: ignore
-            feature_metadata = features_metadata[feature.id()]
-            ngw_fid = feature_metadata.ngw_fid
-            assert ngw_fid is not None
-            vid = feature_metadata.version
+            request = QgsFeatureRequest(updated_fids)
+            for feature in self.__layer.getFeatures(request):  # type: ignore
+                feature_metadata = features_metadata[feature.id()]
+                ngw_fid = feature_metadata.ngw_fid
+                assert ngw_fid is not None
+                vid = feature_metadata.version
 
-            geom = (
-                self.__serialize_geometry(feature.geometry())
-                if feature_metadata.fid in updated_feature_geoms
-                else None
-            )
+                geom = (
+                    self.__serialize_geometry(feature.geometry())
+                    if feature_metadata.fid in updated_feature_geoms
+                    else None
+                )
 
-            fields = self.__metadata.fields
+                fields = self.__metadata.fields
 
-            fields_values = []
-            for attribute_id in updated_feature_attributes.get(
-                feature.id(), set()
-            ):
-                field = fields.get_with(attribute=attribute_id)
-                value = simplify_value(feature.attribute(attribute_id))
-                self.__check_value(field, value)
-                fields_values.append([field.ngw_id, value])
+                fields_values = []
+                for attribute_id in updated_feature_attributes.get(
+                    feature.id(), set()
+                ):
+                    field = fields.get_with(attribute=attribute_id)
+                    value = simplify_value(feature.attribute(attribute_id))
+                    self.__check_value(field, value)
+                    fields_values.append([field.ngw_id, value])
 
-            updated_actions.append(
-                FeatureUpdateAction(ngw_fid, vid, geom, fields_values)
-            )
+                updated_actions.append(
+                    FeatureUpdateAction(ngw_fid, vid, geom, fields_values)
+                )
 
-        return updated_actions
+            if len(updated_actions) > 0:
+                yield updated_actions
 
     def extract_deleted_features(self) -> List[FeatureDeleteAction]:
-        query = """
-            SELECT feature_metadata.ngw_fid
+        return list(
+            itertools.chain.from_iterable(self.iterate_deleted_features())
+        )
+
+    def iterate_deleted_features(
+        self,
+        batch_size: int = BATCH_SIZE,
+        *,
+        fids: Optional[Collection[FeatureId]] = None,
+    ) -> Iterator[List[FeatureDeleteAction]]:
+        query = f"""
+            SELECT removed.fid, feature_metadata.ngw_fid
             FROM ngw_removed_features removed
             LEFT JOIN ngw_features_metadata feature_metadata
                 ON feature_metadata.fid = removed.fid
-            """
-
-        try:
-            with closing(
-                make_connection(self.__container_path)
-            ) as connection, closing(connection.cursor()) as cursor:
-                return [
-                    FeatureDeleteAction(row[0])
-                    for row in cursor.execute(query)
-                ]
+            WHERE removed.fid > ?1 {self.__fids_condition("removed.fid", fids)}
+            ORDER BY removed.fid
+            LIMIT ?2
+            """  # nosec B608
 
-        except Exception as error:
-            raise ContainerError from error
+        for rows in self.__rows_batches(query, batch_size, fids):
+            yield [FeatureDeleteAction(row[1]) for row in rows]
 
     def extract_restored_features(self) -> List[FeatureRestoreAction]:
-        try:
-            with closing(
-                make_connection(self.__container_path)
-            ) as connection, closing(connection.cursor()) as cursor:
-                restored_features_id = [
-                    row[0]
-                    for row in cursor.execute(
-                        "SELECT fid from ngw_restored_features"
+        return list(
+            itertools.chain.from_iterable(self.iterate_restored_features())
+        )
+
+    def iterate_restored_features(
+        self,
+        batch_size: int = BATCH_SIZE,
+        *,
+        fids: Optional[Collection[FeatureId]] = None,
+    ) -> Iterator[List[FeatureRestoreAction]]:
+        query = f"""
+            SELECT fid FROM ngw_restored_features
+            WHERE fid > ?1 {self.__fids_condition("fid", fids)}
+            ORDER BY fid
+            LIMIT ?2
+            """  # nosec B608
+
+        for rows in self.__rows_batches(query, batch_size, fids):
+            restored_features_id = [row[0] for row in rows]
+            try:
+                with self.__connection_pool.reader() as connection, closing(
+                    connection.cursor()
+                ) as cursor:
+                    features_metadata = self.__features_metadata(
+                        cursor, restored_features_id
                     )
-                ]
-                features_metadata = self.__features_metadata(
-                    cursor, restored_features_id
+            except Exception as error:
+                raise ContainerError from error
+
+            restore_actions = []
+            request = QgsFeatureRequest(restored_features_id)
+            for feature in self.__layer.getFeatures(request):  # type: ignore
+                fid = feature.id()
+                geom = self.__serialize_geometry(feature.geometry())
+                fields_values = self.__fields_values(feature)
+
+                ngw_fid = features_metadata[fid].ngw_fid
+                version = features_metadata[fid].version
+                assert ngw_fid is not None
+
+                restore_actions.append(
+                    FeatureRestoreAction(ngw_fid, version, geom, fields_values)
                 )
-        except Exception as error:
-            raise ContainerError from error
-
-        restore_actions = []
-        request = QgsFeatureRequest(restored_features_id)
-        for feature in self.__layer.getFeatures(request):  # type: ignore
-            fid = feature.id()
-            geom = self.__serialize_geometry(feature.geometry())
-            fields_values = []
-            for field in self.__metadata.fields:
-                value = simplify_value(feature.attribute(field.attribute))
-                if value is None:
-                    continue
-                self.__check_value(field, value)
-                fields_values.append([field.ngw_id, value])
-
-            ngw_fid = features_metadata[fid].ngw_fid
-            version = features_metadata[fid].version
-            assert ngw_fid is not None
-
-            restore_actions.append(
-                FeatureRestoreAction(ngw_fid, version, geom, fields_values)
-            )
 
-        if len(restored_features_id) != len(restore_actions):
-            error = ContainerError("Not all actions were created")
-            error.add_note(
-                f"Restored features count: {len(restored_features_id)}"
-            )
-            error.add_note(f"Actions count: {len(restore_actions)}")
-            raise error
-
-        return restore_actions
+            if len(restored_features_id) != len(restore_actions):
+                error = ContainerError("Not all actions were created")
+                error.add_note(
+                    f"Restored features count: {len(restored_features_id)}"
+                )
+                error.add_note(f"Actions count: {len(restore_actions)}")
+                raise error
+
+            yield restore_actions
+
+    def __rows_batches(
+        self,
+        query: str,
+        batch_size: int,
+        fids: Optional[Collection[FeatureId]] = None,
+    ) -> Iterator[List[Tuple[Any, ...]]]:
+        """
+        Pages through query results by fid.
+
+        The query must take the last fid and the limit as parameters and
+        return fid as the first column. If fids are given, they are passed
+        as the third parameter. Keyset pagination keeps working when
+        already processed rows are deleted between batches.
+        """
+        fids_parameter = () if fids is None else (json_ids(fids),)
+        last_fid = MIN_FID
+        while True:
+            try:
+                with self.__connection_pool.reader() as connection, closing(
+                    connection.cursor()
+                ) as cursor:
+                    rows = cursor.execute(
+                        query, (last_fid, batch_size, *fids_parameter)
+                    ).fetchall()
+            except Exception as error:
+                raise ContainerError from error
+
+            if len(rows) == 0:
+                return
+
+            last_fid = rows[-1][0]
+            yield rows
+
+    def __fids_condition(
+        self, column: str, fids: Optional[Collection[FeatureId]]
+    ) -> str:
+        if fids is None:
+            return ""
+        return f"AND {column} IN ({json_ids_subquery('?3')})"
+
+    def __fields_values(self, feature: QgsFeature) -> List[List[Any]]:
+        fields_values = []
+        for field in self.__metadata.fields:
+            value = simplify_value(feature.attribute(field.attribute))
+            if value is None:
+                continue
+            self.__check_value(field, value)
+            fields_values.append([field.ngw_id, value])
+        return fields_values
 
     def __features_metadata(
         self, cursor: sqlite3.Cursor, fids: Iterable[FeatureId]
     ) -> Dict[FeatureId, FeatureMetaData]:
-        all_fids_joined = ",".join(str(fid) for fid in fids)
-
         features_metadata = {
             row[0]: FeatureMetaData(fid=row[0], ngw_fid=row[1], version=row[2])
             for row in cursor.execute(
                 f"""
                     SELECT fid, ngw_fid, version
                     FROM ngw_features_metadata
-                    WHERE fid IN ({all_fids_joined})
-                """  # nosec B608
+                    WHERE fid IN ({JSON_IDS})
+                """,  # nosec B608
+                (json_ids(fids),),
             )
         }
         return features_metadata
@@ -1,5 +1,15 @@
 import json
-from typing import Any, ClassVar, Dict, Iterable, List, Type, Union
+from typing import (
+    Any,
+    ClassVar,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Tuple,
+    Type,
+    Union,
+)
 
 from nextgis_connect.detached_editing.actions import (
     ActionType,
@@ -58,6 +68,53 @@ class ActionSerializer:
 
         return json.dumps(actions_container, default=action_converter)
 
+    def to_json_batches(
+        self,
+        actions: Iterable[VersioningAction],
+        max_count: int,
+        max_bytes: int,
+        last_action_number: int = 0,
+    ) -> Iterator[Tuple[int, str]]:
+        """
+        Serializes actions into consecutive JSON lists limited by actions
+        count and by payload size.
+
+        Action numbering is continuous across batches, so every batch is
+        the same as to_json() of its slice. A single action larger than
+        max_bytes is sent in a separate batch.
+
+        :return: Iterator of actions count and serialized batch pairs
+        """
+        action_converter = (
+            self.__convert_versioning_action
+            if self.__layer_metadata.is_versioning_enabled
+            else self.__convert_action
+        )
+
+        items: List[str] = []
+        batch_bytes = 0
+        for number, action in enumerate(actions, start=last_action_number):
+            item = json.dumps(
+                (number, action)
+                if self.__layer_metadata.is_versioning_enabled
+                else action,
+                default=action_converter,
+            )
+            item_bytes = len(item.encode()) + 2  # with separator
+
+            if len(items) > 0 and (
+                len(items) >= max_count or batch_bytes + item_bytes > max_bytes
+            ):
+                yield len(items), "[" + ", ".join(items) + "]"
+                items = []
+                batch_bytes = 0
+
+            items.append(item)
+            batch_bytes += item_bytes
+
+        if len(items) > 0:
+            yield len(items), "[" + ", ".join(items) + "]"
+
     def from_json(
         self,
         json_data: Union[str, Iterable[Dict[str, Any]]],
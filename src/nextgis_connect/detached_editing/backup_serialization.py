@@ -0,0 +1,406 @@
+"""
+Binary encoding of backups stored in change tables.
+
+Backups are written on every local change but are read only when
+a conflict is resolved, a feature is restored or no-op changes are
+compacted. So they are stored as compact BLOBs instead of JSON text:
+
+* every backup starts with the format version byte;
+* values are packed with a type tag (null, boolean, integer, real, text,
+  and JSON for anything else), integers and lengths are varints;
+* geometries are stored as raw WKB.
+
+A deleted feature backup holds the feature state after the last
+synchronization and only the differences of the state before deletion.
+
+Text backups written by previous versions are still decoded. They are
+converted in place once by DetachedLayerFactory.upgrade_container
+in the container maintenance task.
+"""
+
+import json
+import struct
+from base64 import b64decode
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Tuple, Union
+
+from qgis.core import QgsGeometry
+
+from nextgis_connect.detached_editing.serialization import (
+    deserialize_geometry,
+    deserialize_value,
+    simplify_value,
+)
+from nextgis_connect.exceptions import SerializationError
+from nextgis_connect.resources.ngw_field import FieldId
+
+BACKUP_FORMAT_VERSION = 1
+
+Backup = Union[bytes, str, None]
+
+_NULL = 0
+_FALSE = 1
+_TRUE = 2
+_INTEGER = 3
+_REAL = 4
+_TEXT = 5
+_JSON = 6
+
+_GEOMETRY_SAME = 0
+_GEOMETRY_CHANGED = 1
+
+_DOUBLE = struct.Struct("<d")
+
+
+@dataclass
+class FeatureState:
+    """Attributes and geometry of a feature saved in a backup"""
+
+    fields: List[Tuple[FieldId, Any]] = field(default_factory=list)
+    wkb: bytes = b""
+
+    def geometry(self) -> QgsGeometry:
+        return _geometry_from_wkb(self.wkb)
+
+
+class FeatureBackup:
+    """Backup of a deleted feature decoded on first access"""
+
+    __backup: Backup
+    __is_versioning_enabled: bool
+    __after_sync: Optional[FeatureState]
+    __before_deletion: Optional[FeatureState]
+
+    def __init__(self, backup: Backup, is_versioning_enabled: bool) -> None:
+        self.__backup = backup
+        self.__is_versioning_enabled = is_versioning_enabled
+        self.__after_sync = None
+        self.__before_deletion = None
+
+    @property
+    def after_sync(self) -> FeatureState:
+        self.__decode()
+        assert self.__after_sync is not None
+        return self.__after_sync
+
+    @property
+    def before_deletion(self) -> FeatureState:
+        self.__decode()
+        assert self.__before_deletion is not None
+        return self.__before_deletion
+
+    def __decode(self) -> None:
+        if self.__after_sync is not None:
+            return
+
+        try:
+            if isinstance(self.__backup, str):
+                self.__after_sync, self.__before_deletion = (
+                    _decode_legacy_feature(
+                        self.__backup, self.__is_versioning_enabled
+                    )
+                )
+            else:
+                self.__after_sync, self.__before_deletion = _decode_feature(
+                    self.__backup
+                )
+        except SerializationError:
+            raise
+        except Exception as error:
+            raise SerializationError("Invalid feature backup") from error
+
+
+def serialize_value_backup(value: Any) -> bytes:
+    writer = _Writer()
+    writer.write_value(simplify_value(value))
+    return writer.data()
+
+
+def deserialize_value_backup(backup: Backup) -> Any:
+    if backup is None:
+        return None
+
+    if isinstance(backup, str):
+        return deserialize_value(backup)
+
+    try:
+        reader = _Reader(backup)
+        return reader.read_value()
+    except SerializationError:
+        raise
+    except Exception as error:
+        raise SerializationError("Invalid value backup") from error
+
+
+def serialize_geometry_backup(geometry: Optional[QgsGeometry]) -> bytes:
+    return serialize_wkb_backup(geometry_to_wkb(geometry))
+
+
+def serialize_wkb_backup(wkb: bytes) -> bytes:
+    """Makes a geometry backup from WKB, empty for empty geometry"""
+    return bytes((BACKUP_FORMAT_VERSION,)) + wkb
+
+
+def deserialize_geometry_backup(
+    backup: Backup, is_versioning_enabled: bool
+) -> QgsGeometry:
+    if isinstance(backup, str):
+        return deserialize_geometry(backup, is_versioning_enabled)
+
+    wkb = geometry_backup_wkb(backup, is_versioning_enabled)
+    return _geometry_from_wkb(wkb) if wkb is not None else QgsGeometry()
+
+
+def geometry_backup_wkb(
+    backup: Backup, is_versioning_enabled: bool
+) -> Optional[bytes]:
+    """
+    Returns WKB of a geometry backup.
+
+    :return: WKB, empty bytes for empty geometry or None if backup is absent
+    """
+    if backup is None:
+        return None
+
+    if isinstance(backup, str):
+        if backup == "":
+            return b""
+        if is_versioning_enabled:
+            return b64decode(backup)
+        return geometry_to_wkb(deserialize_geometry(backup))
+
+    return _Reader(backup).read_rest()
+
+
+def serialize_feature_backup(
+    after_sync: FeatureState, before_deletion: FeatureState
+) -> bytes:
+    writer = _Writer()
+    writer.write_state(after_sync)
+
+    if before_deletion.wkb == after_sync.wkb:
+        writer.write_byte(_GEOMETRY_SAME)
+    else:
+        writer.write_byte(_GEOMETRY_CHANGED)
+        writer.write_bytes(before_deletion.wkb)
+
+    values_after_sync = dict(after_sync.fields)
+    changed_fields = [
+        (field_id, value)
+        for field_id, value in before_deletion.fields
+        if field_id not in values_after_sync
+        or not _is_same_value(values_after_sync[field_id], value)
+    ]
+    writer.write_fields(changed_fields)
+
+    return writer.data()
+
+
+def upgrade_value_backup(backup: str) -> bytes:
+    """Converts a text attribute backup to the binary format"""
+    writer = _Writer()
+    writer.write_value(deserialize_value(backup))
+    return writer.data()
+
+
+def upgrade_geometry_backup(backup: str, is_versioning_enabled: bool) -> bytes:
+    """Converts a text geometry backup to the binary format"""
+    wkb = geometry_backup_wkb(backup, is_versioning_enabled)
+    assert wkb is not None
+    return serialize_wkb_backup(wkb)
+
+
+def upgrade_feature_backup(backup: str, is_versioning_enabled: bool) -> bytes:
+    """Converts a text deleted feature backup to the binary format"""
+    feature_backup = FeatureBackup(backup, is_versioning_enabled)
+    return serialize_feature_backup(
+        feature_backup.after_sync, feature_backup.before_deletion
+    )
+
+
+def _decode_feature(backup: bytes) -> Tuple[FeatureState, FeatureState]:
+    reader = _Reader(backup)
+    after_sync = reader.read_state()
+
+    wkb = after_sync.wkb
+    if reader.read_byte() == _GEOMETRY_CHANGED:
+        wkb = reader.read_bytes()
+
+    values = dict(after_sync.fields)
+    values.update(reader.read_fields())
+    before_deletion = FeatureState(list(values.items()), wkb)
+
+    return after_sync, before_deletion
+
+
+def _decode_legacy_feature(
+    backup: str, is_versioning_enabled: bool
+) -> Tuple[FeatureState, FeatureState]:
+    document = json.loads(backup)
+
+    def state(name: str) -> FeatureState:
+        wkb = geometry_backup_wkb(
+            document[name]["geom"], is_versioning_enabled
+        )
+        return FeatureState(
+            [
+                (field_id, value)
+                for field_id, value in document[name]["fields"]
+            ],
+            wkb if wkb is not None else b"",
+        )
+
+    return state("after_sync"), state("before_deletion")
+
+
+def _is_same_value(lhs: Any, rhs: Any) -> bool:
+    return type(lhs) is type(rhs) and lhs == rhs
+
+
+def geometry_to_wkb(geometry: Optional[QgsGeometry]) -> bytes:
+    """Returns WKB of a geometry or empty bytes for empty geometry"""
+    if geometry is None or geometry.isEmpty():
+        return b""
+    return bytes(geometry.asWkb().data())
+
+
+def _geometry_from_wkb(wkb: bytes) -> QgsGeometry:
+    geometry = QgsGeometry()
+    if len(wkb) == 0:
+        return geometry
+
+    geometry.fromWkb(wkb)
+    if geometry.isNull():
+        raise SerializationError("Invalid geometry backup")
+
+    return geometry
+
+
+class _Writer:
+    __buffer: bytearray
+
+    def __init__(self) -> None:
+        self.__buffer = bytearray((BACKUP_FORMAT_VERSION,))
+
+    def data(self) -> bytes:
+        return bytes(self.__buffer)
+
+    def write_byte(self, value: int) -> None:
+        self.__buffer.append(value)
+
+    def write_size(self, value: int) -> None:
+        # Unsigned LEB128
+        while True:
+            byte = value & 0x7F
+            value >>= 7
+            if value == 0:
+                self.__buffer.append(byte)
+                return
+            self.__buffer.append(byte | 0x80)
+
+    def write_bytes(self, value: bytes) -> None:
+        self.write_size(len(value))
+        self.__buffer.extend(value)
+
+    def write_value(self, value: Any) -> None:
+        if value is None:
+            self.write_byte(_NULL)
+        elif isinstance(value, bool):
+            self.write_byte(_TRUE if value else _FALSE)
+        elif isinstance(value, int):
+            # Zigzag encoding keeps small negative numbers short
+            self.write_byte(_INTEGER)
+            self.write_size(value * 2 if value >= 0 else -value * 2 - 1)
+        elif isinstance(value, float):
+            self.write_byte(_REAL)
+            self.__buffer.extend(_DOUBLE.pack(value))
+        elif isinstance(value, str):
+            self.write_byte(_TEXT)
+            self.write_bytes(value.encode())
+        else:
+            try:
+                serialized_value = json.dumps(value)
+            except Exception as error:
+                raise SerializationError from error
+            self.write_byte(_JSON)
+            self.write_bytes(serialized_value.encode())
+
+    def write_fields(self, fields: List[Tuple[FieldId, Any]]) -> None:
+        self.write_size(len(fields))
+        for field_id, value in fields:
+            self.write_size(field_id)
+            self.write_value(value)
+
+    def write_state(self, state: FeatureState) -> None:
+        self.write_bytes(state.wkb)
+        self.write_fields(state.fields)
+
+
+class _Reader:
+    __data: memoryview
+    __offset: int
+
+    def __init__(self, data: bytes) -> None:
+        self.__data = memoryview(data)
+        if len(data) == 0 or data[0] != BACKUP_FORMAT_VERSION:
+            raise SerializationError("Unsupported backup format")
+        self.__offset = 1
+
+    def read_byte(self) -> int:
+        value = self.__data[self.__offset]
+        self.__offset += 1
+        return value
+
+    def read_size(self) -> int:
+        result = 0
+        shift = 0
+        while True:
+            byte = self.read_byte()
+            result |= (byte & 0x7F) << shift
+            if byte & 0x80 == 0:
+                return result
+            shift += 7
+
+    def read_bytes(self) -> bytes:
+        size = self.read_size()
+        end = self.__offset + size
+        if end > len(self.__data):
+            raise SerializationError("Truncated backup")
+        value = self.__data[self.__offset : end].tobytes()
+        self.__offset = end
+        return value
+
+    def read_rest(self) -> bytes:
+        value = self.__data[self.__offset :].tobytes()
+        self.__offset = len(self.__data)
+        return value
+
+    def read_value(self) -> Any:
+        tag = self.read_byte()
+        if tag == _NULL:
+            return None
+        if tag in (_FALSE, _TRUE):
+            return tag == _TRUE
+        if tag == _INTEGER:
+            value = self.read_size()
+            return value // 2 if value % 2 == 0 else -(value + 1) // 2
+        if tag == _REAL:
+            value = _DOUBLE.unpack_from(self.__data, self.__offset)[0]
+            self.__offset += _DOUBLE.size
+            return value
+        if tag == _TEXT:
+            return self.read_bytes().decode()
+        if tag == _JSON:
+            return json.loads(self.read_bytes().decode())
+
+        raise SerializationError(f"Unknown value tag: {tag}")
+
+    def read_fields(self) -> List[Tuple[FieldId, Any]]:
+        return [
+            (self.read_size(), self.read_value())
+            for _ in range(self.read_size())
+        ]
+
+    def read_state(self) -> FeatureState:
+        wkb = self.read_bytes()
+        return FeatureState(self.read_fields(), wkb)
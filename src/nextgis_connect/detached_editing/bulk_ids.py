@@ -0,0 +1,105 @@
+"""
+Id sets for bulk SQL queries.
+
+Joining thousands of ids into "IN (...)" lists or "(...) OR (...)" chains
+makes SQLite parse a new statement on every call, and large
+synchronizations hit the statement length limit. Ids are passed as data
+instead, so statement text stays constant:
+
+* queries of the writer connection fill an indexed temporary table and
+  use it in "IN temp.<name>" conditions and joins;
+* reader connections must not write even to temporary tables, because
+  it would leave a transaction open, so they pass ids as a JSON array
+  parameter expanded by JSON_IDS subquery.
+"""
+
+import json
+import sqlite3
+from typing import Iterable, Tuple
+
+FIDS_TABLE = "ngw_bulk_fids"
+NGW_FIDS_TABLE = "ngw_bulk_ngw_fids"
+ATTRIBUTES_TABLE = "ngw_bulk_attributes"
+
+
+def json_ids_subquery(parameter: str = "?") -> str:
+    """
+    Returns subquery with ids passed as a JSON array parameter.
+
+    A numbered parameter, like "?3", allows to use the subquery in queries
+    with other numbered parameters.
+    """
+    return f"SELECT value FROM json_each({parameter})"
+
+
+# Subquery with ids passed as a JSON array parameter
+JSON_IDS = json_ids_subquery()
+
+
+def json_ids(ids: Iterable[int]) -> str:
+    """Serializes ids for the JSON_IDS parameter"""
+    return json.dumps(list(map(int, ids)))
+
+
+def fill_temp_fids(cursor: sqlite3.Cursor, fids: Iterable[int]) -> str:
+    """
+    Replaces content of the temporary table of feature ids.
+
+    :return: Qualified table name with "id" column
+    """
+    return _fill_temp_ids(cursor, FIDS_TABLE, fids)
+
+
+def fill_temp_ngw_fids(cursor: sqlite3.Cursor, ngw_fids: Iterable[int]) -> str:
+    """
+    Replaces content of the temporary table of NextGIS Web feature ids.
+
+    :return: Qualified table name with "id" column
+    """
+    return _fill_temp_ids(cursor, NGW_FIDS_TABLE, ngw_fids)
+
+
+def fill_temp_attributes(
+    cursor: sqlite3.Cursor, attributes: Iterable[Tuple[int, int]]
+) -> str:
+    """
+    Replaces content of the temporary table of (fid, attribute) pairs.
+
+    :return: Qualified table name with "fid" and "attribute" columns
+    """
+    cursor.execute(
+        f"""
+        CREATE TEMP TABLE IF NOT EXISTS {ATTRIBUTES_TABLE} (
+            'fid' INTEGER,
+            'attribute' INTEGER,
+            PRIMARY KEY (fid, attribute)
+        ) WITHOUT ROWID
+        """
+    )
+    cursor.execute(f"DELETE FROM temp.{ATTRIBUTES_TABLE}")  # nosec B608
+    cursor.executemany(
+        f"""
+        INSERT OR IGNORE INTO temp.{ATTRIBUTES_TABLE} (fid, attribute)
+        VALUES (?, ?)
+        """,  # nosec B608
+        attributes,
+    )
+    return f"temp.{ATTRIBUTES_TABLE}"
+
+
+def _fill_temp_ids(
+    cursor: sqlite3.Cursor, table_name: str, ids: Iterable[int]
+) -> str:
+    cursor.execute(
+        f"""
+        CREATE TEMP TABLE IF NOT EXISTS {table_name} (
+            'id' INTEGER PRIMARY KEY
+        )
+        """
+    )
+    cursor.execute(f"DELETE FROM temp.{table_name}")  # nosec B608
+    cursor.executemany(
+        f"INSERT OR IGNORE INTO temp.{table_name} (id) VALUES (?)",  # nosec B608
+        ((id_,) for id_ in ids),
+    )
+    return f"temp.{table_name}"
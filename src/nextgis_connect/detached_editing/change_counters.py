@@ -0,0 +1,204 @@
+"""
+Counters of features and local changes maintained by container triggers.
+
+Reading the counters is O(1), so container metadata and changes summary
+don't have to scan the feature table and changes tables after every
+commit. Counters are installed lazily for containers created before they
+were introduced and are verified by the container maintenance task with
+repair_change_counters.
+"""
+
+import sqlite3
+from typing import Dict, List, Optional
+
+from nextgis_connect.utils import wrap_sql_table_name
+
+FEATURES = "features"
+ADDED_FEATURES = "added_features"
+REMOVED_FEATURES = "removed_features"
+RESTORED_FEATURES = "restored_features"
+UPDATED_ATTRIBUTES = "updated_attributes"
+UPDATED_GEOMETRIES = "updated_geometries"
+
+# Counters with one row per feature in ngw_<name> table
+CHANGES_TABLES_COUNTERS = (
+    ADDED_FEATURES,
+    REMOVED_FEATURES,
+    RESTORED_FEATURES,
+    UPDATED_GEOMETRIES,
+)
+
+COUNTERS = (FEATURES, *CHANGES_TABLES_COUNTERS, UPDATED_ATTRIBUTES)
+
+TRIGGER_NAMES = tuple(
+    f"ngw_counters_{counter}_{operation}"
+    for counter in COUNTERS
+    for operation in ("insert", "delete")
+)
+
+
+def has_change_counters(cursor: sqlite3.Cursor) -> bool:
+    """Checks that counters table and all triggers exist"""
+    placeholders = ",".join("?" * len(TRIGGER_NAMES))
+    cursor.execute(
+        f"""
+        SELECT COUNT(*) FROM sqlite_master
+        WHERE type = 'trigger' AND name IN ({placeholders})
+        """,  # nosec B608
+        TRIGGER_NAMES,
+    )
+    return cursor.fetchone()[0] == len(TRIGGER_NAMES)
+
+
+def read_change_counters(cursor: sqlite3.Cursor) -> Optional[Dict[str, int]]:
+    """
+    Returns counters values or None if counters are not installed or
+    were lost (e.g. after the feature table was recreated).
+    """
+    if not has_change_counters(cursor):
+        return None
+
+    counters = dict(cursor.execute("SELECT name, value FROM ngw_counters"))
+    if any(counter not in counters for counter in COUNTERS):
+        return None
+
+    return counters
+
+
+def ensure_change_counters(cursor: sqlite3.Cursor) -> bool:
+    """
+    Installs counters if they are missing.
+
+    :return: True if counters were installed
+    """
+    if has_change_counters(cursor):
+        return False
+
+    install_change_counters(cursor, _features_table_name(cursor))
+    return True
+
+
+def install_change_counters(cursor: sqlite3.Cursor, table_name: str) -> None:
+    """Creates counters table and triggers and calculates initial values"""
+    cursor.executescript(_counters_schema(table_name))
+    repair_change_counters(cursor, table_name)
+
+
+def repair_change_counters(
+    cursor: sqlite3.Cursor, table_name: Optional[str] = None
+) -> bool:
+    """
+    Recalculates counters using full scans.
+
+    :return: True if stored values were out of date
+    """
+    if table_name is None:
+        table_name = _features_table_name(cursor)
+
+    actual_values = dict(
+        zip(
+            COUNTERS,
+            cursor.execute(
+                f"""
+                SELECT
+                    (SELECT COUNT(*) FROM {wrap_sql_table_name(table_name)}),
+                    (SELECT COUNT(*) FROM ngw_added_features),
+                    (SELECT COUNT(*) FROM ngw_removed_features),
+                    (SELECT COUNT(*) FROM ngw_restored_features),
+                    (SELECT COUNT(*) FROM ngw_updated_geometries),
+                    (SELECT COUNT(DISTINCT fid) FROM ngw_updated_attributes)
+                """  # nosec B608
+            ).fetchone(),
+        )
+    )
+    stored_values = dict(
+        cursor.execute("SELECT name, value FROM ngw_counters")
+    )
+    if stored_values == actual_values:
+        return False
+
+    cursor.executemany(
+        """
+        INSERT INTO ngw_counters (name, value) VALUES (?, ?)
+        ON CONFLICT (name) DO UPDATE SET value = excluded.value
+        """,
+        actual_values.items(),
+    )
+    return True
+
+
+def _features_table_name(cursor: sqlite3.Cursor) -> str:
+    cursor.execute(
+        "SELECT table_name FROM gpkg_contents WHERE data_type='features'"
+    )
+    return cursor.fetchone()[0]
+
+
+def _counters_schema(table_name: str) -> str:
+    statements: List[str] = [
+        """
+        CREATE TABLE IF NOT EXISTS ngw_counters (
+            'name' TEXT PRIMARY KEY,
+            'value' INTEGER NOT NULL DEFAULT 0
+        );
+        """
+    ]
+
+    tables = {
+        FEATURES: wrap_sql_table_name(table_name),
+        **{counter: f"ngw_{counter}" for counter in CHANGES_TABLES_COUNTERS},
+    }
+    for counter, table in tables.items():
+        statements.append(
+            _trigger(counter, "insert", table, delta=1)
+            + _trigger(counter, "delete", table, delta=-1)
+        )
+
+    # Attributes are counted by features, not by rows
+    statements.append(
+        _trigger(
+            UPDATED_ATTRIBUTES,
+            "insert",
+            "ngw_updated_attributes",
+            delta=1,
+            condition="""
+                (
+                    SELECT COUNT(*) FROM ngw_updated_attributes
+                    WHERE fid = NEW.fid
+                ) = 1
+            """,
+        )
+        + _trigger(
+            UPDATED_ATTRIBUTES,
+            "delete",
+            "ngw_updated_attributes",
+            delta=-1,
+            condition="""
+                NOT EXISTS (
+                    SELECT 1 FROM ngw_updated_attributes WHERE fid = OLD.fid
+                )
+            """,
+        )
+    )
+
+    return "\n".join(statements)
+
+
+def _trigger(
+    counter: str,
+    operation: str,
+    table: str,
+    *,
+    delta: int,
+    condition: Optional[str] = None,
+) -> str:
+    when = f"WHEN {condition}" if condition is not None else ""
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS ngw_counters_{counter}_{operation}
+        AFTER {operation.upper()} ON {table}
+        {when}
+        BEGIN
+            UPDATE ngw_counters SET value = value + ({delta})
+            WHERE name = '{counter}';
+        END;
+        """
@@ -0,0 +1,425 @@
+"""
+Capture of features state before a layer commit.
+
+QGIS doesn't keep old values of committed features, so they are saved
+before the edit buffer is committed and are moved to change tables when
+the commit succeeds.
+
+Backups are selected straight from the feature table with set-based
+queries into temporary tables of the writer connection. Values are packed
+by SQL functions, so features are read through the layer only for date
+and time fields, because their stored text differs from values returned
+by QGIS.
+
+When an attribute is changed for all synchronized features of a fid range
+(e.g. by the field calculator), a column record is saved instead of rows
+of changes. Backups of its features are kept apart for deletions and
+conflicts resolution.
+"""
+
+import sqlite3
+from contextlib import closing
+from typing import Dict, Iterable, List, Optional
+
+from qgis.core import QgsFeatureRequest, QgsVectorDataProvider
+
+from nextgis_connect.compat import (
+    FeatureRequestFlag,
+    QgsChangedAttributesMap,
+    QgsFeatureId,
+    QgsFeatureIds,
+)
+from nextgis_connect.detached_editing.backup_serialization import (
+    FeatureState,
+    deserialize_value_backup,
+    geometry_backup_wkb,
+    serialize_value_backup,
+    serialize_wkb_backup,
+)
+from nextgis_connect.detached_editing.bulk_ids import JSON_IDS, json_ids
+from nextgis_connect.detached_editing.column_changes import (
+    COLUMN_FEATURES_CONDITION,
+    MIN_COLUMN_FEATURES_COUNT,
+)
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
+from nextgis_connect.detached_editing.gpkg_utils import geometry_wkb
+from nextgis_connect.detached_editing.utils import DetachedContainerMetaData
+from nextgis_connect.resources.ngw_data_type import NgwDataType
+from nextgis_connect.utils import wrap_sql_table_name
+
+CONVERTED_DATATYPES = (
+    NgwDataType.DATE,
+    NgwDataType.TIME,
+    NgwDataType.DATETIME,
+)
+
+
+class ChangesBackup:
+    """
+    Keeps backups of features changed in the current commit.
+
+    Rows with is_changed flag are backups of changed values and
+    geometries. Rows with is_column flag are backups of values changed by
+    column records. Other rows are the rest of deleted features state.
+    """
+
+    __connection_pool: ContainerConnectionPool
+
+    def __init__(self, connection_pool: ContainerConnectionPool) -> None:
+        self.__connection_pool = connection_pool
+
+    def capture(
+        self,
+        metadata: DetachedContainerMetaData,
+        provider: QgsVectorDataProvider,
+        changed_attributes: QgsChangedAttributesMap,
+        changed_geometries: Iterable[QgsFeatureId],
+        deleted_fids: QgsFeatureIds,
+    ) -> None:
+        """Saves current state of changed and deleted features"""
+        with self.__connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            self.__prepare(connection, cursor)
+
+            cursor.executemany(
+                """
+                INSERT INTO temp.ngw_backup_attributes (
+                    fid, attribute, is_changed
+                )
+                VALUES (?, ?, 1)
+                """,
+                (
+                    (fid, attribute)
+                    for fid, attributes in changed_attributes.items()
+                    for attribute in attributes
+                ),
+            )
+            cursor.executemany(
+                """
+                INSERT INTO temp.ngw_backup_geometries (fid, is_changed)
+                VALUES (?, 1)
+                """,
+                ((fid,) for fid in changed_geometries),
+            )
+            cursor.executemany(
+                "INSERT INTO temp.ngw_backup_deleted (fid) VALUES (?)",
+                ((fid,) for fid in deleted_fids),
+            )
+
+            self.__complete_keys(cursor)
+            self.__capture_columns(cursor)
+            self.__capture_values(cursor, metadata)
+            self.__capture_converted_values(cursor, metadata, provider)
+            self.__capture_geometries(cursor, metadata)
+
+    def reset(self) -> None:
+        with self.__connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            self.__prepare(connection, cursor)
+
+    def save_updated_attributes(self, cursor: sqlite3.Cursor) -> None:
+        """Moves backups of changed values to the change tables"""
+        cursor.execute(
+            """
+            INSERT INTO ngw_updated_columns (attribute, min_fid, max_fid)
+            SELECT attribute, min_fid, max_fid
+            FROM temp.ngw_backup_columns
+            """
+        )
+        cursor.execute(
+            """
+            INSERT INTO ngw_updated_attributes (fid, attribute, backup)
+            SELECT fid, attribute, backup
+            FROM temp.ngw_backup_attributes
+            WHERE is_changed
+            ON CONFLICT DO NOTHING
+            """
+        )
+        cursor.execute(
+            """
+            INSERT INTO ngw_column_backups (fid, attribute, backup)
+            SELECT fid, attribute, backup
+            FROM temp.ngw_backup_attributes
+            WHERE is_column
+            ON CONFLICT DO NOTHING
+            """
+        )
+
+    def save_updated_geometries(self, cursor: sqlite3.Cursor) -> None:
+        """Moves backups of changed geometries to the change table"""
+        cursor.execute(
+            """
+            INSERT INTO ngw_updated_geometries (fid, backup)
+            SELECT fid, backup
+            FROM temp.ngw_backup_geometries
+            WHERE is_changed
+            ON CONFLICT DO NOTHING
+            """
+        )
+
+    def deleted_features_states(
+        self,
+        cursor: sqlite3.Cursor,
+        metadata: DetachedContainerMetaData,
+        fids: QgsFeatureIds,
+    ) -> Dict[QgsFeatureId, FeatureState]:
+        """Returns states of deleted features before deletion"""
+        fids_parameter = (json_ids(fids),)
+
+        values: Dict[QgsFeatureId, Dict[int, bytes]] = {}
+        for fid, attribute, backup in cursor.execute(
+            f"""
+            SELECT fid, attribute, backup
+            FROM temp.ngw_backup_attributes
+            WHERE fid IN ({JSON_IDS})
+            """,  # nosec B608
+            fids_parameter,
+        ):
+            values.setdefault(fid, {})[attribute] = backup
+
+        states = {}
+        for fid, backup in cursor.execute(
+            f"""
+            SELECT fid, backup
+            FROM temp.ngw_backup_geometries
+            WHERE fid IN ({JSON_IDS})
+            """,  # nosec B608
+            fids_parameter,
+        ):
+            wkb = geometry_backup_wkb(backup, metadata.is_versioning_enabled)
+            feature_values = values.get(fid, {})
+            states[fid] = FeatureState(
+                [
+                    (
+                        field.ngw_id,
+                        deserialize_value_backup(
+                            feature_values.get(field.attribute)
+                        ),
+                    )
+                    for field in metadata.fields
+                ],
+                wkb if wkb is not None else b"",
+            )
+
+        return states
+
+    def __prepare(
+        self, connection: sqlite3.Connection, cursor: sqlite3.Cursor
+    ) -> None:
+        connection.create_function(
+            "ngw_value_backup", 1, serialize_value_backup
+        )
+        connection.create_function("ngw_geometry_backup", 1, _geometry_backup)
+
+        cursor.executescript(
+            """
+            CREATE TEMP TABLE IF NOT EXISTS ngw_backup_attributes (
+                'fid' INTEGER,
+                'attribute' INTEGER,
+                'is_changed' BOOLEAN DEFAULT 0,
+                'is_column' BOOLEAN DEFAULT 0,
+                'backup' BLOB,
+                PRIMARY KEY (fid, attribute)
+            );
+            CREATE TEMP TABLE IF NOT EXISTS ngw_backup_geometries (
+                'fid' INTEGER PRIMARY KEY,
+                'is_changed' BOOLEAN DEFAULT 0,
+                'backup' BLOB
+            );
+            CREATE TEMP TABLE IF NOT EXISTS ngw_backup_deleted (
+                'fid' INTEGER PRIMARY KEY
+            );
+            CREATE TEMP TABLE IF NOT EXISTS ngw_backup_columns (
+                'attribute' INTEGER PRIMARY KEY,
+                'min_fid' INTEGER,
+                'max_fid' INTEGER
+            );
+
+            DELETE FROM temp.ngw_backup_attributes;
+            DELETE FROM temp.ngw_backup_geometries;
+            DELETE FROM temp.ngw_backup_deleted;
+            DELETE FROM temp.ngw_backup_columns;
+            """
+        )
+
+    def __complete_keys(self, cursor: sqlite3.Cursor) -> None:
+        # Not uploaded features don't need backups
+        for table_name in (
+            "ngw_backup_attributes",
+            "ngw_backup_geometries",
+            "ngw_backup_deleted",
+        ):
+            cursor.execute(
+                f"""
+                DELETE FROM temp.{table_name}
+                WHERE fid IN (SELECT fid FROM ngw_added_features)
+                """  # nosec B608
+            )
+
+        cursor.execute(
+            """
+            INSERT OR IGNORE INTO temp.ngw_backup_attributes (fid, attribute)
+            SELECT deleted.fid, fields.attribute
+            FROM temp.ngw_backup_deleted deleted
+            CROSS JOIN ngw_fields_metadata fields
+            """
+        )
+        cursor.execute(
+            """
+            INSERT OR IGNORE INTO temp.ngw_backup_geometries (fid)
+            SELECT fid FROM temp.ngw_backup_deleted
+            """
+        )
+
+    def __capture_columns(self, cursor: sqlite3.Cursor) -> None:
+        cursor.execute(
+            f"""
+            SELECT attribute, COUNT(*), MIN(fid), MAX(fid)
+            FROM temp.ngw_backup_attributes
+            WHERE is_changed AND fid IN (
+                SELECT metadata.fid FROM ngw_features_metadata metadata
+                WHERE {COLUMN_FEATURES_CONDITION}
+            )
+            GROUP BY attribute
+            HAVING COUNT(*) >= ?
+            """,  # nosec B608
+            (MIN_COLUMN_FEATURES_COUNT,),
+        )
+        candidates = cursor.fetchall()
+        if len(candidates) == 0:
+            return
+
+        for attribute, changed_count, min_fid, max_fid in candidates:
+            # Column record is possible only if there are no unchanged
+            # features in the range
+            cursor.execute(
+                f"""
+                SELECT COUNT(*) FROM ngw_features_metadata metadata
+                WHERE metadata.fid BETWEEN ? AND ?
+                    AND {COLUMN_FEATURES_CONDITION}
+                """,  # nosec B608
+                (min_fid, max_fid),
+            )
+            if cursor.fetchone()[0] != changed_count:
+                continue
+
+            cursor.execute(
+                "INSERT INTO temp.ngw_backup_columns VALUES (?, ?, ?)",
+                (attribute, min_fid, max_fid),
+            )
+            cursor.execute(
+                f"""
+                UPDATE temp.ngw_backup_attributes
+                SET is_changed = 0, is_column = 1
+                WHERE attribute = ? AND fid IN (
+                    SELECT metadata.fid FROM ngw_features_metadata metadata
+                    WHERE metadata.fid BETWEEN ? AND ?
+                        AND {COLUMN_FEATURES_CONDITION}
+                )
+                """,  # nosec B608
+                (attribute, min_fid, max_fid),
+            )
+
+    def __capture_values(
+        self, cursor: sqlite3.Cursor, metadata: DetachedContainerMetaData
+    ) -> None:
+        fields = [
+            field
+            for field in metadata.fields
+            if field.datatype not in CONVERTED_DATATYPES
+        ]
+        if len(fields) == 0:
+            return
+
+        current_value = "\n".join(
+            f"WHEN {field.attribute} THEN"
+            f" features.{wrap_sql_table_name(field.keyname)}"
+            for field in fields
+        )
+        attributes = ",".join(str(field.attribute) for field in fields)
+        cursor.execute(
+            f"""
+            UPDATE temp.ngw_backup_attributes
+            SET backup = (
+                SELECT ngw_value_backup(
+                    CASE ngw_backup_attributes.attribute {current_value} END
+                )
+                FROM {wrap_sql_table_name(metadata.table_name)} features
+                WHERE features.{wrap_sql_table_name(metadata.fid_field)}
+                    = ngw_backup_attributes.fid
+            )
+            WHERE attribute IN ({attributes})
+            """  # nosec B608
+        )
+
+    def __capture_converted_values(
+        self,
+        cursor: sqlite3.Cursor,
+        metadata: DetachedContainerMetaData,
+        provider: QgsVectorDataProvider,
+    ) -> None:
+        converted_attributes = [
+            field.attribute
+            for field in metadata.fields
+            if field.datatype in CONVERTED_DATATYPES
+        ]
+        if len(converted_attributes) == 0:
+            return
+
+        attributes_by_fid: Dict[QgsFeatureId, List[int]] = {}
+        for fid, attribute in cursor.execute(
+            f"""
+            SELECT fid, attribute FROM temp.ngw_backup_attributes
+            WHERE attribute IN ({",".join(map(str, converted_attributes))})
+            """  # nosec B608
+        ):
+            attributes_by_fid.setdefault(fid, []).append(attribute)
+
+        if len(attributes_by_fid) == 0:
+            return
+
+        request = QgsFeatureRequest(set(attributes_by_fid.keys()))
+        request.setSubsetOfAttributes(converted_attributes)
+        request.setFlags(FeatureRequestFlag.NoGeometry)
+
+        cursor.executemany(
+            """
+            UPDATE temp.ngw_backup_attributes SET backup = ?
+            WHERE fid = ? AND attribute = ?
+            """,
+            (
+                (
+                    serialize_value_backup(feature.attribute(attribute)),
+                    feature.id(),
+                    attribute,
+                )
+                for feature in provider.getFeatures(request)
+                for attribute in attributes_by_fid[feature.id()]
+            ),
+        )
+
+    def __capture_geometries(
+        self, cursor: sqlite3.Cursor, metadata: DetachedContainerMetaData
+    ) -> None:
+        cursor.execute(
+            f"""
+            UPDATE temp.ngw_backup_geometries
+            SET backup = (
+                SELECT ngw_geometry_backup(
+                    features.{wrap_sql_table_name(metadata.geom_field)}
+                )
+                FROM {wrap_sql_table_name(metadata.table_name)} features
+                WHERE features.{wrap_sql_table_name(metadata.fid_field)}
+                    = ngw_backup_geometries.fid
+            )
+            """  # nosec B608
+        )
+
+
+def _geometry_backup(blob: Optional[bytes]) -> bytes:
+    wkb = geometry_wkb(blob)
+    return serialize_wkb_backup(wkb if wkb is not None else b"")
@@ -0,0 +1,112 @@
+import queue
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+from nextgis_connect.ngw_api.qgis.qgis_ngw_connection import QgsNgwConnection
+
+Page = List[Dict[str, Any]]
+
+_END_OF_PAGES = object()
+
+
+class ChangesPagesPrefetcher:
+    """
+    Iterates over pages of versioning changes.
+
+    Every page ends with a continue action which holds the URL of the next
+    page. The cursor in this URL is issued by the server, so pages can't be
+    requested out of order. Instead, next pages are downloaded in a
+    background thread while the current one is processed, so processing
+    time is hidden behind network round trips.
+    """
+
+    PREFETCH_COUNT = 2
+
+    __connection_id: str
+    __fetch_url: str
+    __pages: "queue.Queue[Any]"
+    __stop_event: threading.Event
+    __thread: Optional[threading.Thread]
+
+    def __init__(
+        self,
+        connection_id: str,
+        fetch_url: str,
+        prefetch_count: int = PREFETCH_COUNT,
+    ) -> None:
+        self.__connection_id = connection_id
+        self.__fetch_url = fetch_url
+        self.__pages = queue.Queue(maxsize=max(1, prefetch_count))
+        self.__stop_event = threading.Event()
+        self.__thread = None
+
+    def __iter__(self) -> Iterator[Page]:
+        self.__start()
+        try:
+            while True:
+                item = self.__pages.get()
+                if item is _END_OF_PAGES:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+
+                yield item
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self.__thread is None:
+            return
+
+        self.__stop_event.set()
+
+        # Unblock producer waiting for free space
+        while self.__thread.is_alive():
+            try:
+                self.__pages.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+        self.__thread.join()
+        self.__thread = None
+
+    def __start(self) -> None:
+        if self.__thread is not None:
+            return
+
+        self.__stop_event.clear()
+        self.__thread = threading.Thread(
+            target=self.__fetch_pages,
+            name="NgConnectChangesPrefetcher",
+            daemon=True,
+        )
+        self.__thread.start()
+
+    def __fetch_pages(self) -> None:
+        try:
+            ngw_connection = QgsNgwConnection(self.__connection_id)
+            url = self.__fetch_url
+            while not self.__stop_event.is_set():
+                page = ngw_connection.get(url)
+                if len(page) == 0:
+                    break
+
+                continue_action = page[-1]
+                assert "url" in continue_action
+                url = continue_action["url"]
+
+                self.__put(page)
+
+        except Exception as error:
+            self.__put(error)
+            return
+
+        self.__put(_END_OF_PAGES)
+
+    def __put(self, item: Any) -> None:
+        while not self.__stop_event.is_set():
+            try:
+                self.__pages.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            return
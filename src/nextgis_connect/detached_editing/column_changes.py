@@ -0,0 +1,145 @@
+"""
+Column records of attribute changes.
+
+Rewriting a whole column (e.g. with the field calculator) would add
+a ngw_updated_attributes row with a backup for every feature of the layer.
+Instead ngw_updated_columns keeps one record per attribute and fid range:
+the attribute is changed for every synchronized feature in the range that
+is neither removed nor restored.
+
+ngw_column_changes view expands records to (fid, attribute) pairs and
+ngw_changed_attributes view joins them with per-feature rows, so readers
+of changes see both kinds of records. Synced values of features covered
+by column records are kept apart in ngw_column_backups, so code which edits
+changes of particular features expands records with their backups first
+with expand_column_changes.
+"""
+
+import sqlite3
+
+# Minimal number of changed features to store changes as a column record
+MIN_COLUMN_FEATURES_COUNT = 1000
+
+# Condition for features covered by a column record. Table alias of
+# ngw_features_metadata must be "metadata"
+COLUMN_FEATURES_CONDITION = """
+    metadata.ngw_fid IS NOT NULL
+    AND metadata.fid NOT IN (SELECT fid FROM ngw_removed_features)
+    AND metadata.fid NOT IN (SELECT fid FROM ngw_restored_features)
+"""
+
+COLUMN_CHANGES_SCHEMA = f"""
+    -- Attributes updated for all features in fid range
+    CREATE TABLE IF NOT EXISTS ngw_updated_columns (
+        'id' INTEGER PRIMARY KEY,
+        'attribute' INTEGER, -- Attribute ID
+        'min_fid' INTEGER, -- First feature ID of the range
+        'max_fid' INTEGER, -- Last feature ID of the range
+        FOREIGN KEY (attribute) REFERENCES ngw_fields_metadata(attribute) ON DELETE CASCADE
+    );
+
+    -- Synced values of features covered by column records
+    CREATE TABLE IF NOT EXISTS ngw_column_backups (
+        'fid' INTEGER,
+        'attribute' INTEGER, -- Attribute ID
+        'backup' BLOB, -- Serialized value
+        PRIMARY KEY (fid, attribute),
+        FOREIGN KEY (attribute) REFERENCES ngw_fields_metadata(attribute) ON DELETE CASCADE
+    ) WITHOUT ROWID;
+
+    CREATE VIEW IF NOT EXISTS ngw_column_changes AS
+    SELECT DISTINCT metadata.fid, columns.attribute
+    FROM ngw_updated_columns columns
+    JOIN ngw_features_metadata metadata
+        ON metadata.fid BETWEEN columns.min_fid AND columns.max_fid
+    WHERE {COLUMN_FEATURES_CONDITION};
+
+    CREATE VIEW IF NOT EXISTS ngw_changed_attributes AS
+    SELECT fid, attribute FROM ngw_updated_attributes
+    UNION
+    SELECT fid, attribute FROM ngw_column_changes;
+"""  # nosec B608
+
+
+def has_column_changes(cursor: sqlite3.Cursor) -> bool:
+    """Checks that column records table and views exist"""
+    cursor.execute(
+        """
+        SELECT COUNT(*) FROM sqlite_master
+        WHERE name IN (
+            'ngw_updated_columns',
+            'ngw_column_backups',
+            'ngw_column_changes',
+            'ngw_changed_attributes'
+        )
+        """
+    )
+    return cursor.fetchone()[0] == 4
+
+
+def ensure_column_changes(cursor: sqlite3.Cursor) -> bool:
+    """
+    Creates column records table and views if they are missing.
+
+    :return: True if they were created
+    """
+    if has_column_changes(cursor):
+        return False
+
+    install_column_changes(cursor)
+    return True
+
+
+def install_column_changes(cursor: sqlite3.Cursor) -> None:
+    """Creates column records table and views"""
+    cursor.executescript(COLUMN_CHANGES_SCHEMA)
+
+
+def has_column_records(cursor: sqlite3.Cursor) -> bool:
+    cursor.execute("SELECT EXISTS(SELECT 1 FROM ngw_updated_columns)")
+    return bool(cursor.fetchone()[0])
+
+
+def expand_column_changes(cursor: sqlite3.Cursor) -> int:
+    """
+    Replaces column records with per-feature rows.
+
+    Rows get backups kept for column records. They are empty for records
+    created before backups were kept.
+
+    :return: Number of expanded column records
+    """
+    if not has_column_records(cursor):
+        return 0
+
+    cursor.execute(
+        """
+        INSERT OR IGNORE INTO ngw_updated_attributes (fid, attribute, backup)
+        SELECT changes.fid, changes.attribute, backups.backup
+        FROM ngw_column_changes changes
+        LEFT JOIN ngw_column_backups backups
+            ON backups.fid = changes.fid
+                AND backups.attribute = changes.attribute
+        """
+    )
+    cursor.execute("DELETE FROM ngw_updated_columns")
+    expanded_count = cursor.rowcount
+    cursor.execute("DELETE FROM ngw_column_backups")
+    return expanded_count
+
+
+def shrink_column_changes(cursor: sqlite3.Cursor, max_fid: int) -> None:
+    """
+    Removes uploaded part of column records.
+
+    Updated features are uploaded in ascending fid order, so features with
+    fid up to max_fid are already sent.
+    """
+    cursor.execute(
+        """
+        UPDATE ngw_updated_columns SET min_fid = ?
+        WHERE min_fid <= ?
+        """,
+        (max_fid + 1, max_fid),
+    )
+    cursor.execute("DELETE FROM ngw_updated_columns WHERE min_fid > max_fid")
@@ -1,8 +1,7 @@
-import json
 import sqlite3
 from contextlib import closing
 from pathlib import Path
-from typing import Dict, Iterable, List, Sequence, Tuple, cast
+from typing import Any, Dict, Iterable, List, Sequence, Tuple, cast
 
 from qgis.core import QgsFeature, QgsFeatureRequest, QgsVectorLayer
 
@@ -13,20 +12,28 @@ from nextgis_connect.detached_editing.actions import (
     FeatureAction,
     FeatureId,
 )
+from nextgis_connect.detached_editing.backup_serialization import (
+    Backup,
+    FeatureBackup,
+    deserialize_geometry_backup,
+    deserialize_value_backup,
+)
+from nextgis_connect.detached_editing.bulk_ids import JSON_IDS, json_ids
 from nextgis_connect.detached_editing.conflicts.conflict import (
     VersioningConflict,
 )
 from nextgis_connect.detached_editing.conflicts.conflict_resolving_item import (
     ConflictResolvingItem,
 )
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
 from nextgis_connect.detached_editing.serialization import (
     deserialize_geometry,
-    deserialize_value,
 )
 from nextgis_connect.detached_editing.utils import (
     DetachedContainerMetaData,
     detached_layer_uri,
-    make_connection,
 )
 from nextgis_connect.resources.ngw_field import FieldId
 
@@ -34,12 +41,17 @@ from nextgis_connect.resources.ngw_field import FieldId
 class ConflictResolvingItemExtractor:
     __container_path: Path
     __metadata: DetachedContainerMetaData
+    __connection_pool: ContainerConnectionPool
 
     def __init__(
-        self, container_path: Path, metadata: DetachedContainerMetaData
+        self,
+        container_path: Path,
+        metadata: DetachedContainerMetaData,
+        connection_pool: ContainerConnectionPool,
     ) -> None:
         self.__container_path = container_path
         self.__metadata = metadata
+        self.__connection_pool = connection_pool
 
     def extract(
         self, conflicts: List[VersioningConflict]
@@ -133,8 +145,8 @@ class ConflictResolvingItemExtractor:
     def __restore_feature(
         self,
         feature: QgsFeature,
-        fields_backups: Dict[Tuple[QgsFeatureId, FieldId], str],
-        geometries_backups: Dict[QgsFeatureId, str],
+        fields_backups: Dict[Tuple[QgsFeatureId, FieldId], Any],
+        geometries_backups: Dict[QgsFeatureId, Backup],
     ) -> QgsFeature:
         result_feature = QgsFeature(feature)
         for field in self.__metadata.fields:
@@ -144,7 +156,7 @@ class ConflictResolvingItemExtractor:
             result_feature.setAttribute(field.attribute, fields_backups[key])
         if feature.id() in geometries_backups:
             result_feature.setGeometry(
-                deserialize_geometry(
+                deserialize_geometry_backup(
                     geometries_backups[feature.id()],
                     self.__metadata.is_versioning_enabled,
                 )
@@ -226,16 +238,18 @@ class ConflictResolvingItemExtractor:
     def __extract_deleted_features(
         self, fids: Sequence
     ) -> Dict[FeatureId, QgsFeature]:
-        fids_str = ",".join(map(str, fids))
-        with closing(
-            make_connection(self.__container_path)
-        ) as connection, closing(connection.cursor()) as cursor:
+        with self.__connection_pool.reader() as connection, closing(
+            connection.cursor()
+        ) as cursor:
             backups = {
                 row[0]: row[1]
-                for row in cursor.execute(f"""
+                for row in cursor.execute(
+                    f"""
                     SELECT fid, backup FROM ngw_removed_features
-                    WHERE fid IN ({fids_str});
-                """)  # nosec B608
+                    WHERE fid IN ({JSON_IDS});
+                    """,  # nosec B608
+                    (json_ids(fids),),
+                )
             }
 
         fields = QgsVectorLayer(
@@ -246,20 +260,16 @@ class ConflictResolvingItemExtractor:
 
         deleted_features = {}
         for fid in fids:
-            backup = json.loads(backups[fid])
-            attributes_after_sync = backup["after_sync"]["fields"]
+            after_sync = FeatureBackup(
+                backups[fid], self.__metadata.is_versioning_enabled
+            ).after_sync
             feature = QgsFeature(fields, fid)
-            for field_id, value in attributes_after_sync:
+            for field_id, value in after_sync.fields:
                 feature.setAttribute(
                     self.__metadata.fields.get_with(ngw_id=field_id).attribute,
                     value,
                 )
-            feature.setGeometry(
-                deserialize_geometry(
-                    backup["after_sync"]["geom"],
-                    self.__metadata.is_versioning_enabled,
-                )
-            )
+            feature.setGeometry(after_sync.geometry())
             deleted_features[feature.id()] = feature
 
         return deleted_features
@@ -267,61 +277,70 @@ class ConflictResolvingItemExtractor:
     def __extract_backups(
         self, locally_changed_fids: List[QgsFeatureId]
     ) -> Tuple[
-        Dict[Tuple[QgsFeatureId, FieldId], str], Dict[QgsFeatureId, str]
+        Dict[Tuple[QgsFeatureId, FieldId], Any], Dict[QgsFeatureId, Backup]
     ]:
-        joined_locally_changed_fids = ",".join(map(str, locally_changed_fids))
-        with closing(
-            make_connection(self.__container_path)
-        ) as connection, closing(connection.cursor()) as cursor:
+        fids_parameter = json_ids(locally_changed_fids)
+        with self.__connection_pool.reader() as connection, closing(
+            connection.cursor()
+        ) as cursor:
             fields_backups = self.__extract_fields_backups(
-                cursor, joined_locally_changed_fids
+                cursor, fids_parameter
             )
             geometries_backups = self.__extract_geometries_backups(
-                cursor, joined_locally_changed_fids
+                cursor, fids_parameter
             )
         return fields_backups, geometries_backups
 
     def __extract_fields_backups(
-        self, cursor: sqlite3.Cursor, joined_fids: str
-    ) -> Dict[Tuple[QgsFeatureId, FieldId], str]:
-        return {
-            (row[0], row[1]): deserialize_value(row[2])
-            for row in cursor.execute(
-                f"""
-                SELECT fid, attribute, backup
-                FROM ngw_updated_attributes
-                WHERE fid IN ({joined_fids})
-                """  # nosec B608
+        self, cursor: sqlite3.Cursor, fids_parameter: str
+    ) -> Dict[Tuple[QgsFeatureId, FieldId], Any]:
+        # Backups of features changes take precedence over column ones
+        fields_backups: Dict[Tuple[QgsFeatureId, FieldId], Any] = {}
+        for table_name in ("ngw_column_backups", "ngw_updated_attributes"):
+            fields_backups.update(
+                {
+                    (row[0], row[1]): deserialize_value_backup(row[2])
+                    for row in cursor.execute(
+                        f"""
+                        SELECT fid, attribute, backup
+                        FROM {table_name}
+                        WHERE fid IN ({JSON_IDS})
+                        """,  # nosec B608
+                        (fids_parameter,),
+                    )
+                }
             )
-        }
+        return fields_backups
 
     def __extract_geometries_backups(
-        self, cursor: sqlite3.Cursor, joined_fids: str
-    ) -> Dict[QgsFeatureId, str]:
+        self, cursor: sqlite3.Cursor, fids_parameter: str
+    ) -> Dict[QgsFeatureId, Backup]:
         return {
             row[0]: row[1]
             for row in cursor.execute(
                 f"""
                 SELECT fid, backup
                 FROM ngw_updated_geometries
-                WHERE fid IN ({joined_fids})
-                """  # nosec B608
+                WHERE fid IN ({JSON_IDS})
+                """,  # nosec B608
+                (fids_parameter,),
             )
         }
 
     def __ngw_fid_to_fid_dict(
         self, ngw_fids: Iterable[FeatureId]
     ) -> Dict[FeatureId, FeatureId]:
-        ngw_fids_str = ",".join(map(str, ngw_fids))
-
-        with closing(
-            make_connection(self.__container_path)
-        ) as connection, closing(connection.cursor()) as cursor:
+        with self.__connection_pool.reader() as connection, closing(
+            connection.cursor()
+        ) as cursor:
             return {
                 row[0]: row[1]
-                for row in cursor.execute(f"""
+                for row in cursor.execute(
+                    f"""
                     SELECT ngw_fid, fid
                     FROM ngw_features_metadata
-                    WHERE ngw_fid IN ({ngw_fids_str});
-                """)  # nosec B608
+                    WHERE ngw_fid IN ({JSON_IDS});
+                    """,  # nosec B608
+                    (json_ids(ngw_fids),),
+                )
             }
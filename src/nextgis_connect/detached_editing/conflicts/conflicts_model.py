@@ -28,6 +28,9 @@ from nextgis_connect.detached_editing.conflicts.conflict_resolving_item_extracto
 from nextgis_connect.detached_editing.conflicts.item_to_resolution_converter import (
     ItemToResolutionConverter,
 )
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
 from nextgis_connect.detached_editing.utils import DetachedContainerMetaData
 from nextgis_connect.utils import material_icon
 
@@ -44,6 +47,7 @@ class ConflictsResolvingModel(QAbstractListModel):
 
     _container_path: Path
     _container_metadata: DetachedContainerMetaData
+    _connection_pool: ContainerConnectionPool
     _conflict_resoving_items: List[ConflictResolvingItem]
 
     __not_resolved_icon: QIcon
@@ -54,11 +58,13 @@ class ConflictsResolvingModel(QAbstractListModel):
         container_path: Path,
         metadata: DetachedContainerMetaData,
         conflicts: List[VersioningConflict],
+        connection_pool: ContainerConnectionPool,
         parent: Optional[QObject] = None,
     ) -> None:
         super().__init__(parent)
         self._container_path = container_path
         self._container_metadata = metadata
+        self._connection_pool = connection_pool
         self._conflict_resoving_items = self.__convert_conflicts_to_items(
             conflicts
         )
@@ -212,6 +218,8 @@ class ConflictsResolvingModel(QAbstractListModel):
         self, conflicts: List[VersioningConflict]
     ) -> List[ConflictResolvingItem]:
         extractor = ConflictResolvingItemExtractor(
-            self._container_path, self._container_metadata
+            self._container_path,
+            self._container_metadata,
+            self._connection_pool,
         )
         return extractor.extract(conflicts)
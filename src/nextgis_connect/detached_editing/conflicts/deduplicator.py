@@ -10,12 +10,21 @@ from nextgis_connect.detached_editing.actions import (
     FeatureId,
     VersioningAction,
 )
+from nextgis_connect.detached_editing.bulk_ids import (
+    fill_temp_attributes,
+    fill_temp_ngw_fids,
+)
+from nextgis_connect.detached_editing.column_changes import (
+    expand_column_changes,
+)
 from nextgis_connect.detached_editing.conflicts.conflict import (
     VersioningConflict,
 )
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
 from nextgis_connect.detached_editing.utils import (
     DetachedContainerMetaData,
-    make_connection,
 )
 from nextgis_connect.resources.ngw_field import FieldId
 
@@ -23,15 +32,20 @@ from nextgis_connect.resources.ngw_field import FieldId
 class ConflictsDeduplicator:
     __container_path: Path
     __metadata: DetachedContainerMetaData
+    __connection_pool: ContainerConnectionPool
     __both_deleted: List[FeatureId]
     __both_updated_fields: Dict[QgsFeatureId, List[FieldId]]
     __both_updated_geometries: List[FeatureId]
 
     def __init__(
-        self, container_path: Path, metadata: DetachedContainerMetaData
+        self,
+        container_path: Path,
+        metadata: DetachedContainerMetaData,
+        connection_pool: ContainerConnectionPool,
     ) -> None:
         self.__container_path = container_path
         self.__metadata = metadata
+        self.__connection_pool = connection_pool
         self.__both_deleted = []
         self.__both_updated_fields = {}
         self.__both_updated_geometries = []
@@ -132,67 +146,68 @@ class ConflictsDeduplicator:
         if len(self.__both_deleted) + len(self.__both_updated_fields) == 0:
             return
 
-        with closing(
-            make_connection(self.__container_path)
-        ) as connection, closing(connection.cursor()) as cursor:
+        with self.__connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            # Changes of particular features are edited below
+            expand_column_changes(cursor)
+
             if len(self.__both_deleted) > 0:
-                deleted_ngw_fids = ",".join(map(str, self.__both_deleted))
-                cursor.executescript(f"""
+                ngw_fids = fill_temp_ngw_fids(cursor, self.__both_deleted)
+                cursor.execute(f"""
                     DELETE FROM ngw_removed_features
                     WHERE fid IN (
                         SELECT fid FROM ngw_features_metadata
-                        WHERE ngw_fid IN ({deleted_ngw_fids})
-                    );
+                        WHERE ngw_fid IN {ngw_fids}
+                    )
+                """)  # nosec B608
+                cursor.execute(f"""
                     DELETE FROM ngw_features_metadata
-                    WHERE ngw_fid IN ({deleted_ngw_fids});
+                    WHERE ngw_fid IN {ngw_fids}
                 """)  # nosec B608
 
             if len(self.__both_updated_fields) > 0:
-                ngw_fids_str = ",".join(
-                    map(str, self.__both_updated_fields.keys())
+                ngw_fids = fill_temp_ngw_fids(
+                    cursor, self.__both_updated_fields.keys()
                 )
                 ngw_fid_to_fid = {
                     row[0]: row[1]
                     for row in cursor.execute(f"""
                         SELECT ngw_fid, fid
                         FROM ngw_features_metadata
-                        WHERE ngw_fid IN ({ngw_fids_str});
+                        WHERE ngw_fid IN {ngw_fids}
                     """)  # nosec B608
                 }
 
                 fields = self.__metadata.fields
-                pk_pairs = []
-                for ngw_fid, attributes in self.__both_updated_fields.items():
-                    fid = ngw_fid_to_fid[ngw_fid]
-                    attributes = ",".join(
-                        map(
-                            lambda attribute: str(
-                                fields.get_with(ngw_id=attribute).attribute
-                            ),
-                            attributes,
+                attributes = fill_temp_attributes(
+                    cursor,
+                    (
+                        (
+                            ngw_fid_to_fid[ngw_fid],
+                            fields.get_with(ngw_id=field_id).attribute,
                         )
-                    )
-
-                    pk_pairs.append(
-                        f"(fid={fid} AND attribute IN ({attributes}))"
-                    )
-
-                where_clause = " OR ".join(pk_pairs)
+                        for ngw_fid, fields_ids in (
+                            self.__both_updated_fields.items()
+                        )
+                        for field_id in fields_ids
+                    ),
+                )
                 cursor.execute(f"""
                     DELETE FROM ngw_updated_attributes
-                    WHERE {where_clause};
+                    WHERE (fid, attribute) IN (
+                        SELECT fid, attribute FROM {attributes}
+                    )
                 """)  # nosec B608
 
             if len(self.__both_updated_geometries) > 0:
-                deleted_ngw_fids = ",".join(
-                    map(str, self.__both_updated_geometries)
+                ngw_fids = fill_temp_ngw_fids(
+                    cursor, self.__both_updated_geometries
                 )
-                cursor.executescript(f"""
+                cursor.execute(f"""
                     DELETE FROM ngw_updated_geometries
                     WHERE fid IN (
                         SELECT fid FROM ngw_features_metadata
-                        WHERE ngw_fid IN ({deleted_ngw_fids})
-                    );
+                        WHERE ngw_fid IN {ngw_fids}
+                    )
                 """)  # nosec B608
-
-            connection.commit()
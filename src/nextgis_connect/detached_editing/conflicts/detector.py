@@ -13,18 +13,30 @@ from nextgis_connect.detached_editing.actions import (
 from nextgis_connect.detached_editing.conflicts.conflict import (
     VersioningConflict,
 )
+from nextgis_connect.detached_editing.conflicts.local_changes_index import (
+    LocalFeatureChanges,
+    build_local_changes_index,
+)
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
 from nextgis_connect.detached_editing.utils import DetachedContainerMetaData
 
 
 class ConflictsDetector:
     __container_path: Path
     __metadata: DetachedContainerMetaData
+    __connection_pool: ContainerConnectionPool
 
     def __init__(
-        self, container_path: Path, metadata: DetachedContainerMetaData
+        self,
+        container_path: Path,
+        metadata: DetachedContainerMetaData,
+        connection_pool: ContainerConnectionPool,
     ) -> None:
         self.__container_path = container_path
         self.__metadata = metadata
+        self.__connection_pool = connection_pool
 
     def detect(
         self, remote_actions: List[VersioningAction]
@@ -34,19 +46,34 @@ class ConflictsDetector:
         if len(grouped_remote) == 0:
             return []
 
-        # Check local list
-        extractor = ActionExtractor(self.__container_path, self.__metadata)
-        local_actions = extractor.extract_all()
-        grouped_local = self.__group_actions(local_actions)
-        if len(grouped_local) == 0:
+        # Check local changes without reading features
+        local_index = build_local_changes_index(
+            self.__connection_pool, self.__metadata
+        )
+        candidate_fids = [
+            ngw_fid
+            for ngw_fid, actions in grouped_remote.items()
+            if ngw_fid in local_index
+            and any(
+                self.__may_conflict(local_index[ngw_fid], action)
+                for action in actions
+            )
+        ]
+        if len(candidate_fids) == 0:
             return []
 
-        # Check intersection
+        # Extract full local actions only for possibly conflicting features
+        extractor = ActionExtractor(
+            self.__container_path, self.__metadata, self.__connection_pool
+        )
+        local_actions = extractor.extract_features(
+            [local_index[ngw_fid].fid for ngw_fid in candidate_fids]
+        )
+        grouped_local = self.__group_actions(local_actions)
+
         intersected_fids = set(grouped_local.keys()).intersection(
-            grouped_remote.keys()
+            candidate_fids
         )
-        if len(intersected_fids) == 0:
-            return []
 
         # Detect conflicts
         return list(
@@ -78,6 +105,29 @@ class ConflictsDetector:
 
         return result
 
+    def __may_conflict(
+        self, local_changes: LocalFeatureChanges, remote_action: FeatureAction
+    ) -> bool:
+        if local_changes.is_deleted:
+            return True
+
+        if remote_action.action == ActionType.FEATURE_DELETE:
+            return True
+
+        if not local_changes.is_updated or not isinstance(
+            remote_action, FeatureUpdateAction
+        ):
+            return False
+
+        if local_changes.has_geometry and remote_action.geom is not None:
+            return True
+
+        if not remote_action.fields:
+            return False
+
+        remote_fields = set(field[0] for field in remote_action.fields)
+        return len(local_changes.fields.intersection(remote_fields)) > 0
+
     def __detect_conflicts(
         self,
         local_actions: List[FeatureAction],
@@ -0,0 +1,86 @@
+from contextlib import closing
+from dataclasses import dataclass, field
+from typing import Dict, Set
+
+from nextgis_connect.detached_editing.actions import FeatureId
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
+from nextgis_connect.detached_editing.utils import DetachedContainerMetaData
+from nextgis_connect.exceptions import ContainerError
+from nextgis_connect.resources.ngw_field import FieldId
+
+
+@dataclass
+class LocalFeatureChanges:
+    """Summary of local changes of an already synchronized feature"""
+
+    fid: FeatureId
+    ngw_fid: FeatureId
+    fields: Set[FieldId] = field(default_factory=set)
+    has_geometry: bool = False
+    is_deleted: bool = False
+    is_restored: bool = False
+
+    @property
+    def is_updated(self) -> bool:
+        return self.has_geometry or len(self.fields) > 0
+
+
+def build_local_changes_index(
+    connection_pool: ContainerConnectionPool,
+    metadata: DetachedContainerMetaData,
+) -> Dict[FeatureId, LocalFeatureChanges]:
+    """
+    Builds changes summary by NGW feature id.
+
+    Only change tracking tables are read, so features geometries and
+    attribute values are not loaded.
+    """
+    index: Dict[FeatureId, LocalFeatureChanges] = {}
+
+    def feature_changes(fid: FeatureId, ngw_fid: FeatureId):
+        changes = index.get(ngw_fid)
+        if changes is None:
+            changes = LocalFeatureChanges(fid, ngw_fid)
+            index[ngw_fid] = changes
+        return changes
+
+    fields = metadata.fields
+
+    try:
+        with connection_pool.reader() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            for fid, ngw_fid, attribute in cursor.execute(
+                """
+                SELECT changes.fid, metadata.ngw_fid, changes.attribute
+                FROM ngw_changed_attributes changes
+                JOIN ngw_features_metadata metadata
+                    ON metadata.fid = changes.fid
+                WHERE metadata.ngw_fid IS NOT NULL
+                """
+            ):
+                field_id = fields.get_with(attribute=attribute).ngw_id
+                feature_changes(fid, ngw_fid).fields.add(field_id)
+
+            for table, flag in (
+                ("ngw_updated_geometries", "has_geometry"),
+                ("ngw_removed_features", "is_deleted"),
+                ("ngw_restored_features", "is_restored"),
+            ):
+                for fid, ngw_fid in cursor.execute(
+                    f"""
+                    SELECT changes.fid, metadata.ngw_fid
+                    FROM {table} changes
+                    JOIN ngw_features_metadata metadata
+                        ON metadata.fid = changes.fid
+                    WHERE metadata.ngw_fid IS NOT NULL
+                    """  # nosec B608
+                ):
+                    setattr(feature_changes(fid, ngw_fid), flag, True)
+
+    except Exception as error:
+        raise ContainerError from error
+
+    return index
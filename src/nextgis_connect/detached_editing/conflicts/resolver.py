@@ -1,10 +1,8 @@
-import json
 from contextlib import closing
 from copy import deepcopy
 from enum import Enum, auto
 from pathlib import Path
-from textwrap import dedent
-from typing import Any, Dict, Iterable, List, Set, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
 from qgis.core import QgsFeature, QgsVectorLayer, edit
 
@@ -15,15 +13,34 @@ from nextgis_connect.detached_editing.actions import (
     FeatureUpdateAction,
     FieldId,
 )
+from nextgis_connect.detached_editing.backup_serialization import (
+    FeatureBackup,
+    serialize_geometry_backup,
+    serialize_value_backup,
+)
+from nextgis_connect.detached_editing.bulk_ids import (
+    JSON_IDS,
+    fill_temp_attributes,
+    fill_temp_fids,
+    fill_temp_ngw_fids,
+    json_ids,
+)
+from nextgis_connect.detached_editing.column_changes import (
+    expand_column_changes,
+)
 from nextgis_connect.detached_editing.conflicts.conflict_resolution import (
     ConflictResolution,
     ResolutionType,
 )
-from nextgis_connect.detached_editing.serialization import deserialize_geometry
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
+from nextgis_connect.detached_editing.serialization import (
+    deserialize_geometry,
+)
 from nextgis_connect.detached_editing.utils import (
     DetachedContainerMetaData,
     detached_layer_uri,
-    make_connection,
 )
 from nextgis_connect.exceptions import DetachedEditingError
 from nextgis_connect.logging import logger
@@ -32,6 +49,7 @@ from nextgis_connect.logging import logger
 class ConflictsResolver:
     __container_path: Path
     __metadata: DetachedContainerMetaData
+    __connection_pool: ContainerConnectionPool
 
     __new_actions: List[FeatureAction]
     __modified_actions: Dict[Tuple[FeatureId, ActionType], FeatureAction]
@@ -43,6 +61,10 @@ class ConflictsResolver:
     __local_geometry_changes_for_add: List[FeatureId]
     __local_geometry_changes_for_delete: List[FeatureId]
 
+    # Remote values become synchronized ones for kept local changes
+    __local_fields_backups: Dict[FeatureId, Dict[FieldId, Any]]
+    __local_geometry_backups: Dict[FeatureId, Optional[str]]
+
     __local_features_to_restore: List[FeatureId]
     __remote_features_to_restore: List[FeatureId]
 
@@ -52,10 +74,14 @@ class ConflictsResolver:
         Resolved = auto()
 
     def __init__(
-        self, container_path: Path, metadata: DetachedContainerMetaData
+        self,
+        container_path: Path,
+        metadata: DetachedContainerMetaData,
+        connection_pool: ContainerConnectionPool,
     ) -> None:
         self.__container_path = container_path
         self.__metadata = metadata
+        self.__connection_pool = connection_pool
 
         self.__reset()
 
@@ -82,6 +108,8 @@ class ConflictsResolver:
         self.__local_fields_changes_for_delete = dict()
         self.__local_geometry_changes_for_add = list()
         self.__local_geometry_changes_for_delete = list()
+        self.__local_fields_backups = dict()
+        self.__local_geometry_backups = dict()
         self.__local_features_to_restore = list()
         self.__remote_features_to_restore = list()
 
@@ -215,10 +243,16 @@ class ConflictsResolver:
                 if field_data[0] not in intersected
             ]
 
+            remote_fields = remote.fields_dict
+            self.__local_fields_backups[fid] = {
+                field_id: remote_fields[field_id] for field_id in intersected
+            }
+
         if local.geom is not None and remote.geom is not None:
             # Geometry will not be updated, but the version ID (vid) will be.
             # We will send the locally changed geometry after applying.
             updated_action.geom = None
+            self.__local_geometry_backups[fid] = remote.geom
 
         self.__modified_actions[(fid, ActionType.FEATURE_UPDATE)] = (
             updated_action
@@ -308,6 +342,7 @@ class ConflictsResolver:
         updated_fields = []
         local_fields_changes_for_delete = []
         local_fields_changes_for_add = []
+        local_fields_backups = {}
         for field_id, field_value in custom_fields.items():
             if (
                 field_id in remote_changed_fields
@@ -319,8 +354,16 @@ class ConflictsResolver:
             elif field_id not in local_changed_fields:
                 local_fields_changes_for_add.append(field_id)
 
+            elif field_id in remote_changed_fields:
+                local_fields_backups[field_id] = remote_changed_fields[
+                    field_id
+                ]
+
             updated_fields.append((field_id, field_value))
 
+        if len(local_fields_backups) > 0:
+            self.__local_fields_backups[fid] = local_fields_backups
+
         if len(local_fields_changes_for_delete) > 0:
             self.__local_fields_changes_for_delete[fid] = (
                 local_fields_changes_for_delete
@@ -338,6 +381,9 @@ class ConflictsResolver:
         if local.geom is not None:
             if updated_action.geom == remote.geom:
                 self.__local_geometry_changes_for_delete.append(fid)
+            elif remote.geom is not None:
+                # Local or new geometry will be sent after remote one
+                self.__local_geometry_backups[fid] = remote.geom
             else:
                 # If it's a local changed geometry or new one, we don't need
                 # to do anything. Change will be sent
@@ -385,147 +431,234 @@ class ConflictsResolver:
         return result
 
     def __update_container(self) -> None:
-        script = ""
+        attributes_for_add = self.__local_attributes(
+            self.__local_fields_changes_for_add
+        )
+        attributes_for_delete = self.__local_attributes(
+            self.__local_fields_changes_for_delete
+        )
+        attributes_backups = self.__local_attributes_backups()
+        geometries_backups = self.__local_geometries_backups()
+        locally_restored_fids = self.__restore_local_features()
+        remotely_restored_fids = (
+            list(
+                self.__ngw_fid_to_fid_dict(
+                    self.__remote_features_to_restore
+                ).values()
+            )
+            if self.__remote_features_to_restore
+            else []
+        )
 
-        fields = self.__metadata.fields
+        if (
+            len(attributes_for_add) == 0
+            and len(attributes_for_delete) == 0
+            and not self.__local_geometry_changes_for_add
+            and not self.__local_geometry_changes_for_delete
+            and len(attributes_backups) == 0
+            and len(geometries_backups) == 0
+            and len(locally_restored_fids) == 0
+            and len(remotely_restored_fids) == 0
+        ):
+            return
 
-        if self.__local_fields_changes_for_add:
-            ngw_fid_to_fid = self.__ngw_fid_to_fid_dict(
-                self.__local_fields_changes_for_add.keys()
-            )
-            values = ",".join(
-                f"({ngw_fid_to_fid[ngw_fid]},{fields.find_with(ngw_id=ngw_attribute).attribute})"
-                for ngw_fid, ngw_attributes in self.__local_fields_changes_for_add.items()
-                for ngw_attribute in ngw_attributes
-            )
-            script += dedent(f"""
-                INSERT INTO ngw_updated_attributes (fid, attribute)
-                VALUES {values};
-            """)  # nosec B608
-
-        if self.__local_fields_changes_for_delete:
-            ngw_fid_to_fid = self.__ngw_fid_to_fid_dict(
-                self.__local_fields_changes_for_delete.keys()
-            )
-            where_clause = " OR ".join(
-                f"(fid={ngw_fid_to_fid[ngw_fid]} AND attribute={fields.find_with(ngw_id=ngw_attribute).attribute})"
-                for ngw_fid, ngw_attributes in self.__local_fields_changes_for_delete.items()
-                for ngw_attribute in ngw_attributes
-            )
-            script += dedent(f"""
-                DELETE FROM ngw_updated_attributes WHERE {where_clause};
-            """)  # nosec B608
+        with self.__connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            # Changes of particular features are edited below
+            expand_column_changes(cursor)
+
+            if len(attributes_for_add) > 0:
+                attributes = fill_temp_attributes(cursor, attributes_for_add)
+                cursor.execute(
+                    f"""
+                    INSERT INTO ngw_updated_attributes (fid, attribute)
+                    SELECT fid, attribute FROM {attributes}
+                    """  # nosec B608
+                )
 
-        if self.__local_geometry_changes_for_add:
-            ngw_fids = ",".join(
-                map(str, self.__local_geometry_changes_for_add)
+            if len(attributes_for_delete) > 0:
+                attributes = fill_temp_attributes(
+                    cursor, attributes_for_delete
+                )
+                cursor.execute(
+                    f"""
+                    DELETE FROM ngw_updated_attributes
+                    WHERE (fid, attribute) IN (
+                        SELECT fid, attribute FROM {attributes}
+                    )
+                    """  # nosec B608
+                )
+
+            if self.__local_geometry_changes_for_add:
+                ngw_fids = fill_temp_ngw_fids(
+                    cursor, self.__local_geometry_changes_for_add
+                )
+                cursor.execute(
+                    f"""
+                    INSERT INTO ngw_updated_geometries (fid)
+                    SELECT fid FROM ngw_features_metadata
+                    WHERE ngw_fid IN {ngw_fids}
+                    """  # nosec B608
+                )
+
+            if self.__local_geometry_changes_for_delete:
+                ngw_fids = fill_temp_ngw_fids(
+                    cursor, self.__local_geometry_changes_for_delete
+                )
+                cursor.execute(
+                    f"""
+                    DELETE FROM ngw_updated_geometries
+                    WHERE fid IN (
+                        SELECT fid FROM ngw_features_metadata
+                        WHERE ngw_fid IN {ngw_fids}
+                    )
+                    """  # nosec B608
+                )
+
+            # Kept local changes are compared with remote values by
+            # LocalChangesCompactor before uploading
+            cursor.executemany(
+                """
+                UPDATE ngw_updated_attributes SET backup = ?
+                WHERE fid = ? AND attribute = ?
+                """,
+                attributes_backups,
             )
-            script += dedent(f"""
-                INSERT INTO ngw_updated_geometries (fid)
-                SELECT fid FROM ngw_features_metadata
-                WHERE ngw_fid IN ({ngw_fids});
-            """)  # nosec B608
-
-        if self.__local_geometry_changes_for_delete:
-            ngw_fids = ",".join(
-                map(str, self.__local_geometry_changes_for_delete)
+            cursor.executemany(
+                "UPDATE ngw_updated_geometries SET backup = ? WHERE fid = ?",
+                geometries_backups,
             )
-            script += dedent(f"""
-                DELETE FROM ngw_updated_geometries
-                WHERE fid IN (
-                    SELECT fid FROM ngw_features_metadata
-                    WHERE ngw_fid IN ({ngw_fids})
-                );
-            """)  # nosec B608
 
-        if self.__local_features_to_restore:
-            ngw_fid_to_fid = self.__ngw_fid_to_fid_dict(
-                self.__local_features_to_restore
+            if len(locally_restored_fids) > 0:
+                fids = fill_temp_fids(cursor, locally_restored_fids)
+                cursor.execute(
+                    f"DELETE FROM ngw_removed_features WHERE fid IN {fids}"  # nosec B608
+                )
+
+            if len(remotely_restored_fids) > 0:
+                fids = fill_temp_fids(cursor, remotely_restored_fids)
+                cursor.execute(
+                    f"INSERT INTO ngw_restored_features (fid) SELECT id FROM {fids}"  # nosec B608
+                )
+
+    def __local_attributes(
+        self, fields_changes: Dict[FeatureId, List[FieldId]]
+    ) -> List[Tuple[FeatureId, int]]:
+        if not fields_changes:
+            return []
+
+        fields = self.__metadata.fields
+        ngw_fid_to_fid = self.__ngw_fid_to_fid_dict(fields_changes.keys())
+        return [
+            (
+                ngw_fid_to_fid[ngw_fid],
+                fields.find_with(ngw_id=ngw_attribute).attribute,
             )
+            for ngw_fid, ngw_attributes in fields_changes.items()
+            for ngw_attribute in ngw_attributes
+        ]
+
+    def __local_attributes_backups(self) -> List[Tuple[bytes, FeatureId, int]]:
+        if not self.__local_fields_backups:
+            return []
 
-            fids_str = ",".join(map(str, ngw_fid_to_fid.values()))
-            with closing(
-                make_connection(self.__container_path)
-            ) as connection, closing(connection.cursor()) as cursor:
-                backups = {
-                    row[0]: row[1]
-                    for row in cursor.execute(f"""
-                        SELECT fid, backup FROM ngw_removed_features
-                        WHERE fid IN ({fids_str});
-                    """)  # nosec B608
-                }
-
-            layer = QgsVectorLayer(
-                detached_layer_uri(self.__container_path, self.__metadata)
+        fields = self.__metadata.fields
+        ngw_fid_to_fid = self.__ngw_fid_to_fid_dict(
+            self.__local_fields_backups.keys()
+        )
+        return [
+            (
+                serialize_value_backup(value),
+                ngw_fid_to_fid[ngw_fid],
+                fields.find_with(ngw_id=ngw_attribute).attribute,
             )
-            restored_features = []
-            for fid in ngw_fid_to_fid.values():
-                feature_backup = json.loads(backups[fid])
-                after_sync = feature_backup["after_sync"]
-
-                feature = QgsFeature(layer.fields(), fid)
-                feature.setAttribute(self.__metadata.fid_field, fid)
-                for field_ngw_id, value in after_sync["fields"]:
-                    attribute = self.__metadata.fields.get_with(
-                        ngw_id=field_ngw_id
-                    ).attribute
-                    feature.setAttribute(attribute, value)
-
-                feature.setGeometry(
+            for ngw_fid, values in self.__local_fields_backups.items()
+            for ngw_attribute, value in values.items()
+        ]
+
+    def __local_geometries_backups(self) -> List[Tuple[bytes, FeatureId]]:
+        if not self.__local_geometry_backups:
+            return []
+
+        ngw_fid_to_fid = self.__ngw_fid_to_fid_dict(
+            self.__local_geometry_backups.keys()
+        )
+        return [
+            (
+                serialize_geometry_backup(
                     deserialize_geometry(
-                        after_sync["geom"],
-                        self.__metadata.is_versioning_enabled,
+                        geom, self.__metadata.is_versioning_enabled
                     )
-                )
-                restored_features.append(feature)
+                ),
+                ngw_fid_to_fid[ngw_fid],
+            )
+            for ngw_fid, geom in self.__local_geometry_backups.items()
+        ]
 
-            with edit(layer):
-                layer.addFeatures(restored_features)
+    def __restore_local_features(self) -> List[FeatureId]:
+        if not self.__local_features_to_restore:
+            return []
 
-            script += dedent(f"""
-                DELETE FROM ngw_removed_features
-                WHERE fid IN ({fids_str});
-            """)  # nosec B608
+        ngw_fid_to_fid = self.__ngw_fid_to_fid_dict(
+            self.__local_features_to_restore
+        )
 
-        if self.__remote_features_to_restore:
-            ngw_fid_to_fid = self.__ngw_fid_to_fid_dict(
-                self.__remote_features_to_restore
-            )
-            values = ",".join(
-                map(
-                    lambda fid: f"({ngw_fid_to_fid[fid]})",
-                    self.__remote_features_to_restore,
+        with self.__connection_pool.reader() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            backups = {
+                row[0]: row[1]
+                for row in cursor.execute(
+                    f"""
+                    SELECT fid, backup FROM ngw_removed_features
+                    WHERE fid IN ({JSON_IDS})
+                    """,  # nosec B608
+                    (json_ids(ngw_fid_to_fid.values()),),
                 )
-            )
-            script += dedent(f"""
-                INSERT INTO ngw_restored_features (fid)
-                VALUES {values};
-            """)  # nosec B608
+            }
 
-        if len(script) == 0:
-            return
+        layer = QgsVectorLayer(
+            detached_layer_uri(self.__container_path, self.__metadata)
+        )
+        restored_features = []
+        for fid in ngw_fid_to_fid.values():
+            after_sync = FeatureBackup(
+                backups[fid], self.__metadata.is_versioning_enabled
+            ).after_sync
+
+            feature = QgsFeature(layer.fields(), fid)
+            feature.setAttribute(self.__metadata.fid_field, fid)
+            for field_ngw_id, value in after_sync.fields:
+                attribute = self.__metadata.fields.get_with(
+                    ngw_id=field_ngw_id
+                ).attribute
+                feature.setAttribute(attribute, value)
 
-        with closing(
-            make_connection(self.__container_path)
-        ) as connection, closing(connection.cursor()) as cursor:
-            cursor.executescript(script)
-            connection.commit()
+            feature.setGeometry(after_sync.geometry())
+            restored_features.append(feature)
+
+        with edit(layer):
+            layer.addFeatures(restored_features)
+
+        return list(ngw_fid_to_fid.values())
 
     def __ngw_fid_to_fid_dict(
         self, ngw_fids: Iterable[FeatureId]
     ) -> Dict[FeatureId, FeatureId]:
-        ngw_fids_str = ",".join(map(str, ngw_fids))
-
-        with closing(
-            make_connection(self.__container_path)
-        ) as connection, closing(connection.cursor()) as cursor:
+        with self.__connection_pool.reader() as connection, closing(
+            connection.cursor()
+        ) as cursor:
             return {
                 row[0]: row[1]
-                for row in cursor.execute(f"""
+                for row in cursor.execute(
+                    f"""
                     SELECT ngw_fid, fid
                     FROM ngw_features_metadata
-                    WHERE ngw_fid IN ({ngw_fids_str});
-                """)  # nosec B608
+                    WHERE ngw_fid IN ({JSON_IDS})
+                    """,  # nosec B608
+                    (json_ids(ngw_fids),),
+                )
             }
 
     def __intersected_fields(
@@ -70,6 +70,9 @@ from nextgis_connect.detached_editing.conflicts.conflict_resolving_item import (
 from nextgis_connect.detached_editing.conflicts.conflicts_model import (
     ConflictsResolvingModel,
 )
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
 from nextgis_connect.detached_editing.serialization import simplify_value
 from nextgis_connect.detached_editing.utils import (
     DetachedContainerMetaData,
@@ -103,6 +106,7 @@ class Page(IntEnum):
 class ResolvingDialog(QDialog, WIDGET):
     __container_path: Path
     __container_metadata: DetachedContainerMetaData
+    __connection_pool: ContainerConnectionPool
     __geometry_type: GeometryType
     __conflicts: List[VersioningConflict]
     __resolving_model: ConflictsResolvingModel
@@ -117,11 +121,13 @@ class ResolvingDialog(QDialog, WIDGET):
         container_path: Path,
         metadata: DetachedContainerMetaData,
         conflicts: List[VersioningConflict],
+        connection_pool: ContainerConnectionPool,
         parent: Optional[QWidget] = None,
     ):
         super().__init__(parent)
         self.__container_path = container_path
         self.__container_metadata = metadata
+        self.__connection_pool = connection_pool
         self.__geometry_type = QgsVectorLayer(
             detached_layer_uri(container_path, metadata), "", "ogr"
         ).geometryType()
@@ -188,6 +194,7 @@ class ResolvingDialog(QDialog, WIDGET):
             self.__container_path,
             self.__container_metadata,
             self.__conflicts,
+            self.__connection_pool,
             self,
         )
         self.__resolving_model.dataChanged.connect(self.__validate)
@@ -0,0 +1,135 @@
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager, suppress
+from pathlib import Path
+from typing import Iterator, Optional
+
+from nextgis_connect.detached_editing.storage_profile import (
+    configure_connection,
+)
+from nextgis_connect.exceptions import ContainerError, ErrorCode
+from nextgis_connect.logging import logger
+
+
+class _ReaderConnection:
+    """Reader connection of a thread, closed together with thread data"""
+
+    connection: sqlite3.Connection
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.connection = connection
+
+    def __del__(self) -> None:
+        with suppress(sqlite3.Error):
+            self.connection.close()
+
+
+class ContainerConnectionPool:
+    """
+    Keeps SQLite connections to a detached container open between calls.
+
+    Every thread gets its own reader connection, which is closed when
+    the thread finishes. All writes go through a single writer connection
+    guarded by a lock, so tasks and the UI thread do not compete for write
+    transactions inside the plugin. Connections are opened lazily in WAL
+    mode with a prepared statements cache.
+    """
+
+    STATEMENTS_CACHE_SIZE = 256
+    BUSY_TIMEOUT = 30.0  # seconds
+
+    __path: Path
+    __lock: threading.Lock
+    __writer_lock: threading.RLock
+    __local: threading.local
+    __readers: "weakref.WeakSet[_ReaderConnection]"
+    __writer: Optional[sqlite3.Connection]
+
+    def __init__(self, container_path: Path) -> None:
+        self.__path = container_path
+        self.__lock = threading.Lock()
+        self.__writer_lock = threading.RLock()
+        self.__local = threading.local()
+        self.__readers = weakref.WeakSet()
+        self.__writer = None
+
+    @property
+    def path(self) -> Path:
+        return self.__path
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Yields a connection for read-only queries of the current thread"""
+        reader: Optional[_ReaderConnection] = getattr(
+            self.__local, "reader", None
+        )
+        with self.__lock:
+            # Readers of other threads are dropped on close
+            is_opened = reader is not None and reader in self.__readers
+
+        if not is_opened:
+            reader = _ReaderConnection(self.__open())
+            self.__local.reader = reader
+            with self.__lock:
+                self.__readers.add(reader)
+
+        assert reader is not None
+        yield reader.connection
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """
+        Yields the writer connection.
+
+        Changes are committed on exit or rolled back if an exception
+        was raised.
+        """
+        with self.__writer_lock:
+            if self.__writer is None:
+                self.__writer = self.__open()
+
+            connection = self.__writer
+            try:
+                yield connection
+            except BaseException:
+                connection.rollback()
+                raise
+            else:
+                connection.commit()
+
+    def close(self) -> None:
+        with self.__writer_lock, self.__lock:
+            connections = [reader.connection for reader in self.__readers]
+            if self.__writer is not None:
+                connections.append(self.__writer)
+
+            self.__readers.clear()
+            self.__writer = None
+
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception:
+                logger.exception("Can't close container connection")
+
+    def __open(self) -> sqlite3.Connection:
+        if not self.__path.exists():
+            error = ContainerError(code=ErrorCode.DeletedContainer)
+            error.add_note(f"Path: {self.__path}")
+            raise error
+
+        try:
+            connection = sqlite3.connect(
+                str(self.__path),
+                timeout=self.BUSY_TIMEOUT,
+                check_same_thread=False,
+                cached_statements=self.STATEMENTS_CACHE_SIZE,
+            )
+            connection.execute("PRAGMA foreign_keys = ON")
+            connection.execute("PRAGMA journal_mode = WAL")
+            configure_connection(connection, self.__path)
+        except sqlite3.Error as error:
+            raise ContainerError from error
+
+        return connection
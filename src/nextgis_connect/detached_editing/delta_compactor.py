@@ -0,0 +1,166 @@
+"""
+Folding of remote feature actions into net actions.
+
+A delta fetched for several versions can contain a whole history of
+a feature, e.g. create -> update -> update -> delete. Replaying it through
+the layer edit buffer costs an operation per action, while applying the
+net result is enough.
+
+Actions of a feature are folded by life segments:
+
+* consecutive updates are merged into one update with the last geometry,
+  merged fields and the last version;
+* updates following a restore are merged into the restore;
+* a create is kept as is because for features uploaded by this container
+  it only updates the version, so following updates are merged separately;
+* only the last description is kept and is applied after data changes;
+* a delete discards all changes of the segment. If the feature was known
+  to be absent before the segment (it was deleted earlier in the delta),
+  the whole segment disappears.
+
+The result leaves the container in the same state as the original actions
+when they are applied by ActionApplier.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+from nextgis_connect.detached_editing.actions import (
+    ActionType,
+    AttachmentAction,
+    DataChangeAction,
+    DescriptionPutAction,
+    FeatureAction,
+    FeatureCreateAction,
+    FeatureId,
+    FeatureRestoreAction,
+    FeatureUpdateAction,
+)
+
+
+def compact_actions(actions: Iterable[FeatureAction]) -> List[FeatureAction]:
+    """
+    Folds actions of every feature into net actions.
+
+    Features keep the order of their first action. Attachment actions are
+    passed through unchanged.
+    """
+    grouped: Dict[FeatureId, List[FeatureAction]] = {}
+    passed_through: List[FeatureAction] = []
+
+    for action in actions:
+        if isinstance(action, AttachmentAction):
+            passed_through.append(action)
+            continue
+        grouped.setdefault(action.fid, []).append(action)
+
+    result: List[FeatureAction] = []
+    for feature_actions in grouped.values():
+        result.extend(_compact_feature_actions(feature_actions))
+
+    result.extend(passed_through)
+    return result
+
+
+class _FeatureSegment:
+    """Actions of one feature between its appearance and its deletion"""
+
+    start: Optional[DataChangeAction]
+    update: Optional[DataChangeAction]
+    description: Optional[DescriptionPutAction]
+
+    def __init__(self) -> None:
+        self.start = None
+        self.update = None
+        self.description = None
+
+    def actions(self) -> List[FeatureAction]:
+        result: List[FeatureAction] = []
+        if self.start is not None:
+            result.append(self.start)
+        if self.update is not None:
+            result.append(self.update)
+        if self.description is not None:
+            result.append(self.description)
+        return result
+
+
+def _compact_feature_actions(
+    actions: List[FeatureAction],
+) -> List[FeatureAction]:
+    if len(actions) < 2:
+        return list(actions)
+
+    result: List[FeatureAction] = []
+    segment = _FeatureSegment()
+    is_deleted_before = False
+
+    for action in actions:
+        if action.action in (
+            ActionType.FEATURE_CREATE,
+            ActionType.FEATURE_RESTORE,
+        ):
+            # Feature appears again only after it was deleted
+            result.extend(segment.actions())
+            segment = _FeatureSegment()
+            segment.start = _copy_data_action(action)
+
+        elif action.action == ActionType.FEATURE_UPDATE:
+            assert isinstance(action, FeatureUpdateAction)
+            if isinstance(segment.start, FeatureRestoreAction):
+                segment.start = _merge(segment.start, action)
+            elif segment.update is not None:
+                segment.update = _merge(segment.update, action)
+            else:
+                segment.update = _copy_data_action(action)
+
+        elif action.action == ActionType.DESCRIPTION_PUT:
+            assert isinstance(action, DescriptionPutAction)
+            segment.description = action
+
+        elif action.action == ActionType.FEATURE_DELETE:
+            # Feature appeared and disappeared inside the delta
+            if not (is_deleted_before and segment.start is not None):
+                result.append(action)
+            segment = _FeatureSegment()
+            is_deleted_before = True
+
+        else:
+            result.extend(segment.actions())
+            segment = _FeatureSegment()
+            result.append(action)
+
+    result.extend(segment.actions())
+
+    return result
+
+
+def _copy_data_action(action: FeatureAction) -> DataChangeAction:
+    assert isinstance(action, DataChangeAction)
+    return _make_action(
+        action, action.vid, action.geom, list(action.fields_dict.items())
+    )
+
+
+def _merge(
+    target: DataChangeAction, update: DataChangeAction
+) -> DataChangeAction:
+    fields: Dict[Any, Any] = target.fields_dict
+    fields.update(update.fields_dict)
+    geom = update.geom if update.geom is not None else target.geom
+    return _make_action(target, update.vid, geom, list(fields.items()))
+
+
+def _make_action(
+    prototype: DataChangeAction,
+    vid: Optional[int],
+    geom: Optional[str],
+    fields: List[Any],
+) -> DataChangeAction:
+    action_class = {
+        ActionType.FEATURE_CREATE: FeatureCreateAction,
+        ActionType.FEATURE_UPDATE: FeatureUpdateAction,
+        ActionType.FEATURE_RESTORE: FeatureRestoreAction,
+    }[prototype.action]
+    return action_class(
+        prototype.fid, vid, geom, [list(field) for field in fields]
+    )
@@ -0,0 +1,306 @@
+import json
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from nextgis_connect.detached_editing.action_serializer import ActionSerializer
+from nextgis_connect.detached_editing.actions import (
+    FeatureAction,
+    FeatureId,
+    VersioningAction,
+)
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
+from nextgis_connect.detached_editing.delta_compactor import compact_actions
+from nextgis_connect.detached_editing.utils import DetachedContainerMetaData
+
+
+class DeltaJournal:
+    """
+    Local journal of remote changes stored in a versioned container.
+
+    Fetched pages are spooled to the ngw_delta_journal table, so the whole
+    change history does not have to be kept in memory between fetching,
+    conflicts detection and applying. Applying progress is saved in the
+    ngw_delta_journal_state table, so interrupted applying can be resumed
+    from the first not applied action.
+    """
+
+    BATCH_SIZE = 500
+
+    __connection_pool: ContainerConnectionPool
+    __serializer: ActionSerializer
+    __is_table_checked: bool
+
+    def __init__(
+        self,
+        connection_pool: ContainerConnectionPool,
+        metadata: DetachedContainerMetaData,
+    ) -> None:
+        self.__connection_pool = connection_pool
+        self.__serializer = ActionSerializer(metadata)
+        self.__is_table_checked = False
+
+    def clear(self) -> None:
+        self.__ensure_table()
+        with self.__connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            self.finish(cursor)
+
+    def append(self, actions: Iterable[VersioningAction]) -> int:
+        """Appends feature actions to the end of journal"""
+        rows = [
+            (action.fid, json.dumps(action.__dict__))
+            for action in actions
+            if isinstance(action, FeatureAction)
+        ]
+        if len(rows) == 0:
+            return 0
+
+        self.__ensure_table()
+        with self.__connection_pool.writer() as connection:
+            connection.executemany(
+                "INSERT INTO ngw_delta_journal (fid, action) VALUES (?, ?)",
+                rows,
+            )
+
+        return len(rows)
+
+    def count(self) -> int:
+        """Returns count of not applied actions"""
+        self.__ensure_table()
+        with self.__connection_pool.reader() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM ngw_delta_journal WHERE id > ?",
+                (self.__applied_id(cursor),),
+            )
+            return cursor.fetchone()[0]
+
+    def batches(
+        self, batch_size: int = BATCH_SIZE
+    ) -> Iterator[List[FeatureAction]]:
+        """Yields not applied journal actions in fetching order"""
+        for _, actions in self.numbered_batches(batch_size):
+            yield actions
+
+    def numbered_batches(
+        self, batch_size: int = BATCH_SIZE
+    ) -> Iterator[Tuple[int, List[FeatureAction]]]:
+        """Yields not applied actions with id of the last action in batch"""
+        self.__ensure_table()
+        last_id: Optional[int] = None
+        while True:
+            with self.__connection_pool.reader() as connection, closing(
+                connection.cursor()
+            ) as cursor:
+                if last_id is None:
+                    last_id = self.__applied_id(cursor)
+
+                rows = cursor.execute(
+                    """
+                    SELECT id, action FROM ngw_delta_journal
+                    WHERE id > ?
+                    ORDER BY id
+                    LIMIT ?
+                    """,
+                    (last_id, batch_size),
+                ).fetchall()
+
+            if len(rows) == 0:
+                return
+
+            last_id = rows[-1][0]
+            yield last_id, self.__deserialize(row[1] for row in rows)
+
+    def interrupted_target(self) -> Optional[Tuple[int, datetime]]:
+        """
+        Returns version and timestamp of partially applied changes.
+
+        :return: None if applying was not started or was finished
+        """
+        self.__ensure_table()
+        with self.__connection_pool.reader() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            cursor.execute(
+                "SELECT target, tstamp FROM ngw_delta_journal_state"
+            )
+            row = cursor.fetchone()
+
+        if row is None:
+            return None
+
+        return row[0], datetime.fromisoformat(row[1])
+
+    def mark_applied(
+        self,
+        cursor: sqlite3.Cursor,
+        target: int,
+        timestamp: datetime,
+        last_id: int,
+    ) -> None:
+        """
+        Saves applying progress.
+
+        Should be called in the transaction that applies actions up to
+        last_id.
+        """
+        cursor.execute("DELETE FROM ngw_delta_journal_state")
+        cursor.execute(
+            """
+            INSERT INTO ngw_delta_journal_state (target, tstamp, applied_id)
+            VALUES (?, ?, ?)
+            """,
+            (target, timestamp.isoformat(), last_id),
+        )
+
+    def finish(self, cursor: sqlite3.Cursor) -> None:
+        """Removes all actions and applying progress"""
+        cursor.execute("DELETE FROM ngw_delta_journal")
+        cursor.execute("DELETE FROM ngw_delta_journal_state")
+
+    def locally_changed_actions(self) -> List[FeatureAction]:
+        """Returns actions for features that have local changes"""
+        self.__ensure_table()
+        with self.__connection_pool.reader() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            cursor.execute(
+                """
+                SELECT action FROM ngw_delta_journal
+                WHERE id > ? AND fid IN (
+                    SELECT ngw_fid FROM ngw_features_metadata
+                    WHERE ngw_fid IS NOT NULL AND fid IN (
+                        SELECT fid FROM ngw_removed_features
+                        UNION SELECT fid FROM ngw_restored_features
+                        UNION SELECT fid FROM ngw_changed_attributes
+                        UNION SELECT fid FROM ngw_updated_geometries
+                    )
+                )
+                ORDER BY id
+                """,
+                (self.__applied_id(cursor),),
+            )
+            return self.__deserialize(row[0] for row in cursor)
+
+    def replace(
+        self, fids: Iterable[FeatureId], actions: Iterable[FeatureAction]
+    ) -> None:
+        """Replaces actions of given features with new ones"""
+        self.__ensure_table()
+        with self.__connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            self.__replace(cursor, fids, actions)
+
+    def compact(self) -> int:
+        """
+        Folds actions of every feature into net actions.
+
+        :return: Number of removed actions
+        """
+        self.__ensure_table()
+        with self.__connection_pool.reader() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            cursor.execute(
+                """
+                SELECT fid FROM ngw_delta_journal
+                WHERE fid >= 0
+                GROUP BY fid
+                HAVING COUNT(*) > 1
+                """
+            )
+            fids = [row[0] for row in cursor]
+
+        removed_count = 0
+        for i in range(0, len(fids), self.BATCH_SIZE):
+            batch = fids[i : i + self.BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            with self.__connection_pool.writer() as connection, closing(
+                connection.cursor()
+            ) as cursor:
+                cursor.execute(
+                    f"""
+                    SELECT action FROM ngw_delta_journal
+                    WHERE fid IN ({placeholders})
+                    ORDER BY id
+                    """,  # nosec B608
+                    batch,
+                )
+                actions = self.__deserialize(row[0] for row in cursor)
+                compacted_actions = compact_actions(actions)
+                self.__replace(cursor, batch, compacted_actions)
+
+            removed_count += len(actions) - len(compacted_actions)
+
+        return removed_count
+
+    def __replace(
+        self,
+        cursor: sqlite3.Cursor,
+        fids: Iterable[FeatureId],
+        actions: Iterable[FeatureAction],
+    ) -> None:
+        fids = list(set(fids))
+        rows = [
+            (action.fid, json.dumps(action.__dict__))
+            for action in actions
+            if isinstance(action, FeatureAction)
+        ]
+
+        for i in range(0, len(fids), self.BATCH_SIZE):
+            batch = fids[i : i + self.BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            cursor.execute(
+                f"DELETE FROM ngw_delta_journal WHERE fid IN ({placeholders})",  # nosec B608
+                batch,
+            )
+
+        cursor.executemany(
+            "INSERT INTO ngw_delta_journal (fid, action) VALUES (?, ?)",
+            rows,
+        )
+
+    def __applied_id(self, cursor: sqlite3.Cursor) -> int:
+        cursor.execute("SELECT applied_id FROM ngw_delta_journal_state")
+        row = cursor.fetchone()
+        return row[0] if row is not None else 0
+
+    def __deserialize(self, rows: Iterable[str]) -> List[FeatureAction]:
+        actions = self.__serializer.from_json(
+            [json.loads(row) for row in rows]
+        )
+        return [
+            action for action in actions if isinstance(action, FeatureAction)
+        ]
+
+    def __ensure_table(self) -> None:
+        if self.__is_table_checked:
+            return
+
+        # Containers created before the journal was introduced
+        with self.__connection_pool.writer() as connection:
+            connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS ngw_delta_journal (
+                    'id' INTEGER PRIMARY KEY, -- Fetching order
+                    'fid' INTEGER, -- Feature ID in NextGIS Web
+                    'action' TEXT -- Serialized action
+                );
+                CREATE INDEX IF NOT EXISTS idx_delta_journal_fid
+                    ON ngw_delta_journal (fid);
+                CREATE TABLE IF NOT EXISTS ngw_delta_journal_state (
+                    'target' INTEGER, -- Version being applied
+                    'tstamp' TEXT, -- Timestamp of the version
+                    'applied_id' INTEGER -- Last applied journal action
+                );
+                """
+            )
+
+        self.__is_table_checked = True
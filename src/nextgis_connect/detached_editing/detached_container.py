@@ -4,7 +4,7 @@ import tempfile
 from contextlib import closing
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, Dict, Optional, Sequence
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
 
 from qgis.core import (
     QgsEditorWidgetSetup,
@@ -17,6 +17,10 @@ from qgis.gui import QgisInterface
 from qgis.PyQt.QtCore import QObject, Qt, pyqtSignal, pyqtSlot
 from qgis.utils import iface
 
+from nextgis_connect.detached_editing.actions import FeatureAction, FeatureId
+from nextgis_connect.detached_editing.conflicts.conflict import (
+    VersioningConflict,
+)
 from nextgis_connect.detached_editing.conflicts.deduplicator import (
     ConflictsDeduplicator,
 )
@@ -36,6 +40,7 @@ from nextgis_connect.detached_editing.tasks import (
     FetchDeltaTask,
     FillLayerWithoutVersioningTask,
     FillLayerWithVersioning,
+    MaintainContainerTask,
     UploadChangesTask,
 )
 from nextgis_connect.exceptions import (
@@ -61,23 +66,41 @@ from nextgis_connect.settings import NgConnectSettings
 from nextgis_connect.utils import wrap_sql_value
 
 from . import utils
+from .change_counters import ensure_change_counters
+from .column_changes import ensure_column_changes
+from .container_connection_pool import ContainerConnectionPool
+from .delta_journal import DeltaJournal
 from .detached_layer import DetachedLayer
 from .detached_layer_factory import DetachedLayerFactory
 from .detached_layer_indicator import DetachedLayerIndicator
+from .features_index import invalidate_features_index
+from .gpkg_utils import register_gpkg_functions
+from .metadata_cache import (
+    cached_container_metadata,
+    invalidate_container_metadata,
+)
+from .spatial_index import restore_spatial_index
+from .sync_period import AdaptiveSyncPeriod
 from .utils import (
     DetachedContainerChangesInfo,
     DetachedContainerMetaData,
     DetachedLayerState,
     VersioningSynchronizationState,
-    make_connection,
 )
 
 if TYPE_CHECKING:
+    from .synchronization_scheduler import SynchronizationScheduler
+
     assert isinstance(iface, QgisInterface)
 
+PendingConflicts = Tuple[
+    Set[FeatureId], List[FeatureAction], List[VersioningConflict]
+]
+
 
 class DetachedContainer(QObject):
     __path: Path
+    __connection_pool: ContainerConnectionPool
     __detached_layers: Dict[str, DetachedLayer]
 
     __metadata: DetachedContainerMetaData
@@ -90,8 +113,14 @@ class DetachedContainer(QObject):
     __indicator: Optional[DetachedLayerIndicator]
     __sync_task: Optional[DetachedEditingTask]
     __is_silent_sync: bool
+    __scheduler: Optional["SynchronizationScheduler"]
+    __pending_conflicts: Optional[PendingConflicts]
+    __maintenance_task: Optional[MaintainContainerTask]
+    __maintenance_date: Optional[datetime]
+    __is_maintained: bool
 
     __check_date: Optional[datetime]
+    __sync_period: AdaptiveSyncPeriod
     __additional_data_fetch_date: Optional[datetime]
     __is_edit_allowed: bool
 
@@ -103,11 +132,16 @@ class DetachedContainer(QObject):
     state_changed = pyqtSignal(DetachedLayerState, name="stateChanged")
 
     def __init__(
-        self, container_path: Path, parent: Optional[QObject] = None
+        self,
+        container_path: Path,
+        parent: Optional[QObject] = None,
+        *,
+        scheduler: Optional["SynchronizationScheduler"] = None,
     ) -> None:
         super().__init__(parent)
 
         self.__path = container_path
+        self.__connection_pool = ContainerConnectionPool(container_path)
         self.__detached_layers = {}
 
         self.__metadata = None
@@ -121,8 +155,14 @@ class DetachedContainer(QObject):
         self.__indicator = None
         self.__sync_task = None
         self.__is_silent_sync = False
+        self.__scheduler = scheduler
+        self.__pending_conflicts = None
+        self.__maintenance_task = None
+        self.__maintenance_date = datetime.now()
+        self.__is_maintained = False
 
         self.__check_date = None
+        self.__sync_period = AdaptiveSyncPeriod()
         self.__additional_data_fetch_date = None
         self.__is_edit_allowed = True
         self.__is_project_container = parent is not None
@@ -147,6 +187,10 @@ class DetachedContainer(QObject):
     def path(self) -> Path:
         return self.__path
 
+    @property
+    def connection_pool(self) -> ContainerConnectionPool:
+        return self.__connection_pool
+
     @property
     def metadata(self):
         return self.__metadata
@@ -173,6 +217,18 @@ class DetachedContainer(QObject):
     def check_date(self) -> Optional[datetime]:
         return self.__check_date
 
+    @property
+    def next_check_date(self) -> Optional[datetime]:
+        """Date of the next automatic check for remote changes"""
+        if (
+            self.__check_date is None
+            or self.metadata is None
+            or not self.metadata.is_auto_sync_enabled
+        ):
+            return None
+
+        return self.__check_date + self.__sync_period.period
+
     @property
     def sync_date(self) -> Optional[datetime]:
         return self.__metadata.sync_date if self.__metadata else None
@@ -265,6 +321,8 @@ class DetachedContainer(QObject):
         for layer_id in layer_ids:
             self.delete_layer(layer_id)
 
+        self.__connection_pool.close()
+
     def add_indicator(self, node: QgsLayerTreeLayer) -> None:
         assert isinstance(iface, QgisInterface)
         view = iface.layerTreeView()
@@ -291,6 +349,7 @@ class DetachedContainer(QObject):
         if (
             self.is_edit_mode_enabled
             or self.state == DetachedLayerState.Synchronization
+            or self.__maintenance_task is not None
             or (not is_manual and not self.metadata.is_auto_sync_enabled)
         ):
             return False
@@ -314,7 +373,7 @@ class DetachedContainer(QObject):
                     return False
 
             if self.check_date is not None and not self.metadata.has_changes:
-                period = NgConnectSettings().synchronizatin_period
+                period = self.__sync_period.period
                 if datetime.now() - self.check_date < period:
                     return False
 
@@ -333,10 +392,49 @@ class DetachedContainer(QObject):
 
         return True
 
+    def maintain(self) -> bool:
+        """Starts periodic storage maintenance of the idle container"""
+        if (
+            self.is_edit_mode_enabled
+            or self.__sync_task is not None
+            or self.__maintenance_task is not None
+            or self.metadata is None
+            or not self.path.exists()
+        ):
+            return False
+
+        # Containers of previous versions are upgraded at the first
+        # maintenance of the session, and then regular period is used
+        is_upgrade_due = (
+            not self.__is_maintained
+            and DetachedLayerFactory().needs_upgrade(self.metadata)
+        )
+        period = NgConnectSettings().container_maintenance_period
+        if (
+            not is_upgrade_due
+            and datetime.now() - self.__maintenance_date < period
+        ):
+            return False
+
+        task = MaintainContainerTask(self.__connection_pool)
+        task.taskCompleted.connect(self.__on_maintenance_finished)
+        task.taskTerminated.connect(self.__on_maintenance_finished)
+
+        # Layers can't enter edit mode while pages are being released
+        self.__lock_layers()
+        self.__maintenance_task = task
+
+        task_manager = NgConnectInterface.instance().task_manager
+        assert task_manager is not None
+        task_manager.addTask(task)
+
+        return True
+
     def reset_container(self) -> None:
         logger.debug(f"<b>Start layer {self.metadata} reset</b>")
 
         self.__reset_error()
+        self.__sync_period.reset()
 
         # Get resource
         if self.__metadata is not None:
@@ -396,6 +494,8 @@ class DetachedContainer(QObject):
         for layer in self.__detached_layers.values():
             layer.enable_fake()
 
+        self.__connection_pool.close()
+
         try:
             for service_file in self.path.parent.glob(f"{self.path.name}-*"):
                 service_file.unlink(missing_ok=True)
@@ -413,7 +513,11 @@ class DetachedContainer(QObject):
 
             return
 
-        self.__metadata = utils.container_metadata(self.path)
+        invalidate_container_metadata(self.path)
+        invalidate_features_index(self.path)
+        self.__metadata = cached_container_metadata(
+            self.path, self.__connection_pool
+        )
 
         for layer in self.__detached_layers.values():
             layer.disable_fake()
@@ -433,8 +537,17 @@ class DetachedContainer(QObject):
         self.synchronize(is_manual=True)
 
     def __update_state(self, is_full_update: bool = False) -> None:
+        invalidate_features_index(self.path)
+
+        if is_full_update:
+            self.__check_change_counters()
+            self.__check_column_changes()
+            self.__check_spatial_index()
+
         try:
-            self.__metadata = utils.container_metadata(self.path)
+            self.__metadata = cached_container_metadata(
+                self.path, self.__connection_pool
+            )
             if not self.metadata.is_versioning_enabled:
                 self.__versioning_state = (
                     VersioningSynchronizationState.NotVersionedLayer
@@ -528,7 +641,9 @@ class DetachedContainer(QObject):
             > timedelta(hours=1)
         ):
             sync_task = FetchAdditionalDataTask(
-                self.path, need_update_structure=True
+                self.path,
+                need_update_structure=True,
+                connection_pool=self.__connection_pool,
             )
             sync_task.taskCompleted.connect(self.__on_additional_data_fetched)
             sync_task.taskTerminated.connect(self.__on_additional_data_fetched)
@@ -538,9 +653,13 @@ class DetachedContainer(QObject):
     def __init_ordinary_task(self) -> Optional[DetachedEditingTask]:
         sync_task = None
         if self.is_not_initialized:
-            sync_task = FillLayerWithoutVersioningTask(self.path)
+            sync_task = FillLayerWithoutVersioningTask(
+                self.path, connection_pool=self.__connection_pool
+            )
         elif self.metadata.has_changes:
-            sync_task = UploadChangesTask(self.path)
+            sync_task = UploadChangesTask(
+                self.path, connection_pool=self.__connection_pool
+            )
 
         if sync_task is not None:
             sync_task.taskCompleted.connect(
@@ -557,7 +676,9 @@ class DetachedContainer(QObject):
         self.__versioning_state = State.FetchingChanges
 
         if self.is_not_initialized:
-            sync_task = FillLayerWithVersioning(self.path)
+            sync_task = FillLayerWithVersioning(
+                self.path, connection_pool=self.__connection_pool
+            )
             sync_task.taskCompleted.connect(
                 lambda: self.__on_synchronization_finished(True)
             )
@@ -566,7 +687,9 @@ class DetachedContainer(QObject):
             )
             return sync_task
 
-        sync_task = FetchDeltaTask(self.path)
+        sync_task = FetchDeltaTask(
+            self.path, connection_pool=self.__connection_pool
+        )
         sync_task.taskCompleted.connect(self.__on_fetch_finished)
         sync_task.taskTerminated.connect(self.__on_fetch_finished)
         return sync_task
@@ -622,7 +745,11 @@ class DetachedContainer(QObject):
             return
 
         # After first sync
-        task = FetchAdditionalDataTask(self.path, need_update_structure=True)
+        task = FetchAdditionalDataTask(
+            self.path,
+            need_update_structure=True,
+            connection_pool=self.__connection_pool,
+        )
         task.taskCompleted.connect(self.__on_additional_data_fetched)
         task.taskTerminated.connect(self.__on_additional_data_fetched)
         self.__start_sync(task)
@@ -682,45 +809,29 @@ class DetachedContainer(QObject):
 
         self.__update_state()
 
-        if len(self.__sync_task.delta) > 0:
+        self.__sync_period.record(self.__sync_task.actions_count)
+
+        if self.__sync_task.actions_count > 0:
             try:
-                delta = self.__process_delta(self.__sync_task)
-            except SynchronizationError as error:
-                error.try_again = lambda: self.synchronize(is_manual=True)
-                self.__process_error(error)
-                self.__finish_sync()
-                return
+                self.__process_delta()
             except Exception as error:
-                ng_error = NgConnectError()
-                ng_error.__cause__ = error
-                self.__process_error(ng_error)
-                self.__finish_sync()
+                self.__process_delta_error(error)
                 return
 
-            # Even if delta is empty after conflicts resolution we should
-            # update layer metadata
-
-            fetch_delta_task = self.__sync_task
+            if self.__pending_conflicts is not None:
+                self.__request_conflicts_resolution()
+                return
 
-            self.__versioning_state = (
-                VersioningSynchronizationState.ChangesApplying
-            )
-            task = ApplyDeltaTask(
-                self.path,
-                fetch_delta_task.target,
-                fetch_delta_task.timestamp,
-                delta,
-            )
-            task.taskCompleted.connect(self.__on_apply_finished)
-            task.taskTerminated.connect(self.__on_apply_finished)
-            self.__start_sync(task)
+            self.__start_applying()
             return
 
         if self.metadata.has_changes:
             self.__versioning_state = (
                 VersioningSynchronizationState.UploadingChanges
             )
-            task = UploadChangesTask(self.path)
+            task = UploadChangesTask(
+                self.path, connection_pool=self.__connection_pool
+            )
             task.taskCompleted.connect(self.__on_versioned_uploading_finished)
             task.taskTerminated.connect(self.__on_versioned_uploading_finished)
             self.__start_sync(task)
@@ -728,6 +839,69 @@ class DetachedContainer(QObject):
 
         self.__on_synchronization_finished(True)
 
+    def resolve_conflicts(self) -> None:
+        """
+        Shows the dialog for conflicts found by the synchronization and
+        continues it with the resolved delta.
+
+        Called by the scheduler when no other container resolves
+        conflicts.
+        """
+        if self.__pending_conflicts is None:
+            if self.__scheduler is not None:
+                self.__scheduler.finish_conflicts_resolution(self)
+            return
+
+        try:
+            self.__resolve_conflicts()
+        except Exception as error:
+            self.__process_delta_error(error)
+        else:
+            self.__start_applying()
+        finally:
+            self.__pending_conflicts = None
+            if self.__scheduler is not None:
+                self.__scheduler.finish_conflicts_resolution(self)
+
+    def __request_conflicts_resolution(self) -> None:
+        if self.__scheduler is None:
+            self.resolve_conflicts()
+            return
+
+        # Dialogs of other containers may be shown, so the
+        # synchronization waits for its turn
+        self.__scheduler.request_conflicts_resolution(self)
+
+    def __process_delta_error(self, error: Exception) -> None:
+        if isinstance(error, SynchronizationError):
+            error.try_again = lambda: self.synchronize(is_manual=True)
+            self.__process_error(error)
+        else:
+            ng_error = NgConnectError()
+            ng_error.__cause__ = error
+            self.__process_error(ng_error)
+
+        self.__finish_sync()
+
+    def __start_applying(self) -> None:
+        # Even if delta is empty after conflicts resolution we should
+        # update layer metadata
+        fetch_delta_task = self.__sync_task
+        assert isinstance(fetch_delta_task, FetchDeltaTask)
+
+        self.__versioning_state = (
+            VersioningSynchronizationState.ChangesApplying
+        )
+        task = ApplyDeltaTask(
+            self.path,
+            fetch_delta_task.target,
+            fetch_delta_task.timestamp,
+            connection_pool=self.__connection_pool,
+        )
+        task.taskCompleted.connect(self.__on_apply_finished)
+        task.taskTerminated.connect(self.__on_apply_finished)
+        self.__start_sync(task)
+
     @pyqtSlot()
     def __on_apply_finished(self) -> None:
         result = self.__sync_task.status() == QgsTask.TaskStatus.Complete
@@ -744,7 +918,9 @@ class DetachedContainer(QObject):
         self.__versioning_state = (
             VersioningSynchronizationState.UploadingChanges
         )
-        task = UploadChangesTask(self.path)
+        task = UploadChangesTask(
+            self.path, connection_pool=self.__connection_pool
+        )
         task.taskCompleted.connect(self.__on_versioned_uploading_finished)
         task.taskTerminated.connect(self.__on_versioned_uploading_finished)
         self.__start_sync(task)
@@ -758,7 +934,9 @@ class DetachedContainer(QObject):
 
         self.__update_state()
 
-        task = FetchDeltaTask(self.path)
+        task = FetchDeltaTask(
+            self.path, connection_pool=self.__connection_pool
+        )
         task.taskCompleted.connect(self.__on_fetch_finished)
         task.taskTerminated.connect(self.__on_fetch_finished)
         self.__versioning_state = (
@@ -788,6 +966,19 @@ class DetachedContainer(QObject):
         # Start next layer update
         NgConnectInterface.instance().synchronize_layers()
 
+    def __on_maintenance_finished(self) -> None:
+        assert self.__maintenance_task is not None
+        # Maintenance is repeated later, so failures are not shown
+        if self.__maintenance_task.error is not None:
+            logger.warning(
+                f"Container maintenance failed: {self.__maintenance_task.error}"
+            )
+
+        self.__maintenance_task = None
+        self.__maintenance_date = datetime.now()
+        self.__is_maintained = True
+        self.__unlock_layers()
+
     def __lock_layers(self) -> None:
         for detached_layer in self.__detached_layers.values():
             detached_layer.qgs_layer.setReadOnly(True)
@@ -824,7 +1015,7 @@ class DetachedContainer(QObject):
             detached_layer.qgs_layer.setCustomProperty(name, value)
 
     def __apply_label_attribute(self) -> None:
-        metadata = utils.container_metadata(self.path)
+        metadata = cached_container_metadata(self.path, self.__connection_pool)
         label_field = metadata.fields.label_field
         if label_field is None:
             return
@@ -851,7 +1042,8 @@ class DetachedContainer(QObject):
     def __apply_lookup_tables(self) -> None:
         assert isinstance(self.__sync_task, FetchAdditionalDataTask)
 
-        for lookup_table_id, pairs in self.__sync_task.lookup_tables.items():
+        lookup_tables = self.__sync_task.lookup_tables
+        for lookup_table_id, lookup_table in lookup_tables.items():
             attributes_id = [
                 field.attribute
                 for field in self.metadata.fields
@@ -860,9 +1052,8 @@ class DetachedContainer(QObject):
 
             for detached_layer in self.__detached_layers.values():
                 for attribute_id in attributes_id:
-                    setup = QgsEditorWidgetSetup("ValueMap", {"map": pairs})
                     detached_layer.qgs_layer.setEditorWidgetSetup(
-                        attribute_id, setup
+                        attribute_id, lookup_table.widget_setup
                     )
 
         attributes_with_removed_lookup_table = (
@@ -911,7 +1102,7 @@ class DetachedContainer(QObject):
 
     def __check_structure(self) -> None:
         container_fields_name = set()
-        with closing(make_connection(self.__path)) as connection, closing(
+        with self.__connection_pool.reader() as connection, closing(
             connection.cursor()
         ) as cursor:
             container_fields_name = set(
@@ -953,36 +1144,54 @@ class DetachedContainer(QObject):
         if is_connection_changed or self.__metadata.is_auto_sync_enabled:
             self.synchronize(is_manual=True)
 
-    def __process_delta(self, fetch_delta_task: FetchDeltaTask) -> Sequence:
-        if len(fetch_delta_task.delta) == 0:
-            return []
-
+    def __process_delta(self) -> None:
         self.__versioning_state = (
             VersioningSynchronizationState.ConflictDetection
         )
 
+        # Only remote changes of locally changed features can conflict
+        journal = DeltaJournal(self.__connection_pool, self.metadata)
+        remote_actions = journal.locally_changed_actions()
+        if len(remote_actions) == 0:
+            return
+
+        remote_fids = set(action.fid for action in remote_actions)
+
         # Check conflicts
-        conflict_detector = ConflictsDetector(self.path, self.metadata)
-        conflicts = conflict_detector.detect(fetch_delta_task.delta)
+        conflict_detector = ConflictsDetector(
+            self.path, self.metadata, self.__connection_pool
+        )
+        conflicts = conflict_detector.detect(remote_actions)
 
         # Find duplicates and remove it from actions and local changes
-        deduplicator = ConflictsDeduplicator(self.path, self.metadata)
+        deduplicator = ConflictsDeduplicator(
+            self.path, self.metadata, self.__connection_pool
+        )
         need_update_state, delta, conflicts = deduplicator.deduplicate(
-            fetch_delta_task.delta, conflicts
+            remote_actions, conflicts
         )
 
-        if need_update_state:
-            if len(conflicts) > 0:
-                self.__versioning_state = (
-                    VersioningSynchronizationState.ConflictSolving
-                )
+        if len(conflicts) > 0:
+            self.__versioning_state = (
+                VersioningSynchronizationState.ConflictSolving
+            )
 
+        if need_update_state:
             self.__update_state(is_full_update=True)
 
         if len(conflicts) == 0:
-            return delta
+            journal.replace(remote_fids, delta)
+            return
+
+        self.__pending_conflicts = (remote_fids, delta, conflicts)
 
-        dialog = ResolvingDialog(self.path, self.metadata, conflicts)
+    def __resolve_conflicts(self) -> None:
+        assert self.__pending_conflicts is not None
+        remote_fids, delta, conflicts = self.__pending_conflicts
+
+        dialog = ResolvingDialog(
+            self.path, self.metadata, conflicts, self.__connection_pool
+        )
         result = dialog.exec()
 
         if result != ResolvingDialog.DialogCode.Accepted:
@@ -990,15 +1199,62 @@ class DetachedContainer(QObject):
                 "Resolving cancelled", code=ErrorCode.ConflictsNotResolved
             )
 
-        resolver = ConflictsResolver(self.path, self.metadata)
+        resolver = ConflictsResolver(
+            self.path, self.metadata, self.__connection_pool
+        )
         status, delta = resolver.resolve(delta, dialog.resolutions)
 
         if status != ConflictsResolver.Status.Resolved:
             raise SynchronizationError("Not all conflicts were solved")
 
+        journal = DeltaJournal(self.__connection_pool, self.metadata)
+        journal.replace(remote_fids, delta)
+
         self.__update_state(is_full_update=True)
 
-        return delta
+    def __check_change_counters(self) -> None:
+        if not self.path.exists():
+            return
+
+        try:
+            with self.__connection_pool.writer() as connection, closing(
+                connection.cursor()
+            ) as cursor:
+                if ensure_change_counters(cursor):
+                    logger.debug("Change counters installed")
+
+        except Exception:
+            logger.exception("Failed to check change counters")
+
+    def __check_column_changes(self) -> None:
+        if not self.path.exists():
+            return
+
+        try:
+            with self.__connection_pool.writer() as connection, closing(
+                connection.cursor()
+            ) as cursor:
+                if ensure_column_changes(cursor):
+                    logger.debug("Column changes table created")
+
+        except Exception:
+            logger.exception("Failed to check column changes table")
+
+    def __check_spatial_index(self) -> None:
+        # Index suspended by a running synchronization is restored by it
+        if not self.path.exists() or self.__sync_task is not None:
+            return
+
+        try:
+            with self.__connection_pool.writer() as connection, closing(
+                connection.cursor()
+            ) as cursor:
+                register_gpkg_functions(connection)
+                if restore_spatial_index(cursor):
+                    logger.warning("Spatial index of interrupted sync rebuilt")
+
+        except Exception:
+            logger.exception("Failed to restore spatial index")
 
     def __reset_error(self) -> None:
         if self.__error is None or self.__is_silent_sync:
@@ -24,6 +24,7 @@ from nextgis_connect.settings import NgConnectSettings
 from . import utils
 from .detached_container import DetachedContainer
 from .detached_layer_config_widget import DetachedLayerConfigWidgetFactory
+from .synchronization_scheduler import SynchronizationScheduler
 
 iface: QgisInterface
 
@@ -32,6 +33,7 @@ class DetachedEditing(QObject):
     __containers: Dict[Path, DetachedContainer]
     __containers_by_layer_id: Dict[str, DetachedContainer]
     __is_synchronization_enabled: bool
+    __scheduler: SynchronizationScheduler
 
     __timer: QTimer
     __properties_factory: DetachedLayerConfigWidgetFactory
@@ -47,6 +49,10 @@ class DetachedEditing(QObject):
         self.__containers = {}
         self.__containers_by_layer_id = {}
         self.__is_synchronization_enabled = True
+        self.__scheduler = SynchronizationScheduler(
+            settings.synchronization_concurrency,
+            settings.synchronization_instance_concurrency,
+        )
 
         self.__timer = QTimer(self)
         self.__timer.setInterval(settings.layer_check_period)
@@ -109,25 +115,18 @@ class DetachedEditing(QObject):
     def synchronize_layers(self) -> None:
         self.__remove_empty_containers()
 
-        if (
-            self.is_sychronization_active
-            or not self.__is_synchronization_enabled
-        ):
+        if not self.__is_synchronization_enabled:
             return
 
-        stubs = list(
-            filter(
-                lambda container: container.is_not_initialized,
-                self.__containers.values(),
-            )
-        )
-        containers = (
-            stubs if len(stubs) > 0 else list(self.__containers.values())
+        settings = NgConnectSettings()
+        self.__scheduler.global_limit = settings.synchronization_concurrency
+        self.__scheduler.instance_limit = (
+            settings.synchronization_instance_concurrency
         )
-        for container in containers:
-            is_started = container.synchronize()
-            if is_started:
-                return
+        self.__scheduler.schedule(self.__containers.values())
+
+        for container in self.__containers.values():
+            container.maintain()
 
     @pyqtSlot(name="enableSynchronization")
     def enable_synchronization(self) -> None:
@@ -168,7 +167,9 @@ class DetachedEditing(QObject):
         container = self.__containers.get(container_path)
         if container is None:
             try:
-                container = DetachedContainer(container_path, self)
+                container = DetachedContainer(
+                    container_path, self, scheduler=self.__scheduler
+                )
             except Exception:
                 logger.exception("Container is corrupted")
                 return False
@@ -211,6 +212,7 @@ class DetachedEditing(QObject):
                 and container.state != utils.DetachedLayerState.Synchronization
             ):
                 self.__containers.pop(container.path)
+                self.__scheduler.forget(container.path)
                 container.deleteLater()
 
     @pyqtSlot(QgsLayerTreeNode, int, int)
@@ -276,5 +278,6 @@ class DetachedEditing(QObject):
 
         for path in paths_for_remove:
             container = self.__containers.pop(path, None)
+            self.__scheduler.forget(path)
             if container is not None:
                 container.deleteLater()
@@ -1,12 +1,9 @@
-import json
 import sqlite3
 from contextlib import closing
 from copy import deepcopy
-from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Tuple, cast
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
 
 from qgis.core import (
-    QgsFeature,
-    QgsFeatureRequest,
     QgsField,
     QgsMemoryProviderUtils,
     QgsVectorLayer,
@@ -22,21 +19,20 @@ from nextgis_connect.compat import (
     QgsFeatureList,
     QgsGeometryMap,
 )
-from nextgis_connect.detached_editing.serialization import (
-    deserialize_value,
-    serialize_geometry,
-    serialize_value,
-    simplify_value,
+from nextgis_connect.detached_editing.backup_serialization import (
+    FeatureState,
+    deserialize_value_backup,
+    geometry_backup_wkb,
+    serialize_feature_backup,
 )
+from nextgis_connect.detached_editing.bulk_ids import fill_temp_fids
+from nextgis_connect.detached_editing.changes_backup import ChangesBackup
 from nextgis_connect.detached_editing.utils import (
     detached_layer_uri,
-    make_connection,
 )
 from nextgis_connect.exceptions import ContainerError
 from nextgis_connect.logging import logger
 from nextgis_connect.resources.ngw_field import FieldId
-from nextgis_connect.types import NgwFeatureId
-from nextgis_connect.utils import wrap_sql_value
 
 if TYPE_CHECKING:
     from .detached_container import DetachedContainer
@@ -53,9 +49,7 @@ class DetachedLayer(QObject):
     __is_layer_changed: bool
     __errors: List[ContainerError]
 
-    __updated_attributes: Dict[Tuple[QgsFeatureId, FieldId], Any]
-    __updated_geometries: Dict[QgsFeatureId, str]
-    __deleted_features: Dict[QgsFeatureId, QgsFeature]
+    __changes_backup: ChangesBackup
 
     editing_started = pyqtSignal(name="editingStarted")
     editing_finished = pyqtSignal(name="editingFinished")
@@ -77,9 +71,9 @@ class DetachedLayer(QObject):
         self.__is_layer_changed = False
         self.__errors = []
 
-        self.__fix_source_if_needed()
+        self.__changes_backup = ChangesBackup(container.connection_pool)
 
-        self.__reset_backup()
+        self.__fix_source_if_needed()
 
         self.__qgs_layer.editingStarted.connect(self.__start_listen_changes)
         self.__qgs_layer.editingStopped.connect(self.__stop_listen_changes)
@@ -213,21 +207,20 @@ class DetachedLayer(QObject):
     def __log_added_features(self, _: str, features: QgsFeatureList) -> None:
         ng_error = None
         try:
-            with closing(
-                make_connection(self.__qgs_layer)
-            ) as connection, closing(connection.cursor()) as cursor:
-                added_fids = ",".join(
-                    map(lambda feature: f"({feature.id()})", features)
+            connection_pool = self.__container.connection_pool
+            with connection_pool.writer() as connection, closing(
+                connection.cursor()
+            ) as cursor:
+                added_fids = [(feature.id(),) for feature in features]
+                cursor.executemany(
+                    "INSERT INTO ngw_features_metadata (fid) VALUES (?)",
+                    added_fids,
                 )
-                cursor.executescript(
-                    f"""
-                    INSERT INTO ngw_features_metadata (fid) VALUES {added_fids};
-                    INSERT INTO ngw_added_features (fid) VALUES {added_fids};
-                    """  # nosec B608
+                cursor.executemany(
+                    "INSERT INTO ngw_added_features (fid) VALUES (?)",
+                    added_fids,
                 )
 
-                connection.commit()
-
         except Exception as error:
             message = "Can't create adding changes records"
             ng_error = ContainerError(message)
@@ -249,9 +242,10 @@ class DetachedLayer(QObject):
         ng_error = None
 
         try:
-            with closing(
-                make_connection(self.__qgs_layer)
-            ) as connection, closing(connection.cursor()) as cursor:
+            connection_pool = self.__container.connection_pool
+            with connection_pool.writer() as connection, closing(
+                connection.cursor()
+            ) as cursor:
                 # Delete added feature fids
                 removed_not_uploaded_fids = (
                     self.__extract_intersection_with_added_fids(
@@ -268,8 +262,6 @@ class DetachedLayer(QObject):
                 )
                 self.__add_remove_records(cursor, removed_uploaded_fids)
 
-                connection.commit()
-
         except Exception as error:
             message = "Can't create deletion changes records"
             ng_error = ContainerError(message)
@@ -294,9 +286,10 @@ class DetachedLayer(QObject):
         feature_ids = set()
 
         try:
-            with closing(
-                make_connection(self.__qgs_layer)
-            ) as connection, closing(connection.cursor()) as cursor:
+            connection_pool = self.__container.connection_pool
+            with connection_pool.writer() as connection, closing(
+                connection.cursor()
+            ) as cursor:
                 feature_ids = set(changed_attributes.keys())
                 added_fids_intersection = (
                     self.__extract_intersection_with_added_fids(
@@ -305,23 +298,7 @@ class DetachedLayer(QObject):
                 )
                 changed_fids = set(feature_ids) - set(added_fids_intersection)
                 if len(changed_fids) > 0:
-                    cursor.executemany(
-                        """
-                        INSERT INTO ngw_updated_attributes (fid, attribute, backup)
-                        VALUES (?, ?, ?)
-                        ON CONFLICT DO NOTHING;
-                        """,
-                        (
-                            (
-                                fid,
-                                attribute,
-                                self.__updated_attributes[(fid, attribute)],
-                            )
-                            for fid in changed_fids
-                            for attribute in changed_attributes[fid]
-                        ),
-                    )
-                    connection.commit()
+                    self.__changes_backup.save_updated_attributes(cursor)
 
         except Exception as error:
             message = "Can't create values changes records"
@@ -348,9 +325,10 @@ class DetachedLayer(QObject):
 
         feature_ids: QgsFeatureIds = set()
         try:
-            with closing(
-                make_connection(self.__qgs_layer)
-            ) as connection, closing(connection.cursor()) as cursor:
+            connection_pool = self.__container.connection_pool
+            with connection_pool.writer() as connection, closing(
+                connection.cursor()
+            ) as cursor:
                 feature_ids = set(changed_geometries.keys())
                 added_fids_intersection = (
                     self.__extract_intersection_with_added_fids(
@@ -359,18 +337,7 @@ class DetachedLayer(QObject):
                 )
                 changed_fids = set(feature_ids) - set(added_fids_intersection)
                 if len(changed_fids) > 0:
-                    cursor.executemany(
-                        """
-                        INSERT INTO ngw_updated_geometries (fid, backup)
-                        VALUES (?, ?)
-                        ON CONFLICT DO NOTHING;
-                        """,
-                        (
-                            (fid, self.__updated_geometries[fid])
-                            for fid in changed_fids
-                        ),
-                    )
-                    connection.commit()
+                    self.__changes_backup.save_updated_geometries(cursor)
 
         except Exception as error:
             message = "Can't create geometry changes records"
@@ -458,10 +425,27 @@ class DetachedLayer(QObject):
     def __create_backup(self, stop_editing: bool) -> None:
         ng_error = None
 
+        edit_buffer = self.__qgs_layer.editBuffer()
+        changed_attributes: QgsChangedAttributesMap = (
+            edit_buffer.changedAttributeValues()
+        )
+        changed_geometries: QgsGeometryMap = edit_buffer.changedGeometries()
+        deleted_fids: QgsFeatureIds = edit_buffer.deletedFeatureIds()
+        if (
+            len(changed_attributes) == 0
+            and len(changed_geometries) == 0
+            and len(deleted_fids) == 0
+        ):
+            return
+
         try:
-            self.__create_backup_for_updated_fields()
-            self.__create_backup_for_updated_geometries()
-            self.__create_backup_for_deleted()
+            self.__changes_backup.capture(
+                self.__container.metadata,
+                self.__qgs_layer.dataProvider(),
+                changed_attributes,
+                changed_geometries.keys(),
+                deleted_fids,
+            )
         except Exception as error:
             message = "Can't create backup before changes"
             ng_error = ContainerError(message)
@@ -473,81 +457,17 @@ class DetachedLayer(QObject):
     def __extract_intersection_with_added_fids(
         self, cursor: sqlite3.Cursor, feature_ids: QgsFeatureIds
     ) -> QgsFeatureIds:
-        fetch_added_query = """
-            SELECT fid
-            FROM ngw_added_features
-            WHERE fid in ({placeholders})
-        """.format(placeholders=",".join(map(str, feature_ids)))  # nosec B608
-        cursor.execute(fetch_added_query)
-        return set(row[0] for row in cursor.fetchall())
-
-    def __create_backup_for_updated_fields(self) -> None:
-        changed_attributes_info: QgsChangedAttributesMap = (
-            self.__qgs_layer.editBuffer().changedAttributeValues()
-        )
-        if len(changed_attributes_info) == 0:
-            return
-
-        features_before_change = cast(
-            Iterable[QgsFeature],
-            self.__qgs_layer.dataProvider().getFeatures(
-                QgsFeatureRequest(list(changed_attributes_info.keys()))
-            ),
-        )
-        self.__updated_attributes.update(
-            (
-                (feature.id(), attribute),
-                serialize_value(feature.attribute(attribute)),
-            )
-            for feature in features_before_change
-            for attribute in changed_attributes_info[feature.id()].keys()
-        )
-
-    def __create_backup_for_updated_geometries(self) -> None:
-        changed_geometries_info: QgsGeometryMap = (
-            self.__qgs_layer.editBuffer().changedGeometries()
-        )
-        if len(changed_geometries_info) == 0:
-            return
-
-        features_before_change = cast(
-            Iterable[QgsFeature],
-            self.__qgs_layer.dataProvider().getFeatures(
-                QgsFeatureRequest(list(changed_geometries_info.keys()))
-            ),
-        )
-        self.__updated_geometries.update(
-            (
-                feature.id(),
-                serialize_geometry(
-                    feature.geometry(),
-                    self.__container.metadata.is_versioning_enabled,
-                ),
-            )
-            for feature in features_before_change
-        )
-
-    def __create_backup_for_deleted(self) -> None:
-        deleted_features_id: QgsFeatureIds = (
-            self.__qgs_layer.editBuffer().deletedFeatureIds()
-        )
-        if len(deleted_features_id) == 0:
-            return
-
-        deleted_features = cast(
-            Iterable[QgsFeature],
-            self.__qgs_layer.dataProvider().getFeatures(
-                QgsFeatureRequest(deleted_features_id)
-            ),
+        fids = fill_temp_fids(cursor, feature_ids)
+        cursor.execute(
+            f"SELECT fid FROM ngw_added_features WHERE fid IN {fids}"  # nosec B608
         )
-        self.__deleted_features = {
-            feature.id(): feature for feature in deleted_features
-        }
+        return set(row[0] for row in cursor.fetchall())
 
     def __reset_backup(self) -> None:
-        self.__updated_attributes = dict()
-        self.__updated_geometries = dict()
-        self.__deleted_features = dict()
+        try:
+            self.__changes_backup.reset()
+        except Exception:
+            logger.exception("Can't reset changes backup")
 
     def __remove_features_metadata(
         self, cursor: sqlite3.Cursor, fids: QgsFeatureIds
@@ -555,11 +475,11 @@ class DetachedLayer(QObject):
         if len(fids) == 0:
             return
 
-        joined_fids = ",".join(map(str, fids))
-        cursor.executescript(
+        fids_table = fill_temp_fids(cursor, fids)
+        cursor.execute(
             f"""
             DELETE FROM ngw_features_metadata
-            WHERE fid IN ({joined_fids}) AND ngw_fid IS NULL;
+            WHERE fid IN {fids_table} AND ngw_fid IS NULL
             """  # nosec B608
         )
 
@@ -569,115 +489,102 @@ class DetachedLayer(QObject):
         if len(removed_fids) == 0:
             return
 
-        joined_removed_fids = ",".join(map(str, removed_fids))
+        removed_fids_table = fill_temp_fids(cursor, removed_fids)
         fields_backups = self.__extract_fields_backups(
-            cursor, joined_removed_fids
+            cursor, removed_fids_table
         )
         geometries_backups = self.__extract_geometries_backups(
-            cursor, joined_removed_fids
+            cursor, removed_fids_table
         )
 
+        features_states = self.__changes_backup.deleted_features_states(
+            cursor, self.__container.metadata, removed_fids
+        )
         features_backup = self.__serialize_deletion_backup(
-            removed_fids, fields_backups, geometries_backups
+            features_states, fields_backups, geometries_backups
         )
 
         # Update records
-        removed_records = ",".join(
-            map(
-                lambda fid: "({fid}, {backup})".format(  # noqa: UP032
-                    fid=fid,
-                    backup=wrap_sql_value(json.dumps(features_backup[fid])),
-                ),
-                removed_fids,
-            )
+        cursor.executemany(
+            "INSERT INTO ngw_removed_features (fid, backup) VALUES (?, ?)",
+            ((fid, features_backup[fid]) for fid in removed_fids),
         )
-        script = f"""
-            INSERT INTO ngw_removed_features (fid, backup)
-                VALUES {removed_records};
-        """  # nosec B608
 
         if len(fields_backups) > 0:
-            script += f"""
-            DELETE FROM ngw_updated_attributes
-                WHERE fid in ({joined_removed_fids});
-            """  # nosec B608
+            for table_name in ("ngw_updated_attributes", "ngw_column_backups"):
+                cursor.execute(
+                    f"""
+                    DELETE FROM {table_name}
+                    WHERE fid IN {removed_fids_table}
+                    """  # nosec B608
+                )
         if len(geometries_backups) > 0:
-            script += f"""
-            DELETE FROM ngw_updated_geometries
-                WHERE fid in ({joined_removed_fids});
-            """  # nosec B608
-
-        cursor.executescript(script)
-
-    def __extract_fields_backups(
-        self, cursor: sqlite3.Cursor, joined_fids: str
-    ) -> Dict[Tuple[QgsFeatureId, FieldId], str]:
-        return {
-            (row[0], row[1]): deserialize_value(row[2])
-            for row in cursor.execute(
+            cursor.execute(
                 f"""
-                SELECT fid, attribute, backup
-                FROM ngw_updated_attributes
-                WHERE fid IN ({joined_fids})
+                DELETE FROM ngw_updated_geometries
+                WHERE fid IN {removed_fids_table}
                 """  # nosec B608
             )
-        }
+
+    def __extract_fields_backups(
+        self, cursor: sqlite3.Cursor, fids_table: str
+    ) -> Dict[Tuple[QgsFeatureId, FieldId], Any]:
+        # Backups of features changes take precedence over column ones
+        fields_backups: Dict[Tuple[QgsFeatureId, FieldId], Any] = {}
+        for table_name in ("ngw_column_backups", "ngw_updated_attributes"):
+            fields_backups.update(
+                {
+                    (row[0], row[1]): deserialize_value_backup(row[2])
+                    for row in cursor.execute(
+                        f"""
+                        SELECT fid, attribute, backup
+                        FROM {table_name}
+                        WHERE fid IN {fids_table}
+                        """  # nosec B608
+                    )
+                }
+            )
+        return fields_backups
 
     def __extract_geometries_backups(
-        self, cursor: sqlite3.Cursor, joined_fids: str
-    ) -> Dict[QgsFeatureId, str]:
+        self, cursor: sqlite3.Cursor, fids_table: str
+    ) -> Dict[QgsFeatureId, bytes]:
+        is_versioning_enabled = self.__container.metadata.is_versioning_enabled
         return {
-            row[0]: row[1]
+            row[0]: geometry_backup_wkb(row[1], is_versioning_enabled) or b""
             for row in cursor.execute(
                 f"""
                 SELECT fid, backup
                 FROM ngw_updated_geometries
-                WHERE fid IN ({joined_fids})
+                WHERE fid IN {fids_table}
                 """  # nosec B608
             )
         }
 
     def __serialize_deletion_backup(
         self,
-        fids: Iterable[NgwFeatureId],
-        fields_backups: Dict[Tuple[QgsFeatureId, FieldId], str],
-        geometries_backups: Dict[QgsFeatureId, str],
-    ) -> Dict[NgwFeatureId, Dict[str, Any]]:
+        features_states: Dict[QgsFeatureId, FeatureState],
+        fields_backups: Dict[Tuple[QgsFeatureId, FieldId], Any],
+        geometries_backups: Dict[QgsFeatureId, bytes],
+    ) -> Dict[QgsFeatureId, bytes]:
         result = {}
 
-        for fid in fids:
-            feature = self.__deleted_features[fid]
-
-            fields_after_sync = []
-            fields_before_deletion = []
-
-            for field in self.__container.metadata.fields:
-                value_before_deletion = simplify_value(
-                    feature.attribute(field.attribute)
-                )
-                value_after_sync = fields_backups.get(
-                    (fid, field.attribute), value_before_deletion
-                )
-                fields_after_sync.append([field.ngw_id, value_after_sync])
-                fields_before_deletion.append(
-                    [field.ngw_id, value_before_deletion]
-                )
-
-            serialized_geometry = serialize_geometry(
-                feature.geometry(),
-                self.__container.metadata.is_versioning_enabled,
+        fields = self.__container.metadata.fields
+        for fid, before_deletion in features_states.items():
+            after_sync = FeatureState(
+                [
+                    (
+                        ngw_id,
+                        fields_backups.get(
+                            (fid, fields.get_with(ngw_id=ngw_id).attribute),
+                            value,
+                        ),
+                    )
+                    for ngw_id, value in before_deletion.fields
+                ],
+                geometries_backups.get(fid, before_deletion.wkb),
             )
-            feature_record = {
-                "after_sync": {
-                    "fields": fields_after_sync,
-                    "geom": geometries_backups.get(fid, serialized_geometry),
-                },
-                "before_deletion": {
-                    "fields": fields_before_deletion,
-                    "geom": serialized_geometry,
-                },
-            }
-            result[fid] = feature_record
+            result[fid] = serialize_feature_backup(after_sync, before_deletion)
 
         return result
 
@@ -21,6 +21,10 @@ from nextgis_connect.ngw_connection.ngw_connections_widget import (
 from nextgis_connect.utils import wrap_sql_value
 
 from . import utils
+from .metadata_cache import (
+    cached_container_metadata,
+    invalidate_container_metadata,
+)
 
 
 class DetachedLayerConfigPage(QgsMapLayerConfigWidget):
@@ -58,7 +62,7 @@ class DetachedLayerConfigPage(QgsMapLayerConfigWidget):
         assert isinstance(layer, QgsVectorLayer)
         self.__path = utils.container_path(layer)
         try:
-            self.__metadata = utils.container_metadata(self.__path)
+            self.__metadata = cached_container_metadata(self.__path)
         except Exception:
             logger.exception(
                 "An error occurred during layer metadata extracting"
@@ -109,7 +113,8 @@ class DetachedLayerConfigPage(QgsMapLayerConfigWidget):
 
             connection.commit()
 
-        self.__metadata = utils.container_metadata(self.__path)
+        invalidate_container_metadata(self.__path)
+        self.__metadata = cached_container_metadata(self.__path)
 
         self.__layer.setCustomProperty("ngw_need_update_state", True)
 
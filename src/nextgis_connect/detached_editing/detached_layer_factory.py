@@ -1,8 +1,8 @@
 import sqlite3
-from contextlib import closing
+from contextlib import closing, nullcontext
 from datetime import datetime
 from pathlib import Path
-from typing import Iterable, Optional, Tuple, cast
+from typing import Iterable, List, Optional, Tuple, cast
 
 from qgis.core import (
     QgsEditError,
@@ -15,7 +15,35 @@ from qgis.core import (
     edit,
 )
 
-from nextgis_connect.compat import FieldType
+from nextgis_connect.compat import FieldType, parse_version
+from nextgis_connect.detached_editing.backup_serialization import (
+    upgrade_feature_backup,
+    upgrade_geometry_backup,
+    upgrade_value_backup,
+)
+from nextgis_connect.detached_editing.change_counters import (
+    install_change_counters,
+)
+from nextgis_connect.detached_editing.column_changes import (
+    install_column_changes,
+)
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
+from nextgis_connect.detached_editing.gpkg_utils import register_gpkg_functions
+from nextgis_connect.detached_editing.metadata_cache import (
+    invalidate_container_metadata,
+)
+from nextgis_connect.detached_editing.spatial_index import (
+    BULK_FEATURES_COUNT,
+    restore_spatial_index,
+    suspend_spatial_index,
+    suspended_spatial_index,
+)
+from nextgis_connect.detached_editing.storage_profile import (
+    analyze_container,
+    apply_storage_profile,
+)
 from nextgis_connect.detached_editing.utils import (
     DetachedContainerMetaData,
     container_metadata,
@@ -58,6 +86,10 @@ class DetachedLayerFactory:
             ) as connection, closing(connection.cursor()) as cursor:
                 self.__initialize_container_settings(cursor)
                 self.__create_container_tables(cursor)
+                install_change_counters(
+                    cursor, f"vector_layer_{ngw_layer.resource_id}"
+                )
+                install_column_changes(cursor)
                 self.__insert_metadata(ngw_layer, cursor)
 
                 connection.commit()
@@ -72,6 +104,7 @@ class DetachedLayerFactory:
             raise ContainerError(message, code=code) from error
 
         else:
+            invalidate_container_metadata(container_path)
             logger.debug(
                 "Container successfully created and filled with metadata"
             )
@@ -94,15 +127,19 @@ class DetachedLayerFactory:
             self.__check_fields(ngw_layer, source_path, fid_field=fid_field)
             self.__check_fields(ngw_layer, container_path, fid_field=fid_field)
 
-            self.__copy_features(source_path, container_path, metadata)
+            if not self.__copy_features_in_bulk(
+                source_path, container_path, metadata
+            ):
+                self.__copy_features(source_path, container_path, metadata)
 
-            with closing(
-                make_connection(container_path)
-            ) as connection, closing(connection.cursor()) as cursor:
-                self.__insert_ngw_ids(cursor)
-                self.__update_sync_date(cursor)
+                with closing(
+                    make_connection(container_path)
+                ) as connection, closing(connection.cursor()) as cursor:
+                    self.__insert_ngw_ids(cursor)
+                    self.__update_sync_date(cursor)
+                    analyze_container(connection)
 
-                connection.commit()
+                    connection.commit()
 
         except NgConnectError:
             raise
@@ -113,11 +150,81 @@ class DetachedLayerFactory:
             raise ContainerError(message, code=code) from error
 
         else:
+            invalidate_container_metadata(container_path)
             logger.debug(
                 f'Container for layer "{ngw_layer.display_name}" successfully '
                 "updated"
             )
 
+    def needs_upgrade(self, metadata: DetachedContainerMetaData) -> bool:
+        """Checks if the container was created by a previous version"""
+        return parse_version(metadata.container_version) < parse_version(
+            NgConnectSettings().container_version
+        )
+
+    def upgrade_container(self, cursor: sqlite3.Cursor) -> bool:
+        """
+        Upgrades data of a container created by a previous version.
+
+        Text backups are converted to binary ones, and the container
+        version is updated in the same transaction, so the upgrade is
+        done only once.
+
+        :return: True if the container was upgraded
+        """
+        metadata = container_metadata(cursor)
+        if not self.needs_upgrade(metadata):
+            return False
+
+        upgraded_count = self.__upgrade_backups(
+            cursor, metadata.is_versioning_enabled
+        )
+        container_version = NgConnectSettings().container_version
+        cursor.execute(
+            "UPDATE ngw_metadata SET container_version=?",
+            (container_version,),
+        )
+
+        logger.debug(
+            f"Container upgraded to version {container_version}"
+            f" ({upgraded_count} changes backups converted)"
+        )
+
+        return True
+
+    def __upgrade_backups(
+        self, cursor: sqlite3.Cursor, is_versioning_enabled: bool
+    ) -> int:
+        converters = {
+            "ngw_updated_attributes": upgrade_value_backup,
+            "ngw_updated_geometries": lambda backup: upgrade_geometry_backup(
+                backup, is_versioning_enabled
+            ),
+            "ngw_removed_features": lambda backup: upgrade_feature_backup(
+                backup, is_versioning_enabled
+            ),
+        }
+
+        upgraded_count = 0
+        for table_name, converter in converters.items():
+            cursor.execute(
+                f"""
+                SELECT rowid, backup FROM {table_name}
+                WHERE typeof(backup) = 'text'
+                """  # nosec B608
+            )
+            backups = [
+                (converter(backup), rowid)
+                for rowid, backup in cursor.fetchall()
+            ]
+            cursor.executemany(
+                f"UPDATE {table_name} SET backup = ? WHERE rowid = ?",  # nosec B608
+                backups,
+            )
+            upgraded_count += len(backups)
+
+        return upgraded_count
+
     def __create_container(
         self, ngw_layer: NGWVectorLayer, container_path: Path
     ) -> bool:
@@ -158,7 +265,8 @@ class DetachedLayerFactory:
         return is_success
 
     def __initialize_container_settings(self, cursor: sqlite3.Cursor) -> None:
-        pass
+        # Container is still small, so rebuilding with new page size is cheap
+        apply_storage_profile(cursor.connection)
 
     def __create_container_tables(self, cursor: sqlite3.Cursor) -> None:
         cursor.executescript(
@@ -236,7 +344,7 @@ class DetachedLayerFactory:
             -- Removed features
             CREATE TABLE ngw_removed_features (
                 'fid' INTEGER PRIMARY KEY, -- Unique removed feature ID
-                'backup' TEXT, -- Backup information
+                'backup' BLOB, -- Feature state after sync and before deletion
                 FOREIGN KEY (fid) REFERENCES ngw_features_metadata(fid) ON DELETE CASCADE
             );
 
@@ -250,7 +358,7 @@ class DetachedLayerFactory:
             CREATE TABLE ngw_updated_attributes (
                 'fid' INTEGER, -- Feature ID
                 'attribute' INTEGER, -- Attribute ID
-                'backup' TEXT, -- Field state before changes
+                'backup' BLOB, -- Field state before changes
                 PRIMARY KEY (fid, attribute),
                 FOREIGN KEY (fid) REFERENCES ngw_features_metadata(fid) ON DELETE CASCADE,
                 FOREIGN KEY (attribute) REFERENCES ngw_fields_metadata(attribute) ON DELETE CASCADE
@@ -259,7 +367,7 @@ class DetachedLayerFactory:
             -- Updated geometries
             CREATE TABLE ngw_updated_geometries (
                 'fid' INTEGER PRIMARY KEY, -- Unique updated geometry ID
-                'backup' TEXT, -- Geometry before update
+                'backup' BLOB, -- Geometry before update
                 FOREIGN KEY (fid) REFERENCES ngw_features_metadata(fid) ON DELETE CASCADE
             );
 
@@ -282,8 +390,16 @@ class DetachedLayerFactory:
                 FOREIGN KEY (aid) REFERENCES ngw_features_attachments(aid) ON DELETE CASCADE
             );
 
+            -- Fetched remote changes
+            CREATE TABLE ngw_delta_journal (
+                'id' INTEGER PRIMARY KEY, -- Fetching order
+                'fid' INTEGER, -- Feature ID in NextGIS Web
+                'action' TEXT -- Serialized action
+            );
+
             -- Index to speed up searches by ngw_fid
             CREATE INDEX idx_features_ngw_fid ON ngw_features_metadata (ngw_fid);
+            CREATE INDEX idx_delta_journal_fid ON ngw_delta_journal (fid);
             """
         )
 
@@ -302,7 +418,7 @@ class DetachedLayerFactory:
 
         settings = NgConnectSettings()
         metadata = {
-            "container_version": settings.supported_container_version,
+            "container_version": settings.container_version,
             "instance_id": connection.domain_uuid,
             "connection_id": ngw_layer.connection_id,
             "resource_id": ngw_layer.resource_id,
@@ -354,6 +470,146 @@ class DetachedLayerFactory:
             fields_tuple_generator,
         )
 
+    def __copy_features_in_bulk(
+        self,
+        source_path: Path,
+        container_path: Path,
+        metadata: DetachedContainerMetaData,
+    ) -> bool:
+        """
+        Copies features, spatial index and features metadata at SQLite level
+        in one transaction.
+
+        Returns False if source schema differs from container one and
+        features should be copied feature by feature.
+        """
+        with closing(make_connection(container_path)) as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            register_gpkg_functions(connection)
+            cursor.execute("ATTACH DATABASE ? AS source", (str(source_path),))
+            try:
+                columns = self.__bulk_copy_columns(cursor, metadata)
+                if columns is None:
+                    return False
+
+                source_table, target_columns, source_columns = columns
+
+                # Index is built in one pass after copying
+                suspend_spatial_index(cursor)
+                cursor.execute(
+                    f"""
+                    INSERT INTO main.{wrap_sql_table_name(metadata.table_name)}
+                        ({", ".join(target_columns)})
+                    SELECT {", ".join(source_columns)}
+                    FROM source.{wrap_sql_table_name(source_table)}
+                    """  # nosec B608
+                )
+                cursor.execute(
+                    """
+                    UPDATE main.gpkg_contents
+                    SET (min_x, min_y, max_x, max_y) = (
+                        SELECT min_x, min_y, max_x, max_y
+                        FROM source.gpkg_contents
+                        WHERE table_name = ?
+                    )
+                    WHERE table_name = ?
+                    """,
+                    (source_table, metadata.table_name),
+                )
+                restore_spatial_index(cursor)
+                self.__insert_ngw_ids(cursor)
+                self.__update_sync_date(cursor)
+                analyze_container(connection)
+
+                connection.commit()
+
+            except sqlite3.Error:
+                connection.rollback()
+                logger.exception("Bulk features copying failed")
+                return False
+
+            finally:
+                cursor.execute("DETACH DATABASE source")
+
+        logger.debug("Features copied in bulk")
+        return True
+
+    def __bulk_copy_columns(
+        self, cursor: sqlite3.Cursor, metadata: DetachedContainerMetaData
+    ) -> Optional[Tuple[str, List[str], List[str]]]:
+        cursor.execute(
+            """
+            SELECT table_name, column_name, srs_id
+            FROM source.gpkg_geometry_columns
+            """
+        )
+        source_geometry_columns = cursor.fetchall()
+        if len(source_geometry_columns) != 1:
+            logger.debug("Bulk copying skipped: source layers count")
+            return None
+
+        source_table, source_geom_field, source_srs_id = (
+            source_geometry_columns[0]
+        )
+        cursor.execute(
+            """
+            SELECT srs_id FROM main.gpkg_geometry_columns
+            WHERE table_name = ?
+            """,
+            (metadata.table_name,),
+        )
+        if cursor.fetchone()[0] != source_srs_id:
+            logger.debug("Bulk copying skipped: SRS differs")
+            return None
+
+        cursor.execute(
+            "SELECT name FROM pragma_table_info(?, 'source')", (source_table,)
+        )
+        source_column_names = set(row[0] for row in cursor)
+        cursor.execute(
+            "SELECT name FROM pragma_table_info(?, 'main')",
+            (metadata.table_name,),
+        )
+        target_column_names = set(row[0] for row in cursor)
+
+        fields_keynames = [field.keyname for field in metadata.fields]
+        expected_target_columns = {
+            metadata.fid_field,
+            metadata.geom_field,
+            *fields_keynames,
+        }
+        if target_column_names != expected_target_columns or not set(
+            [metadata.fid_field, *fields_keynames]
+        ).issubset(source_column_names):
+            logger.debug("Bulk copying skipped: fields differ")
+            return None
+
+        cursor.execute(
+            f"""
+            SELECT EXISTS(
+                SELECT 1 FROM main.{wrap_sql_table_name(metadata.table_name)}
+            )
+            """  # nosec B608
+        )
+        if cursor.fetchone()[0]:
+            logger.debug("Bulk copying skipped: container is not empty")
+            return None
+
+        target_columns = [
+            wrap_sql_table_name(name)
+            for name in (metadata.fid_field, metadata.geom_field)
+        ]
+        source_columns = [
+            wrap_sql_table_name(name)
+            for name in (metadata.fid_field, source_geom_field)
+        ]
+        for keyname in fields_keynames:
+            target_columns.append(wrap_sql_table_name(keyname))
+            source_columns.append(wrap_sql_table_name(keyname))
+
+        return source_table, target_columns, source_columns
+
     def __copy_features(
         self,
         source_path: Path,
@@ -366,6 +622,7 @@ class DetachedLayerFactory:
         target_layer = QgsVectorLayer(
             detached_layer_uri(container_path), "", "ogr"
         )
+        connection_pool = ContainerConnectionPool(container_path)
 
         try:
             target_fields = target_layer.fields()
@@ -374,7 +631,11 @@ class DetachedLayerFactory:
             )
             assert fid_attribute is not None
 
-            with edit(target_layer):
+            with (
+                suspended_spatial_index(connection_pool)
+                if source_layer.featureCount() >= BULK_FEATURES_COUNT
+                else nullcontext()
+            ), edit(target_layer):
                 for source_feature in cast(
                     Iterable[QgsFeature], source_layer.getFeatures()
                 ):
@@ -410,6 +671,9 @@ class DetachedLayerFactory:
             ng_error = ContainerError(log_message="Features was not copied")
             raise ng_error from error
 
+        finally:
+            connection_pool.close()
+
     def __insert_ngw_ids(self, cursor: sqlite3.Cursor) -> None:
         metadata = container_metadata(cursor)
         table_name = metadata.table_name
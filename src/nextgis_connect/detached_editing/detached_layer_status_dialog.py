@@ -148,6 +148,13 @@ class DetachedLayerStatusDialog(QDialog, WIDGET):
         )
         self.latestUpdateLabel.setText(sync_datetime)
 
+        next_check_datetime = self.__container.next_check_date
+        self.nextCheckLabel.setText(
+            next_check_datetime.strftime("%c")
+            if next_check_datetime is not None
+            else "—"
+        )
+
         states = {
             DetachedLayerState.NotInitialized: self.tr("Not initialized"),
             DetachedLayerState.Error: self.tr("Error"),
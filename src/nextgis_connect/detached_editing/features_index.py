@@ -0,0 +1,128 @@
+"""
+Shared in-memory index of ngw_features_metadata.
+
+Expression functions are evaluated for every rendered or calculated
+feature, so the index is loaded once per container and then answers with
+a dictionary lookup. The index is reloaded when the container file is
+changed and can be invalidated explicitly after local writes.
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+from nextgis_connect.detached_editing.metadata_cache import (
+    CacheKey,
+    container_file_signature,
+)
+from nextgis_connect.exceptions import ContainerError
+from nextgis_connect.logging import logger
+
+# Container files are checked for changes not more often than this interval
+REVALIDATION_INTERVAL = 0.5
+
+
+@dataclass
+class _IndexEntry:
+    key: Optional[CacheKey]
+    checked_at: float
+    ngw_fids: Dict[int, int]
+    descriptions: Dict[int, str]
+    is_container: bool = True
+
+
+_lock = threading.Lock()
+_entries: Dict[Path, _IndexEntry] = {}
+
+
+def feature_ngw_id(path: Path, fid: int) -> Optional[int]:
+    """Returns NextGIS Web feature id by container feature id"""
+    entry = _actual_entry(path)
+    if entry is None:
+        return None
+    return entry.ngw_fids.get(fid)
+
+
+def feature_description(path: Path, fid: int) -> Optional[str]:
+    """Returns NextGIS Web feature description by container feature id"""
+    entry = _actual_entry(path)
+    if entry is None:
+        return None
+    return entry.descriptions.get(fid)
+
+
+def invalidate_features_index(path: Optional[Path] = None) -> None:
+    """Drops index of the container or of all containers"""
+    with _lock:
+        if path is None:
+            _entries.clear()
+        else:
+            _entries.pop(Path(path), None)
+
+
+def _actual_entry(path: Path) -> Optional[_IndexEntry]:
+    path = Path(path)
+    now = time.monotonic()
+
+    with _lock:
+        entry = _entries.get(path)
+        if (
+            entry is not None
+            and now - entry.checked_at < REVALIDATION_INTERVAL
+        ):
+            return entry if entry.is_container else None
+
+    try:
+        key = container_file_signature(path)
+    except ContainerError:
+        invalidate_features_index(path)
+        return None
+
+    if entry is not None and entry.key == key:
+        with _lock:
+            entry.checked_at = now
+        return entry if entry.is_container else None
+
+    entry = _load_entry(path, key, now)
+    with _lock:
+        _entries[path] = entry
+
+    return entry if entry.is_container else None
+
+
+def _load_entry(path: Path, key: CacheKey, now: float) -> _IndexEntry:
+    entry = _IndexEntry(key, now, {}, {})
+    try:
+        with closing(sqlite3.connect(str(path))) as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            cursor.execute(
+                """
+                SELECT count(name) FROM sqlite_master
+                WHERE type='table' AND name='ngw_features_metadata'
+                """
+            )
+            if cursor.fetchone()[0] == 0:
+                entry.is_container = False
+                return entry
+
+            cursor.execute(
+                "SELECT fid, ngw_fid, description FROM ngw_features_metadata"
+            )
+            for fid, ngw_fid, description in cursor:
+                if ngw_fid is not None:
+                    entry.ngw_fids[fid] = ngw_fid
+                if description is not None:
+                    entry.descriptions[fid] = description
+
+    except Exception:
+        logger.exception("Error occurred while loading features index")
+        # Don't query the container for every feature, but retry later
+        entry.key = None
+        entry.is_container = False
+
+    return entry
@@ -0,0 +1,100 @@
+"""
+Checkpoints of the initial container fill.
+
+Downloading a large layer may be interrupted by closing QGIS or by
+network failures. Progress is saved to ngw_fill_checkpoint table of the
+container, so the next synchronization continues where the previous one
+stopped:
+
+* layers with versioning save the URL of the next changes page and the
+  target version after every applied page. Reapplying a page is safe,
+  because already added features are detected by ngw_fid;
+* layers without versioning keep the partially downloaded export next to
+  the container and save its validator (ETag or Last-Modified), so the
+  download is continued with a Range request only if the export was not
+  changed.
+
+The table is removed when the fill is finished.
+"""
+
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+
+@dataclass
+class FillCheckpoint:
+    fetch_url: Optional[str] = None
+    sync_date: Optional[str] = None
+    applied_pages: int = 0
+    download_validator: Optional[str] = None
+
+
+def partial_download_path(container_path: Path) -> Path:
+    """
+    Returns path of the partially downloaded export.
+
+    The name matches service files of the container, so the file is
+    removed together with them on container reset.
+    """
+    return container_path.with_name(f"{container_path.name}-download")
+
+
+def load_fill_checkpoint(cursor: sqlite3.Cursor) -> Optional[FillCheckpoint]:
+    cursor.execute(
+        """
+        SELECT EXISTS(
+            SELECT 1 FROM sqlite_master
+            WHERE type = 'table' AND name = 'ngw_fill_checkpoint'
+        )
+        """
+    )
+    if not cursor.fetchone()[0]:
+        return None
+
+    cursor.execute(
+        """
+        SELECT fetch_url, sync_date, applied_pages, download_validator
+        FROM ngw_fill_checkpoint
+        """
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return None
+
+    return FillCheckpoint(*row)
+
+
+def save_fill_checkpoint(
+    cursor: sqlite3.Cursor, checkpoint: FillCheckpoint
+) -> None:
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ngw_fill_checkpoint (
+            'id' INTEGER PRIMARY KEY CHECK (id = 1),
+            'fetch_url' TEXT,
+            'sync_date' TEXT,
+            'applied_pages' INTEGER NOT NULL DEFAULT 0,
+            'download_validator' TEXT
+        )
+        """
+    )
+    cursor.execute(
+        """
+        INSERT OR REPLACE INTO ngw_fill_checkpoint (
+            id, fetch_url, sync_date, applied_pages, download_validator
+        )
+        VALUES (1, ?, ?, ?, ?)
+        """,
+        (
+            checkpoint.fetch_url,
+            checkpoint.sync_date,
+            checkpoint.applied_pages,
+            checkpoint.download_validator,
+        ),
+    )
+
+
+def clear_fill_checkpoint(cursor: sqlite3.Cursor) -> None:
+    cursor.execute("DROP TABLE IF EXISTS ngw_fill_checkpoint")
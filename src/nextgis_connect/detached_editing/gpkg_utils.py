@@ -0,0 +1,208 @@
+"""
+Helpers for working with GeoPackage files through the sqlite3 module.
+
+GeoPackage R-tree triggers created by GDAL call the ST_IsEmpty, ST_MinX,
+ST_MaxX, ST_MinY and ST_MaxY functions, which are provided by the
+SpatiaLite/GDAL runtime only. They have to be registered on plain sqlite3
+connections before any geometry is written to a feature table.
+"""
+
+import math
+import sqlite3
+import struct
+from typing import Optional, Tuple
+
+Envelope = Tuple[float, float, float, float]  # min_x, max_x, min_y, max_y
+
+GPKG_MAGIC = b"GP"
+
+# Number of doubles in envelope by envelope indicator code
+ENVELOPE_SIZES = {0: 0, 1: 4, 2: 6, 3: 6, 4: 8}
+
+WKB_POINT = 1
+WKB_LINESTRING = 2
+WKB_POLYGON = 3
+WKB_CIRCULARSTRING = 8
+WKB_TRIANGLE = 17
+
+
+def register_gpkg_functions(connection: sqlite3.Connection) -> None:
+    """Registers GeoPackage geometry functions used by R-tree triggers"""
+    connection.create_function("ST_IsEmpty", 1, st_is_empty)
+    connection.create_function("ST_MinX", 1, _envelope_getter(0))
+    connection.create_function("ST_MaxX", 1, _envelope_getter(1))
+    connection.create_function("ST_MinY", 1, _envelope_getter(2))
+    connection.create_function("ST_MaxY", 1, _envelope_getter(3))
+
+
+def st_is_empty(blob: Optional[bytes]) -> Optional[int]:
+    if blob is None:
+        return None
+
+    header = _parse_header(blob)
+    if header is None:
+        return None
+
+    is_empty, _, _ = header
+    if is_empty:
+        return 1
+
+    return int(geometry_envelope(blob) is None)
+
+
+def geometry_envelope(blob: Optional[bytes]) -> Optional[Envelope]:
+    """
+    Returns 2D envelope of a GeoPackage geometry blob.
+
+    The envelope from the blob header is used if present, otherwise it is
+    calculated from the WKB part.
+    """
+    if blob is None:
+        return None
+
+    header = _parse_header(blob)
+    if header is None:
+        return None
+
+    is_empty, envelope, wkb_offset = header
+    if is_empty:
+        return None
+
+    if envelope is not None:
+        return envelope
+
+    try:
+        bounds = _WkbBounds(blob, wkb_offset)
+        return bounds.envelope()
+    except (struct.error, ValueError):
+        return None
+
+
+def geometry_wkb(blob: Optional[bytes]) -> Optional[bytes]:
+    """Returns WKB part of a GeoPackage geometry blob or None if empty"""
+    if blob is None:
+        return None
+
+    header = _parse_header(blob)
+    if header is None:
+        return None
+
+    is_empty, _, wkb_offset = header
+    if is_empty:
+        return None
+
+    return blob[wkb_offset:]
+
+
+def _envelope_getter(index: int):
+    def getter(blob: Optional[bytes]) -> Optional[float]:
+        envelope = geometry_envelope(blob)
+        return envelope[index] if envelope is not None else None
+
+    return getter
+
+
+def _parse_header(
+    blob: bytes,
+) -> Optional[Tuple[bool, Optional[Envelope], int]]:
+    if len(blob) < 8 or blob[:2] != GPKG_MAGIC:
+        return None
+
+    flags = blob[3]
+    byte_order = "<" if flags & 0b1 else ">"
+    envelope_code = (flags >> 1) & 0b111
+    is_empty = bool(flags & 0b10000)
+
+    envelope_size = ENVELOPE_SIZES.get(envelope_code)
+    if envelope_size is None:
+        return None
+
+    wkb_offset = 8 + envelope_size * 8
+    envelope = None
+    if envelope_size > 0:
+        min_x, max_x, min_y, max_y = struct.unpack_from(
+            f"{byte_order}4d", blob, 8
+        )
+        if not any(math.isnan(value) for value in (min_x, min_y)):
+            envelope = (min_x, max_x, min_y, max_y)
+
+    return is_empty, envelope, wkb_offset
+
+
+class _WkbBounds:
+    """Calculates 2D bounds of WKB geometry without building objects"""
+
+    def __init__(self, data: bytes, offset: int) -> None:
+        self.__data = data
+        self.__offset = offset
+        self.__min_x = math.inf
+        self.__max_x = -math.inf
+        self.__min_y = math.inf
+        self.__max_y = -math.inf
+
+    def envelope(self) -> Optional[Envelope]:
+        self.__read_geometry()
+        if self.__min_x > self.__max_x:
+            return None
+        return (self.__min_x, self.__max_x, self.__min_y, self.__max_y)
+
+    def __read_geometry(self) -> None:
+        byte_order = "<" if self.__data[self.__offset] == 1 else ">"
+        (wkb_type,) = struct.unpack_from(
+            f"{byte_order}I", self.__data, self.__offset + 1
+        )
+        self.__offset += 5
+
+        # EWKB flags
+        has_z = bool(wkb_type & 0x80000000)
+        has_m = bool(wkb_type & 0x40000000)
+        if wkb_type & 0x20000000:
+            self.__offset += 4  # SRID
+        wkb_type &= 0x0FFFFFFF
+
+        # ISO WKB dimensions
+        dimension_code, base_type = divmod(wkb_type, 1000)
+        has_z = has_z or dimension_code in (1, 3)
+        has_m = has_m or dimension_code in (2, 3)
+        dimensions = 2 + int(has_z) + int(has_m)
+
+        if base_type == WKB_POINT:
+            self.__read_points(byte_order, dimensions, 1)
+        elif base_type in (WKB_LINESTRING, WKB_CIRCULARSTRING):
+            self.__read_points(
+                byte_order, dimensions, self.__read_count(byte_order)
+            )
+        elif base_type in (WKB_POLYGON, WKB_TRIANGLE):
+            for _ in range(self.__read_count(byte_order)):
+                self.__read_points(
+                    byte_order, dimensions, self.__read_count(byte_order)
+                )
+        elif 4 <= base_type <= 16:
+            for _ in range(self.__read_count(byte_order)):
+                self.__read_geometry()
+        else:
+            raise ValueError(f"Unsupported WKB type: {wkb_type}")
+
+    def __read_count(self, byte_order: str) -> int:
+        (count,) = struct.unpack_from(
+            f"{byte_order}I", self.__data, self.__offset
+        )
+        self.__offset += 4
+        return count
+
+    def __read_points(
+        self, byte_order: str, dimensions: int, count: int
+    ) -> None:
+        point_format = f"{byte_order}{dimensions}d"
+        point_size = dimensions * 8
+        for _ in range(count):
+            x, y = struct.unpack_from(
+                point_format, self.__data, self.__offset
+            )[:2]
+            self.__offset += point_size
+            if math.isnan(x) or math.isnan(y):
+                continue
+            self.__min_x = min(self.__min_x, x)
+            self.__max_x = max(self.__max_x, x)
+            self.__min_y = min(self.__min_y, y)
+            self.__max_y = max(self.__max_y, y)
@@ -0,0 +1,183 @@
+import json
+from contextlib import closing
+from functools import partial
+from typing import Any, Optional
+
+from nextgis_connect.detached_editing.backup_serialization import (
+    Backup,
+    deserialize_value_backup,
+    geometry_backup_wkb,
+)
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
+from nextgis_connect.detached_editing.gpkg_utils import geometry_wkb
+from nextgis_connect.detached_editing.utils import DetachedContainerMetaData
+from nextgis_connect.exceptions import ContainerError
+from nextgis_connect.utils import wrap_sql_table_name
+
+MIN_FID = -(2**63)
+
+
+class LocalChangesCompactor:
+    """
+    Removes local changes records which don't change anything.
+
+    Attribute and geometry changes are kept in change tables until upload
+    even if the value was reverted later. Records whose current value
+    equals the stored backup are deleted in bulk, window by window, so
+    they aren't sent to NextGIS Web.
+
+    Backups are decoded by SQL functions registered on the writer
+    connection, so text backups of previous versions are compared too.
+    """
+
+    WINDOW_SIZE = 5000
+
+    __connection_pool: ContainerConnectionPool
+    __metadata: DetachedContainerMetaData
+
+    def __init__(
+        self,
+        connection_pool: ContainerConnectionPool,
+        metadata: DetachedContainerMetaData,
+    ) -> None:
+        self.__connection_pool = connection_pool
+        self.__metadata = metadata
+
+    def compact(self) -> int:
+        """
+        Deletes no-op changes.
+
+        :return: Number of removed change records
+        """
+        try:
+            removed_count = self.__compact_attributes()
+            removed_count += self.__compact_geometries()
+        except Exception as error:
+            raise ContainerError from error
+
+        return removed_count
+
+    def __compact_attributes(self) -> int:
+        if len(self.__metadata.fields) == 0:
+            return 0
+
+        current_value = "\n".join(
+            f"WHEN {field.attribute} THEN"
+            f" features.{wrap_sql_table_name(field.keyname)}"
+            for field in self.__metadata.fields
+        )
+        query = f"""
+            DELETE FROM ngw_updated_attributes
+            WHERE (fid, attribute) IN (
+                SELECT changes.fid, changes.attribute
+                FROM ngw_updated_attributes changes
+                JOIN {self.__features_table} features
+                    ON features.{self.__fid_column} = changes.fid
+                WHERE changes.fid > :start AND changes.fid <= :end
+                    AND changes.backup IS NOT NULL
+                    AND ngw_is_backup_value(
+                        CASE changes.attribute {current_value} END,
+                        changes.backup
+                    )
+            )
+            """  # nosec B608
+
+        return self.__delete_by_windows("ngw_updated_attributes", query)
+
+    def __compact_geometries(self) -> int:
+        geom_column = wrap_sql_table_name(self.__metadata.geom_field)
+        query = f"""
+            DELETE FROM ngw_updated_geometries
+            WHERE fid IN (
+                SELECT changes.fid
+                FROM ngw_updated_geometries changes
+                JOIN {self.__features_table} features
+                    ON features.{self.__fid_column} = changes.fid
+                WHERE changes.fid > :start AND changes.fid <= :end
+                    AND changes.backup IS NOT NULL
+                    AND ngw_is_backup_geometry(
+                        features.{geom_column}, changes.backup
+                    )
+            )
+            """  # nosec B608
+
+        return self.__delete_by_windows("ngw_updated_geometries", query)
+
+    def __delete_by_windows(self, table_name: str, query: str) -> int:
+        removed_count = 0
+        start = MIN_FID
+
+        while True:
+            with self.__connection_pool.writer() as connection, closing(
+                connection.cursor()
+            ) as cursor:
+                connection.create_function(
+                    "ngw_is_backup_value", 2, _is_backup_value
+                )
+                connection.create_function(
+                    "ngw_is_backup_geometry",
+                    2,
+                    partial(
+                        _is_backup_geometry,
+                        is_versioning_enabled=(
+                            self.__metadata.is_versioning_enabled
+                        ),
+                    ),
+                )
+
+                cursor.execute(
+                    f"""
+                    SELECT MAX(fid) FROM (
+                        SELECT DISTINCT fid FROM {table_name}
+                        WHERE fid > ?
+                        ORDER BY fid
+                        LIMIT ?
+                    )
+                    """,  # nosec B608
+                    (start, self.WINDOW_SIZE),
+                )
+                end = cursor.fetchone()[0]
+                if end is None:
+                    return removed_count
+
+                cursor.execute(query, {"start": start, "end": end})
+                removed_count += cursor.rowcount
+
+            start = end
+
+    @property
+    def __features_table(self) -> str:
+        return wrap_sql_table_name(self.__metadata.table_name)
+
+    @property
+    def __fid_column(self) -> str:
+        return wrap_sql_table_name(self.__metadata.fid_field)
+
+
+def _is_backup_value(value: Any, backup: Backup) -> bool:
+    try:
+        backup_value = deserialize_value_backup(backup)
+    except Exception:
+        return False
+
+    if isinstance(backup_value, (dict, list)):
+        backup_value = json.dumps(backup_value)
+
+    if value is None or backup_value is None:
+        return value is None and backup_value is None
+
+    return value == backup_value
+
+
+def _is_backup_geometry(
+    blob: Optional[bytes], backup: Backup, *, is_versioning_enabled: bool
+) -> bool:
+    try:
+        backup_wkb = geometry_backup_wkb(backup, is_versioning_enabled)
+    except Exception:
+        return False
+
+    wkb = geometry_wkb(blob)
+    return backup_wkb == (wkb if wkb is not None else b"")
@@ -0,0 +1,102 @@
+import os
+import threading
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
+from nextgis_connect.detached_editing.utils import (
+    DetachedContainerMetaData,
+    container_metadata,
+)
+from nextgis_connect.exceptions import ContainerError, ErrorCode
+
+CacheKey = Tuple[Any, ...]
+
+_lock = threading.Lock()
+_entries: Dict[Path, Tuple[CacheKey, DetachedContainerMetaData]] = {}
+
+
+def cached_container_metadata(
+    path: Path, connection_pool: Optional[ContainerConnectionPool] = None
+) -> DetachedContainerMetaData:
+    """
+    Returns container metadata reading it from disk only if the container
+    was changed since the last call.
+
+    Changes are detected by the size and modification time of the
+    container and its WAL file. If a connection pool is passed,
+    ``PRAGMA data_version`` of its reader connection is checked too, so
+    commits made within the file system timestamp resolution are not
+    missed.
+    """
+    path = Path(path)
+    key = _cache_key(path, connection_pool)
+
+    with _lock:
+        entry = _entries.get(path)
+    if entry is not None and entry[0] == key:
+        return replace(entry[1])
+
+    metadata = container_metadata(path)
+    with _lock:
+        _entries[path] = (key, metadata)
+
+    return replace(metadata)
+
+
+def invalidate_container_metadata(path: Optional[Path] = None) -> None:
+    """
+    Drops cached metadata of the container or of all containers.
+
+    Should be called after writing to ngw_metadata or ngw_fields_metadata.
+    """
+    with _lock:
+        if path is None:
+            _entries.clear()
+        else:
+            _entries.pop(Path(path), None)
+
+
+def container_file_signature(path: Path) -> CacheKey:
+    """
+    Returns size and modification time of the container and its WAL file.
+
+    :raises ContainerError: if container doesn't exist
+    """
+    try:
+        container_stat = os.stat(path)
+    except FileNotFoundError:
+        error = ContainerError(code=ErrorCode.DeletedContainer)
+        error.add_note(f"Path: {path}")
+        raise error from None
+
+    try:
+        wal_stat = os.stat(f"{path}-wal")
+        wal_signature = (wal_stat.st_mtime_ns, wal_stat.st_size)
+    except FileNotFoundError:
+        wal_signature = None
+
+    return (container_stat.st_mtime_ns, container_stat.st_size, wal_signature)
+
+
+def _cache_key(
+    path: Path, connection_pool: Optional[ContainerConnectionPool]
+) -> CacheKey:
+    try:
+        file_signature = container_file_signature(path)
+    except ContainerError:
+        invalidate_container_metadata(path)
+        raise
+
+    data_version = None
+    if connection_pool is not None:
+        with connection_pool.reader() as connection:
+            data_version = (
+                id(connection),
+                connection.execute("PRAGMA data_version").fetchone()[0],
+            )
+
+    return (*file_signature, data_version)
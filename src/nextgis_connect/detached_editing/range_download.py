@@ -0,0 +1,136 @@
+from http import HTTPStatus
+from pathlib import Path
+from typing import BinaryIO, Callable, Optional
+
+from qgis.core import QgsNetworkAccessManager
+from qgis.PyQt.QtCore import QEventLoop, QUrl
+from qgis.PyQt.QtNetwork import QNetworkReply, QNetworkRequest
+
+from nextgis_connect.exceptions import NgwError
+from nextgis_connect.logging import logger
+from nextgis_connect.ngw_connection import NgwConnectionsManager
+
+ValidatorCallback = Callable[[Optional[str]], None]
+
+
+class RangeDownloader:
+    """
+    Downloads a file from NextGIS Web continuing a partial download.
+
+    The partial file is continued only if its validator (ETag or
+    Last-Modified) is known. The server checks it with If-Range header
+    and sends the whole file if it was changed or if ranges are not
+    supported.
+    """
+
+    __connection_id: str
+    __url: str
+    __path: Path
+    __on_validator: ValidatorCallback
+
+    __reply: Optional[QNetworkReply]
+    __file: Optional[BinaryIO]
+
+    def __init__(
+        self,
+        connection_id: str,
+        url: str,
+        path: Path,
+        on_validator: ValidatorCallback,
+    ) -> None:
+        self.__connection_id = connection_id
+        self.__url = url
+        self.__path = path
+        self.__on_validator = on_validator
+
+        self.__reply = None
+        self.__file = None
+
+    def download(self, validator: Optional[str]) -> None:
+        connections_manager = NgwConnectionsManager()
+        connection = connections_manager.connection(self.__connection_id)
+        assert connection is not None
+
+        request = QNetworkRequest(QUrl(connection.url + self.__url))
+        connection.update_network_request(request)
+
+        offset = 0
+        if validator is not None and self.__path.exists():
+            offset = self.__path.stat().st_size
+
+        if offset > 0:
+            logger.debug(f"Continue downloading from {offset} byte")
+            request.setRawHeader(b"Range", f"bytes={offset}-".encode())
+            request.setRawHeader(b"If-Range", validator.encode())
+
+        event_loop = QEventLoop()
+        network_manager = QgsNetworkAccessManager()
+        self.__reply = network_manager.get(request)
+        self.__reply.readyRead.connect(self.__write_chunk)
+        self.__reply.finished.connect(event_loop.quit)
+
+        try:
+            event_loop.exec()
+            self.__write_chunk()
+            self.__check_reply()
+
+        finally:
+            if self.__file is not None:
+                self.__file.close()
+                self.__file = None
+            self.__reply.deleteLater()
+            self.__reply = None
+
+    def __write_chunk(self) -> None:
+        assert self.__reply is not None
+
+        if self.__file is None:
+            status_code = self.__status_code()
+            if status_code == HTTPStatus.PARTIAL_CONTENT:
+                self.__file = self.__path.open("ab")
+            elif status_code == HTTPStatus.OK:
+                # Ranges are not supported or the file was changed
+                self.__file = self.__path.open("wb")
+            else:
+                return
+
+            self.__on_validator(self.__validator())
+
+        self.__file.write(self.__reply.readAll().data())
+
+    def __check_reply(self) -> None:
+        assert self.__reply is not None
+
+        if self.__reply.error() == QNetworkReply.NetworkError.NoError:
+            return
+
+        status_code = self.__status_code()
+        if status_code == HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE:
+            self.__path.unlink(missing_ok=True)
+
+        error = NgwError(
+            "Layer downloading was interrupted", try_reconnect=True
+        )
+        error.add_note(f"Url: {self.__url}")
+        error.add_note(f"Http status code: {status_code}")
+        error.add_note(f"Network error: {self.__reply.errorString()}")
+        if self.__path.exists():
+            error.add_note(f"Downloaded: {self.__path.stat().st_size} bytes")
+        raise error
+
+    def __status_code(self) -> Optional[int]:
+        assert self.__reply is not None
+        return self.__reply.attribute(
+            QNetworkRequest.Attribute.HttpStatusCodeAttribute
+        )
+
+    def __validator(self) -> Optional[str]:
+        assert self.__reply is not None
+
+        etag = bytes(self.__reply.rawHeader(b"ETag")).decode()
+        # Weak validators can't be used in If-Range
+        if etag != "" and not etag.startswith("W/"):
+            return etag
+
+        last_modified = bytes(self.__reply.rawHeader(b"Last-Modified"))
+        return last_modified.decode() if len(last_modified) > 0 else None
@@ -0,0 +1,181 @@
+"""
+Suspension of the GeoPackage spatial index during bulk writes.
+
+GDAL keeps the R-tree of a feature table up to date with triggers which
+fire for every written row. Bulk operations drop these triggers and
+rebuild the index in one pass when they are finished.
+
+SQL of dropped triggers is saved to ngw_suspended_triggers table in the
+same transaction. A non-empty table marks the index as stale, so if an
+operation was interrupted, the index is rebuilt and the triggers are
+restored when the container is opened next time.
+"""
+
+import sqlite3
+from contextlib import closing, contextmanager
+from typing import Iterator, Optional, Tuple
+
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
+from nextgis_connect.detached_editing.gpkg_utils import register_gpkg_functions
+from nextgis_connect.utils import wrap_sql_table_name
+
+# Minimal number of written features to suspend the index
+BULK_FEATURES_COUNT = 5000
+
+
+def is_spatial_index_suspended(cursor: sqlite3.Cursor) -> bool:
+    cursor.execute(
+        """
+        SELECT EXISTS(
+            SELECT 1 FROM sqlite_master
+            WHERE type = 'table' AND name = 'ngw_suspended_triggers'
+        )
+        """
+    )
+    if not cursor.fetchone()[0]:
+        return False
+
+    cursor.execute("SELECT EXISTS(SELECT 1 FROM ngw_suspended_triggers)")
+    return bool(cursor.fetchone()[0])
+
+
+def suspend_spatial_index(cursor: sqlite3.Cursor) -> bool:
+    """
+    Drops R-tree triggers of the feature table and saves their SQL.
+
+    :return: True if triggers were dropped by this call
+    """
+    if is_spatial_index_suspended(cursor):
+        return False
+
+    index = _spatial_index(cursor)
+    if index is None:
+        return False
+
+    table_name, _, rtree_name = index
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ngw_suspended_triggers (
+            'name' TEXT PRIMARY KEY,
+            'sql' TEXT
+        )
+        """
+    )
+    cursor.execute(
+        """
+        INSERT INTO ngw_suspended_triggers (name, sql)
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'trigger' AND tbl_name = ?
+            AND substr(name, 1, ?) = ?
+        """,
+        (table_name, len(rtree_name) + 1, f"{rtree_name}_"),
+    )
+    triggers = [
+        row[0]
+        for row in cursor.execute("SELECT name FROM ngw_suspended_triggers")
+    ]
+    for trigger in triggers:
+        cursor.execute(f"DROP TRIGGER {wrap_sql_table_name(trigger)}")
+
+    return len(triggers) > 0
+
+
+def restore_spatial_index(cursor: sqlite3.Cursor) -> bool:
+    """
+    Rebuilds the spatial index and restores saved triggers.
+
+    GeoPackage functions must be registered for the cursor connection.
+
+    :return: True if the index was suspended
+    """
+    if not is_spatial_index_suspended(cursor):
+        return False
+
+    index = _spatial_index(cursor)
+    if index is not None:
+        table_name, geom_field, rtree_name = index
+        fid_field = _fid_field(cursor, table_name)
+        geom = wrap_sql_table_name(geom_field)
+        cursor.execute(f"DELETE FROM {wrap_sql_table_name(rtree_name)}")  # nosec B608
+        cursor.execute(
+            f"""
+            INSERT INTO {wrap_sql_table_name(rtree_name)}
+            SELECT
+                {wrap_sql_table_name(fid_field)},
+                ST_MinX({geom}), ST_MaxX({geom}),
+                ST_MinY({geom}), ST_MaxY({geom})
+            FROM {wrap_sql_table_name(table_name)}
+            WHERE {geom} NOT NULL AND NOT ST_IsEmpty({geom})
+            """  # nosec B608
+        )
+
+    for (sql,) in cursor.execute(
+        "SELECT sql FROM ngw_suspended_triggers"
+    ).fetchall():
+        cursor.execute(sql)
+    cursor.execute("DELETE FROM ngw_suspended_triggers")
+
+    return True
+
+
+@contextmanager
+def suspended_spatial_index(
+    connection_pool: ContainerConnectionPool,
+) -> Iterator[None]:
+    """
+    Keeps the spatial index suspended while the context is active.
+
+    The index is restored even if an exception was raised. If restoring
+    fails, it is repeated when the container is opened next time.
+    """
+    with connection_pool.writer() as connection, closing(
+        connection.cursor()
+    ) as cursor:
+        is_suspended = suspend_spatial_index(cursor)
+
+    try:
+        yield
+
+    finally:
+        if is_suspended:
+            with connection_pool.writer() as connection, closing(
+                connection.cursor()
+            ) as cursor:
+                register_gpkg_functions(connection)
+                restore_spatial_index(cursor)
+
+
+def _spatial_index(cursor: sqlite3.Cursor) -> Optional[Tuple[str, str, str]]:
+    """Returns feature table, geometry column and R-tree table names"""
+    cursor.execute(
+        """
+        SELECT EXISTS(
+            SELECT 1 FROM sqlite_master
+            WHERE type = 'table' AND name = 'gpkg_extensions'
+        )
+        """
+    )
+    if not cursor.fetchone()[0]:
+        return None
+
+    cursor.execute(
+        """
+        SELECT table_name, column_name FROM gpkg_extensions
+        WHERE extension_name = 'gpkg_rtree_index'
+        """
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return None
+
+    table_name, geom_field = row
+    return table_name, geom_field, f"rtree_{table_name}_{geom_field}"
+
+
+def _fid_field(cursor: sqlite3.Cursor, table_name: str) -> str:
+    cursor.execute(
+        "SELECT name FROM pragma_table_info(?) WHERE pk = 1", (table_name,)
+    )
+    return cursor.fetchone()[0]
@@ -0,0 +1,119 @@
+"""
+Storage settings of container files.
+
+Containers get the following persistent settings:
+
+* WAL journal, so readers don't block the writer and commits need fewer
+  fsync calls;
+* 8 KiB pages, since geometry blobs rarely fit into default 4 KiB ones
+  and spill to overflow pages;
+* incremental auto vacuum, so space of deleted features is returned by
+  the maintenance task in small steps instead of a full VACUUM.
+
+Page size and auto vacuum mode are changed only by rebuilding the file
+with VACUUM. New containers get both settings, existing ones get only
+incremental auto vacuum by the maintenance task and only while they are
+small. Connection settings (page cache and memory mapping) are scaled
+to the container size.
+"""
+
+import sqlite3
+from pathlib import Path
+
+PAGE_SIZE = 8192
+AUTO_VACUUM_INCREMENTAL = 2
+
+# Existing containers larger than this are not rebuilt
+REBUILD_SIZE_LIMIT = 64 * 1024 * 1024
+
+MIN_CACHE_SIZE = 2 * 1024 * 1024
+MAX_CACHE_SIZE = 64 * 1024 * 1024
+MAX_MMAP_SIZE = 256 * 1024 * 1024
+
+# Pages returned to the file system by one maintenance run
+INCREMENTAL_VACUUM_PAGES = 2048
+
+
+def apply_storage_profile(connection: sqlite3.Connection) -> None:
+    """
+    Applies persistent storage settings to a new container.
+
+    Must be called outside of a transaction while no other connections
+    are open, since page size can't be changed in WAL mode.
+    """
+    page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+    auto_vacuum = connection.execute("PRAGMA auto_vacuum").fetchone()[0]
+
+    if page_size != PAGE_SIZE or auto_vacuum != AUTO_VACUUM_INCREMENTAL:
+        connection.execute("PRAGMA journal_mode = DELETE")
+        connection.execute(f"PRAGMA page_size = {PAGE_SIZE}")
+        connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        connection.execute("VACUUM")
+
+    connection.execute("PRAGMA journal_mode = WAL")
+
+
+def needs_storage_profile(connection: sqlite3.Connection, path: Path) -> bool:
+    """Checks if an existing container should be rebuilt"""
+    auto_vacuum = connection.execute("PRAGMA auto_vacuum").fetchone()[0]
+    return (
+        auto_vacuum != AUTO_VACUUM_INCREMENTAL
+        and path.stat().st_size <= REBUILD_SIZE_LIMIT
+    )
+
+
+def upgrade_storage_profile(connection: sqlite3.Connection) -> None:
+    """
+    Enables incremental auto vacuum for an existing container.
+
+    Containers opened by other connections stay in WAL mode, so their
+    page size is kept. Must be called outside of a transaction.
+    """
+    connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    connection.execute("VACUUM")
+
+
+def configure_connection(connection: sqlite3.Connection, path: Path) -> None:
+    """Sets per-connection settings scaled to the container size"""
+    try:
+        container_size = path.stat().st_size
+    except OSError:
+        container_size = 0
+
+    # Whole small containers fit into the cache, big ones get a quarter
+    cache_size = min(max(container_size // 4, MIN_CACHE_SIZE), MAX_CACHE_SIZE)
+    mmap_size = min(container_size * 2, MAX_MMAP_SIZE)
+
+    # NORMAL is safe in WAL mode: a power loss may only roll back the
+    # last commits, but never corrupts the file
+    connection.execute("PRAGMA synchronous = NORMAL")
+    connection.execute("PRAGMA temp_store = MEMORY")
+    connection.execute(f"PRAGMA cache_size = {-(cache_size // 1024)}")
+    connection.execute(f"PRAGMA mmap_size = {mmap_size}")
+
+
+def analyze_container(connection: sqlite3.Connection) -> None:
+    """Collects statistics for the query planner after bulk changes"""
+    connection.execute("ANALYZE")
+
+
+def maintain_container(connection: sqlite3.Connection) -> int:
+    """
+    Returns free pages to the file system and refreshes statistics.
+
+    :return: Number of released pages
+    """
+    freelist_count = connection.execute("PRAGMA freelist_count").fetchone()[0]
+    auto_vacuum = connection.execute("PRAGMA auto_vacuum").fetchone()[0]
+
+    released_pages = 0
+    if freelist_count > 0 and auto_vacuum == AUTO_VACUUM_INCREMENTAL:
+        released_pages = min(freelist_count, INCREMENTAL_VACUUM_PAGES)
+        # Cursor steps the pragma only once, so one page would be released
+        connection.executescript(
+            f"PRAGMA incremental_vacuum({released_pages});"
+        )
+
+    connection.execute("PRAGMA optimize")
+
+    return released_pages
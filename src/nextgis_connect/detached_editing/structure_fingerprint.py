@@ -0,0 +1,88 @@
+"""
+Fingerprint of the layer structure verified against NextGIS Web.
+
+Every step of a versioned synchronization checks that the remote layer
+is still compatible with the container, and most of them request the
+whole resource JSON for it. The changes check answer of FetchDeltaTask
+already holds everything needed for this check, so after a successful
+check the fingerprint of the local structure is saved to
+ngw_structure_fingerprint table. Next steps of the same synchronization
+cycle skip the request while the local structure is the same.
+
+Every cycle starts with FetchDeltaTask, which forgets the fingerprint
+before the changes check, so remote structure changes are detected at
+the beginning of the next cycle. Layers without versioning are always
+checked, because their check also compares features count, which
+changes without structure changes.
+"""
+
+import json
+import sqlite3
+from datetime import datetime
+
+from nextgis_connect.detached_editing.utils import DetachedContainerMetaData
+
+
+def structure_fingerprint(metadata: DetachedContainerMetaData) -> str:
+    structure = {
+        "fields": [
+            [field.ngw_id, field.datatype.name, field.keyname]
+            for field in metadata.fields
+        ],
+        "geometry_type": metadata.geometry_name,
+        "srs": metadata.srs_id,
+        "is_versioning_enabled": metadata.is_versioning_enabled,
+        "epoch": metadata.epoch,
+    }
+    return json.dumps(structure, sort_keys=True)
+
+
+def is_structure_verified(cursor: sqlite3.Cursor, fingerprint: str) -> bool:
+    """Checks if the structure was verified in the current cycle"""
+    if not _has_fingerprint_table(cursor):
+        return False
+
+    cursor.execute("SELECT fingerprint FROM ngw_structure_fingerprint")
+    row = cursor.fetchone()
+    return row is not None and row[0] == fingerprint
+
+
+def save_verified_structure(cursor: sqlite3.Cursor, fingerprint: str) -> None:
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ngw_structure_fingerprint (
+            'id' INTEGER PRIMARY KEY CHECK (id = 1),
+            'fingerprint' TEXT NOT NULL,
+            'check_date' TEXT NOT NULL
+        )
+        """
+    )
+    cursor.execute(
+        """
+        INSERT OR REPLACE INTO ngw_structure_fingerprint (
+            id, fingerprint, check_date
+        )
+        VALUES (1, ?, ?)
+        """,
+        (fingerprint, datetime.now().isoformat()),
+    )
+
+
+def forget_verified_structure(cursor: sqlite3.Cursor) -> None:
+    """Removes the fingerprint at the beginning of a synchronization cycle"""
+    if not _has_fingerprint_table(cursor):
+        return
+
+    cursor.execute("DELETE FROM ngw_structure_fingerprint")
+
+
+def _has_fingerprint_table(cursor: sqlite3.Cursor) -> bool:
+    cursor.execute(
+        """
+        SELECT EXISTS(
+            SELECT 1 FROM sqlite_master
+            WHERE type = 'table' AND name = 'ngw_structure_fingerprint'
+        )
+        """
+    )
+    return bool(cursor.fetchone()[0])
@@ -0,0 +1,74 @@
+from collections import deque
+from datetime import timedelta
+from typing import Deque
+
+from nextgis_connect.settings import NgConnectSettings
+
+
+class AdaptiveSyncPeriod:
+    """
+    Period of automatic synchronization of a layer with versioning.
+
+    Every fetched delta is recorded. Each empty delta in a row doubles
+    the period, so static layers are checked rarely. Each non-empty delta
+    in a row halves it, and a big recent change volume halves it once
+    more, so active layers are checked often. The period starts from the
+    configured synchronization period and stays within configured bounds.
+    """
+
+    HISTORY_SIZE = 5
+    MAX_EXPONENT = 16
+
+    # Mean actions count of recent deltas treated as a big change volume
+    ACTIVE_ACTIONS_COUNT = 100
+
+    __empty_streak: int
+    __active_streak: int
+    __recent_actions: Deque[int]
+
+    def __init__(self) -> None:
+        self.__empty_streak = 0
+        self.__active_streak = 0
+        self.__recent_actions = deque(maxlen=self.HISTORY_SIZE)
+
+    @property
+    def period(self) -> timedelta:
+        settings = NgConnectSettings()
+        min_period = settings.synchronization_min_period
+        max_period = max(settings.synchronization_max_period, min_period)
+        base_period = min(
+            max(settings.synchronizatin_period, min_period), max_period
+        )
+
+        # Exponent is limited to keep values within timedelta range
+        exponent = min(self.__empty_streak, self.MAX_EXPONENT)
+        if exponent == 0:
+            exponent = -min(self.__active_streak, self.MAX_EXPONENT)
+            if self.__is_volume_big():
+                exponent -= 1
+
+        seconds = base_period.total_seconds() * 2.0**exponent
+        return min(max(timedelta(seconds=seconds), min_period), max_period)
+
+    def record(self, actions_count: int) -> None:
+        """Records actions count of a fetched delta"""
+        self.__recent_actions.append(actions_count)
+
+        if actions_count == 0:
+            self.__empty_streak += 1
+            self.__active_streak = 0
+        else:
+            self.__empty_streak = 0
+            self.__active_streak += 1
+
+    def reset(self) -> None:
+        self.__empty_streak = 0
+        self.__active_streak = 0
+        self.__recent_actions.clear()
+
+    def __is_volume_big(self) -> bool:
+        if len(self.__recent_actions) == 0:
+            return False
+
+        mean_actions = sum(self.__recent_actions) / len(self.__recent_actions)
+        return mean_actions >= self.ACTIVE_ACTIONS_COUNT
@@ -0,0 +1,176 @@
+from collections import Counter, deque
+from itertools import count
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from nextgis_connect.detached_editing.utils import DetachedLayerState
+
+if TYPE_CHECKING:
+    from nextgis_connect.detached_editing.detached_container import (
+        DetachedContainer,
+    )
+
+
+class SynchronizationScheduler:
+    """
+    Starts synchronization of several detached containers at once.
+
+    Number of simultaneously synchronizing containers is limited globally
+    and for each NextGIS Web instance. Not initialized containers go first,
+    then containers with local changes. Containers with the same priority
+    are started in round-robin order, so the least recently started one
+    is tried first.
+
+    Conflicts resolution dialogs are modal, so containers which found
+    conflicts wait in a queue and only one dialog is shown at a time.
+    Otherwise the event loop of a second dialog would block the
+    synchronization of the first container until it is closed.
+    """
+
+    __global_limit: int
+    __instance_limit: int
+    __start_order: Dict[Path, int]
+    __counter: Iterator[int]
+    __resolution_queue: Deque["DetachedContainer"]
+    __resolving_container: Optional["DetachedContainer"]
+
+    def __init__(self, global_limit: int, instance_limit: int) -> None:
+        self.__global_limit = max(1, global_limit)
+        self.__instance_limit = max(1, instance_limit)
+        self.__start_order = {}
+        self.__counter = count(1)
+        self.__resolution_queue = deque()
+        self.__resolving_container = None
+
+    @property
+    def global_limit(self) -> int:
+        return self.__global_limit
+
+    @global_limit.setter
+    def global_limit(self, value: int) -> None:
+        self.__global_limit = max(1, value)
+
+    @property
+    def instance_limit(self) -> int:
+        return self.__instance_limit
+
+    @instance_limit.setter
+    def instance_limit(self, value: int) -> None:
+        self.__instance_limit = max(1, value)
+
+    def schedule(self, containers: Iterable["DetachedContainer"]) -> int:
+        """
+        Starts synchronization of containers within limits.
+
+        :return: Number of started synchronizations
+        """
+        containers = list(containers)
+
+        active_by_instance = Counter(
+            self.__instance_key(container)
+            for container in containers
+            if container.state == DetachedLayerState.Synchronization
+        )
+        free_slots = self.__global_limit - sum(active_by_instance.values())
+
+        started_count = 0
+        for container in self.__candidates(containers):
+            if free_slots <= 0:
+                break
+
+            instance_key = self.__instance_key(container)
+            if active_by_instance[instance_key] >= self.__instance_limit:
+                continue
+
+            if not container.synchronize():
+                continue
+
+            self.__start_order[container.path] = next(self.__counter)
+            active_by_instance[instance_key] += 1
+            free_slots -= 1
+            started_count += 1
+
+        return started_count
+
+    def request_conflicts_resolution(
+        self, container: "DetachedContainer"
+    ) -> None:
+        """
+        Queues conflicts resolution of the container.
+
+        Resolution is started immediately if no other container resolves
+        conflicts at the moment.
+        """
+        if (
+            container is self.__resolving_container
+            or container in self.__resolution_queue
+        ):
+            return
+
+        self.__resolution_queue.append(container)
+        self.__start_conflicts_resolution()
+
+    def finish_conflicts_resolution(
+        self, container: "DetachedContainer"
+    ) -> None:
+        """Releases the resolution slot and starts the next one"""
+        if container is not self.__resolving_container:
+            return
+
+        self.__resolving_container = None
+        self.__start_conflicts_resolution()
+
+    def forget(self, path: Path) -> None:
+        self.__start_order.pop(path, None)
+        self.__resolution_queue = deque(
+            container
+            for container in self.__resolution_queue
+            if container.path != path
+        )
+
+    def __start_conflicts_resolution(self) -> None:
+        if (
+            self.__resolving_container is not None
+            or len(self.__resolution_queue) == 0
+        ):
+            return
+
+        self.__resolving_container = self.__resolution_queue.popleft()
+        self.__resolving_container.resolve_conflicts()
+
+    def __candidates(
+        self, containers: List["DetachedContainer"]
+    ) -> List["DetachedContainer"]:
+        candidates = [
+            container
+            for container in containers
+            if container.state != DetachedLayerState.Synchronization
+        ]
+        return sorted(candidates, key=self.__sort_key)
+
+    def __sort_key(self, container: "DetachedContainer") -> Tuple[int, int]:
+        if container.is_not_initialized:
+            priority = 0
+        elif container.metadata is not None and container.metadata.has_changes:
+            priority = 1
+        else:
+            priority = 2
+
+        return priority, self.__start_order.get(container.path, 0)
+
+    def __instance_key(self, container: "DetachedContainer") -> str:
+        metadata = container.metadata
+        if metadata is None:
+            return ""
+        if metadata.instance_id is not None:
+            return metadata.instance_id
+        return metadata.connection_id
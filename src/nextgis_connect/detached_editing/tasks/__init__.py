@@ -4,4 +4,5 @@ from .fetch_additional_data_task import FetchAdditionalDataTask
 from .fetch_delta_task import FetchDeltaTask
 from .fill_layer_with_versioning_task import FillLayerWithVersioning
 from .fill_layer_without_versioning_task import FillLayerWithoutVersioningTask
+from .maintain_container_task import MaintainContainerTask
 from .upload_changes_task import UploadChangesTask
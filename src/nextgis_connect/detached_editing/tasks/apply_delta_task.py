@@ -1,39 +1,56 @@
-from contextlib import closing
+import sqlite3
+from contextlib import closing, nullcontext
 from datetime import datetime
+from functools import partial
 from pathlib import Path
-from typing import List
 
 from nextgis_connect.detached_editing.action_applier import ActionApplier
-from nextgis_connect.detached_editing.actions import (
-    FeatureAction,
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
+from nextgis_connect.detached_editing.delta_journal import DeltaJournal
+from nextgis_connect.detached_editing.metadata_cache import (
+    invalidate_container_metadata,
+)
+from nextgis_connect.detached_editing.spatial_index import (
+    BULK_FEATURES_COUNT,
+    suspended_spatial_index,
 )
 from nextgis_connect.detached_editing.tasks.detached_editing_task import (
     DetachedEditingTask,
 )
 from nextgis_connect.detached_editing.utils import (
     DetachedContainerMetaData,
-    make_connection,
 )
 from nextgis_connect.exceptions import SynchronizationError
 from nextgis_connect.logging import logger
 
 
 class ApplyDeltaTask(DetachedEditingTask):
+    """
+    Applies remote changes from the container delta journal.
+
+    Progress is saved together with every applied batch, and the layer
+    version is updated together with the last one, so an interrupted
+    applying is resumed instead of being replayed from the start.
+    """
+
     _container_path: Path
     _metadata: DetachedContainerMetaData
 
     __target: int
     __timestamp: datetime
-    __delta: List[FeatureAction]
+    __journal: DeltaJournal
 
     def __init__(
         self,
         container_path: Path,
         target: int,
         timestamp: datetime,
-        delta: List[FeatureAction],
+        *,
+        connection_pool: ContainerConnectionPool,
     ) -> None:
-        super().__init__(container_path)
+        super().__init__(container_path, connection_pool=connection_pool)
         if self._error is not None:
             return
 
@@ -44,7 +61,6 @@ class ApplyDeltaTask(DetachedEditingTask):
 
         self.__target = target
         self.__timestamp = timestamp
-        self.__delta = delta
 
     def run(self) -> bool:
         if not super().run():
@@ -55,17 +71,20 @@ class ApplyDeltaTask(DetachedEditingTask):
         )
 
         try:
-            applier = ActionApplier(self._container_path, self._metadata)
-            applier.apply(self.__delta)
-
-            with closing(
-                make_connection(self._container_path)
-            ) as connection, closing(connection.cursor()) as cursor:
-                cursor.execute(
-                    "UPDATE ngw_metadata SET version=?, sync_date=?",
-                    (self.__target, self.__timestamp),
-                )
-                connection.commit()
+            applier = ActionApplier(
+                self._container_path, self._metadata, self._connection_pool
+            )
+            self.__journal = DeltaJournal(
+                self._connection_pool, self._metadata
+            )
+            with (
+                suspended_spatial_index(self._connection_pool)
+                if self.__journal.count() >= BULK_FEATURES_COUNT
+                else nullcontext()
+            ):
+                self.__apply_batches(applier)
+
+            invalidate_container_metadata(self._container_path)
 
         except SynchronizationError as error:
             self._error = error
@@ -81,3 +100,37 @@ class ApplyDeltaTask(DetachedEditingTask):
             return False
 
         return True
+
+    def __apply_batches(self, applier: ActionApplier) -> None:
+        batches = self.__journal.numbered_batches()
+        batch = next(batches, None)
+        if batch is None:
+            with self._connection_pool.writer() as connection, closing(
+                connection.cursor()
+            ) as cursor:
+                self.__update_version(cursor)
+            return
+
+        while batch is not None:
+            # The next batch is read beforehand to know which one is last
+            next_batch = next(batches, None)
+            last_id, actions = batch
+            on_commit = (
+                self.__update_version
+                if next_batch is None
+                else partial(self.__save_progress, last_id=last_id)
+            )
+            applier.apply(actions, on_commit)
+            batch = next_batch
+
+    def __save_progress(self, cursor: sqlite3.Cursor, *, last_id: int) -> None:
+        self.__journal.mark_applied(
+            cursor, self.__target, self.__timestamp, last_id
+        )
+
+    def __update_version(self, cursor: sqlite3.Cursor) -> None:
+        cursor.execute(
+            "UPDATE ngw_metadata SET version=?, sync_date=?",
+            (self.__target, self.__timestamp),
+        )
+        self.__journal.finish(cursor)
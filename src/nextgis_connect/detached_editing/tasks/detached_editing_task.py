@@ -6,11 +6,21 @@ from qgis.core import QgsApplication, QgsTask
 
 from nextgis_connect.compat import parse_version
 from nextgis_connect.core.tasks.ng_connect_task import NgConnectTask
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
+from nextgis_connect.detached_editing.metadata_cache import (
+    cached_container_metadata,
+)
+from nextgis_connect.detached_editing.structure_fingerprint import (
+    forget_verified_structure,
+    is_structure_verified,
+    save_verified_structure,
+    structure_fingerprint,
+)
 from nextgis_connect.detached_editing.utils import (
     DetachedContainerMetaData,
     container_changes,
-    container_metadata,
-    make_connection,
 )
 from nextgis_connect.exceptions import (
     ContainerError,
@@ -34,18 +44,26 @@ from nextgis_connect.utils import wrap_sql_value
 class DetachedEditingTask(NgConnectTask):
     _container_path: Path
     _metadata: DetachedContainerMetaData
+    _connection_pool: ContainerConnectionPool
 
     def __init__(
-        self, container_path: Path, flags: Optional[QgsTask.Flags] = None
+        self,
+        container_path: Path,
+        flags: Optional[QgsTask.Flags] = None,
+        *,
+        connection_pool: ContainerConnectionPool,
     ) -> None:
         if flags is None:
             flags = QgsTask.Flags()
         super().__init__(flags=flags)
 
         self._container_path = container_path
+        self._connection_pool = connection_pool
 
         try:
-            self._metadata = container_metadata(container_path)
+            self._metadata = cached_container_metadata(
+                container_path, self._connection_pool
+            )
             self.__check_container()
 
         except ContainerError as error:
@@ -104,9 +122,58 @@ class DetachedEditingTask(NgConnectTask):
             raise SynchronizationError(user_message=user_message) from error
 
         self.__check_compatibility(ngw_layer)
+        self._save_verified_structure()
 
         return ngw_layer
 
+    def _check_layer(self, ngw_connection: QgsNgwConnection) -> None:
+        """
+        Checks compatibility of the remote layer.
+
+        The request is skipped if the structure was verified in the current
+        synchronization cycle.
+        """
+        if self._metadata.is_versioning_enabled:
+            with self._connection_pool.reader() as connection, closing(
+                connection.cursor()
+            ) as cursor:
+                is_verified = is_structure_verified(
+                    cursor, structure_fingerprint(self._metadata)
+                )
+
+            if is_verified:
+                self._check_container_fields()
+                return
+
+        self._get_layer(ngw_connection)
+
+    def _save_verified_structure(self) -> None:
+        if not self._metadata.is_versioning_enabled:
+            return
+
+        with self._connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            save_verified_structure(
+                cursor, structure_fingerprint(self._metadata)
+            )
+
+    def _forget_verified_structure(self) -> None:
+        if not self._metadata.is_versioning_enabled:
+            return
+
+        with self._connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            forget_verified_structure(cursor)
+
+    def _check_container_fields(self) -> None:
+        if self._is_container_fields_changed():
+            message = "Fields changed in QGIS"
+            code = ErrorCode.StructureChanged
+            error = SynchronizationError(message, code=code)
+            raise error
+
     def __check_container(self) -> None:
         container_version = parse_version(self._metadata.container_version)
         supported_version = parse_version(
@@ -132,11 +199,7 @@ class DetachedEditingTask(NgConnectTask):
             error.add_note(f"Remote: {ngw_layer.fields}")
             raise error
 
-        if self._is_container_fields_changed():
-            message = "Fields changed in QGIS"
-            code = ErrorCode.StructureChanged
-            error = SynchronizationError(message, code=code)
-            raise error
+        self._check_container_fields()
 
         if (
             self._metadata.is_versioning_enabled
@@ -186,9 +249,9 @@ class DetachedEditingTask(NgConnectTask):
 
     def _is_container_fields_changed(self) -> bool:
         container_fields_name = set()
-        with closing(
-            make_connection(self._container_path)
-        ) as connection, closing(connection.cursor()) as cursor:
+        with self._connection_pool.reader() as connection, closing(
+            connection.cursor()
+        ) as cursor:
             container_fields_name = set(
                 row[1]
                 for row in cursor.execute(
@@ -1,17 +1,24 @@
 from contextlib import closing
 from pathlib import Path
-from typing import Dict, List, Set
+from typing import Dict, Set
 
-from nextgis_connect.detached_editing.tasks import DetachedEditingTask
-from nextgis_connect.detached_editing.utils import (
-    container_metadata,
-    make_connection,
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
+from nextgis_connect.detached_editing.metadata_cache import (
+    cached_container_metadata,
+    invalidate_container_metadata,
 )
+from nextgis_connect.detached_editing.tasks import DetachedEditingTask
 from nextgis_connect.exceptions import (
     SynchronizationError,
 )
 from nextgis_connect.logging import logger
 from nextgis_connect.ngw_api.qgis.qgis_ngw_connection import QgsNgwConnection
+from nextgis_connect.resources.lookup_tables_cache import (
+    CachedLookupTable,
+    cached_lookup_table,
+)
 from nextgis_connect.resources.ngw_field import FieldId
 
 
@@ -20,12 +27,16 @@ class FetchAdditionalDataTask(DetachedEditingTask):
 
     __is_edit_allowed: bool
     __attributes_with_removed_lookup_table: Set[FieldId]
-    __lookup_tables: Dict[int, List[Dict[str, str]]]
+    __lookup_tables: Dict[int, CachedLookupTable]
 
     def __init__(
-        self, container_path: Path, *, need_update_structure: bool = False
+        self,
+        container_path: Path,
+        *,
+        need_update_structure: bool = False,
+        connection_pool: ContainerConnectionPool,
     ) -> None:
-        super().__init__(container_path)
+        super().__init__(container_path, connection_pool=connection_pool)
         if self._error is not None:
             return
 
@@ -44,7 +55,7 @@ class FetchAdditionalDataTask(DetachedEditingTask):
         return self.__is_edit_allowed
 
     @property
-    def lookup_tables(self) -> Dict[int, List[Dict[str, str]]]:
+    def lookup_tables(self) -> Dict[int, CachedLookupTable]:
         return self.__lookup_tables
 
     @property
@@ -64,7 +75,7 @@ class FetchAdditionalDataTask(DetachedEditingTask):
                 self.__update_structure(ngw_connection)
 
             self.__get_permissions(ngw_connection)
-            self.__get_lookup_tables(ngw_connection)
+            self.__get_lookup_tables()
 
         except SynchronizationError as error:
             self._error = error
@@ -92,9 +103,9 @@ class FetchAdditionalDataTask(DetachedEditingTask):
             if field.lookup_table is not None
         )
 
-        with closing(
-            make_connection(self._container_path)
-        ) as connection, closing(connection.cursor()) as cursor:
+        with self._connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
             cursor.executemany(
                 """
                 UPDATE ngw_fields_metadata
@@ -114,10 +125,12 @@ class FetchAdditionalDataTask(DetachedEditingTask):
                     for field in ngw_layer.fields
                 ),
             )
-            connection.commit()
 
         # Update for next tasks
-        self._metadata = container_metadata(self._container_path)
+        invalidate_container_metadata(self._container_path)
+        self._metadata = cached_container_metadata(
+            self._container_path, self._connection_pool
+        )
 
         self.__attributes_with_removed_lookup_table -= set(
             field.attribute
@@ -133,10 +146,7 @@ class FetchAdditionalDataTask(DetachedEditingTask):
         permissions = ngw_connection.get(permission_url)
         self.__is_edit_allowed = permissions["data"]["write"]
 
-    def __get_lookup_tables(self, ngw_connection: QgsNgwConnection) -> None:
-        resource_id = self._metadata.resource_id
-        resource_url = "/api/resource/{resource_id}"
-
+    def __get_lookup_tables(self) -> None:
         lookup_table_resources_id = list(
             set(
                 field.lookup_table
@@ -148,20 +158,17 @@ class FetchAdditionalDataTask(DetachedEditingTask):
         if len(lookup_table_resources_id) > 0:
             logger.debug("↓ Get lookup tables")
 
+        # Tables shared by several layers are downloaded only once
         for lookup_table_id in lookup_table_resources_id:
             try:
-                result = ngw_connection.get(
-                    resource_url.format(resource_id=lookup_table_id)
+                lookup_table = cached_lookup_table(
+                    self._metadata.connection_id, lookup_table_id
                 )
             except Exception:
-                logger.exception(f"Can't get lookup table {resource_id}")
+                logger.exception(f"Can't get lookup table {lookup_table_id}")
                 continue
 
-            lookup_table = result.get("lookup_table")
             if lookup_table is None:
                 continue
 
-            self.__lookup_tables[lookup_table_id] = [
-                {description: value}
-                for value, description in lookup_table["items"].items()
-            ]
+            self.__lookup_tables[lookup_table_id] = lookup_table
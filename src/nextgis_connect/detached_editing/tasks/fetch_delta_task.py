@@ -1,13 +1,16 @@
 import urllib.parse
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict
 
 from nextgis_connect.detached_editing.action_serializer import ActionSerializer
-from nextgis_connect.detached_editing.actions import (
-    ContinueAction,
-    VersioningAction,
+from nextgis_connect.detached_editing.changes_pages_prefetcher import (
+    ChangesPagesPrefetcher,
 )
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
+from nextgis_connect.detached_editing.delta_journal import DeltaJournal
 from nextgis_connect.detached_editing.tasks.detached_editing_task import (
     DetachedEditingTask,
 )
@@ -22,12 +25,25 @@ from nextgis_connect.resources.ngw_fields import NgwFields
 
 
 class FetchDeltaTask(DetachedEditingTask):
+    """
+    Fetches remote changes page by page and spools them to the container
+    delta journal.
+
+    If applying of previously fetched changes was interrupted, nothing is
+    fetched and the rest of the journal is returned for applying.
+    """
+
     __target: int
     __timestamp: datetime
-    __delta: List[VersioningAction]
-
-    def __init__(self, stub_path: Path) -> None:
-        super().__init__(stub_path)
+    __actions_count: int
+
+    def __init__(
+        self,
+        stub_path: Path,
+        *,
+        connection_pool: ContainerConnectionPool,
+    ) -> None:
+        super().__init__(stub_path, connection_pool=connection_pool)
         if self._error is not None:
             return
 
@@ -38,7 +54,7 @@ class FetchDeltaTask(DetachedEditingTask):
 
         self.__target = -1
         self.__timestamp = datetime.now()
-        self.__delta = []
+        self.__actions_count = 0
 
     @property
     def target(self) -> int:
@@ -49,8 +65,8 @@ class FetchDeltaTask(DetachedEditingTask):
         return self.__timestamp
 
     @property
-    def delta(self) -> List[VersioningAction]:
-        return self.__delta
+    def actions_count(self) -> int:
+        return self.__actions_count
 
     def run(self) -> bool:
         if not super().run():
@@ -64,6 +80,24 @@ class FetchDeltaTask(DetachedEditingTask):
         resource_id = self._metadata.resource_id
 
         try:
+            # Synchronization cycle starts here, so remote structure is
+            # checked again
+            self._forget_verified_structure()
+
+            journal = DeltaJournal(self._connection_pool, self._metadata)
+
+            interrupted_target = journal.interrupted_target()
+            if interrupted_target is not None:
+                self.__target, self.__timestamp = interrupted_target
+                self.__actions_count = journal.count()
+                logger.debug(
+                    f"Resume applying of {self.__actions_count} actions"
+                    f" up to version {self.__target}"
+                )
+                return True
+
+            journal.clear()
+
             ngw_connection = QgsNgwConnection(connection_id)
 
             check_params = urllib.parse.urlencode(
@@ -90,28 +124,26 @@ class FetchDeltaTask(DetachedEditingTask):
                 raise error
 
             if check_result is None:
-                self.__delta = []
                 return True
 
             self._check_compatibility(check_result)
+            self._save_verified_structure()
 
             self.__target = check_result["target"]
             self.__timestamp = datetime.fromisoformat(check_result["tstamp"])
             fetch_url = check_result["fetch"]
 
             serializer = ActionSerializer(self._metadata)
-            actions = serializer.from_json(ngw_connection.get(fetch_url))
-
-            while len(actions) > 0:
-                self.__delta.extend(actions)
+            pages = ChangesPagesPrefetcher(connection_id, fetch_url)
+            for page in pages:
+                actions = serializer.from_json(page)
+                self.__actions_count += journal.append(actions)
 
-                continue_action = actions[-1]
-                assert isinstance(continue_action, ContinueAction)
-                actions = serializer.from_json(
-                    ngw_connection.get(continue_action.url)
-                )
+            logger.debug(f"Fetched {self.__actions_count} actions")
 
-            logger.debug(f"Fetched {len(self.__delta)} actions")
+            removed_count = journal.compact()
+            self.__actions_count -= removed_count
+            logger.debug(f"Compacted delta by {removed_count} actions")
 
         except SynchronizationError as error:
             self._error = error
@@ -153,11 +185,7 @@ class FetchDeltaTask(DetachedEditingTask):
             error.add_note(f"Remote: {answer['srs']['id']}")
             raise error
 
-        if self._is_container_fields_changed():
-            message = "Fields changed in QGIS"
-            code = ErrorCode.StructureChanged
-            error = SynchronizationError(message, code=code)
-            raise error
+        self._check_container_fields()
 
         ngw_layer_fields = NgwFields.from_json(answer["fields"])
         if not self._is_fields_compatible(ngw_layer_fields):
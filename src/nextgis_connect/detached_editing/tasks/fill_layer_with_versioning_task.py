@@ -3,20 +3,47 @@ from pathlib import Path
 
 from nextgis_connect.detached_editing.action_applier import ActionApplier
 from nextgis_connect.detached_editing.action_serializer import ActionSerializer
+from nextgis_connect.detached_editing.changes_pages_prefetcher import (
+    ChangesPagesPrefetcher,
+)
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
+from nextgis_connect.detached_editing.fill_checkpoint import (
+    FillCheckpoint,
+    clear_fill_checkpoint,
+    load_fill_checkpoint,
+    save_fill_checkpoint,
+)
+from nextgis_connect.detached_editing.metadata_cache import (
+    invalidate_container_metadata,
+)
+from nextgis_connect.detached_editing.spatial_index import (
+    suspended_spatial_index,
+)
+from nextgis_connect.detached_editing.storage_profile import (
+    analyze_container,
+)
 from nextgis_connect.detached_editing.tasks.detached_editing_task import (
     DetachedEditingTask,
 )
-from nextgis_connect.detached_editing.utils import (
-    make_connection,
+from nextgis_connect.exceptions import (
+    ErrorCode,
+    NgwError,
+    SynchronizationError,
 )
-from nextgis_connect.exceptions import SynchronizationError
 from nextgis_connect.logging import logger
 from nextgis_connect.ngw_api.qgis.qgis_ngw_connection import QgsNgwConnection
 
 
 class FillLayerWithVersioning(DetachedEditingTask):
-    def __init__(self, stub_path: Path) -> None:
-        super().__init__(stub_path)
+    def __init__(
+        self,
+        stub_path: Path,
+        *,
+        connection_pool: ContainerConnectionPool,
+    ) -> None:
+        super().__init__(stub_path, connection_pool=connection_pool)
         if self._error is not None:
             return
 
@@ -32,7 +59,7 @@ class FillLayerWithVersioning(DetachedEditingTask):
         logger.debug(f"<b>Start filling</b> layer{self._metadata}")
 
         connection_id = self._metadata.connection_id
-        resource_id = self._metadata.resource_id
+        checkpoint = None
 
         try:
             ngw_connection = QgsNgwConnection(connection_id)
@@ -40,36 +67,58 @@ class FillLayerWithVersioning(DetachedEditingTask):
             # Check structure etc
             self._get_layer(ngw_connection)
 
-            check_result = ngw_connection.get(
-                f"/api/resource/{resource_id}/feature/changes/check"
-            )
-            fetch_url = check_result["fetch"]
-
-            actions = []
-            fetched_actions = ngw_connection.get(fetch_url)
-            while len(fetched_actions) > 0:
-                actions.extend(fetched_actions)
-                continue_action = fetched_actions[-1]
-                assert "url" in continue_action
-                fetched_actions = ngw_connection.get(continue_action["url"])
+            checkpoint = self.__checkpoint(ngw_connection)
 
             serializer = ActionSerializer(self._metadata)
-            applier = ActionApplier(self._container_path, self._metadata)
-            applier.apply(serializer.from_json(actions))
+            applier = ActionApplier(
+                self._container_path, self._metadata, self._connection_pool
+            )
 
-            sync_date = check_result["tstamp"]
-            with closing(
-                make_connection(self._container_path)
-            ) as connection, closing(connection.cursor()) as cursor:
+            # Apply every page while next ones are being fetched. Index of
+            # the empty container is built once after all pages
+            pages = ChangesPagesPrefetcher(connection_id, checkpoint.fetch_url)
+            with suspended_spatial_index(self._connection_pool):
+                for page in pages:
+                    applier.apply(serializer.from_json(page))
+
+                    # Continue action of the page holds next page URL
+                    checkpoint.fetch_url = page[-1]["url"]
+                    checkpoint.applied_pages += 1
+                    self.__save_checkpoint(checkpoint)
+
+            sync_date = checkpoint.sync_date
+            with self._connection_pool.writer() as connection, closing(
+                connection.cursor()
+            ) as cursor:
                 cursor.execute(
                     f"UPDATE ngw_metadata SET sync_date='{sync_date}'"  # nosec B608
                 )
-                connection.commit()
+                clear_fill_checkpoint(cursor)
+                analyze_container(connection)
+
+            invalidate_container_metadata(self._container_path)
 
         except SynchronizationError as error:
             self._error = error
             return False
 
+        except NgwError as error:
+            # Cursor of the saved URL may be no longer valid on the server
+            if (
+                checkpoint is not None
+                and checkpoint.applied_pages > 0
+                and error.code in (ErrorCode.NgwError, ErrorCode.NotFound)
+            ):
+                logger.warning("Saved fill checkpoint is discarded")
+                self.__clear_checkpoint()
+
+            message = (
+                f"An error occurred while downloading layer {self._metadata}"
+            )
+            self._error = SynchronizationError(message)
+            self._error.__cause__ = error
+            return False
+
         except Exception as error:
             message = (
                 f"An error occurred while downloading layer {self._metadata}"
@@ -79,3 +128,38 @@ class FillLayerWithVersioning(DetachedEditingTask):
             return False
 
         return True
+
+    def __checkpoint(self, ngw_connection: QgsNgwConnection) -> FillCheckpoint:
+        with self._connection_pool.reader() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            checkpoint = load_fill_checkpoint(cursor)
+
+        if checkpoint is not None and checkpoint.fetch_url is not None:
+            logger.debug(
+                f"Continue filling after {checkpoint.applied_pages} pages"
+            )
+            return checkpoint
+
+        resource_id = self._metadata.resource_id
+        check_result = ngw_connection.get(
+            f"/api/resource/{resource_id}/feature/changes/check"
+        )
+        checkpoint = FillCheckpoint(
+            fetch_url=check_result["fetch"], sync_date=check_result["tstamp"]
+        )
+        self.__save_checkpoint(checkpoint)
+
+        return checkpoint
+
+    def __save_checkpoint(self, checkpoint: FillCheckpoint) -> None:
+        with self._connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            save_fill_checkpoint(cursor, checkpoint)
+
+    def __clear_checkpoint(self) -> None:
+        with self._connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            clear_fill_checkpoint(cursor)
@@ -1,15 +1,24 @@
-import tempfile
 import urllib.parse
 from contextlib import closing
-from os import close
 from pathlib import Path
-from typing import cast
+from typing import Optional, cast
 
 from nextgis_connect.detached_editing.action_applier import ActionApplier
 from nextgis_connect.detached_editing.action_serializer import ActionSerializer
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
 from nextgis_connect.detached_editing.detached_layer_factory import (
     DetachedLayerFactory,
 )
+from nextgis_connect.detached_editing.fill_checkpoint import (
+    FillCheckpoint,
+    clear_fill_checkpoint,
+    load_fill_checkpoint,
+    partial_download_path,
+    save_fill_checkpoint,
+)
+from nextgis_connect.detached_editing.range_download import RangeDownloader
 from nextgis_connect.detached_editing.tasks.detached_editing_task import (
     DetachedEditingTask,
 )
@@ -18,6 +27,7 @@ from nextgis_connect.detached_editing.utils import (
     make_connection,
 )
 from nextgis_connect.exceptions import (
+    ContainerError,
     SynchronizationError,
 )
 from nextgis_connect.logging import logger
@@ -29,8 +39,13 @@ from nextgis_connect.ngw_api.qgis.qgis_ngw_connection import QgsNgwConnection
 
 
 class FillLayerWithoutVersioningTask(DetachedEditingTask):
-    def __init__(self, stub_path: Path) -> None:
-        super().__init__(stub_path)
+    def __init__(
+        self,
+        stub_path: Path,
+        *,
+        connection_pool: ContainerConnectionPool,
+    ) -> None:
+        super().__init__(stub_path, connection_pool=connection_pool)
         if self._error is not None:
             return
 
@@ -47,20 +62,24 @@ class FillLayerWithoutVersioningTask(DetachedEditingTask):
             f"<b>Start GPKG downloading</b> for layer {self._metadata}"
         )
 
-        temp_fd, temp_path = tempfile.mkstemp(suffix=".gpkg")
-        close(temp_fd)
-        self.__temp_path = Path(temp_path)
+        # Partial export is kept after failures to be continued next time
+        self.__temp_path = partial_download_path(self._container_path)
 
         try:
             connection_id = self._metadata.connection_id
             ngw_connection = QgsNgwConnection(connection_id)
 
-            self.__download_layer(ngw_connection)
+            self.__download_layer()
             self.__copy_features(ngw_connection)
 
         except SynchronizationError as error:
             self._error = error
-            self.__temp_path.unlink(missing_ok=True)
+            return False
+
+        except ContainerError as error:
+            # Downloaded file can't be read, so it is downloaded again
+            self._error = error
+            self.__remove_partial_download()
             return False
 
         except Exception as error:
@@ -69,14 +88,15 @@ class FillLayerWithoutVersioningTask(DetachedEditingTask):
             )
             self._error = SynchronizationError(message)
             self._error.__cause__ = error
-            self.__temp_path.unlink(missing_ok=True)
             return False
 
+        self.__remove_partial_download()
+
         logger.debug("Downloading GPKG completed")
 
         return True
 
-    def __download_layer(self, ngw_connection: QgsNgwConnection) -> None:
+    def __download_layer(self) -> None:
         resource_id = self._metadata.resource_id
         srs_id = self._metadata.srs_id
 
@@ -91,10 +111,40 @@ class FillLayerWithoutVersioningTask(DetachedEditingTask):
             + urllib.parse.urlencode(export_params)
         )
 
+        with self._connection_pool.reader() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            checkpoint = load_fill_checkpoint(cursor)
+
+        validator = (
+            checkpoint.download_validator if checkpoint is not None else None
+        )
+
         logger.debug("Downloading layer")
-        ngw_connection.download(export_url, str(self.__temp_path))
+        downloader = RangeDownloader(
+            self._metadata.connection_id,
+            export_url,
+            self.__temp_path,
+            self.__save_validator,
+        )
+        downloader.download(validator)
         logger.debug("Downloading completed")
 
+    def __save_validator(self, validator: Optional[str]) -> None:
+        with self._connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            save_fill_checkpoint(
+                cursor, FillCheckpoint(download_validator=validator)
+            )
+
+    def __remove_partial_download(self) -> None:
+        self.__temp_path.unlink(missing_ok=True)
+        with self._connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            clear_fill_checkpoint(cursor)
+
     def __copy_features(self, ngw_connection: QgsNgwConnection) -> None:
         resources_factory = NGWResourceFactory(ngw_connection)
         ngw_layer = resources_factory.get_resource(self._metadata.resource_id)
@@ -0,0 +1,89 @@
+from contextlib import closing
+
+from qgis.core import QgsApplication
+
+from nextgis_connect.core.tasks.ng_connect_task import NgConnectTask
+from nextgis_connect.detached_editing.change_counters import (
+    has_change_counters,
+    repair_change_counters,
+)
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
+from nextgis_connect.detached_editing.detached_layer_factory import (
+    DetachedLayerFactory,
+)
+from nextgis_connect.detached_editing.metadata_cache import (
+    invalidate_container_metadata,
+)
+from nextgis_connect.detached_editing.storage_profile import (
+    maintain_container,
+    needs_storage_profile,
+    upgrade_storage_profile,
+)
+from nextgis_connect.exceptions import ContainerError
+from nextgis_connect.logging import logger
+
+
+class MaintainContainerTask(NgConnectTask):
+    """
+    Upgrades containers created by previous versions, repairs change
+    counters, rebuilds small containers without incremental auto vacuum
+    and releases free pages.
+    """
+
+    __connection_pool: ContainerConnectionPool
+
+    def __init__(self, connection_pool: ContainerConnectionPool) -> None:
+        super().__init__()
+        self.__connection_pool = connection_pool
+
+        description = QgsApplication.translate(
+            "MaintainContainerTask", 'Maintenance of "{container_name}"'
+        ).format(container_name=connection_pool.path.name)
+        self.setDescription(description)
+
+    def run(self) -> bool:
+        if not super().run():
+            return False
+
+        try:
+            with self.__connection_pool.writer() as connection, closing(
+                connection.cursor()
+            ) as cursor:
+                is_upgraded = DetachedLayerFactory().upgrade_container(cursor)
+
+                # Counters are verified here with full scans, so state
+                # updates can rely on them
+                is_repaired = has_change_counters(
+                    cursor
+                ) and repair_change_counters(cursor)
+                if is_repaired:
+                    logger.warning("Change counters were out of date")
+
+            if is_upgraded or is_repaired:
+                invalidate_container_metadata(self.__connection_pool.path)
+
+            with self.__connection_pool.writer() as connection:
+                if needs_storage_profile(
+                    connection, self.__connection_pool.path
+                ):
+                    upgrade_storage_profile(connection)
+                    logger.debug(
+                        "Incremental auto vacuum enabled for container"
+                    )
+
+                released_pages = maintain_container(connection)
+
+        except Exception as error:
+            message = "An error occurred during container maintenance"
+            self._error = ContainerError(message)
+            self._error.__cause__ = error
+            return False
+
+        logger.debug(
+            f'Container "{self.__connection_pool.path.name}" maintained, '
+            f"released {released_pages} pages"
+        )
+
+        return True
@@ -1,28 +1,60 @@
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import closing
 from datetime import datetime
-from itertools import islice
 from pathlib import Path
-from typing import Optional
+from typing import Deque, Iterable, Iterator, List, Optional, Tuple
 
 from nextgis_connect.detached_editing.action_extractor import ActionExtractor
 from nextgis_connect.detached_editing.action_serializer import ActionSerializer
+from nextgis_connect.detached_editing.actions import (
+    DataChangeAction,
+    VersioningAction,
+)
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
+from nextgis_connect.detached_editing.local_changes_compactor import (
+    LocalChangesCompactor,
+)
+from nextgis_connect.detached_editing.metadata_cache import (
+    invalidate_container_metadata,
+)
 from nextgis_connect.detached_editing.tasks.detached_editing_task import (
     DetachedEditingTask,
 )
 from nextgis_connect.detached_editing.transaction_applier import (
     TransactionApplier,
 )
-from nextgis_connect.detached_editing.utils import make_connection
-from nextgis_connect.exceptions import SynchronizationError
+from nextgis_connect.exceptions import (
+    NgwConnectionError,
+    NgwError,
+    SynchronizationError,
+)
 from nextgis_connect.logging import logger
+from nextgis_connect.ngw_api.core.ngw_error import NGWError
 from nextgis_connect.ngw_api.qgis.qgis_ngw_connection import QgsNgwConnection
 
 
 class UploadChangesTask(DetachedEditingTask):
     BATCH_SIZE = 1000
 
-    def __init__(self, container_path: Path) -> None:
-        super().__init__(container_path)
+    # Versioned transaction uploading
+    MAX_BATCH_BYTES = 4 * 1024 * 1024
+    UPLOAD_WINDOW = 4
+    BATCH_ATTEMPTS = 3
+    RETRY_DELAY = 1.0  # seconds
+
+    def __init__(
+        self,
+        container_path: Path,
+        *,
+        connection_pool: ContainerConnectionPool,
+    ) -> None:
+        super().__init__(container_path, connection_pool=connection_pool)
         if self._error is not None:
             return
 
@@ -61,7 +93,15 @@ class UploadChangesTask(DetachedEditingTask):
         ngw_connection = QgsNgwConnection(self._metadata.connection_id)
 
         # Check structure etc
-        self._get_layer(ngw_connection)
+        self._check_layer(ngw_connection)
+
+        # Don't send reverted changes
+        compactor = LocalChangesCompactor(
+            self._connection_pool, self._metadata
+        )
+        removed_count = compactor.compact()
+        if removed_count > 0:
+            logger.debug(f"Removed {removed_count} no-op changes")
 
         if self._metadata.is_versioning_enabled:
             self.__upload_versioned_changes(ngw_connection)
@@ -78,26 +118,19 @@ class UploadChangesTask(DetachedEditingTask):
     ) -> None:
         layer_metadata = self._metadata
 
-        extractor = ActionExtractor(self._container_path, layer_metadata)
-        create_actions = extractor.extract_added_features()
-
-        if len(create_actions) == 0:
-            return
-
-        logger.debug(f"Found {len(create_actions)} create actions")
-
+        extractor = ActionExtractor(
+            self._container_path, layer_metadata, self._connection_pool
+        )
         serializer = ActionSerializer(layer_metadata)
 
         transaction_applier = TransactionApplier(
-            self._container_path, self._metadata
+            self._container_path, self._metadata, self._connection_pool
         )
 
         resource_id = layer_metadata.resource_id
         url = f"/api/resource/{resource_id}/feature/?geom_null=true&dt_format=iso"
 
-        iterator = iter(create_actions)
-        batch = tuple(islice(iterator, self.BATCH_SIZE))
-        while batch:
+        for batch in extractor.iterate_added_features(self.BATCH_SIZE):
             body = serializer.to_json(batch)
 
             logger.debug(f"Send {len(batch)} create actions")
@@ -106,33 +139,24 @@ class UploadChangesTask(DetachedEditingTask):
 
             transaction_applier.apply(batch, assigned_fids)
 
-            batch = tuple(islice(iterator, self.BATCH_SIZE))
-
     def __upload_deleted(
         self,
         ngw_connection: QgsNgwConnection,
     ) -> None:
         layer_metadata = self._metadata
 
-        extractor = ActionExtractor(self._container_path, layer_metadata)
-        delete_actions = extractor.extract_deleted_features()
-
-        if len(delete_actions) == 0:
-            return
-
-        logger.debug(f"Found {len(delete_actions)} delete actions")
-
+        extractor = ActionExtractor(
+            self._container_path, layer_metadata, self._connection_pool
+        )
         serializer = ActionSerializer(layer_metadata)
 
         transaction_applier = TransactionApplier(
-            self._container_path, self._metadata
+            self._container_path, self._metadata, self._connection_pool
         )
 
         url = f"/api/resource/{layer_metadata.resource_id}/feature/"
 
-        iterator = iter(delete_actions)
-        batch = tuple(islice(iterator, self.BATCH_SIZE))
-        while batch:
+        for batch in extractor.iterate_deleted_features(self.BATCH_SIZE):
             body = serializer.to_json(batch)
 
             logger.debug(f"Send {len(batch)} delete actions")
@@ -141,34 +165,25 @@ class UploadChangesTask(DetachedEditingTask):
 
             transaction_applier.apply(batch)
 
-            batch = tuple(islice(iterator, self.BATCH_SIZE))
-
     def __upload_updated(
         self,
         ngw_connection: QgsNgwConnection,
     ) -> None:
         layer_metadata = self._metadata
 
-        extractor = ActionExtractor(self._container_path, layer_metadata)
-        updated_actions = extractor.extract_updated_features()
-
-        if len(updated_actions) == 0:
-            return
-
-        logger.debug(f"Found {len(updated_actions)} update actions")
-
+        extractor = ActionExtractor(
+            self._container_path, layer_metadata, self._connection_pool
+        )
         serializer = ActionSerializer(layer_metadata)
 
         transaction_applier = TransactionApplier(
-            self._container_path, self._metadata
+            self._container_path, self._metadata, self._connection_pool
         )
 
         resource_id = layer_metadata.resource_id
         url = f"/api/resource/{resource_id}/feature/?geom_null=true&dt_format=iso"
 
-        iterator = iter(updated_actions)
-        batch = tuple(islice(iterator, self.BATCH_SIZE))
-        while batch:
+        for batch in extractor.iterate_updated_features(self.BATCH_SIZE):
             body = serializer.to_json(batch)
 
             logger.debug(f"Send {len(batch)} update actions")
@@ -177,8 +192,6 @@ class UploadChangesTask(DetachedEditingTask):
 
             transaction_applier.apply(batch)
 
-            batch = tuple(islice(iterator, self.BATCH_SIZE))
-
     def __upload_versioned_changes(
         self,
         connection: QgsNgwConnection,
@@ -187,10 +200,12 @@ class UploadChangesTask(DetachedEditingTask):
         resource_id = layer_metadata.resource_id
         resource_url = f"/api/resource/{resource_id}"
 
-        extractor = ActionExtractor(self._container_path, layer_metadata)
-        actions = extractor.extract_all()
+        extractor = ActionExtractor(
+            self._container_path, layer_metadata, self._connection_pool
+        )
+        actions_count = extractor.count_all()
 
-        if len(actions) == 0:
+        if actions_count == 0:
             return
 
         transaction_answer = connection.post(
@@ -205,25 +220,26 @@ class UploadChangesTask(DetachedEditingTask):
             f"Transaction {transaction_id} started at {transaction_start_time}"
         )
 
-        logger.debug(f"Found {len(actions)} actions")
-
-        serializer = ActionSerializer(layer_metadata)
+        logger.debug(f"Found {actions_count} actions")
 
-        iterator = iter(actions)
-        last_action_number = 0
-        batch = tuple(islice(iterator, self.BATCH_SIZE))
-        while batch:
-            body = serializer.to_json(batch, last_action_number)
+        # Only types and ids are needed after commit, so payload of sent
+        # actions is not kept in memory
+        sent_actions: List[VersioningAction] = []
 
-            logger.debug(f"Send {len(batch)} actions")
+        def extract_actions() -> Iterator[VersioningAction]:
+            for batch in extractor.iterate_all(self.BATCH_SIZE):
+                for action in batch:
+                    sent_actions.append(self.__without_payload(action))
+                    yield action
 
-            connection.put(
-                f"{resource_url}/feature/transaction/{transaction_id}",
-                body,
-            )
+        serializer = ActionSerializer(layer_metadata)
+        batches = serializer.to_json_batches(
+            extract_actions(), self.BATCH_SIZE, self.MAX_BATCH_BYTES
+        )
 
-            last_action_number += len(batch)
-            batch = tuple(islice(iterator, self.BATCH_SIZE))
+        self.__put_batches(
+            f"{resource_url}/feature/transaction/{transaction_id}", batches
+        )
 
         logger.debug(f"Commit transaction {transaction_id}")
 
@@ -251,12 +267,101 @@ class UploadChangesTask(DetachedEditingTask):
         )
 
         transaction_applier = TransactionApplier(
-            self._container_path, self._metadata
+            self._container_path, self._metadata, self._connection_pool
         )
-        transaction_applier.apply(actions, transaction_result)
+        transaction_applier.apply(sent_actions, transaction_result)
 
         self.__update_sync_date(commit_datetime=result["committed"])
 
+    def __without_payload(self, action: VersioningAction) -> VersioningAction:
+        if not isinstance(action, DataChangeAction):
+            return action
+        return action.__class__(action.fid, action.vid)
+
+    def __put_batches(
+        self, transaction_url: str, batches: Iterable[Tuple[int, str]]
+    ) -> None:
+        """
+        Sends transaction batches keeping up to UPLOAD_WINDOW requests in
+        flight.
+
+        Actions are numbered before sending, so the batches are independent
+        and may be stored by server in any order.
+        """
+        thread_data = threading.local()
+
+        def put(body: str, actions_count: int) -> None:
+            connection = getattr(thread_data, "connection", None)
+            if connection is None:
+                connection = QgsNgwConnection(self._metadata.connection_id)
+                thread_data.connection = connection
+
+            logger.debug(f"Send {actions_count} actions")
+            self.__put_batch(connection, transaction_url, body)
+
+        pending: Deque[Future] = deque()
+        with ThreadPoolExecutor(
+            max_workers=self.UPLOAD_WINDOW,
+            thread_name_prefix="NgConnectUpload",
+        ) as executor:
+            try:
+                for actions_count, body in batches:
+                    if len(pending) >= self.UPLOAD_WINDOW:
+                        pending.popleft().result()
+                    pending.append(executor.submit(put, body, actions_count))
+
+                while len(pending) > 0:
+                    pending.popleft().result()
+
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def __put_batch(
+        self, connection: QgsNgwConnection, transaction_url: str, body: str
+    ) -> None:
+        for attempt in range(1, self.BATCH_ATTEMPTS + 1):
+            try:
+                connection.put(transaction_url, body)
+                return
+            except Exception as error:
+                if attempt == self.BATCH_ATTEMPTS or not self.__is_retryable(
+                    error
+                ):
+                    raise
+
+                logger.warning(
+                    f"Batch uploading failed (attempt {attempt}), retrying"
+                )
+                time.sleep(self.RETRY_DELAY * attempt)
+
+    def __is_retryable(self, error: Exception) -> bool:
+        """
+        Checks if the batch can be sent again.
+
+        Only network errors, server errors and throttling are temporary.
+        Other client errors are returned by the server for every attempt.
+        """
+        if isinstance(error, NgwConnectionError):
+            return True
+
+        if isinstance(error, NgwError):
+            return error.try_reconnect
+
+        if not isinstance(error, NGWError):
+            return False
+
+        if error.type == NGWError.TypeRequestError:
+            return True
+
+        if error.type != NGWError.TypeNGWError:
+            return False
+
+        try:
+            return NgwError.from_json(json.loads(error.message)).try_reconnect
+        except (ValueError, TypeError, KeyError):
+            return False
+
     def __update_sync_date(
         self, *, commit_datetime: Optional[str] = None
     ) -> None:
@@ -265,8 +370,9 @@ class UploadChangesTask(DetachedEditingTask):
         else:
             sync_date = commit_datetime
 
-        with closing(
-            make_connection(self._container_path)
-        ) as connection, closing(connection.cursor()) as cursor:
+        with self._connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
             cursor.execute(f"UPDATE ngw_metadata SET sync_date='{sync_date}'")  # nosec B608
-            connection.commit()
+
+        invalidate_container_metadata(self._container_path)
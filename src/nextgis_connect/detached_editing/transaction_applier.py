@@ -2,10 +2,19 @@ from contextlib import closing
 from pathlib import Path
 from typing import List, Optional, Sequence, cast
 
+from nextgis_connect.detached_editing.bulk_ids import (
+    fill_temp_fids,
+    fill_temp_ngw_fids,
+)
+from nextgis_connect.detached_editing.column_changes import (
+    shrink_column_changes,
+)
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
 from nextgis_connect.detached_editing.utils import (
     DetachedContainerMetaData,
     FeatureMetaData,
-    make_connection,
 )
 from nextgis_connect.exceptions import SynchronizationError
 
@@ -20,12 +29,17 @@ from .actions import (
 class TransactionApplier:
     __container_path: Path
     __metadata: DetachedContainerMetaData
+    __connection_pool: ContainerConnectionPool
 
     def __init__(
-        self, container_path: Path, metadata: DetachedContainerMetaData
+        self,
+        container_path: Path,
+        metadata: DetachedContainerMetaData,
+        connection_pool: ContainerConnectionPool,
     ) -> None:
         self.__container_path = container_path
         self.__metadata = metadata
+        self.__connection_pool = connection_pool
 
     def apply(
         self,
@@ -129,11 +143,9 @@ class TransactionApplier:
     def __process_added(
         self, features_metadata: List[FeatureMetaData]
     ) -> None:
-        added_fids = ",".join(str(action.fid) for action in features_metadata)
-
-        with closing(
-            make_connection(self.__container_path)
-        ) as connection, closing(connection.cursor()) as cursor:
+        with self.__connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
             cursor.executemany(
                 "UPDATE ngw_features_metadata SET ngw_fid=? WHERE fid=?",
                 (
@@ -141,73 +153,89 @@ class TransactionApplier:
                     for feature in features_metadata
                 ),
             )
+            added_fids = fill_temp_fids(
+                cursor,
+                (cast(int, feature.fid) for feature in features_metadata),
+            )
             cursor.execute(
-                f"DELETE FROM ngw_added_features WHERE fid in ({added_fids})"  # nosec B608
+                f"DELETE FROM ngw_added_features WHERE fid IN {added_fids}"  # nosec B608
             )
 
-            connection.commit()
-
     def __process_deleted(self, actions: Sequence) -> None:
-        batch_ngw_fids = ",".join(str(action.fid) for action in actions)
-
-        with closing(
-            make_connection(self.__container_path)
-        ) as connection, closing(connection.cursor()) as cursor:
-            cursor.executescript(
+        with self.__connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            ngw_fids = fill_temp_ngw_fids(
+                cursor, (action.fid for action in actions)
+            )
+            cursor.execute(
                 f"""
-                WITH removed_fids AS (
+                DELETE FROM ngw_removed_features
+                WHERE fid IN (
                     SELECT fid FROM ngw_features_metadata
-                        WHERE ngw_fid IN ({batch_ngw_fids})
+                    WHERE ngw_fid IN {ngw_fids}
                 )
-                DELETE FROM ngw_removed_features
-                    WHERE fid IN removed_fids;
+                """  # nosec B608
+            )
+            cursor.execute(
+                f"""
                 DELETE FROM ngw_features_metadata
-                    WHERE ngw_fid IN ({batch_ngw_fids});
+                WHERE ngw_fid IN {ngw_fids}
                 """  # nosec B608
             )
-            connection.commit()
 
     def __process_restored(self, actions: Sequence) -> None:
-        batch_ngw_fids = ",".join(str(action.fid) for action in actions)
-
-        with closing(
-            make_connection(self.__container_path)
-        ) as connection, closing(connection.cursor()) as cursor:
-            cursor.executescript(
+        with self.__connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            ngw_fids = fill_temp_ngw_fids(
+                cursor, (action.fid for action in actions)
+            )
+            cursor.execute(
                 f"""
                 DELETE FROM ngw_restored_features
                 WHERE fid IN (
                     SELECT fid FROM ngw_features_metadata
-                    WHERE ngw_fid IN ({batch_ngw_fids})
-                );
+                    WHERE ngw_fid IN {ngw_fids}
+                )
                 """  # nosec B608
             )
-            connection.commit()
 
     def __process_updated(
         self, features_metadata: List[FeatureMetaData]
     ) -> None:
-        ngw_fids = ",".join(
-            str(feature.ngw_fid) for feature in features_metadata
-        )
-        with closing(
-            make_connection(self.__container_path)
-        ) as connection, closing(connection.cursor()) as cursor:
-            updated_fids = ",".join(
-                str(row[0])
-                for row in cursor.execute(
+        with self.__connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            ngw_fids = fill_temp_ngw_fids(
+                cursor,
+                (cast(int, feature.ngw_fid) for feature in features_metadata),
+            )
+            updated_fids = fill_temp_fids(
+                cursor,
+                [
+                    row[0]
+                    for row in cursor.execute(
+                        f"""
+                        SELECT fid FROM ngw_features_metadata
+                        WHERE ngw_fid IN {ngw_fids}
+                        """  # nosec B608
+                    )
+                ],
+            )
+            for table_name in (
+                "ngw_updated_attributes",
+                "ngw_updated_geometries",
+                "ngw_column_backups",
+            ):
+                cursor.execute(
                     f"""
-                    SELECT fid FROM ngw_features_metadata
-                        WHERE ngw_fid IN ({ngw_fids});
+                    DELETE FROM {table_name}
+                    WHERE fid IN {updated_fids}
                     """  # nosec B608
                 )
-            )
-            cursor.executescript(
-                f"""
-                DELETE FROM ngw_updated_attributes
-                    WHERE fid in ({updated_fids});
-                DELETE FROM ngw_updated_geometries
-                    WHERE fid in ({updated_fids});
-                """  # nosec B608
-            )
-            connection.commit()
+
+            cursor.execute(f"SELECT MAX(id) FROM {updated_fids}")  # nosec B608
+            max_fid = cursor.fetchone()[0]
+            if max_fid is not None:
+                shrink_column_changes(cursor, max_fid)
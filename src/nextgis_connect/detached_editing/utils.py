@@ -3,9 +3,10 @@ from contextlib import closing
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum, auto
-from functools import singledispatch
+from functools import lru_cache, singledispatch
 from pathlib import Path
-from typing import Optional, Union
+from types import ModuleType
+from typing import Optional, Tuple, Union
 
 from qgis.core import (
     QgsExpressionContext,
@@ -15,6 +16,14 @@ from qgis.core import (
     qgsfunction,
 )
 
+from nextgis_connect.detached_editing import change_counters
+from nextgis_connect.detached_editing.change_counters import (
+    read_change_counters,
+)
+from nextgis_connect.detached_editing.column_changes import (
+    has_column_changes,
+    has_column_records,
+)
 from nextgis_connect.exceptions import (
     ContainerError,
     ErrorCode,
@@ -290,24 +299,23 @@ def _(cursor: sqlite3.Cursor) -> DetachedContainerMetaData:
     cursor.execute("SELECT column_name FROM gpkg_geometry_columns")
     geom_field = cursor.fetchone()[0]
 
-    cursor.execute(
-        f"SELECT COUNT(*) FROM {wrap_sql_table_name(table_name)}",  # nosec B608
-    )
-    features_count = cursor.fetchone()[0]
-    if features_count is None:
-        features_count = 0
+    counters = read_change_counters(cursor)
+    if counters is not None:
+        features_count = counters[change_counters.FEATURES]
+        has_changes = any(
+            counters[counter] > 0
+            for counter in change_counters.COUNTERS
+            if counter != change_counters.FEATURES
+        )
+    else:
+        features_count, has_changes = _scan_features_and_changes(
+            cursor, table_name
+        )
 
-    cursor.execute(
-        """
-        SELECT
-            EXISTS(SELECT 1 FROM ngw_added_features)
-            OR EXISTS(SELECT 1 FROM ngw_removed_features)
-            OR EXISTS(SELECT 1 FROM ngw_restored_features)
-            OR EXISTS(SELECT 1 FROM ngw_updated_attributes)
-            OR EXISTS(SELECT 1 FROM ngw_updated_geometries)
-    """
-    )
-    has_changes = bool(cursor.fetchone()[0])
+    # Column records are not counted by triggers and are missing in
+    # containers of previous versions until the container is opened
+    if not has_changes and has_column_changes(cursor):
+        has_changes = has_column_records(cursor)
 
     return DetachedContainerMetaData(
         container_version=container_version,
@@ -332,17 +340,68 @@ def _(cursor: sqlite3.Cursor) -> DetachedContainerMetaData:
     )
 
 
+def _scan_features_and_changes(
+    cursor: sqlite3.Cursor, table_name: str
+) -> Tuple[int, bool]:
+    cursor.execute(
+        f"SELECT COUNT(*) FROM {wrap_sql_table_name(table_name)}",  # nosec B608
+    )
+    features_count = cursor.fetchone()[0]
+    if features_count is None:
+        features_count = 0
+
+    cursor.execute(
+        """
+        SELECT
+            EXISTS(SELECT 1 FROM ngw_added_features)
+            OR EXISTS(SELECT 1 FROM ngw_removed_features)
+            OR EXISTS(SELECT 1 FROM ngw_restored_features)
+            OR EXISTS(SELECT 1 FROM ngw_updated_attributes)
+            OR EXISTS(SELECT 1 FROM ngw_updated_geometries)
+    """
+    )
+    has_changes = bool(cursor.fetchone()[0])
+
+    return features_count, has_changes
+
+
 def container_changes(path: Path) -> DetachedContainerChangesInfo:
     with closing(make_connection(path)) as connection, closing(
         connection.cursor()
     ) as cursor:
+        counters = read_change_counters(cursor)
+        if counters is not None:
+            updated_attributes_count = counters[
+                change_counters.UPDATED_ATTRIBUTES
+            ]
+            # Triggers count only per-feature rows
+            if has_column_records(cursor):
+                cursor.execute(
+                    "SELECT COUNT(DISTINCT fid) FROM ngw_changed_attributes"
+                )
+                updated_attributes_count = cursor.fetchone()[0]
+
+            return DetachedContainerChangesInfo(
+                added_features_count=counters[change_counters.ADDED_FEATURES],
+                removed_features_count=counters[
+                    change_counters.REMOVED_FEATURES
+                ],
+                restored_features_count=counters[
+                    change_counters.RESTORED_FEATURES
+                ],
+                updated_attributes_count=updated_attributes_count,
+                updated_geometries_count=counters[
+                    change_counters.UPDATED_GEOMETRIES
+                ],
+            )
+
         cursor.execute(
             """
             SELECT
               (SELECT COUNT(*) FROM ngw_added_features) added,
               (SELECT COUNT(*) FROM ngw_removed_features) removed,
               (SELECT COUNT(*) FROM ngw_restored_features) restored,
-              (SELECT COUNT(DISTINCT fid) FROM ngw_updated_attributes) attributes,
+              (SELECT COUNT(DISTINCT fid) FROM ngw_changed_attributes) attributes,
               (SELECT COUNT(*) FROM ngw_updated_geometries) geometries
             """
         )
@@ -369,27 +428,11 @@ def ngw_feature_id(
     </ul>
     """
 
-    fid = feature.id()
-    layer = context.variable("layer")
-    if layer is None or not is_ngw_container(layer):
+    path = _expression_container_path(context)
+    if path is None:
         return None
 
-    path = container_path(layer)
-    try:
-        with closing(make_connection(path)) as connection, closing(
-            connection.cursor()
-        ) as cursor:
-            cursor.execute(
-                f"SELECT ngw_fid FROM ngw_features_metadata WHERE fid={fid}"  # nosec B608
-            )
-            result = cursor.fetchone()
-            if result is not None:
-                return result[0]
-
-    except Exception:
-        logger.exception("Error occurred while querying ngw_fid")
-
-    return None
+    return _features_index().feature_ngw_id(path, feature.id())
 
 
 # @qgsfunction(group="NextGIS Connect", referenced_columns=["fid"])
@@ -404,25 +447,29 @@ def ngw_feature_description(
     </ul>
     """
 
-    fid = feature.id()
-    layer = context.variable("layer")
-    if layer is None or not is_ngw_container(layer):
+    path = _expression_container_path(context)
+    if path is None:
         return None
 
-    path = container_path(layer)
-    try:
-        with closing(make_connection(path)) as connection, closing(
-            connection.cursor()
-        ) as cursor:
-            cursor.execute(
-                "SELECT description FROM ngw_features_metadata"
-                f" WHERE fid={fid}"  # nosec B608
-            )
-            result = cursor.fetchone()
-            if result is not None:
-                return result[0]
+    return _features_index().feature_description(path, feature.id())
 
-    except Exception:
-        logger.exception("Error occurred while querying ngw_fid")
 
-    return None
+@lru_cache(maxsize=None)
+def _features_index() -> ModuleType:
+    # Imported once on first use, features index depends on this module
+    from nextgis_connect.detached_editing import features_index
+
+    return features_index
+
+
+def _expression_container_path(
+    context: QgsExpressionContext,
+) -> Optional[Path]:
+    layer = context.variable("layer")
+    if not isinstance(layer, QgsVectorLayer):
+        return None
+
+    try:
+        return container_path(layer)
+    except ContainerError:
+        return None
@@ -262,7 +262,10 @@ class NgwError(NgConnectError):
             code = ErrorCode.NgwError
 
         server_error_prefix = 5
-        try_reconnect = status_code // 100 == server_error_prefix
+        try_reconnect = (
+            status_code // 100 == server_error_prefix
+            or status_code == HTTPStatus.TOO_MANY_REQUESTS
+        )
 
         user_message = json.get("title")
         if user_message is not None:
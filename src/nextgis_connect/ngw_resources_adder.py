@@ -66,6 +66,10 @@ from nextgis_connect.ngw_api.core.ngw_webmap import (
     NGWWebMapLayer,
 )
 from nextgis_connect.ngw_connection import NgwConnectionsManager
+from nextgis_connect.resources.lookup_tables_cache import (
+    fresh_lookup_table,
+    put_lookup_table,
+)
 from nextgis_connect.resources.ngw_data_type import NgwDataType
 from nextgis_connect.settings.ng_connect_cache_manager import (
     NgConnectCacheManager,
@@ -781,7 +785,12 @@ class NgwResourcesAdder(QObject):
         result = []
         for field in resource.fields:
             table_id = field.lookup_table
-            if table_id is None or self.__is_downloaded(table_id):
+            if (
+                table_id is None
+                or self.__is_downloaded(table_id)
+                or fresh_lookup_table(resource.connection_id, table_id)
+                is not None
+            ):
                 continue
             result.append(table_id)
 
@@ -1107,8 +1116,6 @@ class NgwResourcesAdder(QObject):
     ) -> None:
         qgs_fields = qgs_vector_layer.fields()
 
-        lookup_tables: Dict[int, List[Dict[str, str]]] = {}
-
         if is_ngw_container(qgs_vector_layer):
             # Fix for old QGIS versions. If widget is range data could be
             # corrupted
@@ -1132,24 +1139,27 @@ class NgwResourcesAdder(QObject):
                 qgs_vector_layer.setEditorWidgetSetup(field_index, setup)
 
             elif ngw_field.lookup_table is not None:
-                lookup_table_id = ngw_field.lookup_table
-
-                if lookup_table_id not in lookup_tables:
-                    lookup_table = self.__model.resource(
-                        ngw_field.lookup_table
+                # Tables from the cache are not downloaded to the model
+                lookup_table_resource = self.__model.resource(
+                    ngw_field.lookup_table
+                )
+                if lookup_table_resource is not None:
+                    lookup_table = put_lookup_table(
+                        ngw_vector_layer.connection_id,
+                        ngw_field.lookup_table,
+                        lookup_table_resource._json,
+                    )
+                else:
+                    lookup_table = fresh_lookup_table(
+                        ngw_vector_layer.connection_id, ngw_field.lookup_table
                     )
-                    lookup_tables[lookup_table_id] = [
-                        {description: value}
-                        for value, description in lookup_table._json[
-                            "lookup_table"
-                        ]["items"].items()
-                    ]
+                if lookup_table is None:
+                    continue
 
-                setup = QgsEditorWidgetSetup(
-                    "ValueMap", {"map": lookup_tables[lookup_table_id]}
-                )
                 field_index = qgs_fields.indexFromName(ngw_field.keyname)
-                qgs_vector_layer.setEditorWidgetSetup(field_index, setup)
+                qgs_vector_layer.setEditorWidgetSetup(
+                    field_index, lookup_table.widget_setup
+                )
 
     def __extract_styles(
         self, layer_index: Union[QModelIndex, NGWResource]
@@ -0,0 +1,278 @@
+"""
+Process-wide cache of NextGIS Web lookup tables.
+
+Layers of a project often share the same lookup tables, so tables are
+cached by NextGIS Web instance and resource id instead of per layer:
+
+* in memory, together with the ValueMap widget setup shared by all
+  fields using the table;
+* on disk in the "lookup_tables" directory of the instance in the plugin
+  cache, so tables survive QGIS restarts.
+
+Cached tables are used as is while they are younger than
+LOOKUP_TABLE_TTL. Older tables are revalidated with If-None-Match
+request if the server returned an ETag, so unchanged tables are not
+downloaded again.
+"""
+
+import json
+import os
+import threading
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta
+from http import HTTPStatus
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from qgis.core import QgsBlockingNetworkRequest, QgsEditorWidgetSetup
+from qgis.PyQt.QtCore import QUrl
+from qgis.PyQt.QtNetwork import QNetworkRequest
+
+from nextgis_connect.exceptions import NgwError
+from nextgis_connect.logging import logger
+from nextgis_connect.ngw_connection import NgwConnectionsManager
+from nextgis_connect.settings import NgConnectSettings
+
+LOOKUP_TABLE_TTL = timedelta(hours=1)
+
+CacheKey = Tuple[str, int]
+
+
+@dataclass(frozen=True)
+class CachedLookupTable:
+    items: Dict[str, str]
+    etag: Optional[str]
+    check_date: datetime
+    widget_setup: QgsEditorWidgetSetup = field(compare=False, repr=False)
+
+    @property
+    def is_expired(self) -> bool:
+        return datetime.now() - self.check_date >= LOOKUP_TABLE_TTL
+
+
+_lock = threading.Lock()
+_entries: Dict[CacheKey, CachedLookupTable] = {}
+
+
+def cached_lookup_table(
+    connection_id: str, resource_id: int
+) -> Optional[CachedLookupTable]:
+    """
+    Returns the lookup table, downloading it only if the cached one is
+    expired and changed on the server.
+
+    Makes blocking network requests, so it shouldn't be called from the
+    main thread. If the server is not available, an expired table is
+    returned.
+    """
+    connection = NgwConnectionsManager().connection(connection_id)
+    assert connection is not None
+    key = (connection.domain_uuid, resource_id)
+
+    lookup_table = _entry(key)
+    if lookup_table is not None and not lookup_table.is_expired:
+        return lookup_table
+
+    try:
+        resource_json, etag = _fetch_resource(
+            connection_id,
+            resource_id,
+            lookup_table.etag if lookup_table is not None else None,
+        )
+    except Exception:
+        if lookup_table is None:
+            raise
+        logger.exception(f"Can't revalidate lookup table {resource_id}")
+        return lookup_table
+
+    if resource_json is None:
+        assert lookup_table is not None
+        lookup_table = replace(
+            lookup_table, etag=etag, check_date=datetime.now()
+        )
+    else:
+        lookup_table = _lookup_table_from_json(resource_json, etag)
+        if lookup_table is None:
+            return None
+
+    _store(key, lookup_table)
+
+    return lookup_table
+
+
+def fresh_lookup_table(
+    connection_id: str, resource_id: int
+) -> Optional[CachedLookupTable]:
+    """
+    Returns the cached lookup table if it is not expired.
+
+    Doesn't make network requests, so it can be called from the main
+    thread to skip downloading of tables.
+    """
+    connection = NgwConnectionsManager().connection(connection_id)
+    assert connection is not None
+
+    lookup_table = _entry((connection.domain_uuid, resource_id))
+    if lookup_table is None or lookup_table.is_expired:
+        return None
+
+    return lookup_table
+
+
+def put_lookup_table(
+    connection_id: str, resource_id: int, resource_json: Dict[str, Any]
+) -> Optional[CachedLookupTable]:
+    """
+    Puts a lookup table resource downloaded in another way to the cache.
+
+    :return: Cached table or None if the resource is not a lookup table
+    """
+    connection = NgwConnectionsManager().connection(connection_id)
+    assert connection is not None
+    key = (connection.domain_uuid, resource_id)
+
+    lookup_table = _entry(key)
+    cached_items = lookup_table.items if lookup_table is not None else None
+    new_table = _lookup_table_from_json(resource_json, etag=None)
+    if new_table is None:
+        return None
+
+    # Keep the shared widget setup if nothing changed
+    if lookup_table is not None and cached_items == new_table.items:
+        new_table = replace(lookup_table, check_date=new_table.check_date)
+
+    _store(key, new_table)
+    return new_table
+
+
+def _entry(key: CacheKey) -> Optional[CachedLookupTable]:
+    with _lock:
+        lookup_table = _entries.get(key)
+    if lookup_table is not None:
+        return lookup_table
+
+    lookup_table = _read_file(key)
+    if lookup_table is None:
+        return None
+
+    with _lock:
+        return _entries.setdefault(key, lookup_table)
+
+
+def _store(key: CacheKey, lookup_table: CachedLookupTable) -> None:
+    with _lock:
+        _entries[key] = lookup_table
+
+    try:
+        _write_file(key, lookup_table)
+    except Exception:
+        logger.exception(f"Can't save lookup table {key[1]} to cache")
+
+
+def _fetch_resource(
+    connection_id: str, resource_id: int, etag: Optional[str]
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Requests the lookup table resource.
+
+    :return: Resource JSON or None if it was not modified, and its ETag
+    """
+    connection = NgwConnectionsManager().connection(connection_id)
+    assert connection is not None
+
+    request = QNetworkRequest(
+        QUrl(f"{connection.url}/api/resource/{resource_id}")
+    )
+    connection.update_network_request(request)
+    if etag is not None:
+        request.setRawHeader(b"If-None-Match", etag.encode())
+
+    blocking_request = QgsBlockingNetworkRequest()
+    error_code = blocking_request.get(request, forceRefresh=True)
+    reply = blocking_request.reply()
+    status_code = reply.attribute(
+        QNetworkRequest.Attribute.HttpStatusCodeAttribute
+    )
+
+    if status_code == HTTPStatus.NOT_MODIFIED:
+        return None, etag
+
+    if error_code != QgsBlockingNetworkRequest.ErrorCode.NoError:
+        error = NgwError("Lookup table downloading failed")
+        error.add_note(f"Resource id: {resource_id}")
+        error.add_note(f"Http status code: {status_code}")
+        error.add_note(f"Network error: {blocking_request.errorMessage()}")
+        raise error
+
+    new_etag = bytes(reply.rawHeader(b"ETag")).decode()
+    return (
+        json.loads(bytes(reply.content()).decode()),
+        new_etag if new_etag != "" else None,
+    )
+
+
+def _lookup_table_from_json(
+    resource_json: Dict[str, Any], etag: Optional[str]
+) -> Optional[CachedLookupTable]:
+    lookup_table_json = resource_json.get("lookup_table")
+    if lookup_table_json is None:
+        return None
+
+    return _make_lookup_table(lookup_table_json["items"], etag)
+
+
+def _make_lookup_table(
+    items: Dict[str, str],
+    etag: Optional[str],
+    check_date: Optional[datetime] = None,
+) -> CachedLookupTable:
+    value_map = [{description: value} for value, description in items.items()]
+    return CachedLookupTable(
+        items=items,
+        etag=etag,
+        check_date=check_date if check_date is not None else datetime.now(),
+        widget_setup=QgsEditorWidgetSetup("ValueMap", {"map": value_map}),
+    )
+
+
+def _file_path(key: CacheKey) -> Path:
+    instance_id, resource_id = key
+    cache_directory = Path(NgConnectSettings().cache_directory)
+    return (
+        cache_directory / instance_id / "lookup_tables" / f"{resource_id}.json"
+    )
+
+
+def _read_file(key: CacheKey) -> Optional[CachedLookupTable]:
+    file_path = _file_path(key)
+    if not file_path.exists():
+        return None
+
+    try:
+        cached_json = json.loads(file_path.read_text(encoding="utf-8"))
+        return _make_lookup_table(
+            cached_json["items"],
+            cached_json["etag"],
+            datetime.fromisoformat(cached_json["check_date"]),
+        )
+    except Exception:
+        logger.exception(f"Can't read cached lookup table {file_path}")
+        return None
+
+
+def _write_file(key: CacheKey, lookup_table: CachedLookupTable) -> None:
+    file_path = _file_path(key)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+
+    cached_json = {
+        "items": lookup_table.items,
+        "etag": lookup_table.etag,
+        "check_date": lookup_table.check_date.isoformat(),
+    }
+
+    # Replace atomically, since other threads may read the file
+    temp_path = file_path.with_name(
+        f"{file_path.name}.{threading.get_ident()}"
+    )
+    temp_path.write_text(json.dumps(cached_json), encoding="utf-8")
+    os.replace(temp_path, file_path)
@@ -6,8 +6,10 @@ from typing import List, Optional, Tuple, Union
 
 from qgis.core import QgsProject
 
+from nextgis_connect.detached_editing.metadata_cache import (
+    cached_container_metadata,
+)
 from nextgis_connect.detached_editing.utils import (
-    container_metadata,
     container_path,
     is_ngw_container,
 )
@@ -207,7 +209,7 @@ class NgConnectCacheManager:
 
     def __is_container_with_changes(self, file_path: Path) -> bool:
         try:
-            metadata = container_metadata(file_path)
+            metadata = cached_container_metadata(file_path)
         except Exception:
             return False
 
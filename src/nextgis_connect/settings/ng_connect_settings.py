@@ -50,6 +50,11 @@ class NgConnectSettings:
     def supported_container_version(self) -> str:
         return "2.0.0"
 
+    @property
+    def container_version(self) -> str:
+        """Version of created containers. Since 2.1.0 backups are binary"""
+        return "2.1.0"
+
     @property
     def search(self) -> SearchSettings:
         if self.__search_settings is None:
@@ -250,6 +255,10 @@ class NgConnectSettings:
     def layer_check_period(self) -> int:
         return int(timedelta(seconds=15) / timedelta(milliseconds=1))
 
+    @property
+    def container_maintenance_period(self) -> timedelta:
+        return timedelta(hours=1)
+
     @property
     def synchronizatin_period(self) -> timedelta:
         value = self.__settings.value(
@@ -266,6 +275,71 @@ class NgConnectSettings:
             value.total_seconds(),
         )
 
+    @property
+    def synchronization_min_period(self) -> timedelta:
+        """Lower bound of the adaptive synchronization period"""
+        value = self.__settings.value(
+            self.__plugin_group + "/synchronization/min_period",
+            defaultValue=15,
+            type=int,
+        )
+        return timedelta(seconds=max(1, value))
+
+    @synchronization_min_period.setter
+    def synchronization_min_period(self, value: timedelta) -> None:
+        self.__settings.setValue(
+            self.__plugin_group + "/synchronization/min_period",
+            value.total_seconds(),
+        )
+
+    @property
+    def synchronization_max_period(self) -> timedelta:
+        """Upper bound of the adaptive synchronization period"""
+        value = self.__settings.value(
+            self.__plugin_group + "/synchronization/max_period",
+            defaultValue=60 * 60,
+            type=int,
+        )
+        return timedelta(seconds=max(1, value))
+
+    @synchronization_max_period.setter
+    def synchronization_max_period(self, value: timedelta) -> None:
+        self.__settings.setValue(
+            self.__plugin_group + "/synchronization/max_period",
+            value.total_seconds(),
+        )
+
+    @property
+    def synchronization_concurrency(self) -> int:
+        value = self.__settings.value(
+            self.__plugin_group + "/synchronization/concurrency",
+            defaultValue=4,
+            type=int,
+        )
+        return max(1, value)
+
+    @synchronization_concurrency.setter
+    def synchronization_concurrency(self, value: int) -> None:
+        self.__settings.setValue(
+            self.__plugin_group + "/synchronization/concurrency", value
+        )
+
+    @property
+    def synchronization_instance_concurrency(self) -> int:
+        value = self.__settings.value(
+            self.__plugin_group + "/synchronization/instance_concurrency",
+            defaultValue=2,
+            type=int,
+        )
+        return max(1, value)
+
+    @synchronization_instance_concurrency.setter
+    def synchronization_instance_concurrency(self, value: int) -> None:
+        self.__settings.setValue(
+            self.__plugin_group + "/synchronization/instance_concurrency",
+            value,
+        )
+
     @property
     def did_last_launch_fail(self) -> bool:
         value = self.__settings.value(
@@ -0,0 +1,829 @@
+"""
+Local stand-in for NextGIS Web used by benchmarks.
+
+Only requests made by the synchronization pipeline are implemented:
+resource, permissions and features count, changes check and fetch,
+versioned transactions, export and feature PATCH/DELETE. Features are
+generated from their ids on the fly, so only changed features are kept in
+memory and layers with millions of features are cheap to serve.
+"""
+
+import json
+import re
+import struct
+import tempfile
+import threading
+import urllib.parse
+from base64 import b64decode, b64encode
+from bisect import bisect_right
+from collections import Counter
+from datetime import datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from osgeo import ogr, osr
+
+FeatureState = Dict[str, Any]
+
+FIELDS: List[Dict[str, Any]] = [
+    {
+        "id": 1001,
+        "keyname": "INTEGER",
+        "datatype": "INTEGER",
+        "display_name": "INTEGER field",
+        "label_field": False,
+        "grid_visibility": True,
+        "text_search": True,
+        "lookup_table": None,
+    },
+    {
+        "id": 1002,
+        "keyname": "BIGINT",
+        "datatype": "BIGINT",
+        "display_name": "BIGINT field",
+        "label_field": False,
+        "grid_visibility": True,
+        "text_search": True,
+        "lookup_table": None,
+    },
+    {
+        "id": 1003,
+        "keyname": "REAL",
+        "datatype": "REAL",
+        "display_name": "REAL field",
+        "label_field": False,
+        "grid_visibility": True,
+        "text_search": True,
+        "lookup_table": None,
+    },
+    {
+        "id": 1004,
+        "keyname": "STRING",
+        "datatype": "STRING",
+        "display_name": "STRING field",
+        "label_field": True,
+        "grid_visibility": True,
+        "text_search": True,
+        "lookup_table": None,
+    },
+]
+
+_OGR_TYPES = {
+    "INTEGER": ogr.OFTInteger,
+    "BIGINT": ogr.OFTInteger64,
+    "REAL": ogr.OFTReal,
+    "STRING": ogr.OFTString,
+}
+
+EPOCH = 1
+SRS_ID = 3857
+
+
+def point_wkb(fid: int) -> bytes:
+    return struct.pack(
+        "<BIdd", 1, 1, (fid % 1000) * 100.0, fid // 1000 * 100.0
+    )
+
+
+def generated_feature(fid: int) -> FeatureState:
+    """Returns initial state of a synthetic feature"""
+    return {
+        "vid": 1,
+        "geom": point_wkb(fid),
+        "fields": {
+            1001: fid % 1000,
+            1002: fid * 1000,
+            1003: fid / 10,
+            1004: f"Feature {fid}",
+        },
+    }
+
+
+class SyntheticLayer:
+    """
+    Vector layer with generated features.
+
+    Layers with versioning keep a log of versioned actions, so changes
+    between any two versions can be fetched. Creation of the layer is
+    version 1.
+    """
+
+    PAGE_SIZE = 5000
+
+    resource_id: int
+    is_versioning_enabled: bool
+
+    __lock: threading.RLock
+    __generated_count: int
+    __next_fid: int
+    __version: int
+    __revision: int
+    __tstamp: str
+    __features: Dict[int, FeatureState]
+    __deleted: Set[int]
+    __log: List[Dict[str, Any]]
+    __log_versions: List[int]
+    __last_transaction_id: int
+    __transactions: Dict[int, Dict[int, Dict[str, Any]]]
+    __transaction_results: Dict[int, List[Any]]
+    __export_path: Optional[Path]
+    __export_revision: int
+    __export_fid_field: Optional[str]
+
+    def __init__(
+        self,
+        resource_id: int,
+        features_count: int,
+        *,
+        is_versioning_enabled: bool = True,
+    ) -> None:
+        self.resource_id = resource_id
+        self.is_versioning_enabled = is_versioning_enabled
+
+        self.__lock = threading.RLock()
+        self.__generated_count = features_count
+        self.__next_fid = features_count + 1
+        self.__version = 1
+        self.__revision = 0
+        self.__tstamp = datetime.now().isoformat()
+        self.__features = {}
+        self.__deleted = set()
+        self.__log = []
+        self.__log_versions = []
+        self.__last_transaction_id = 0
+        self.__transactions = {}
+        self.__transaction_results = {}
+        self.__export_path = None
+        self.__export_revision = -1
+        self.__export_fid_field = None
+
+    @property
+    def version(self) -> int:
+        return self.__version
+
+    @property
+    def features_count(self) -> int:
+        with self.__lock:
+            return self.__next_fid - 1 - len(self.__deleted)
+
+    def resource_json(self) -> Dict[str, Any]:
+        versioning: Dict[str, Any] = {"enabled": self.is_versioning_enabled}
+        if self.is_versioning_enabled:
+            versioning["epoch"] = EPOCH
+            versioning["latest"] = self.__version
+
+        return {
+            "resource": {
+                "id": self.resource_id,
+                "cls": "vector_layer",
+                "creation_date": "2024-08-30T12:00:00.000000",
+                "parent": {"id": 0, "parent": None},
+                "owner_user": {"id": 4},
+                "permissions": [],
+                "keyname": None,
+                "display_name": f"Benchmark layer {self.resource_id}",
+                "description": None,
+                "children": False,
+                "interfaces": [
+                    "IBboxLayer",
+                    "IFeatureLayer",
+                    "IFieldEditableFeatureLayer",
+                    "IGeometryEditableFeatureLayer",
+                    "IWritableFeatureLayer",
+                    "IVersionableFeatureLayer",
+                ],
+                "scopes": ["data", "resource"],
+            },
+            "resmeta": {"items": {}},
+            "social": {
+                "preview_image_exists": False,
+                "preview_description": None,
+            },
+            "feature_layer": {"fields": FIELDS, "versioning": versioning},
+            "vector_layer": {
+                "srs": {"id": SRS_ID},
+                "geometry_type": "POINT",
+            },
+        }
+
+    def update_features(
+        self, fids: Iterable[int], fields: Dict[int, Any]
+    ) -> None:
+        """Changes fields of features as another user would do"""
+        with self.__lock:
+            actions = [
+                {
+                    "action": "feature.update",
+                    "fid": fid,
+                    "fields": [[key, value] for key, value in fields.items()],
+                }
+                for fid in fids
+            ]
+            self.__commit(actions)
+
+    def check(self, base_url: str, initial: int) -> Optional[Dict[str, Any]]:
+        with self.__lock:
+            target = self.__version
+            tstamp = self.__tstamp
+
+        if initial == target:
+            return None
+
+        params = urllib.parse.urlencode(
+            {"epoch": EPOCH, "initial": initial, "target": target, "cursor": 0}
+        )
+        return {
+            "epoch": EPOCH,
+            "initial": initial,
+            "target": target,
+            "tstamp": tstamp,
+            "fetch": f"{base_url}/api/resource/{self.resource_id}"
+            f"/feature/changes/fetch?{params}",
+            "geometry_type": "POINT",
+            "srs": {"id": SRS_ID},
+            "fields": FIELDS,
+        }
+
+    def changes_page(
+        self, base_url: str, initial: int, target: int, cursor: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns a page of actions ending with the continue action.
+
+        The page after the last one is empty.
+        """
+        with self.__lock:
+            if initial == 0:
+                actions, next_cursor = self.__snapshot_page(cursor)
+            else:
+                actions, next_cursor = self.__log_page(initial, target, cursor)
+
+        if next_cursor is None:
+            return actions
+
+        params = urllib.parse.urlencode(
+            {
+                "epoch": EPOCH,
+                "initial": initial,
+                "target": target,
+                "cursor": next_cursor,
+            }
+        )
+        actions.append(
+            {
+                "action": "continue",
+                "url": f"{base_url}/api/resource/{self.resource_id}"
+                f"/feature/changes/fetch?{params}",
+            }
+        )
+        return actions
+
+    def begin_transaction(self) -> Dict[str, Any]:
+        with self.__lock:
+            self.__last_transaction_id += 1
+            transaction_id = self.__last_transaction_id
+            self.__transactions[transaction_id] = {}
+
+        return {"id": transaction_id, "started": datetime.now().isoformat()}
+
+    def put_actions(self, transaction_id: int, actions: List[Any]) -> None:
+        with self.__lock:
+            transaction = self.__transactions[transaction_id]
+            for number, action in actions:
+                transaction[number] = action
+
+    def commit_transaction(self, transaction_id: int) -> Dict[str, Any]:
+        with self.__lock:
+            transaction = self.__transactions.pop(transaction_id)
+            numbers = sorted(transaction.keys())
+            results = self.__commit(
+                [transaction[number] for number in numbers]
+            )
+            self.__transaction_results[transaction_id] = [
+                [number, result] for number, result in zip(numbers, results)
+            ]
+            committed = self.__tstamp
+
+        return {"status": "committed", "committed": committed}
+
+    def transaction_result(self, transaction_id: int) -> List[Any]:
+        with self.__lock:
+            return self.__transaction_results[transaction_id]
+
+    def dispose_transaction(self, transaction_id: int) -> None:
+        with self.__lock:
+            self.__transactions.pop(transaction_id, None)
+
+    def patch_features(
+        self, features: List[Dict[str, Any]]
+    ) -> List[Dict[str, int]]:
+        keynames = {field["keyname"]: field["id"] for field in FIELDS}
+        with self.__lock:
+            result = []
+            for feature in features:
+                fid = feature.get("id")
+                if fid is None:
+                    fid = self.__next_fid
+                    self.__next_fid += 1
+                    state: FeatureState = {"vid": 1, "geom": None}
+                    state["fields"] = {field["id"]: None for field in FIELDS}
+                else:
+                    state = self.__state(fid)
+
+                for keyname, value in feature.get("fields", {}).items():
+                    state["fields"][keynames[keyname]] = value
+                if "geom" in feature:
+                    state["geom"] = _wkt_to_wkb(feature["geom"])
+
+                self.__features[fid] = state
+                result.append({"id": fid})
+
+            self.__revision += 1
+            return result
+
+    def delete_features(self, features: List[Dict[str, Any]]) -> None:
+        with self.__lock:
+            for feature in features:
+                self.__deleted.add(feature["id"])
+                self.__features.pop(feature["id"], None)
+            self.__revision += 1
+
+    def export(self, fid_field: str) -> Tuple[Path, str]:
+        """
+        Writes features to a GeoPackage.
+
+        The file is reused until features are changed.
+
+        :return: Path to the file and its ETag
+        """
+        with self.__lock:
+            etag = f'"{self.resource_id}-{self.__revision}-{fid_field}"'
+            if (
+                self.__export_path is not None
+                and self.__export_revision == self.__revision
+                and self.__export_fid_field == fid_field
+            ):
+                return self.__export_path, etag
+
+            export_path = Path(
+                tempfile.mkdtemp(prefix="ngw_benchmark_export-")
+            ) / (f"layer_{self.resource_id}.gpkg")
+            self.__write_export(export_path, fid_field)
+
+            if self.__export_path is not None:
+                self.__export_path.unlink(missing_ok=True)
+                self.__export_path.parent.rmdir()
+
+            self.__export_path = export_path
+            self.__export_revision = self.__revision
+            self.__export_fid_field = fid_field
+            return export_path, etag
+
+    def remove_export(self) -> None:
+        with self.__lock:
+            if self.__export_path is None:
+                return
+            self.__export_path.unlink(missing_ok=True)
+            self.__export_path.parent.rmdir()
+            self.__export_path = None
+
+    def __state(self, fid: int) -> FeatureState:
+        state = self.__features.get(fid)
+        if state is not None:
+            return state
+
+        if fid > self.__generated_count or fid in self.__deleted:
+            raise KeyError(fid)
+
+        return generated_feature(fid)
+
+    def __json_state(self, fid: int, state: FeatureState) -> Dict[str, Any]:
+        return {
+            "action": "feature.create",
+            "fid": fid,
+            "vid": state["vid"],
+            "geom": (
+                b64encode(state["geom"]).decode()
+                if state["geom"] is not None
+                else None
+            ),
+            "fields": [
+                [field["id"], state["fields"][field["id"]]] for field in FIELDS
+            ],
+        }
+
+    def __snapshot_page(
+        self, cursor: int
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        actions = []
+        fid = max(cursor, 1)
+        while fid < self.__next_fid and len(actions) < self.PAGE_SIZE:
+            if fid not in self.__deleted:
+                actions.append(self.__json_state(fid, self.__state(fid)))
+            fid += 1
+
+        return actions, (fid if len(actions) > 0 else None)
+
+    def __log_page(
+        self, initial: int, target: int, cursor: int
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        start = max(cursor, bisect_right(self.__log_versions, initial))
+        end = min(
+            start + self.PAGE_SIZE, bisect_right(self.__log_versions, target)
+        )
+        if start >= end:
+            return [], None
+
+        return [dict(action) for action in self.__log[start:end]], end
+
+    def __commit(self, actions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        self.__version += 1
+        self.__revision += 1
+        self.__tstamp = datetime.now().isoformat()
+        vid = self.__version
+
+        results = []
+        for action in actions:
+            action_type = action["action"]
+            result: Dict[str, Any] = {"action": action_type}
+            logged = dict(action, vid=vid)
+
+            if action_type == "feature.create":
+                fid = self.__next_fid
+                self.__next_fid += 1
+                state: FeatureState = {
+                    "vid": vid,
+                    "geom": _b64_to_wkb(action.get("geom")),
+                }
+                state["fields"] = {field["id"]: None for field in FIELDS}
+                state["fields"].update(dict(action.get("fields", [])))
+                self.__features[fid] = state
+                result["fid"] = fid
+                logged["fid"] = fid
+
+            elif action_type == "feature.update":
+                fid = action["fid"]
+                state = dict(self.__state(fid), vid=vid)
+                state["fields"] = dict(state["fields"])
+                state["fields"].update(dict(action.get("fields", [])))
+                if "geom" in action:
+                    state["geom"] = _b64_to_wkb(action["geom"])
+                self.__features[fid] = state
+
+            elif action_type == "feature.delete":
+                self.__deleted.add(action["fid"])
+                self.__features.pop(action["fid"], None)
+
+            elif action_type == "feature.restore":
+                self.__deleted.discard(action["fid"])
+
+            self.__log.append(logged)
+            self.__log_versions.append(vid)
+            results.append(result)
+
+        return results
+
+    def __write_export(self, path: Path, fid_field: str) -> None:
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(SRS_ID)
+
+        driver = ogr.GetDriverByName("GPKG")
+        dataset = driver.CreateDataSource(str(path))
+        layer = dataset.CreateLayer(
+            f"layer_{self.resource_id}",
+            srs,
+            ogr.wkbPoint,
+            [f"FID={fid_field}"],
+        )
+        for field in FIELDS:
+            layer.CreateField(
+                ogr.FieldDefn(field["keyname"], _OGR_TYPES[field["datatype"]])
+            )
+
+        layer_definition = layer.GetLayerDefn()
+        layer.StartTransaction()
+        for fid in range(1, self.__next_fid):
+            if fid in self.__deleted:
+                continue
+
+            state = self.__state(fid)
+            feature = ogr.Feature(layer_definition)
+            feature.SetFID(fid)
+            for index, field in enumerate(FIELDS):
+                value = state["fields"][field["id"]]
+                if value is None:
+                    feature.SetFieldNull(index)
+                else:
+                    feature.SetField(index, value)
+            if state["geom"] is not None:
+                geometry = ogr.CreateGeometryFromWkb(state["geom"])
+                feature.SetGeometry(geometry)
+            layer.CreateFeature(feature)
+        layer.CommitTransaction()
+
+        dataset = None
+
+
+def _b64_to_wkb(geom: Optional[str]) -> Optional[bytes]:
+    if geom is None or geom == "":
+        return None
+    return b64decode(geom)
+
+
+def _wkt_to_wkb(geom: Optional[str]) -> Optional[bytes]:
+    if geom is None or geom == "":
+        return None
+    return bytes(ogr.CreateGeometryFromWkt(geom).ExportToWkb(ogr.wkbNDR))
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    server: "_HttpServer"
+
+    RESOURCE = r"^/api/resource/(?P<resource_id>\d+)"
+    TRANSACTION = RESOURCE + r"/feature/transaction/(?P<transaction_id>\d+)$"
+
+    def do_GET(self) -> None:
+        self.__route("GET")
+
+    def do_POST(self) -> None:
+        self.__route("POST")
+
+    def do_PUT(self) -> None:
+        self.__route("PUT")
+
+    def do_PATCH(self) -> None:
+        self.__route("PATCH")
+
+    def do_DELETE(self) -> None:
+        self.__route("DELETE")
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def __route(self, method: str) -> None:
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+
+        routes = (
+            ("GET", self.RESOURCE + "$", self.__resource),
+            ("GET", self.RESOURCE + "/permission$", self.__permission),
+            ("GET", self.RESOURCE + "/feature_count$", self.__count),
+            ("GET", self.RESOURCE + "/feature/changes/check$", self.__check),
+            ("GET", self.RESOURCE + "/feature/changes/fetch$", self.__fetch),
+            ("GET", self.RESOURCE + "/export$", self.__export),
+            ("POST", self.RESOURCE + "/feature/transaction/?$", self.__begin),
+            ("PUT", self.TRANSACTION, self.__put),
+            ("POST", self.TRANSACTION, self.__commit),
+            ("GET", self.TRANSACTION, self.__result),
+            ("DELETE", self.TRANSACTION, self.__dispose),
+            ("PATCH", self.RESOURCE + "/feature/?$", self.__patch),
+            ("DELETE", self.RESOURCE + "/feature/?$", self.__delete),
+        )
+
+        for route_method, pattern, handler in routes:
+            match = re.match(pattern, url.path)
+            if route_method != method or match is None:
+                continue
+
+            self.server.fake_server.count_request(pattern)
+
+            layer = self.server.fake_server.layer(
+                int(match.group("resource_id"))
+            )
+            if layer is None:
+                self.__send_error(
+                    HTTPStatus.NOT_FOUND,
+                    "nextgisweb.resource.exception.ResourceNotFound",
+                )
+                return
+
+            try:
+                handler(layer, query, **match.groupdict())
+            except KeyError:
+                self.__send_error(
+                    HTTPStatus.NOT_FOUND,
+                    "nextgisweb.core.exception.ValidationError",
+                )
+            return
+
+        self.__read_body()
+        self.__send_error(
+            HTTPStatus.NOT_FOUND, "pyramid.httpexceptions.HTTPNotFound"
+        )
+
+    def __resource(self, layer: SyntheticLayer, query, **kwargs) -> None:
+        self.__send_json(layer.resource_json())
+
+    def __permission(self, layer: SyntheticLayer, query, **kwargs) -> None:
+        self.__send_json(
+            {
+                "resource": {"read": True},
+                "data": {"read": True, "write": True},
+            }
+        )
+
+    def __count(self, layer: SyntheticLayer, query, **kwargs) -> None:
+        self.__send_json({"total_count": layer.features_count})
+
+    def __check(self, layer: SyntheticLayer, query, **kwargs) -> None:
+        if not layer.is_versioning_enabled:
+            self.__send_error(
+                HTTPStatus.UNPROCESSABLE_ENTITY,
+                "nextgisweb.feature_layer.versioning.FVersioningNotEnabled",
+            )
+            return
+
+        initial = int(query.get("initial", 0))
+        self.__send_json(layer.check(self.__base_url(), initial))
+
+    def __fetch(self, layer: SyntheticLayer, query, **kwargs) -> None:
+        self.__send_json(
+            layer.changes_page(
+                self.__base_url(),
+                int(query["initial"]),
+                int(query["target"]),
+                int(query["cursor"]),
+            )
+        )
+
+    def __export(self, layer: SyntheticLayer, query, **kwargs) -> None:
+        export_path, etag = layer.export(query.get("fid", "fid"))
+        size = export_path.stat().st_size
+
+        offset = 0
+        range_header = self.headers.get("Range", "")
+        range_match = re.match(r"^bytes=(\d+)-$", range_header)
+        if range_match is not None and self.headers.get("If-Range") == etag:
+            offset = int(range_match.group(1))
+
+        if offset >= size > 0:
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if offset > 0:
+            self.send_response(HTTPStatus.PARTIAL_CONTENT)
+            self.send_header(
+                "Content-Range", f"bytes {offset}-{size - 1}/{size}"
+            )
+        else:
+            self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/geopackage+sqlite3")
+        self.send_header("Content-Length", str(size - offset))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.end_headers()
+
+        with export_path.open("rb") as export_file:
+            export_file.seek(offset)
+            while True:
+                chunk = export_file.read(1024 * 1024)
+                if len(chunk) == 0:
+                    break
+                self.wfile.write(chunk)
+
+    def __begin(self, layer: SyntheticLayer, query, **kwargs) -> None:
+        self.__read_body()
+        self.__send_json(layer.begin_transaction(), HTTPStatus.CREATED)
+
+    def __put(
+        self, layer: SyntheticLayer, query, transaction_id: str, **kwargs
+    ) -> None:
+        layer.put_actions(int(transaction_id), self.__read_body())
+        self.__send_json([])
+
+    def __commit(
+        self, layer: SyntheticLayer, query, transaction_id: str, **kwargs
+    ) -> None:
+        # Long running requests are suggested by the client, but answering
+        # synchronously is allowed
+        self.__read_body()
+        self.__send_json(layer.commit_transaction(int(transaction_id)))
+
+    def __result(
+        self, layer: SyntheticLayer, query, transaction_id: str, **kwargs
+    ) -> None:
+        self.__send_json(layer.transaction_result(int(transaction_id)))
+
+    def __dispose(
+        self, layer: SyntheticLayer, query, transaction_id: str, **kwargs
+    ) -> None:
+        self.__read_body()
+        layer.dispose_transaction(int(transaction_id))
+        self.__send_json(None)
+
+    def __patch(self, layer: SyntheticLayer, query, **kwargs) -> None:
+        self.__send_json(layer.patch_features(self.__read_body()))
+
+    def __delete(self, layer: SyntheticLayer, query, **kwargs) -> None:
+        layer.delete_features(self.__read_body())
+        self.__send_json(None)
+
+    def __base_url(self) -> str:
+        return f"http://{self.headers['Host']}"
+
+    def __read_body(self) -> Any:
+        length = int(self.headers.get("Content-Length", 0))
+        if length == 0:
+            return None
+        return json.loads(self.rfile.read(length).decode())
+
+    def __send_json(
+        self, value: Any, status: HTTPStatus = HTTPStatus.OK
+    ) -> None:
+        body = json.dumps(value).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def __send_error(self, status: HTTPStatus, exception: str) -> None:
+        self.__send_json(
+            {
+                "exception": exception,
+                "status_code": int(status),
+                "title": status.phrase,
+                "message": status.description,
+            },
+            status,
+        )
+
+
+class _HttpServer(ThreadingHTTPServer):
+    daemon_threads = True
+    fake_server: "FakeNgwServer"
+
+
+class FakeNgwServer:
+    """
+    HTTP server imitating NextGIS Web for synthetic layers.
+
+    Runs in a background thread of the current process and counts handled
+    requests by endpoint.
+    """
+
+    __layers: Dict[int, SyntheticLayer]
+    __requests: "Counter[str]"
+    __lock: threading.Lock
+    __http_server: _HttpServer
+    __thread: Optional[threading.Thread]
+
+    def __init__(self) -> None:
+        self.__layers = {}
+        self.__requests = Counter()
+        self.__lock = threading.Lock()
+        self.__http_server = _HttpServer(("127.0.0.1", 0), _RequestHandler)
+        self.__http_server.fake_server = self
+        self.__thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.__http_server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def requests_count(self) -> int:
+        with self.__lock:
+            return sum(self.__requests.values())
+
+    def add_layer(self, layer: SyntheticLayer) -> None:
+        with self.__lock:
+            self.__layers[layer.resource_id] = layer
+
+    def remove_layer(self, resource_id: int) -> None:
+        with self.__lock:
+            layer = self.__layers.pop(resource_id)
+        layer.remove_export()
+
+    def layer(self, resource_id: int) -> Optional[SyntheticLayer]:
+        with self.__lock:
+            return self.__layers.get(resource_id)
+
+    def count_request(self, endpoint: str) -> None:
+        with self.__lock:
+            self.__requests[endpoint] += 1
+
+    def start(self) -> None:
+        self.__thread = threading.Thread(
+            target=self.__http_server.serve_forever,
+            name="FakeNgwServer",
+            daemon=True,
+        )
+        self.__thread.start()
+
+    def stop(self) -> None:
+        self.__http_server.shutdown()
+        self.__http_server.server_close()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+        for resource_id in list(self.__layers.keys()):
+            self.remove_layer(resource_id)
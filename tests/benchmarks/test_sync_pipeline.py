@@ -0,0 +1,316 @@
+"""
+Synchronization pipeline benchmarks.
+
+Layers from 10k to 5M features are served by a local NextGIS Web
+stand-in, and every stage of the synchronization is timed. Benchmarks are
+skipped unless NG_CONNECT_BENCHMARK=1 is set. Other variables:
+
+* NG_CONNECT_BENCHMARK_SIZES: comma-separated features counts;
+* NG_CONNECT_BENCHMARK_REPORT: path to save the JSON report to;
+* NG_CONNECT_BENCHMARK_BASELINE: JSON report of a previous run. Stages
+  slower than in it are reported as failures;
+* NG_CONNECT_BENCHMARK_TOLERANCE: allowed slowdown factor, 1.5 by default.
+"""
+
+import os
+import sys
+import unittest
+import uuid
+from contextlib import closing
+from pathlib import Path
+from typing import ClassVar, ContextManager, Optional
+
+from nextgis_connect.detached_editing.conflicts.detector import (
+    ConflictsDetector,
+)
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
+from nextgis_connect.detached_editing.delta_journal import DeltaJournal
+from nextgis_connect.detached_editing.detached_layer_factory import (
+    DetachedLayerFactory,
+)
+from nextgis_connect.detached_editing.metadata_cache import (
+    cached_container_metadata,
+)
+from nextgis_connect.detached_editing.tasks import (
+    ApplyDeltaTask,
+    DetachedEditingTask,
+    FetchDeltaTask,
+    FillLayerWithoutVersioningTask,
+    FillLayerWithVersioning,
+    UploadChangesTask,
+)
+from nextgis_connect.ngw_connection import NgwConnection, NgwConnectionsManager
+from nextgis_connect.utils import wrap_sql_table_name
+from tests.benchmarks.fake_ngw_server import FakeNgwServer, SyntheticLayer
+from tests.benchmarks.utils import (
+    BENCHMARK_ENABLED,
+    BenchmarkReport,
+    benchmark_sizes,
+    benchmark_tolerance,
+)
+from tests.ng_connect_testcase import NgConnectTestCase
+
+# Every LOCAL_STEP-th feature is changed locally and every REMOTE_STEP-th
+# one remotely. Every CONFLICT_STEP-th feature is changed in both places
+LOCAL_STEP = 100
+REMOTE_STEP = 100
+CONFLICT_STEP = 1000
+
+INTEGER_FIELD_ID = 1001
+STRING_FIELD_ID = 1004
+
+
+@unittest.skipUnless(
+    BENCHMARK_ENABLED, "Set NG_CONNECT_BENCHMARK=1 to run benchmarks"
+)
+class TestSyncPipelineBenchmark(NgConnectTestCase):
+    server: ClassVar[FakeNgwServer]
+    connection: ClassVar[NgwConnection]
+    report: ClassVar[BenchmarkReport]
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+
+        cls.server = FakeNgwServer()
+        cls.server.start()
+
+        cls.connection = NgwConnection(
+            str(uuid.uuid4()), "BENCHMARK_CONNECTION", cls.server.url, None
+        )
+        NgwConnectionsManager().save(cls.connection)
+
+        cls.report = BenchmarkReport()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        print(f"\n{cls.report.format()}", file=sys.stderr)  # noqa: T201
+
+        report_path = os.environ.get("NG_CONNECT_BENCHMARK_REPORT")
+        if report_path:
+            cls.report.save(Path(report_path))
+
+        NgwConnectionsManager().remove(cls.connection.id)
+        cls.server.stop()
+
+        super().tearDownClass()
+
+    def test_versioned_layer(self) -> None:
+        for features_count in benchmark_sizes():
+            with self.subTest(features_count=features_count):
+                self.__benchmark_versioned_layer(features_count)
+
+        self.__check_regressions("versioning")
+
+    def test_not_versioned_layer(self) -> None:
+        for features_count in benchmark_sizes():
+            with self.subTest(features_count=features_count):
+                self.__benchmark_not_versioned_layer(features_count)
+
+        self.__check_regressions("export")
+
+    def __benchmark_versioned_layer(self, features_count: int) -> None:
+        scenario = "versioning"
+        layer = SyntheticLayer(
+            self.__resource_id(features_count, is_versioning_enabled=True),
+            features_count,
+        )
+        self.server.add_layer(layer)
+        container_path = self.create_temp_file(".gpkg")
+        connection_pool: Optional[ContainerConnectionPool] = None
+
+        try:
+            with self.__stage(scenario, features_count, "fill"):
+                self.__create_container(layer, container_path)
+                connection_pool = ContainerConnectionPool(container_path)
+                self.__run(
+                    FillLayerWithVersioning(
+                        container_path, connection_pool=connection_pool
+                    )
+                )
+
+            self.__edit_locally(connection_pool, container_path)
+            layer.update_features(
+                range(REMOTE_STEP // 2, features_count + 1, REMOTE_STEP),
+                {INTEGER_FIELD_ID: -1},
+            )
+            layer.update_features(
+                range(CONFLICT_STEP, features_count + 1, CONFLICT_STEP),
+                {STRING_FIELD_ID: "Remote"},
+            )
+
+            with self.__stage(scenario, features_count, "fetch"):
+                fetch_task = FetchDeltaTask(
+                    container_path, connection_pool=connection_pool
+                )
+                self.__run(fetch_task)
+
+            with self.__stage(scenario, features_count, "conflicts"):
+                metadata = cached_container_metadata(
+                    container_path, connection_pool
+                )
+                journal = DeltaJournal(connection_pool, metadata)
+                detector = ConflictsDetector(
+                    container_path, metadata, connection_pool
+                )
+                conflicts = detector.detect(journal.locally_changed_actions())
+
+            self.assertEqual(
+                set(conflict.fid for conflict in conflicts),
+                set(range(CONFLICT_STEP, features_count + 1, CONFLICT_STEP)),
+            )
+
+            with self.__stage(scenario, features_count, "apply"):
+                self.__run(
+                    ApplyDeltaTask(
+                        container_path,
+                        fetch_task.target,
+                        fetch_task.timestamp,
+                        connection_pool=connection_pool,
+                    )
+                )
+
+            with self.__stage(scenario, features_count, "upload"):
+                self.__run(
+                    UploadChangesTask(
+                        container_path, connection_pool=connection_pool
+                    )
+                )
+
+        finally:
+            if connection_pool is not None:
+                connection_pool.close()
+            self.server.remove_layer(layer.resource_id)
+
+    def __benchmark_not_versioned_layer(self, features_count: int) -> None:
+        scenario = "export"
+        layer = SyntheticLayer(
+            self.__resource_id(features_count, is_versioning_enabled=False),
+            features_count,
+            is_versioning_enabled=False,
+        )
+        self.server.add_layer(layer)
+        container_path = self.create_temp_file(".gpkg")
+        connection_pool: Optional[ContainerConnectionPool] = None
+
+        # Export is built by the server once, so only downloading is timed
+        layer.export("fid")
+
+        try:
+            with self.__stage(scenario, features_count, "fill"):
+                self.__create_container(layer, container_path)
+                connection_pool = ContainerConnectionPool(container_path)
+                self.__run(
+                    FillLayerWithoutVersioningTask(
+                        container_path, connection_pool=connection_pool
+                    )
+                )
+
+            self.__edit_locally(connection_pool, container_path)
+
+            with self.__stage(scenario, features_count, "upload"):
+                self.__run(
+                    UploadChangesTask(
+                        container_path, connection_pool=connection_pool
+                    )
+                )
+
+        finally:
+            if connection_pool is not None:
+                connection_pool.close()
+            self.server.remove_layer(layer.resource_id)
+
+    def __create_container(
+        self, layer: SyntheticLayer, container_path: Path
+    ) -> None:
+        ngw_layer = self.resource(layer.resource_json(), self.connection)
+        factory = DetachedLayerFactory()
+        factory.create_initial_container(ngw_layer, container_path)
+
+    def __edit_locally(
+        self,
+        connection_pool: Optional[ContainerConnectionPool],
+        container_path: Path,
+    ) -> None:
+        """
+        Changes features as the layer editing would do.
+
+        Every LOCAL_STEP-th feature gets a new string value, and features
+        next to them are deleted.
+        """
+        assert connection_pool is not None
+        metadata = cached_container_metadata(container_path, connection_pool)
+        table_name = wrap_sql_table_name(metadata.table_name)
+        fid_field = wrap_sql_table_name(metadata.fid_field)
+        string_field = metadata.fields.get_with(ngw_id=STRING_FIELD_ID)
+
+        with connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            cursor.execute(
+                "SELECT fid, ngw_fid FROM ngw_features_metadata"
+                f" WHERE ngw_fid % {LOCAL_STEP} IN (0, 1)"  # nosec B608
+            )
+            rows = cursor.fetchall()
+            updated_fids = [
+                fid for fid, ngw_fid in rows if ngw_fid % LOCAL_STEP == 0
+            ]
+            deleted_fids = [
+                fid for fid, ngw_fid in rows if ngw_fid % LOCAL_STEP == 1
+            ]
+
+            cursor.executemany(
+                f"UPDATE {table_name}"
+                f" SET {wrap_sql_table_name(string_field.keyname)} = 'Local'"
+                f" WHERE {fid_field} = ?",  # nosec B608
+                ((fid,) for fid in updated_fids),
+            )
+            cursor.executemany(
+                "INSERT INTO ngw_updated_attributes (fid, attribute)"
+                " VALUES (?, ?)",
+                ((fid, string_field.attribute) for fid in updated_fids),
+            )
+
+            cursor.executemany(
+                f"DELETE FROM {table_name} WHERE {fid_field} = ?",  # nosec B608
+                ((fid,) for fid in deleted_fids),
+            )
+            cursor.executemany(
+                "INSERT INTO ngw_removed_features (fid) VALUES (?)",
+                ((fid,) for fid in deleted_fids),
+            )
+
+    def __run(self, task: DetachedEditingTask) -> None:
+        result = task.run()
+        self.assertTrue(result, msg=repr(task.error))
+
+    def __stage(
+        self, scenario: str, features_count: int, stage: str
+    ) -> ContextManager[None]:
+        return self.report.stage(
+            scenario,
+            features_count,
+            stage,
+            lambda: self.server.requests_count,
+        )
+
+    def __check_regressions(self, scenario: str) -> None:
+        baseline_path = os.environ.get("NG_CONNECT_BENCHMARK_BASELINE")
+        if not baseline_path:
+            return
+
+        regressions = self.report.regressions(
+            Path(baseline_path), scenario, benchmark_tolerance()
+        )
+        self.assertEqual(regressions, [])
+
+    def __resource_id(
+        self, features_count: int, *, is_versioning_enabled: bool
+    ) -> int:
+        return features_count * 10 + int(is_versioning_enabled)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,215 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Benchmarks are slow, so they are run only if the variable is set
+BENCHMARK_ENABLED = os.environ.get("NG_CONNECT_BENCHMARK", "") not in (
+    "",
+    "0",
+)
+
+DEFAULT_SIZES = "10000,100000,1000000,5000000"
+
+# Stage is reported as regression if it is slower than the baseline by
+# this factor and by at least MIN_REGRESSION_SECONDS
+DEFAULT_TOLERANCE = 1.5
+MIN_REGRESSION_SECONDS = 0.5
+
+
+def benchmark_sizes() -> List[int]:
+    sizes = os.environ.get("NG_CONNECT_BENCHMARK_SIZES", DEFAULT_SIZES)
+    return [int(size) for size in sizes.split(",") if size.strip() != ""]
+
+
+def benchmark_tolerance() -> float:
+    tolerance = os.environ.get("NG_CONNECT_BENCHMARK_TOLERANCE")
+    return float(tolerance) if tolerance else DEFAULT_TOLERANCE
+
+
+def _resident_memory() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+class MemorySampler:
+    """
+    Samples resident memory of the process in a background thread.
+
+    Memory is read from /proc, so peaks are not available on other
+    platforms.
+    """
+
+    INTERVAL = 0.01  # seconds
+
+    __start: Optional[int]
+    __peak: Optional[int]
+    __stop_event: threading.Event
+    __thread: Optional[threading.Thread]
+
+    def __init__(self) -> None:
+        self.__start = None
+        self.__peak = None
+        self.__stop_event = threading.Event()
+        self.__thread = None
+
+    @property
+    def peak_growth(self) -> Optional[int]:
+        """Peak memory growth in bytes since the start of sampling"""
+        if self.__start is None or self.__peak is None:
+            return None
+        return max(self.__peak - self.__start, 0)
+
+    def start(self) -> None:
+        self.__start = _resident_memory()
+        self.__peak = self.__start
+        if self.__start is None:
+            return
+
+        self.__stop_event.clear()
+        self.__thread = threading.Thread(
+            target=self.__sample, name="NgConnectMemorySampler", daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self) -> None:
+        if self.__thread is None:
+            return
+
+        self.__stop_event.set()
+        self.__thread.join()
+        self.__thread = None
+        self.__update_peak()
+
+    def __sample(self) -> None:
+        while not self.__stop_event.wait(self.INTERVAL):
+            self.__update_peak()
+
+    def __update_peak(self) -> None:
+        memory = _resident_memory()
+        if memory is not None and self.__peak is not None:
+            self.__peak = max(self.__peak, memory)
+
+
+@dataclass
+class StageResult:
+    scenario: str
+    features_count: int
+    stage: str
+    seconds: float
+    cpu_seconds: float
+    peak_memory: Optional[int]
+    requests_count: int
+
+    @property
+    def key(self) -> Tuple[str, int, str]:
+        return self.scenario, self.features_count, self.stage
+
+
+class BenchmarkReport:
+    """Timings and memory peaks of measured stages"""
+
+    __results: List[StageResult]
+
+    def __init__(self) -> None:
+        self.__results = []
+
+    @property
+    def results(self) -> List[StageResult]:
+        return self.__results
+
+    @contextmanager
+    def stage(
+        self,
+        scenario: str,
+        features_count: int,
+        stage: str,
+        requests_counter: Callable[[], int],
+    ) -> Iterator[None]:
+        sampler = MemorySampler()
+        requests_before = requests_counter()
+        sampler.start()
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            cpu_seconds = time.process_time() - cpu_start
+            sampler.stop()
+
+        self.__results.append(
+            StageResult(
+                scenario=scenario,
+                features_count=features_count,
+                stage=stage,
+                seconds=seconds,
+                cpu_seconds=cpu_seconds,
+                peak_memory=sampler.peak_growth,
+                requests_count=requests_counter() - requests_before,
+            )
+        )
+
+    def regressions(
+        self, baseline_path: Path, scenario: str, tolerance: float
+    ) -> List[str]:
+        """Compares timings of the scenario with a previous report"""
+        baseline: Dict[Tuple[str, int, str], float] = {}
+        for result in json.loads(baseline_path.read_text()):
+            key = (
+                result["scenario"],
+                result["features_count"],
+                result["stage"],
+            )
+            baseline[key] = result["seconds"]
+
+        regressions = []
+        for result in self.__results:
+            if result.scenario != scenario or result.key not in baseline:
+                continue
+
+            baseline_seconds = baseline[result.key]
+            if (
+                result.seconds > baseline_seconds * tolerance
+                and result.seconds - baseline_seconds > MIN_REGRESSION_SECONDS
+            ):
+                regressions.append(
+                    f"{result.scenario}/{result.features_count}/{result.stage}:"
+                    f" {result.seconds:.2f} s (baseline {baseline_seconds:.2f} s)"
+                )
+
+        return regressions
+
+    def save(self, path: Path) -> None:
+        path.write_text(
+            json.dumps([asdict(result) for result in self.__results], indent=2)
+        )
+
+    def format(self) -> str:
+        header = (
+            f"{'scenario':<12} {'features':>9} {'stage':<10} {'time, s':>9}"
+            f" {'cpu, s':>9} {'peak, MiB':>10} {'requests':>9}"
+        )
+        lines = [header, "-" * len(header)]
+        for result in self.__results:
+            peak = (
+                f"{result.peak_memory / 2**20:.1f}"
+                if result.peak_memory is not None
+                else "n/a"
+            )
+            lines.append(
+                f"{result.scenario:<12} {result.features_count:>9}"
+                f" {result.stage:<10} {result.seconds:>9.2f}"
+                f" {result.cpu_seconds:>9.2f} {peak:>10}"
+                f" {result.requests_count:>9}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,67 @@
+import unittest
+from contextlib import closing
+from unittest.mock import MagicMock
+
+from qgis.core import QgsVectorLayer
+
+from nextgis_connect.detached_editing.action_extractor import ActionExtractor
+from nextgis_connect.detached_editing.actions import (
+    FeatureDeleteAction,
+    FeatureUpdateAction,
+)
+from tests.detached_editing.utils import mock_container
+from tests.ng_connect_testcase import NgConnectTestCase, TestData
+
+
+class TestActionExtractor(NgConnectTestCase):
+    @mock_container(TestData.Points, is_versioning_enabled=True)
+    def test_iterate_all(
+        self, container_mock: MagicMock, qgs_layer: QgsVectorLayer
+    ) -> None:
+        connection_pool = container_mock.connection_pool
+        with connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            fids = [
+                row[0]
+                for row in cursor.execute(
+                    "SELECT fid FROM ngw_features_metadata ORDER BY fid"
+                )
+            ]
+            updated_fids = fids[:3]
+            removed_fids = fids[3:5]
+            cursor.executemany(
+                "INSERT INTO ngw_updated_geometries VALUES (?, NULL)",
+                ((fid,) for fid in updated_fids),
+            )
+            cursor.executemany(
+                "INSERT INTO ngw_updated_attributes VALUES (?, 1, NULL)",
+                ((fid,) for fid in updated_fids[1:]),
+            )
+            cursor.executemany(
+                "INSERT INTO ngw_removed_features VALUES (?, NULL)",
+                ((fid,) for fid in removed_fids),
+            )
+
+        extractor = ActionExtractor(
+            container_mock.path, container_mock.metadata, connection_pool
+        )
+
+        self.assertEqual(extractor.count_all(), 5)
+
+        batches = list(extractor.iterate_all(batch_size=2))
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+
+        actions = [action for batch in batches for action in batch]
+        self.assertEqual(
+            [type(action) for action in actions],
+            [FeatureDeleteAction] * 2 + [FeatureUpdateAction] * 3,
+        )
+        self.assertEqual(
+            [(action.fid, action.geom) for action in actions],
+            [(action.fid, action.geom) for action in extractor.extract_all()],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
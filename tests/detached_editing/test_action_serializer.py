@@ -0,0 +1,55 @@
+import json
+import unittest
+from unittest.mock import MagicMock
+
+from nextgis_connect.detached_editing.action_serializer import ActionSerializer
+from nextgis_connect.detached_editing.actions import (
+    FeatureCreateAction,
+    FeatureDeleteAction,
+    FeatureUpdateAction,
+)
+from tests.ng_connect_testcase import NgConnectTestCase
+
+
+class TestActionSerializer(NgConnectTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        metadata = MagicMock()
+        metadata.is_versioning_enabled = True
+        self.serializer = ActionSerializer(metadata)
+        self.actions = [
+            FeatureCreateAction(-1, None, "POINT (1 1)", [[1, "a" * 100]]),
+            FeatureUpdateAction(10, 2, "POINT (2 2)"),
+            FeatureDeleteAction(11, 2),
+            FeatureUpdateAction(12, 2, None, [[1, "b" * 500]]),
+            FeatureDeleteAction(13, 2),
+        ]
+
+    def test_batches_by_count(self) -> None:
+        batches = list(
+            self.serializer.to_json_batches(self.actions, 2, 1024 * 1024)
+        )
+
+        self.assertEqual([count for count, _ in batches], [2, 2, 1])
+        self.assertEqual(
+            [json.loads(body) for _, body in batches],
+            [
+                json.loads(self.serializer.to_json(self.actions[0:2], 0)),
+                json.loads(self.serializer.to_json(self.actions[2:4], 2)),
+                json.loads(self.serializer.to_json(self.actions[4:5], 4)),
+            ],
+        )
+
+    def test_batches_by_size(self) -> None:
+        batches = list(self.serializer.to_json_batches(self.actions, 100, 300))
+
+        # Large update action is sent alone
+        self.assertEqual([count for count, _ in batches], [2, 1, 1, 1])
+        self.assertTrue(all(len(body) <= 300 for _, body in batches[:2]))
+
+        numbers = [item[0] for _, body in batches for item in json.loads(body)]
+        self.assertEqual(numbers, list(range(len(self.actions))))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,191 @@
+import json
+import unittest
+from base64 import b64encode
+from contextlib import closing
+from unittest.mock import MagicMock
+
+from qgis.core import QgsGeometry, QgsVectorLayer
+
+from nextgis_connect.detached_editing.backup_serialization import (
+    FeatureBackup,
+    FeatureState,
+    deserialize_geometry_backup,
+    deserialize_value_backup,
+    geometry_to_wkb,
+    serialize_feature_backup,
+    serialize_geometry_backup,
+    serialize_value_backup,
+)
+from nextgis_connect.detached_editing.detached_layer_factory import (
+    DetachedLayerFactory,
+)
+from nextgis_connect.detached_editing.utils import container_metadata
+from tests.detached_editing.utils import mock_container
+from tests.ng_connect_testcase import NgConnectTestCase, TestData
+
+
+class TestBackupSerialization(NgConnectTestCase):
+    def test_values(self) -> None:
+        values = [
+            None,
+            True,
+            False,
+            0,
+            -(2**63),
+            2**63 - 1,
+            2**64,
+            1.5,
+            "",
+            "текст",
+            "x" * 1000,
+            {"year": 2024},
+        ]
+        for value in values:
+            with self.subTest(value=value):
+                backup = serialize_value_backup(value)
+                self.assertIsInstance(backup, bytes)
+                self.assertEqual(deserialize_value_backup(backup), value)
+                self.assertIs(
+                    type(deserialize_value_backup(backup)), type(value)
+                )
+
+        self.assertLessEqual(
+            len(serialize_value_backup(12345)), len(json.dumps(12345))
+        )
+        self.assertEqual(deserialize_value_backup('"legacy"'), "legacy")
+        self.assertIsNone(deserialize_value_backup(None))
+
+    def test_geometries(self) -> None:
+        geometry = QgsGeometry.fromWkt("LineString (0 0, 1 1, 2 0)")
+
+        backup = serialize_geometry_backup(geometry)
+        self.assertTrue(
+            deserialize_geometry_backup(backup, False).equals(geometry)
+        )
+        self.assertTrue(
+            deserialize_geometry_backup(
+                serialize_geometry_backup(None), True
+            ).isEmpty()
+        )
+
+        legacy_wkb64 = b64encode(geometry_to_wkb(geometry)).decode()
+        self.assertTrue(
+            deserialize_geometry_backup(legacy_wkb64, True).equals(geometry)
+        )
+        self.assertTrue(
+            deserialize_geometry_backup(geometry.asWkt(), False).equals(
+                geometry
+            )
+        )
+
+    def test_features(self) -> None:
+        wkb = geometry_to_wkb(QgsGeometry.fromWkt("Point (1 2)"))
+        after_sync = FeatureState([(1, "a"), (2, 1), (3, None)], wkb)
+        before_deletion = FeatureState([(1, "b"), (2, 1), (3, None)], wkb)
+
+        backup = FeatureBackup(
+            serialize_feature_backup(after_sync, before_deletion), False
+        )
+        self.assertEqual(backup.after_sync, after_sync)
+        self.assertEqual(backup.before_deletion, before_deletion)
+        self.assertTrue(
+            backup.after_sync.geometry().equals(
+                QgsGeometry.fromWkt("Point (1 2)")
+            )
+        )
+
+        legacy_backup = FeatureBackup(
+            json.dumps(
+                {
+                    "after_sync": {"fields": [[1, "a"]], "geom": ""},
+                    "before_deletion": {
+                        "fields": [[1, "b"]],
+                        "geom": "Point (1 2)",
+                    },
+                }
+            ),
+            False,
+        )
+        self.assertEqual(legacy_backup.after_sync, FeatureState([(1, "a")]))
+        self.assertTrue(legacy_backup.after_sync.geometry().isEmpty())
+        self.assertEqual(legacy_backup.before_deletion.fields, [(1, "b")])
+
+    @mock_container(TestData.Points)
+    def test_upgrade(
+        self, container_mock: MagicMock, qgs_layer: QgsVectorLayer
+    ) -> None:
+        geometry = QgsGeometry.fromWkt("Point (1 2)")
+        legacy_feature = json.dumps(
+            {
+                "after_sync": {"fields": [[1, 5]], "geom": geometry.asWkt()},
+                "before_deletion": {"fields": [[1, 6]], "geom": ""},
+            }
+        )
+
+        connection_pool = container_mock.connection_pool
+        with connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            cursor.execute(
+                "UPDATE ngw_metadata SET container_version=?", ("2.0.0",)
+            )
+            cursor.execute("SELECT fid FROM ngw_features_metadata LIMIT 2")
+            (updated_fid,), (removed_fid,) = cursor.fetchall()
+            cursor.execute("SELECT attribute FROM ngw_fields_metadata LIMIT 2")
+            (first_attribute,), (second_attribute,) = cursor.fetchall()
+
+            cursor.executemany(
+                "INSERT INTO ngw_updated_attributes VALUES (?, ?, ?)",
+                [
+                    (updated_fid, first_attribute, json.dumps("value")),
+                    (updated_fid, second_attribute, None),
+                ],
+            )
+            cursor.execute(
+                "INSERT INTO ngw_updated_geometries VALUES (?, ?)",
+                (updated_fid, geometry.asWkt()),
+            )
+            cursor.execute(
+                "INSERT INTO ngw_removed_features VALUES (?, ?)",
+                (removed_fid, legacy_feature),
+            )
+
+            factory = DetachedLayerFactory()
+            self.assertTrue(factory.upgrade_container(cursor))
+            self.assertFalse(factory.upgrade_container(cursor))
+            self.assertFalse(factory.needs_upgrade(container_metadata(cursor)))
+
+            attributes = dict(
+                cursor.execute(
+                    "SELECT attribute, backup FROM ngw_updated_attributes"
+                )
+            )
+            self.assertEqual(
+                deserialize_value_backup(attributes[first_attribute]), "value"
+            )
+            self.assertIsNone(attributes[second_attribute])
+
+            geometry_backup = cursor.execute(
+                "SELECT backup FROM ngw_updated_geometries"
+            ).fetchone()[0]
+            self.assertTrue(
+                deserialize_geometry_backup(geometry_backup, False).equals(
+                    geometry
+                )
+            )
+
+            feature_backup = FeatureBackup(
+                cursor.execute(
+                    "SELECT backup FROM ngw_removed_features"
+                ).fetchone()[0],
+                False,
+            )
+            self.assertEqual(feature_backup.after_sync.fields, [(1, 5)])
+            self.assertEqual(feature_backup.before_deletion.fields, [(1, 6)])
+            self.assertTrue(
+                feature_backup.before_deletion.geometry().isEmpty()
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
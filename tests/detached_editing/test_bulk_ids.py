@@ -0,0 +1,89 @@
+import sqlite3
+import unittest
+from contextlib import closing
+
+from nextgis_connect.detached_editing.bulk_ids import (
+    JSON_IDS,
+    fill_temp_attributes,
+    fill_temp_fids,
+    fill_temp_ngw_fids,
+    json_ids,
+    json_ids_subquery,
+)
+from tests.ng_connect_testcase import NgConnectTestCase
+
+
+class TestBulkIds(NgConnectTestCase):
+    def test_temp_tables(self) -> None:
+        with closing(sqlite3.connect(":memory:")) as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            fids = fill_temp_fids(cursor, [3, 1, 3])
+            self.assertEqual(
+                [row[0] for row in cursor.execute(f"SELECT id FROM {fids}")],
+                [1, 3],
+            )
+
+            # Tables are refilled on every call
+            fids = fill_temp_fids(cursor, [2])
+            self.assertEqual(
+                cursor.execute(f"SELECT id FROM {fids}").fetchall(), [(2,)]
+            )
+
+            ngw_fids = fill_temp_ngw_fids(cursor, iter([10, 20]))
+            self.assertEqual(
+                cursor.execute(f"SELECT COUNT(*) FROM {ngw_fids}").fetchone(),
+                (2,),
+            )
+            self.assertNotEqual(fids, ngw_fids)
+
+            cursor.execute(
+                """
+                CREATE TABLE changes (
+                    fid INTEGER, attribute INTEGER,
+                    PRIMARY KEY (fid, attribute)
+                )
+                """
+            )
+            cursor.executemany(
+                "INSERT INTO changes VALUES (?, ?)",
+                [(fid, attribute) for fid in range(3) for attribute in (1, 2)],
+            )
+            attributes = fill_temp_attributes(cursor, [(0, 1), (2, 2)])
+            cursor.execute(
+                f"""
+                DELETE FROM changes
+                WHERE (fid, attribute) IN (
+                    SELECT fid, attribute FROM {attributes}
+                )
+                """
+            )
+            self.assertEqual(
+                cursor.execute("SELECT * FROM changes").fetchall(),
+                [(0, 2), (1, 1), (1, 2), (2, 1)],
+            )
+
+    def test_json_ids(self) -> None:
+        with closing(sqlite3.connect(":memory:")) as connection:
+            rows = connection.execute(
+                f"SELECT value FROM ({JSON_IDS}) ORDER BY value",
+                (json_ids({5, 1}),),
+            ).fetchall()
+            self.assertEqual(rows, [(1,), (5,)])
+
+            rows = connection.execute(JSON_IDS, (json_ids([]),)).fetchall()
+            self.assertEqual(rows, [])
+
+            rows = connection.execute(
+                f"""
+                SELECT value FROM ({json_ids_subquery("?2")})
+                WHERE value > ?1
+                ORDER BY value
+                """,
+                (2, json_ids([1, 3, 4])),
+            ).fetchall()
+            self.assertEqual(rows, [(3,), (4,)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import sqlite3
+import unittest
+from contextlib import closing
+
+from nextgis_connect.detached_editing.change_counters import (
+    ensure_change_counters,
+    has_change_counters,
+    read_change_counters,
+    repair_change_counters,
+)
+from tests.ng_connect_testcase import NgConnectTestCase
+
+SCHEMA = """
+    CREATE TABLE gpkg_contents (table_name TEXT, data_type TEXT);
+    INSERT INTO gpkg_contents VALUES ('layer', 'features');
+    CREATE TABLE layer (fid INTEGER PRIMARY KEY);
+    CREATE TABLE ngw_added_features (fid INTEGER PRIMARY KEY);
+    CREATE TABLE ngw_removed_features (fid INTEGER PRIMARY KEY, backup);
+    CREATE TABLE ngw_restored_features (fid INTEGER PRIMARY KEY);
+    CREATE TABLE ngw_updated_attributes (
+        fid INTEGER, attribute INTEGER, backup, PRIMARY KEY (fid, attribute)
+    );
+    CREATE TABLE ngw_updated_geometries (fid INTEGER PRIMARY KEY, backup);
+    INSERT INTO layer VALUES (1), (2), (3);
+    INSERT INTO ngw_updated_attributes VALUES (1, 1, NULL), (1, 2, NULL);
+"""
+
+
+class TestChangeCounters(NgConnectTestCase):
+    def test_counters(self) -> None:
+        with closing(sqlite3.connect(":memory:")) as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            cursor.executescript(SCHEMA)
+
+            self.assertIsNone(read_change_counters(cursor))
+            self.assertTrue(ensure_change_counters(cursor))
+            self.assertFalse(ensure_change_counters(cursor))
+
+            counters = read_change_counters(cursor)
+            assert counters is not None
+            self.assertEqual(counters["features"], 3)
+            self.assertEqual(counters["updated_attributes"], 1)
+
+            cursor.executescript(
+                """
+                INSERT INTO layer VALUES (4), (5);
+                INSERT INTO ngw_added_features VALUES (4), (5);
+                DELETE FROM layer WHERE fid = 2;
+                INSERT INTO ngw_removed_features VALUES (2, NULL);
+                INSERT INTO ngw_updated_attributes VALUES (3, 1, NULL);
+                INSERT INTO ngw_updated_geometries VALUES (3, NULL);
+                DELETE FROM ngw_updated_attributes
+                    WHERE fid = 1 AND attribute = 1;
+                """
+            )
+            counters = read_change_counters(cursor)
+            assert counters is not None
+            self.assertEqual(
+                counters,
+                {
+                    "features": 4,
+                    "added_features": 2,
+                    "removed_features": 1,
+                    "restored_features": 0,
+                    "updated_attributes": 2,
+                    "updated_geometries": 1,
+                },
+            )
+            self.assertFalse(repair_change_counters(cursor))
+
+            cursor.execute("DELETE FROM ngw_updated_attributes WHERE fid = 1")
+            counters = read_change_counters(cursor)
+            assert counters is not None
+            self.assertEqual(counters["updated_attributes"], 1)
+
+            # Damaged values are fixed by repair
+            cursor.execute("UPDATE ngw_counters SET value = 100")
+            self.assertTrue(repair_change_counters(cursor))
+            counters = read_change_counters(cursor)
+            assert counters is not None
+            self.assertEqual(counters["features"], 4)
+
+    def test_lost_triggers(self) -> None:
+        with closing(sqlite3.connect(":memory:")) as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            cursor.executescript(SCHEMA)
+            ensure_change_counters(cursor)
+
+            cursor.execute("DROP TRIGGER ngw_counters_features_insert")
+            self.assertFalse(has_change_counters(cursor))
+            self.assertIsNone(read_change_counters(cursor))
+
+            self.assertTrue(ensure_change_counters(cursor))
+            self.assertTrue(has_change_counters(cursor))
+
+
+if __name__ == "__main__":
+    unittest.main()
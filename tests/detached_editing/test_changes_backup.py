@@ -0,0 +1,88 @@
+import unittest
+from contextlib import closing
+from unittest.mock import MagicMock
+
+from qgis.core import QgsFeature, QgsVectorLayer
+
+from nextgis_connect.detached_editing.backup_serialization import (
+    deserialize_geometry_backup,
+    deserialize_value_backup,
+)
+from nextgis_connect.detached_editing.changes_backup import ChangesBackup
+from nextgis_connect.detached_editing.serialization import simplify_value
+from tests.detached_editing.utils import mock_container
+from tests.ng_connect_testcase import NgConnectTestCase, TestData
+
+
+class TestChangesBackup(NgConnectTestCase):
+    @mock_container(TestData.Points, is_versioning_enabled=True)
+    def test_capture(
+        self, container_mock: MagicMock, qgs_layer: QgsVectorLayer
+    ) -> None:
+        metadata = container_mock.metadata
+        connection_pool = container_mock.connection_pool
+
+        changed_feature, deleted_feature = list(qgs_layer.getFeatures())[:2]
+        assert isinstance(changed_feature, QgsFeature)
+        assert isinstance(deleted_feature, QgsFeature)
+        field = metadata.fields[0]
+
+        changes_backup = ChangesBackup(connection_pool)
+        changes_backup.capture(
+            metadata,
+            qgs_layer.dataProvider(),
+            {changed_feature.id(): {field.attribute: "changed"}},
+            [changed_feature.id()],
+            {deleted_feature.id()},
+        )
+
+        with connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            changes_backup.save_updated_attributes(cursor)
+            changes_backup.save_updated_geometries(cursor)
+
+            attributes = cursor.execute(
+                "SELECT fid, attribute, backup FROM ngw_updated_attributes"
+            ).fetchall()
+            self.assertEqual(len(attributes), 1)
+            fid, attribute, backup = attributes[0]
+            self.assertEqual(
+                (fid, attribute), (changed_feature.id(), field.attribute)
+            )
+            self.assertEqual(
+                deserialize_value_backup(backup),
+                simplify_value(changed_feature.attribute(field.attribute)),
+            )
+
+            geometries = cursor.execute(
+                "SELECT fid, backup FROM ngw_updated_geometries"
+            ).fetchall()
+            self.assertEqual(len(geometries), 1)
+            self.assertEqual(geometries[0][0], changed_feature.id())
+            self.assertTrue(
+                deserialize_geometry_backup(geometries[0][1], True).equals(
+                    changed_feature.geometry()
+                )
+            )
+
+            states = changes_backup.deleted_features_states(
+                cursor, metadata, {deleted_feature.id()}
+            )
+
+        state = states[deleted_feature.id()]
+        self.assertEqual(
+            state.fields,
+            [
+                (
+                    field.ngw_id,
+                    simplify_value(deleted_feature.attribute(field.attribute)),
+                )
+                for field in metadata.fields
+            ],
+        )
+        self.assertTrue(state.geometry().equals(deleted_feature.geometry()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from nextgis_connect.detached_editing.changes_pages_prefetcher import (
+    ChangesPagesPrefetcher,
+)
+from tests.ng_connect_testcase import NgConnectTestCase
+
+MODULE = "nextgis_connect.detached_editing.changes_pages_prefetcher"
+
+
+def make_pages(count: int):
+    pages = {}
+    for i in range(count):
+        url = "/fetch" if i == 0 else f"/fetch?cursor={i}"
+        pages[url] = [
+            {"action": "feature.update", "fid": i, "vid": 2},
+            {"action": "continue", "url": f"/fetch?cursor={i + 1}"},
+        ]
+    pages[f"/fetch?cursor={count}"] = []
+    return pages
+
+
+class TestChangesPagesPrefetcher(NgConnectTestCase):
+    @patch(f"{MODULE}.QgsNgwConnection")
+    def test_pages_order(self, connection_class: MagicMock) -> None:
+        pages = make_pages(10)
+        connection_class.return_value.get.side_effect = pages.__getitem__
+
+        prefetcher = ChangesPagesPrefetcher("connection", "/fetch", 3)
+        fetched = list(prefetcher)
+
+        self.assertEqual([page[0]["fid"] for page in fetched], list(range(10)))
+        connection_class.assert_called_once_with("connection")
+
+    @patch(f"{MODULE}.QgsNgwConnection")
+    def test_error(self, connection_class: MagicMock) -> None:
+        pages = make_pages(3)
+        del pages["/fetch?cursor=2"]
+        connection_class.return_value.get.side_effect = pages.__getitem__
+
+        fetched = []
+        with self.assertRaises(KeyError):
+            for page in ChangesPagesPrefetcher("connection", "/fetch"):
+                fetched.append(page)
+
+        self.assertEqual(len(fetched), 2)
+
+    @patch(f"{MODULE}.QgsNgwConnection")
+    def test_early_stop(self, connection_class: MagicMock) -> None:
+        pages = make_pages(100)
+        connection_class.return_value.get.side_effect = pages.__getitem__
+
+        prefetcher = ChangesPagesPrefetcher("connection", "/fetch", 2)
+        for _ in prefetcher:
+            break
+
+        # Producer is stopped and does not download all pages
+        self.assertLess(connection_class.return_value.get.call_count, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
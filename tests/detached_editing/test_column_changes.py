@@ -0,0 +1,170 @@
+import unittest
+from contextlib import closing
+from unittest.mock import MagicMock, patch
+
+from qgis.core import QgsVectorLayer
+
+from nextgis_connect.detached_editing.backup_serialization import (
+    deserialize_value_backup,
+)
+from nextgis_connect.detached_editing.changes_backup import ChangesBackup
+from nextgis_connect.detached_editing.column_changes import (
+    expand_column_changes,
+    shrink_column_changes,
+)
+from nextgis_connect.detached_editing.utils import container_metadata
+from tests.detached_editing.utils import mock_container
+from tests.ng_connect_testcase import NgConnectTestCase, TestData
+
+
+class TestColumnChanges(NgConnectTestCase):
+    @mock_container(TestData.Points, is_versioning_enabled=True)
+    @patch(
+        "nextgis_connect.detached_editing.changes_backup"
+        ".MIN_COLUMN_FEATURES_COUNT",
+        2,
+    )
+    def test_column_record(
+        self, container_mock: MagicMock, qgs_layer: QgsVectorLayer
+    ) -> None:
+        metadata = container_mock.metadata
+        connection_pool = container_mock.connection_pool
+        column_field, row_field = metadata.fields[:2]
+
+        values = {
+            feature.id(): feature.attribute(column_field.attribute)
+            for feature in qgs_layer.getFeatures()
+        }
+        fids = sorted(values.keys())
+        self.assertGreater(len(fids), 2)
+
+        changes_backup = ChangesBackup(connection_pool)
+        changes_backup.capture(
+            metadata,
+            qgs_layer.dataProvider(),
+            {
+                fid: {column_field.attribute: "changed"}
+                if fid != fids[0]
+                else {
+                    column_field.attribute: "changed",
+                    row_field.attribute: 1,
+                }
+                for fid in fids
+            },
+            [],
+            set(),
+        )
+
+        with connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            changes_backup.save_updated_attributes(cursor)
+
+            self.assertEqual(
+                cursor.execute(
+                    "SELECT attribute, min_fid, max_fid"
+                    " FROM ngw_updated_columns"
+                ).fetchall(),
+                [(column_field.attribute, fids[0], fids[-1])],
+            )
+            self.assertEqual(
+                cursor.execute(
+                    "SELECT fid, attribute FROM ngw_updated_attributes"
+                ).fetchall(),
+                [(fids[0], row_field.attribute)],
+            )
+
+            def changed_attributes():
+                return set(
+                    cursor.execute(
+                        "SELECT fid, attribute FROM ngw_changed_attributes"
+                    )
+                )
+
+            self.assertEqual(
+                changed_attributes(),
+                {(fid, column_field.attribute) for fid in fids}
+                | {(fids[0], row_field.attribute)},
+            )
+
+            shrink_column_changes(cursor, fids[1])
+            self.assertEqual(
+                changed_attributes(),
+                {(fid, column_field.attribute) for fid in fids[2:]}
+                | {(fids[0], row_field.attribute)},
+            )
+
+            self.assertEqual(expand_column_changes(cursor), 1)
+            self.assertEqual(expand_column_changes(cursor), 0)
+            self.assertEqual(
+                {
+                    (fid, attribute, deserialize_value_backup(backup))
+                    for fid, attribute, backup in cursor.execute(
+                        "SELECT fid, attribute, backup"
+                        " FROM ngw_updated_attributes"
+                        f" WHERE attribute = {column_field.attribute}"
+                    )
+                },
+                {
+                    (fid, column_field.attribute, values[fid])
+                    for fid in fids[2:]
+                },
+            )
+            self.assertEqual(
+                cursor.execute(
+                    "SELECT COUNT(*) FROM ngw_column_backups"
+                ).fetchone()[0],
+                0,
+            )
+
+            shrink_column_changes(cursor, fids[-1])
+            self.assertEqual(
+                cursor.execute(
+                    "SELECT COUNT(*) FROM ngw_updated_columns"
+                ).fetchone()[0],
+                0,
+            )
+
+    @mock_container(TestData.Points, is_versioning_enabled=True)
+    @patch(
+        "nextgis_connect.detached_editing.changes_backup"
+        ".MIN_COLUMN_FEATURES_COUNT",
+        2,
+    )
+    def test_column_record_is_change(
+        self, container_mock: MagicMock, qgs_layer: QgsVectorLayer
+    ) -> None:
+        metadata = container_mock.metadata
+        connection_pool = container_mock.connection_pool
+        column_field = metadata.fields[0]
+
+        changes_backup = ChangesBackup(connection_pool)
+        changes_backup.capture(
+            metadata,
+            qgs_layer.dataProvider(),
+            {
+                feature.id(): {column_field.attribute: "changed"}
+                for feature in qgs_layer.getFeatures()
+            },
+            [],
+            set(),
+        )
+
+        with connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            self.assertFalse(container_metadata(cursor).has_changes)
+
+            changes_backup.save_updated_attributes(cursor)
+
+            self.assertEqual(
+                cursor.execute(
+                    "SELECT COUNT(*) FROM ngw_updated_attributes"
+                ).fetchone()[0],
+                0,
+            )
+            self.assertTrue(container_metadata(cursor).has_changes)
+
+
+if __name__ == "__main__":
+    unittest.main()
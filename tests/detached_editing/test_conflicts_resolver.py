@@ -0,0 +1,129 @@
+import unittest
+from contextlib import closing
+from typing import Any, Tuple
+from unittest.mock import MagicMock
+
+from qgis.core import QgsVectorLayer
+
+from nextgis_connect.detached_editing.actions import FeatureUpdateAction
+from nextgis_connect.detached_editing.backup_serialization import (
+    deserialize_value_backup,
+    serialize_value_backup,
+)
+from nextgis_connect.detached_editing.conflicts.conflict import (
+    VersioningConflict,
+)
+from nextgis_connect.detached_editing.conflicts.conflict_resolution import (
+    ConflictResolution,
+    ResolutionType,
+)
+from nextgis_connect.detached_editing.conflicts.resolver import (
+    ConflictsResolver,
+)
+from nextgis_connect.detached_editing.local_changes_compactor import (
+    LocalChangesCompactor,
+)
+from nextgis_connect.resources.ngw_data_type import NgwDataType
+from nextgis_connect.resources.ngw_field import NgwField
+from nextgis_connect.utils import wrap_sql_table_name
+from tests.detached_editing.utils import mock_container
+from tests.ng_connect_testcase import NgConnectTestCase, TestData
+
+
+class TestConflictsResolver(NgConnectTestCase):
+    @mock_container(TestData.Points, is_versioning_enabled=True)
+    def test_kept_reverted_change(
+        self, container_mock: MagicMock, qgs_layer: QgsVectorLayer
+    ) -> None:
+        self.__check_kept_reverted_change(container_mock, ResolutionType.Local)
+
+    @mock_container(TestData.Points, is_versioning_enabled=True)
+    def test_custom_reverted_change(
+        self, container_mock: MagicMock, qgs_layer: QgsVectorLayer
+    ) -> None:
+        self.__check_kept_reverted_change(
+            container_mock, ResolutionType.Custom
+        )
+
+    def __check_kept_reverted_change(
+        self, container_mock: MagicMock, resolution_type: ResolutionType
+    ) -> None:
+        metadata = container_mock.metadata
+        connection_pool = container_mock.connection_pool
+        field = next(
+            field
+            for field in metadata.fields
+            if field.datatype == NgwDataType.STRING
+        )
+
+        # Local edit was reverted, so the value equals the backup
+        fid, ngw_fid, version, value = self.__feature(container_mock, field)
+        with connection_pool.writer() as connection:
+            connection.execute(
+                "INSERT INTO ngw_updated_attributes VALUES (?, ?, ?)",
+                (fid, field.attribute, serialize_value_backup(value)),
+            )
+
+        local_action = FeatureUpdateAction(
+            ngw_fid, version, None, [[field.ngw_id, value]]
+        )
+        remote_action = FeatureUpdateAction(
+            ngw_fid, version + 1, None, [[field.ngw_id, "remote"]]
+        )
+        resolution = ConflictResolution(
+            resolution_type,
+            VersioningConflict(local_action, remote_action),
+        )
+        if resolution_type == ResolutionType.Custom:
+            resolution.custom_fields = [(field.ngw_id, value)]
+
+        resolver = ConflictsResolver(
+            container_mock.path, metadata, connection_pool
+        )
+        status, _ = resolver.resolve([remote_action], [resolution])
+        self.assertEqual(status, ConflictsResolver.Status.Resolved)
+
+        # Kept value differs from the remote one, so it must be uploaded
+        compactor = LocalChangesCompactor(connection_pool, metadata)
+        self.assertEqual(compactor.compact(), 0)
+
+        with connection_pool.reader() as connection:
+            backup = connection.execute(
+                """
+                SELECT backup FROM ngw_updated_attributes
+                WHERE fid = ? AND attribute = ?
+                """,
+                (fid, field.attribute),
+            ).fetchone()[0]
+        self.assertEqual(deserialize_value_backup(backup), "remote")
+
+    def __feature(
+        self, container_mock: MagicMock, field: NgwField
+    ) -> Tuple[int, int, int, Any]:
+        metadata = container_mock.metadata
+        with container_mock.connection_pool.reader() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            cursor.execute(
+                f"""
+                SELECT
+                    metadata.fid,
+                    metadata.ngw_fid,
+                    metadata.version,
+                    features.{wrap_sql_table_name(field.keyname)}
+                FROM ngw_features_metadata metadata
+                JOIN {wrap_sql_table_name(metadata.table_name)} features
+                    ON features.{wrap_sql_table_name(metadata.fid_field)}
+                        = metadata.fid
+                WHERE metadata.ngw_fid IS NOT NULL
+                ORDER BY metadata.fid
+                LIMIT 1
+                """
+            )
+            fid, ngw_fid, version, value = cursor.fetchone()
+
+        return fid, ngw_fid, version or 0, value
+
+
+if __name__ == "__main__":
+    unittest.main()
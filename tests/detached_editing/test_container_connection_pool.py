@@ -0,0 +1,106 @@
+import gc
+import sqlite3
+import threading
+import unittest
+from contextlib import closing
+
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
+from nextgis_connect.exceptions import ContainerError, ErrorCode
+from tests.ng_connect_testcase import NgConnectTestCase
+
+
+class TestContainerConnectionPool(NgConnectTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.container_path = self.create_temp_file(".gpkg")
+        with closing(sqlite3.connect(str(self.container_path))) as connection:
+            connection.execute("CREATE TABLE test (id INTEGER PRIMARY KEY)")
+            connection.commit()
+
+        self.pool = ContainerConnectionPool(self.container_path)
+
+    def tearDown(self) -> None:
+        self.pool.close()
+        super().tearDown()
+
+    def test_connections_reused(self) -> None:
+        with self.pool.reader() as first, self.pool.reader() as second:
+            self.assertIs(first, second)
+
+        with self.pool.writer() as first, self.pool.writer() as second:
+            self.assertIs(first, second)
+
+        with self.pool.reader() as connection:
+            journal_mode = connection.execute(
+                "PRAGMA journal_mode"
+            ).fetchone()[0]
+            self.assertEqual(journal_mode, "wal")
+
+    def test_reader_per_thread(self) -> None:
+        connections = []
+
+        def read() -> None:
+            with self.pool.reader() as connection:
+                connections.append(connection)
+
+        read()
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+
+        self.assertEqual(len(connections), 2)
+        self.assertIsNot(connections[0], connections[1])
+
+    def test_reader_closed_with_thread(self) -> None:
+        connections = []
+
+        def read() -> None:
+            with self.pool.reader() as connection:
+                connections.append(connection)
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+        del thread
+        gc.collect()
+
+        with self.assertRaises(sqlite3.ProgrammingError):
+            connections[0].execute("SELECT 1")
+
+    def test_reader_reopened_after_close(self) -> None:
+        with self.pool.reader() as connection:
+            pass
+
+        self.pool.close()
+
+        with self.pool.reader() as reopened:
+            self.assertIsNot(reopened, connection)
+            reopened.execute("SELECT 1")
+
+    def test_writer_transaction(self) -> None:
+        with self.pool.writer() as connection:
+            connection.execute("INSERT INTO test (id) VALUES (1)")
+
+        with self.assertRaises(RuntimeError), self.pool.writer() as connection:
+            connection.execute("INSERT INTO test (id) VALUES (2)")
+            raise RuntimeError
+
+        with self.pool.reader() as connection:
+            ids = [row[0] for row in connection.execute("SELECT id FROM test")]
+        self.assertEqual(ids, [1])
+
+    def test_deleted_container(self) -> None:
+        self.pool.close()
+        self.container_path.unlink()
+
+        with self.assertRaises(ContainerError) as context:
+            with self.pool.reader():
+                pass
+
+        self.assertEqual(context.exception.code, ErrorCode.DeletedContainer)
+
+
+if __name__ == "__main__":
+    unittest.main()
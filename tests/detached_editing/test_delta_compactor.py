@@ -0,0 +1,195 @@
+import random
+import unittest
+from typing import Any, Dict, List, Set
+
+from nextgis_connect.detached_editing.actions import (
+    ActionType,
+    DescriptionPutAction,
+    FeatureAction,
+    FeatureCreateAction,
+    FeatureDeleteAction,
+    FeatureRestoreAction,
+    FeatureUpdateAction,
+)
+from nextgis_connect.detached_editing.delta_compactor import compact_actions
+from tests.ng_connect_testcase import NgConnectTestCase
+
+FIELDS = (1, 2, 3)
+
+State = Dict[int, Dict[str, Any]]
+
+
+def replay(
+    state: State, actions: List[FeatureAction], batch_size: int
+) -> State:
+    """Applies actions to the features state the same way as ActionApplier"""
+    state = {fid: dict(feature) for fid, feature in state.items()}
+
+    for i in range(0, len(actions), batch_size):
+        batch = actions[i : i + batch_size]
+        previously_added: Set[int] = set()
+        previously_deleted: Set[int] = set()
+        for action in batch:
+            if action.action == ActionType.FEATURE_CREATE:
+                if action.fid in state:
+                    previously_added.add(action.fid)
+            elif action.action == ActionType.FEATURE_DELETE:
+                if action.fid not in state:
+                    previously_deleted.add(action.fid)
+
+        for action in batch:
+            action_type = action.action
+            if action_type == ActionType.FEATURE_RESTORE:
+                action_type = (
+                    ActionType.FEATURE_UPDATE
+                    if action.fid in state
+                    else ActionType.FEATURE_CREATE
+                )
+
+            if action_type == ActionType.FEATURE_CREATE:
+                if action.fid in previously_added and action.fid in state:
+                    state[action.fid]["vid"] = action.vid
+                    continue
+                state[action.fid] = {
+                    **dict.fromkeys(FIELDS),
+                    **action.fields_dict,
+                    "geom": action.geom,
+                    "vid": action.vid,
+                    "description": None,
+                }
+
+            elif action_type == ActionType.FEATURE_UPDATE:
+                feature = state[action.fid]
+                feature.update(action.fields_dict)
+                if action.geom is not None:
+                    feature["geom"] = action.geom
+                feature["vid"] = action.vid
+
+            elif action_type == ActionType.FEATURE_DELETE:
+                if (
+                    action.fid in previously_deleted
+                    and action.fid not in state
+                ):
+                    continue
+                del state[action.fid]
+
+            elif action_type == ActionType.DESCRIPTION_PUT:
+                state[action.fid]["description"] = action.value
+
+    return state
+
+
+def random_fields() -> List[List[Any]]:
+    return [
+        [field_id, random.randint(0, 100)]
+        for field_id in random.sample(FIELDS, random.randint(0, len(FIELDS)))
+    ]
+
+
+def random_history(fid: int, exists: bool, vid: int) -> List[FeatureAction]:
+    actions: List[FeatureAction] = []
+
+    # Feature uploaded or deleted by this container in previous sync
+    if exists and random.random() < 0.2:
+        actions.append(FeatureCreateAction(fid, vid, "POINT (0 0)", []))
+    elif not exists and random.random() < 0.2:
+        actions.append(FeatureDeleteAction(fid, vid))
+
+    for _ in range(random.randint(0, 8)):
+        vid += 1
+        if not exists:
+            if len(actions) > 0:
+                action_class = FeatureRestoreAction
+            else:
+                action_class = random.choice(
+                    [FeatureCreateAction, FeatureRestoreAction]
+                )
+            actions.append(
+                action_class(fid, vid, f"POINT ({vid} 0)", random_fields())
+            )
+            exists = True
+            continue
+
+        choice = random.random()
+        if choice < 0.5:
+            geom = f"POINT ({vid} 1)" if random.random() < 0.5 else None
+            actions.append(
+                FeatureUpdateAction(fid, vid, geom, random_fields())
+            )
+        elif choice < 0.7:
+            actions.append(DescriptionPutAction(fid, vid, f"text {vid}"))
+        else:
+            actions.append(FeatureDeleteAction(fid, vid))
+            exists = False
+
+    return actions
+
+
+def interleave(histories: List[List[FeatureAction]]) -> List[FeatureAction]:
+    histories = [list(history) for history in histories if history]
+    result = []
+    while histories:
+        history = random.choice(histories)
+        result.append(history.pop(0))
+        if not history:
+            histories.remove(history)
+    return result
+
+
+class TestDeltaCompactor(NgConnectTestCase):
+    def test_folding(self) -> None:
+        actions = [
+            FeatureCreateAction(1, 2, "POINT (1 1)", [[1, "a"]]),
+            FeatureUpdateAction(1, 3, "POINT (2 2)", [[2, "b"]]),
+            FeatureUpdateAction(1, 4, None, [[1, "c"]]),
+            FeatureUpdateAction(2, 3, None, [[1, "d"]]),
+            FeatureDeleteAction(2, 5),
+            FeatureUpdateAction(3, 3, None, [[1, "e"]]),
+            FeatureUpdateAction(3, 4, "POINT (3 3)", [[2, "f"]]),
+        ]
+
+        compacted = compact_actions(actions)
+
+        self.assertEqual(
+            [(type(action), action.fid, action.vid) for action in compacted],
+            [
+                (FeatureCreateAction, 1, 2),
+                (FeatureUpdateAction, 1, 4),
+                (FeatureDeleteAction, 2, 5),
+                (FeatureUpdateAction, 3, 4),
+            ],
+        )
+        self.assertEqual(compacted[1].fields_dict, {1: "c", 2: "b"})
+        self.assertEqual(compacted[1].geom, "POINT (2 2)")
+        self.assertEqual(compacted[3].fields_dict, {1: "e", 2: "f"})
+
+    def test_replay_equivalence(self) -> None:
+        random.seed(42)
+
+        for _ in range(300):
+            state: State = {}
+            histories = []
+            for fid in range(1, 20):
+                exists = random.random() < 0.5
+                if exists:
+                    state[fid] = {
+                        **dict.fromkeys(FIELDS, 0),
+                        "geom": "POINT (0 0)",
+                        "vid": 1,
+                        "description": None,
+                    }
+                histories.append(random_history(fid, exists, 1))
+
+            actions = interleave(histories)
+            compacted = compact_actions(actions)
+            self.assertLessEqual(len(compacted), len(actions))
+
+            for batch_size in (1, 7, len(actions) + 1):
+                self.assertEqual(
+                    replay(state, compacted, batch_size),
+                    replay(state, actions, batch_size),
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+import unittest
+from contextlib import closing
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from qgis.core import QgsVectorLayer
+
+from nextgis_connect.detached_editing.actions import (
+    ContinueAction,
+    FeatureCreateAction,
+    FeatureDeleteAction,
+    FeatureUpdateAction,
+)
+from nextgis_connect.detached_editing.delta_journal import DeltaJournal
+from tests.detached_editing.utils import mock_container
+from tests.ng_connect_testcase import NgConnectTestCase, TestData
+
+
+class TestDeltaJournal(NgConnectTestCase):
+    @mock_container(TestData.Points, is_versioning_enabled=True)
+    def test_spooling(
+        self, container_mock: MagicMock, qgs_layer: QgsVectorLayer
+    ) -> None:
+        journal = DeltaJournal(
+            container_mock.connection_pool, container_mock.metadata
+        )
+        journal.clear()
+        self.assertEqual(journal.count(), 0)
+
+        first_page = [
+            FeatureCreateAction(1000, 2, "POINT (1 1)", [[1, "value"]]),
+            FeatureUpdateAction(1001, 3, None, [[1, "other"]]),
+            ContinueAction("http://example.com/next"),
+        ]
+        second_page = [
+            FeatureDeleteAction(1000, 4),
+            ContinueAction("http://example.com/next"),
+        ]
+        self.assertEqual(journal.append(first_page), 2)
+        self.assertEqual(journal.append(second_page), 1)
+        self.assertEqual(journal.count(), 3)
+
+        actions = [
+            action
+            for batch in journal.batches(batch_size=2)
+            for action in batch
+        ]
+        self.assertEqual(
+            [(type(action), action.fid, action.vid) for action in actions],
+            [
+                (FeatureCreateAction, 1000, 2),
+                (FeatureUpdateAction, 1001, 3),
+                (FeatureDeleteAction, 1000, 4),
+            ],
+        )
+        self.assertEqual(actions[0].fields, [(1, "value")])
+
+        journal.replace([1000], [FeatureUpdateAction(1000, 5, "POINT (2 2)")])
+        actions = [action for batch in journal.batches() for action in batch]
+        self.assertEqual(
+            [(type(action), action.fid, action.vid) for action in actions],
+            [(FeatureUpdateAction, 1001, 3), (FeatureUpdateAction, 1000, 5)],
+        )
+
+        journal.clear()
+        self.assertEqual(journal.count(), 0)
+
+    @mock_container(TestData.Points, is_versioning_enabled=True)
+    def test_compact(
+        self, container_mock: MagicMock, qgs_layer: QgsVectorLayer
+    ) -> None:
+        journal = DeltaJournal(
+            container_mock.connection_pool, container_mock.metadata
+        )
+        journal.clear()
+        journal.append(
+            [
+                FeatureUpdateAction(1000, 2, "POINT (1 1)", [[1, "a"]]),
+                FeatureUpdateAction(1001, 2, None, [[1, "b"]]),
+                FeatureUpdateAction(1000, 3, None, [[2, "c"]]),
+                FeatureUpdateAction(1000, 4, "POINT (2 2)"),
+            ]
+        )
+
+        self.assertEqual(journal.compact(), 2)
+        self.assertEqual(journal.compact(), 0)
+
+        actions = [action for batch in journal.batches() for action in batch]
+        self.assertEqual(
+            [(action.fid, action.vid) for action in actions],
+            [(1001, 2), (1000, 4)],
+        )
+        self.assertEqual(actions[1].geom, "POINT (2 2)")
+        self.assertEqual(actions[1].fields_dict, {1: "a", 2: "c"})
+
+    @mock_container(TestData.Points, is_versioning_enabled=True)
+    def test_applying_progress(
+        self, container_mock: MagicMock, qgs_layer: QgsVectorLayer
+    ) -> None:
+        connection_pool = container_mock.connection_pool
+        journal = DeltaJournal(connection_pool, container_mock.metadata)
+        journal.clear()
+        journal.append(
+            [
+                FeatureUpdateAction(1000, 2, "POINT (1 1)"),
+                FeatureUpdateAction(1001, 3, "POINT (2 2)"),
+                FeatureUpdateAction(1002, 4, "POINT (3 3)"),
+            ]
+        )
+        self.assertIsNone(journal.interrupted_target())
+
+        last_id, _ = next(journal.numbered_batches(batch_size=1))
+        timestamp = datetime(2024, 8, 30, 12)
+        with connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            journal.mark_applied(cursor, 4, timestamp, last_id)
+
+        self.assertEqual(journal.interrupted_target(), (4, timestamp))
+        self.assertEqual(journal.count(), 2)
+        actions = [action for batch in journal.batches() for action in batch]
+        self.assertEqual([action.fid for action in actions], [1001, 1002])
+
+        journal.clear()
+        self.assertIsNone(journal.interrupted_target())
+        self.assertEqual(journal.count(), 0)
+
+    @mock_container(TestData.Points, is_versioning_enabled=True)
+    def test_locally_changed_actions(
+        self, container_mock: MagicMock, qgs_layer: QgsVectorLayer
+    ) -> None:
+        connection_pool = container_mock.connection_pool
+        with connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            cursor.execute(
+                "SELECT fid, ngw_fid FROM ngw_features_metadata LIMIT 2"
+            )
+            (changed_fid, changed_ngw_fid), (_, unchanged_ngw_fid) = (
+                cursor.fetchall()
+            )
+            cursor.execute(
+                "INSERT INTO ngw_updated_geometries VALUES (?, NULL)",
+                (changed_fid,),
+            )
+
+        journal = DeltaJournal(connection_pool, container_mock.metadata)
+        journal.clear()
+        journal.append(
+            [
+                FeatureUpdateAction(unchanged_ngw_fid, 2, "POINT (1 1)"),
+                FeatureUpdateAction(changed_ngw_fid, 2, "POINT (2 2)"),
+            ]
+        )
+
+        actions = journal.locally_changed_actions()
+        self.assertEqual([action.fid for action in actions], [changed_ngw_fid])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -17,6 +17,9 @@ from nextgis_connect.compat import (
     QgsFeatureList,
     QgsGeometryMap,
 )
+from nextgis_connect.detached_editing.backup_serialization import (
+    FeatureBackup,
+)
 from nextgis_connect.detached_editing.detached_layer import DetachedLayer
 from nextgis_connect.detached_editing.serialization import (
     deserialize_geometry,
@@ -787,6 +790,68 @@ class TestDetachedLayer(NgConnectTestCase):
         self.assertTrue(changes_checker.updated_attributes_is_equal({}))
         self.assertTrue(changes_checker.updated_geometries_is_equal({}))
 
+    @mock_container(TestData.Points, is_versioning_enabled=True)
+    @patch(
+        "nextgis_connect.detached_editing.changes_backup"
+        ".MIN_COLUMN_FEATURES_COUNT",
+        2,
+    )
+    def test_deleting_column_feature(
+        self, container_mock: MagicMock, qgs_layer: QgsVectorLayer
+    ) -> None:
+        attribute_index = qgs_layer.fields().indexOf("STRING")
+        field = container_mock.metadata.fields.get_with(keyname="STRING")
+        initial_values = {
+            feature.id(): feature.attribute(attribute_index)
+            for feature in qgs_layer.getFeatures()
+        }
+
+        layer = DetachedLayer(container_mock, qgs_layer)
+        mock_layer_signals(layer)
+
+        # Whole column is changed, so a column record is saved
+        with edit(layer.qgs_layer):
+            for feature_id in initial_values:
+                is_changed = qgs_layer.changeAttributeValue(
+                    feature_id, attribute_index, "changed"
+                )
+                self.assertTrue(is_changed)
+
+        feature_id = next(iter(sorted(initial_values)))
+        with edit(layer.qgs_layer):
+            self.assertTrue(qgs_layer.deleteFeature(feature_id))
+
+        with closing(
+            make_connection(container_mock.path)
+        ) as connection, closing(connection.cursor()) as cursor:
+            self.assertEqual(
+                cursor.execute(
+                    "SELECT COUNT(*) FROM ngw_updated_columns"
+                ).fetchone()[0],
+                1,
+            )
+            backup = cursor.execute(
+                "SELECT backup FROM ngw_removed_features WHERE fid = ?",
+                (feature_id,),
+            ).fetchone()[0]
+            column_backups = cursor.execute(
+                "SELECT COUNT(*) FROM ngw_column_backups WHERE fid = ?",
+                (feature_id,),
+            ).fetchone()[0]
+
+        feature_backup = FeatureBackup(
+            backup, container_mock.metadata.is_versioning_enabled
+        )
+        self.assertEqual(
+            dict(feature_backup.after_sync.fields)[field.ngw_id],
+            initial_values[feature_id],
+        )
+        self.assertEqual(
+            dict(feature_backup.before_deletion.fields)[field.ngw_id],
+            "changed",
+        )
+        self.assertEqual(column_backups, 0)
+
     # todo: add and remove without sync, remove and add with same name, virtual field
 
     @mock_container(TestData.Points)
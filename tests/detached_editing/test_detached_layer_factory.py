@@ -554,7 +554,7 @@ class TestDetachedLayerFactory(NgConnectTestCase):
     ) -> None:
         settings = NgConnectSettings()
         self.assertEqual(
-            metadata.container_version, settings.supported_container_version
+            metadata.container_version, settings.container_version
         )
         self.assertEqual(metadata.connection_id, connection.id)
         self.assertEqual(metadata.instance_id, connection.domain_uuid)
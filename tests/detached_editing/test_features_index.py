@@ -0,0 +1,61 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from qgis.core import QgsVectorLayer
+
+from nextgis_connect.detached_editing import features_index
+from nextgis_connect.detached_editing.features_index import (
+    feature_description,
+    feature_ngw_id,
+    invalidate_features_index,
+)
+from tests.detached_editing.utils import mock_container
+from tests.ng_connect_testcase import NgConnectTestCase, TestData
+
+
+class TestFeaturesIndex(NgConnectTestCase):
+    @mock_container(TestData.Points)
+    def test_lookup(
+        self, container_mock: MagicMock, qgs_layer: QgsVectorLayer
+    ) -> None:
+        path = container_mock.path
+        connection_pool = container_mock.connection_pool
+        invalidate_features_index(path)
+
+        with connection_pool.reader() as connection:
+            rows = connection.execute(
+                "SELECT fid, ngw_fid FROM ngw_features_metadata"
+            ).fetchall()
+        self.assertTrue(len(rows) > 0)
+
+        with patch.object(
+            features_index, "_load_entry", wraps=features_index._load_entry
+        ) as load_mock:
+            for fid, ngw_fid in rows:
+                self.assertEqual(feature_ngw_id(path, fid), ngw_fid)
+            self.assertIsNone(feature_ngw_id(path, -100))
+            self.assertEqual(load_mock.call_count, 1)
+
+            fid = rows[0][0]
+            with connection_pool.writer() as connection:
+                connection.execute(
+                    "UPDATE ngw_features_metadata SET description=?"
+                    " WHERE fid=?",
+                    ("Description", fid),
+                )
+
+            invalidate_features_index(path)
+            self.assertEqual(feature_description(path, fid), "Description")
+            self.assertEqual(load_mock.call_count, 2)
+
+    def test_not_container(self) -> None:
+        path = self.create_temp_file(".gpkg")
+        path.touch()
+        self.assertIsNone(feature_ngw_id(path, 1))
+
+        path.unlink()
+        self.assertIsNone(feature_ngw_id(path, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
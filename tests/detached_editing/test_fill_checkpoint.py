@@ -0,0 +1,50 @@
+import sqlite3
+import unittest
+from contextlib import closing
+from pathlib import Path
+
+from nextgis_connect.detached_editing.fill_checkpoint import (
+    FillCheckpoint,
+    clear_fill_checkpoint,
+    load_fill_checkpoint,
+    partial_download_path,
+    save_fill_checkpoint,
+)
+from tests.ng_connect_testcase import NgConnectTestCase
+
+
+class TestFillCheckpoint(NgConnectTestCase):
+    def test_save_and_load(self) -> None:
+        with closing(sqlite3.connect(":memory:")) as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            self.assertIsNone(load_fill_checkpoint(cursor))
+
+            checkpoint = FillCheckpoint(
+                fetch_url="/api/resource/1/feature/changes/fetch?cursor=1",
+                sync_date="2024-01-01T00:00:00",
+            )
+            save_fill_checkpoint(cursor, checkpoint)
+            self.assertEqual(load_fill_checkpoint(cursor), checkpoint)
+
+            checkpoint.fetch_url = (
+                "/api/resource/1/feature/changes/fetch?cursor=2"
+            )
+            checkpoint.applied_pages += 1
+            save_fill_checkpoint(cursor, checkpoint)
+            self.assertEqual(load_fill_checkpoint(cursor), checkpoint)
+
+            clear_fill_checkpoint(cursor)
+            self.assertIsNone(load_fill_checkpoint(cursor))
+            clear_fill_checkpoint(cursor)
+
+    def test_partial_download_path(self) -> None:
+        container_path = Path("/cache/domain/42.gpkg")
+        self.assertEqual(
+            partial_download_path(container_path),
+            Path("/cache/domain/42.gpkg-download"),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
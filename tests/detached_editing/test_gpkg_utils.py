@@ -0,0 +1,100 @@
+import sqlite3
+import struct
+import unittest
+from contextlib import closing
+from typing import Optional, Tuple
+
+from nextgis_connect.detached_editing.gpkg_utils import (
+    geometry_envelope,
+    register_gpkg_functions,
+    st_is_empty,
+)
+from tests.ng_connect_testcase import NgConnectTestCase
+
+
+def gpkg_blob(
+    wkb: bytes,
+    envelope: Optional[Tuple[float, float, float, float]] = None,
+    *,
+    is_empty: bool = False,
+) -> bytes:
+    flags = 0b1
+    if envelope is not None:
+        flags |= 0b10
+    if is_empty:
+        flags |= 0b10000
+
+    header = b"GP" + bytes([0, flags]) + struct.pack("<i", 4326)
+    if envelope is not None:
+        header += struct.pack("<4d", *envelope)
+
+    return header + wkb
+
+
+POINT = struct.pack("<BIdd", 1, 1, 3.0, 4.0)
+LINESTRING = struct.pack("<BII4d", 1, 2, 2, 0.0, 1.0, 5.0, -2.0)
+MULTIPOINT_Z = (
+    struct.pack("<BII", 1, 1004, 2)
+    + struct.pack("<BIddd", 1, 1001, 1.0, 2.0, 3.0)
+    + struct.pack("<BIddd", 1, 1001, -1.0, 7.0, 3.0)
+)
+
+
+class TestGpkgUtils(NgConnectTestCase):
+    def test_geometry_envelope(self) -> None:
+        self.assertIsNone(geometry_envelope(None))
+        self.assertIsNone(geometry_envelope(b"not a geometry"))
+        self.assertEqual(
+            geometry_envelope(gpkg_blob(POINT)), (3.0, 3.0, 4.0, 4.0)
+        )
+        self.assertEqual(
+            geometry_envelope(gpkg_blob(LINESTRING)), (0.0, 5.0, -2.0, 1.0)
+        )
+        self.assertEqual(
+            geometry_envelope(gpkg_blob(MULTIPOINT_Z)), (-1.0, 1.0, 2.0, 7.0)
+        )
+        self.assertEqual(
+            geometry_envelope(gpkg_blob(LINESTRING, (9.0, 10.0, 11.0, 12.0))),
+            (9.0, 10.0, 11.0, 12.0),
+        )
+
+    def test_st_is_empty(self) -> None:
+        empty_point = struct.pack("<BIdd", 1, 1, float("nan"), float("nan"))
+        self.assertEqual(st_is_empty(gpkg_blob(POINT)), 0)
+        self.assertEqual(st_is_empty(gpkg_blob(empty_point)), 1)
+        self.assertEqual(st_is_empty(gpkg_blob(empty_point, is_empty=True)), 1)
+
+    def test_rtree_trigger(self) -> None:
+        with closing(sqlite3.connect(":memory:")) as connection:
+            register_gpkg_functions(connection)
+            connection.executescript(
+                """
+                CREATE TABLE layer (fid INTEGER PRIMARY KEY, geom BLOB);
+                CREATE VIRTUAL TABLE rtree_layer_geom
+                    USING rtree(id, minx, maxx, miny, maxy);
+                CREATE TRIGGER rtree_layer_geom_insert AFTER INSERT ON layer
+                WHEN (NEW.geom NOT NULL AND NOT ST_IsEmpty(NEW.geom))
+                BEGIN
+                    INSERT OR REPLACE INTO rtree_layer_geom VALUES (
+                        NEW.fid,
+                        ST_MinX(NEW.geom), ST_MaxX(NEW.geom),
+                        ST_MinY(NEW.geom), ST_MaxY(NEW.geom)
+                    );
+                END;
+                """
+            )
+            connection.executemany(
+                "INSERT INTO layer VALUES (?, ?)",
+                [(1, gpkg_blob(POINT)), (2, gpkg_blob(LINESTRING)), (3, None)],
+            )
+            rows = connection.execute(
+                "SELECT * FROM rtree_layer_geom ORDER BY id"
+            ).fetchall()
+
+        self.assertEqual(
+            rows, [(1, 3.0, 3.0, 4.0, 4.0), (2, 0.0, 5.0, -2.0, 1.0)]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
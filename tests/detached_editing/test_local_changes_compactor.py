@@ -0,0 +1,76 @@
+import json
+import unittest
+from base64 import b64encode
+from contextlib import closing
+from unittest.mock import MagicMock
+
+from qgis.core import QgsVectorLayer
+
+from nextgis_connect.detached_editing.gpkg_utils import geometry_wkb
+from nextgis_connect.detached_editing.local_changes_compactor import (
+    LocalChangesCompactor,
+)
+from nextgis_connect.utils import wrap_sql_table_name
+from tests.detached_editing.utils import mock_container
+from tests.ng_connect_testcase import NgConnectTestCase, TestData
+
+
+class TestLocalChangesCompactor(NgConnectTestCase):
+    @mock_container(TestData.Points, is_versioning_enabled=True)
+    def test_compact(
+        self, container_mock: MagicMock, qgs_layer: QgsVectorLayer
+    ) -> None:
+        metadata = container_mock.metadata
+        field = metadata.fields[0]
+        connection_pool = container_mock.connection_pool
+
+        with connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            rows = cursor.execute(
+                f"""
+                SELECT
+                    {wrap_sql_table_name(metadata.fid_field)},
+                    {wrap_sql_table_name(field.keyname)},
+                    {wrap_sql_table_name(metadata.geom_field)}
+                FROM {wrap_sql_table_name(metadata.table_name)}
+                ORDER BY 1
+                LIMIT 2
+                """
+            ).fetchall()
+            (reverted_fid, value, geometry), (changed_fid, _, _) = rows
+            wkb = geometry_wkb(geometry)
+            geometry_backup = (
+                b64encode(wkb).decode("ascii") if wkb is not None else ""
+            )
+
+            cursor.executemany(
+                "INSERT INTO ngw_updated_attributes VALUES (?, ?, ?)",
+                [
+                    (reverted_fid, field.attribute, json.dumps(value)),
+                    (changed_fid, field.attribute, json.dumps("changed")),
+                ],
+            )
+            cursor.executemany(
+                "INSERT INTO ngw_updated_geometries VALUES (?, ?)",
+                [
+                    (reverted_fid, geometry_backup),
+                    (changed_fid, "changed"),
+                ],
+            )
+
+        compactor = LocalChangesCompactor(connection_pool, metadata)
+        self.assertEqual(compactor.compact(), 2)
+        self.assertEqual(compactor.compact(), 0)
+
+        with connection_pool.reader() as connection:
+            for table in ("ngw_updated_attributes", "ngw_updated_geometries"):
+                fids = [
+                    row[0]
+                    for row in connection.execute(f"SELECT fid FROM {table}")
+                ]
+                self.assertEqual(fids, [changed_fid])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from contextlib import closing
+from unittest.mock import MagicMock
+
+from qgis.core import QgsVectorLayer
+
+from nextgis_connect.detached_editing.conflicts.local_changes_index import (
+    build_local_changes_index,
+)
+from tests.detached_editing.utils import mock_container
+from tests.ng_connect_testcase import NgConnectTestCase, TestData
+
+
+class TestLocalChangesIndex(NgConnectTestCase):
+    @mock_container(TestData.Points, is_versioning_enabled=True)
+    def test_index(
+        self, container_mock: MagicMock, qgs_layer: QgsVectorLayer
+    ) -> None:
+        connection_pool = container_mock.connection_pool
+        with connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            features = cursor.execute(
+                "SELECT fid, ngw_fid FROM ngw_features_metadata ORDER BY fid"
+            ).fetchall()
+            (
+                (updated_fid, updated_ngw_fid),
+                (removed_fid, removed_ngw_fid),
+                (restored_fid, restored_ngw_fid),
+            ) = features[:3]
+
+            cursor.execute(
+                "INSERT INTO ngw_updated_attributes VALUES (?, 1, NULL)",
+                (updated_fid,),
+            )
+            cursor.execute(
+                "INSERT INTO ngw_updated_geometries VALUES (?, NULL)",
+                (updated_fid,),
+            )
+            cursor.execute(
+                "INSERT INTO ngw_removed_features VALUES (?, NULL)",
+                (removed_fid,),
+            )
+            cursor.execute(
+                "INSERT INTO ngw_restored_features VALUES (?)",
+                (restored_fid,),
+            )
+
+        metadata = container_mock.metadata
+        index = build_local_changes_index(connection_pool, metadata)
+
+        self.assertEqual(
+            set(index.keys()),
+            {updated_ngw_fid, removed_ngw_fid, restored_ngw_fid},
+        )
+
+        updated = index[updated_ngw_fid]
+        self.assertEqual(updated.fid, updated_fid)
+        self.assertEqual(
+            updated.fields, {metadata.fields.get_with(attribute=1).ngw_id}
+        )
+        self.assertTrue(updated.has_geometry)
+        self.assertFalse(updated.is_deleted)
+
+        self.assertTrue(index[removed_ngw_fid].is_deleted)
+        self.assertFalse(index[removed_ngw_fid].is_updated)
+        self.assertTrue(index[restored_ngw_fid].is_restored)
+
+
+if __name__ == "__main__":
+    unittest.main()
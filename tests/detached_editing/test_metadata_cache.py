@@ -0,0 +1,59 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from qgis.core import QgsVectorLayer
+
+from nextgis_connect.detached_editing import metadata_cache
+from nextgis_connect.detached_editing.metadata_cache import (
+    cached_container_metadata,
+    invalidate_container_metadata,
+)
+from nextgis_connect.exceptions import ContainerError, ErrorCode
+from tests.detached_editing.utils import mock_container
+from tests.ng_connect_testcase import NgConnectTestCase, TestData
+
+
+class TestMetadataCache(NgConnectTestCase):
+    @mock_container(TestData.Points)
+    def test_cache(
+        self, container_mock: MagicMock, qgs_layer: QgsVectorLayer
+    ) -> None:
+        path = container_mock.path
+        connection_pool = container_mock.connection_pool
+        invalidate_container_metadata(path)
+
+        with patch.object(
+            metadata_cache,
+            "container_metadata",
+            wraps=metadata_cache.container_metadata,
+        ) as reader_mock:
+            first = cached_container_metadata(path, connection_pool)
+            second = cached_container_metadata(path, connection_pool)
+            self.assertEqual(reader_mock.call_count, 1)
+            self.assertEqual(first, second)
+            self.assertIsNot(first, second)
+
+            with connection_pool.writer() as connection:
+                connection.execute(
+                    "UPDATE ngw_metadata SET is_auto_sync_enabled = 0"
+                )
+
+            third = cached_container_metadata(path, connection_pool)
+            self.assertEqual(reader_mock.call_count, 2)
+            self.assertFalse(third.is_auto_sync_enabled)
+
+            invalidate_container_metadata(path)
+            cached_container_metadata(path, connection_pool)
+            self.assertEqual(reader_mock.call_count, 3)
+
+    def test_deleted_container(self) -> None:
+        path = self.create_temp_file(".gpkg")
+
+        with self.assertRaises(ContainerError) as context:
+            cached_container_metadata(path)
+
+        self.assertEqual(context.exception.code, ErrorCode.DeletedContainer)
+
+
+if __name__ == "__main__":
+    unittest.main()
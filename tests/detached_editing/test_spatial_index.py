@@ -0,0 +1,82 @@
+import sqlite3
+import unittest
+from contextlib import closing
+from unittest.mock import MagicMock
+
+from qgis.core import QgsVectorLayer
+
+from nextgis_connect.detached_editing.gpkg_utils import register_gpkg_functions
+from nextgis_connect.detached_editing.spatial_index import (
+    is_spatial_index_suspended,
+    restore_spatial_index,
+    suspend_spatial_index,
+    suspended_spatial_index,
+)
+from nextgis_connect.utils import wrap_sql_table_name
+from tests.detached_editing.utils import mock_container
+from tests.ng_connect_testcase import NgConnectTestCase, TestData
+
+
+class TestSpatialIndex(NgConnectTestCase):
+    @mock_container(TestData.Points)
+    def test_suspend_and_restore(
+        self, container_mock: MagicMock, qgs_layer: QgsVectorLayer
+    ) -> None:
+        metadata = container_mock.metadata
+        connection_pool = container_mock.connection_pool
+        rtree_name = wrap_sql_table_name(
+            f"rtree_{metadata.table_name}_{metadata.geom_field}"
+        )
+
+        def triggers_count(cursor: sqlite3.Cursor) -> int:
+            cursor.execute(
+                """
+                SELECT COUNT(*) FROM sqlite_master
+                WHERE type = 'trigger' AND name LIKE 'rtree_%'
+                """
+            )
+            return cursor.fetchone()[0]
+
+        with connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            register_gpkg_functions(connection)
+            initial_triggers_count = triggers_count(cursor)
+            self.assertGreater(initial_triggers_count, 0)
+            index = cursor.execute(
+                f"SELECT * FROM {rtree_name} ORDER BY id"
+            ).fetchall()
+
+            self.assertTrue(suspend_spatial_index(cursor))
+            self.assertFalse(suspend_spatial_index(cursor))
+            self.assertTrue(is_spatial_index_suspended(cursor))
+            self.assertEqual(triggers_count(cursor), 0)
+
+            # Index written by triggers is out of date after bulk writes
+            cursor.execute(f"DELETE FROM {rtree_name}")
+
+            self.assertTrue(restore_spatial_index(cursor))
+            self.assertFalse(restore_spatial_index(cursor))
+            self.assertEqual(triggers_count(cursor), initial_triggers_count)
+            self.assertEqual(
+                cursor.execute(
+                    f"SELECT * FROM {rtree_name} ORDER BY id"
+                ).fetchall(),
+                index,
+            )
+
+        with suspended_spatial_index(connection_pool):
+            with connection_pool.reader() as connection, closing(
+                connection.cursor()
+            ) as cursor:
+                self.assertTrue(is_spatial_index_suspended(cursor))
+
+        with connection_pool.reader() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            self.assertFalse(is_spatial_index_suspended(cursor))
+            self.assertEqual(triggers_count(cursor), initial_triggers_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import sqlite3
+import tempfile
+import unittest
+from contextlib import closing
+from pathlib import Path
+
+from nextgis_connect.detached_editing.storage_profile import (
+    AUTO_VACUUM_INCREMENTAL,
+    PAGE_SIZE,
+    apply_storage_profile,
+    configure_connection,
+    maintain_container,
+    needs_storage_profile,
+    upgrade_storage_profile,
+)
+from tests.ng_connect_testcase import NgConnectTestCase
+
+
+class TestStorageProfile(NgConnectTestCase):
+    def test_new_container(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "container.gpkg"
+            with closing(sqlite3.connect(str(path))) as connection:
+                connection.execute("CREATE TABLE features (data BLOB)")
+                connection.commit()
+
+                apply_storage_profile(connection)
+
+                self.assertEqual(pragma(connection, "page_size"), PAGE_SIZE)
+                self.assertEqual(
+                    pragma(connection, "auto_vacuum"), AUTO_VACUUM_INCREMENTAL
+                )
+                self.assertEqual(pragma(connection, "journal_mode"), "wal")
+                self.assertFalse(needs_storage_profile(connection, path))
+
+                configure_connection(connection, path)
+                self.assertLess(pragma(connection, "cache_size"), 0)
+
+                connection.executemany(
+                    "INSERT INTO features VALUES (?)",
+                    ((bytes(PAGE_SIZE),) for _ in range(100)),
+                )
+                connection.commit()
+                connection.execute("DELETE FROM features")
+                connection.commit()
+
+                freelist_count = pragma(connection, "freelist_count")
+                self.assertGreater(freelist_count, 0)
+                self.assertEqual(
+                    maintain_container(connection), freelist_count
+                )
+                self.assertEqual(pragma(connection, "freelist_count"), 0)
+
+    def test_existing_container(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "container.gpkg"
+            with closing(sqlite3.connect(str(path))) as connection:
+                connection.execute("PRAGMA journal_mode = WAL")
+                connection.execute("CREATE TABLE features (data BLOB)")
+                connection.commit()
+                self.assertTrue(needs_storage_profile(connection, path))
+
+                upgrade_storage_profile(connection)
+
+                self.assertEqual(
+                    pragma(connection, "auto_vacuum"), AUTO_VACUUM_INCREMENTAL
+                )
+                self.assertEqual(pragma(connection, "journal_mode"), "wal")
+                self.assertFalse(needs_storage_profile(connection, path))
+
+
+def pragma(connection: sqlite3.Connection, name: str):
+    return connection.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+from contextlib import closing
+from dataclasses import replace
+from unittest.mock import MagicMock
+
+from qgis.core import QgsVectorLayer
+
+from nextgis_connect.detached_editing.structure_fingerprint import (
+    forget_verified_structure,
+    is_structure_verified,
+    save_verified_structure,
+    structure_fingerprint,
+)
+from tests.detached_editing.utils import mock_container
+from tests.ng_connect_testcase import NgConnectTestCase, TestData
+
+
+class TestStructureFingerprint(NgConnectTestCase):
+    @mock_container(TestData.Points, is_versioning_enabled=True)
+    def test_verified_structure(
+        self, container_mock: MagicMock, qgs_layer: QgsVectorLayer
+    ) -> None:
+        metadata = container_mock.metadata
+        connection_pool = container_mock.connection_pool
+        fingerprint = structure_fingerprint(metadata)
+
+        with connection_pool.writer() as connection, closing(
+            connection.cursor()
+        ) as cursor:
+            self.assertFalse(is_structure_verified(cursor, fingerprint))
+            forget_verified_structure(cursor)
+
+            save_verified_structure(cursor, fingerprint)
+            self.assertTrue(is_structure_verified(cursor, fingerprint))
+
+            changed_metadata = replace(
+                metadata, epoch=(metadata.epoch or 0) + 1
+            )
+            self.assertFalse(
+                is_structure_verified(
+                    cursor, structure_fingerprint(changed_metadata)
+                )
+            )
+
+            forget_verified_structure(cursor)
+            self.assertFalse(is_structure_verified(cursor, fingerprint))
+
+
+if __name__ == "__main__":
+    unittest.main()
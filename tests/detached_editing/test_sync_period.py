@@ -0,0 +1,60 @@
+import unittest
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+from nextgis_connect.detached_editing.sync_period import AdaptiveSyncPeriod
+from tests.ng_connect_testcase import NgConnectTestCase
+
+
+class TestAdaptiveSyncPeriod(NgConnectTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+
+        settings = MagicMock()
+        settings.synchronizatin_period = timedelta(minutes=1)
+        settings.synchronization_min_period = timedelta(seconds=15)
+        settings.synchronization_max_period = timedelta(minutes=10)
+
+        patcher = patch(
+            "nextgis_connect.detached_editing.sync_period.NgConnectSettings",
+            return_value=settings,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_backoff(self) -> None:
+        period = AdaptiveSyncPeriod()
+        self.assertEqual(period.period, timedelta(minutes=1))
+
+        expected_periods = [2, 4, 8, 10, 10]
+        for expected_minutes in expected_periods:
+            period.record(0)
+            self.assertEqual(
+                period.period, timedelta(minutes=expected_minutes)
+            )
+
+        for _ in range(100):
+            period.record(0)
+        self.assertEqual(period.period, timedelta(minutes=10))
+
+    def test_tightening(self) -> None:
+        period = AdaptiveSyncPeriod()
+        period.record(0)
+        period.record(0)
+
+        period.record(1)
+        self.assertEqual(period.period, timedelta(seconds=30))
+
+        period.record(1)
+        self.assertEqual(period.period, timedelta(seconds=15))
+
+        period.reset()
+        self.assertEqual(period.period, timedelta(minutes=1))
+
+        # Big change volume tightens the period once more
+        period.record(AdaptiveSyncPeriod.ACTIVE_ACTIONS_COUNT)
+        self.assertEqual(period.period, timedelta(seconds=15))
+
+
+if __name__ == "__main__":
+    unittest.main()
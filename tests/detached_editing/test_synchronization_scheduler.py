@@ -0,0 +1,134 @@
+import unittest
+from pathlib import Path
+from typing import List, Optional
+from unittest.mock import MagicMock
+
+from nextgis_connect.detached_editing.synchronization_scheduler import (
+    SynchronizationScheduler,
+)
+from nextgis_connect.detached_editing.utils import DetachedLayerState
+from tests.ng_connect_testcase import NgConnectTestCase
+
+
+def container_mock(
+    name: str,
+    instance_id: Optional[str] = "instance",
+    *,
+    is_not_initialized: bool = False,
+    has_changes: bool = False,
+    can_start: bool = True,
+) -> MagicMock:
+    container = MagicMock()
+    container.path = Path(f"{name}.gpkg")
+    container.state = DetachedLayerState.Synchronized
+    container.is_not_initialized = is_not_initialized
+    container.metadata.instance_id = instance_id
+    container.metadata.connection_id = f"connection_{name}"
+    container.metadata.has_changes = has_changes
+
+    def synchronize() -> bool:
+        if not can_start:
+            return False
+        container.state = DetachedLayerState.Synchronization
+        return True
+
+    container.synchronize.side_effect = synchronize
+    return container
+
+
+def started(containers: List[MagicMock]) -> List[str]:
+    return [
+        container.path.stem
+        for container in containers
+        if container.state == DetachedLayerState.Synchronization
+    ]
+
+
+def finish(containers: List[MagicMock]) -> None:
+    for container in containers:
+        container.state = DetachedLayerState.Synchronized
+
+
+class TestSynchronizationScheduler(NgConnectTestCase):
+    def test_priority(self) -> None:
+        containers = [
+            container_mock("plain"),
+            container_mock("changed", has_changes=True),
+            container_mock("stub", is_not_initialized=True),
+        ]
+        scheduler = SynchronizationScheduler(2, 2)
+
+        self.assertEqual(scheduler.schedule(containers), 2)
+        self.assertEqual(started(containers), ["changed", "stub"])
+
+    def test_limits(self) -> None:
+        containers = [
+            container_mock("a1", "a"),
+            container_mock("a2", "a"),
+            container_mock("a3", "a"),
+            container_mock("b1", "b"),
+            container_mock("c1", None),
+        ]
+        scheduler = SynchronizationScheduler(4, 2)
+
+        self.assertEqual(scheduler.schedule(containers), 4)
+        self.assertEqual(started(containers), ["a1", "a2", "b1", "c1"])
+
+        # All slots are busy
+        self.assertEqual(scheduler.schedule(containers), 0)
+
+        containers[0].state = DetachedLayerState.Synchronized
+        self.assertEqual(scheduler.schedule(containers), 1)
+        self.assertEqual(started(containers), ["a2", "a3", "b1", "c1"])
+
+    def test_round_robin(self) -> None:
+        containers = [
+            container_mock("first", can_start=False),
+            container_mock("second"),
+            container_mock("third"),
+            container_mock("fourth"),
+        ]
+        scheduler = SynchronizationScheduler(1, 1)
+
+        order = []
+        for _ in range(4):
+            scheduler.schedule(containers)
+            order.extend(started(containers))
+            finish(containers)
+
+        self.assertEqual(order, ["second", "third", "fourth", "second"])
+
+    def test_conflicts_resolution(self) -> None:
+        first = container_mock("first")
+        second = container_mock("second")
+        third = container_mock("third")
+        scheduler = SynchronizationScheduler(3, 3)
+
+        resolving = []
+        for container in (first, second, third):
+            container.resolve_conflicts.side_effect = (
+                lambda container=container: resolving.append(
+                    container.path.stem
+                )
+            )
+
+        scheduler.request_conflicts_resolution(first)
+        self.assertEqual(resolving, ["first"])
+
+        # Dialog of the first container is still shown
+        scheduler.request_conflicts_resolution(second)
+        scheduler.request_conflicts_resolution(third)
+        scheduler.request_conflicts_resolution(second)
+        scheduler.finish_conflicts_resolution(second)
+        self.assertEqual(resolving, ["first"])
+
+        scheduler.forget(third.path)
+        scheduler.finish_conflicts_resolution(first)
+        self.assertEqual(resolving, ["first", "second"])
+
+        scheduler.finish_conflicts_resolution(second)
+        self.assertEqual(resolving, ["first", "second"])
+
+
+if __name__ == "__main__":
+    unittest.main()
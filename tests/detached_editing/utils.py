@@ -17,6 +17,9 @@ from qgis.core import (
 )
 
 from nextgis_connect.compat import WkbType
+from nextgis_connect.detached_editing.container_connection_pool import (
+    ContainerConnectionPool,
+)
 from nextgis_connect.detached_editing.detached_layer_factory import (
     DetachedLayerFactory,
 )
@@ -222,6 +225,9 @@ def mock_container(
         container_mock = MagicQObjectMock()
         container_mock.metadata = metadata
         container_mock.path = container_path
+        container_mock.connection_pool = ContainerConnectionPool(
+            container_path
+        )
 
         qgs_layer = QgsVectorLayer(
             detached_layer_uri(container_path, metadata),
@@ -242,6 +248,7 @@ def mock_container(
             try:
                 method(self, container_mock, qgs_layer, *args, **kwargs)
             finally:
+                container_mock.connection_pool.close()
                 container_mock.deleteLater()
 
         return wrapper
@@ -0,0 +1,148 @@
+import unittest
+from dataclasses import replace
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+from nextgis_connect.resources import lookup_tables_cache
+from nextgis_connect.resources.lookup_tables_cache import (
+    LOOKUP_TABLE_TTL,
+    cached_lookup_table,
+    fresh_lookup_table,
+    put_lookup_table,
+)
+from tests.ng_connect_testcase import NgConnectTestCase
+
+
+class TestLookupTablesCache(NgConnectTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.cache_directory = self.create_temp_dir()
+        settings = MagicMock()
+        settings.return_value.cache_directory = str(self.cache_directory)
+
+        connection = MagicMock()
+        connection.domain_uuid = "domain"
+        manager = MagicMock()
+        manager.return_value.connection.return_value = connection
+
+        patches = [
+            patch.object(lookup_tables_cache, "NgConnectSettings", settings),
+            patch.object(
+                lookup_tables_cache, "NgwConnectionsManager", manager
+            ),
+            patch.dict(lookup_tables_cache._entries, clear=True),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_widget_setup(self):
+        lookup_table = put_lookup_table(
+            "connection", 1, self.__resource_json({"a": "A", "b": "B"})
+        )
+        assert lookup_table is not None
+
+        setup = lookup_table.widget_setup
+        self.assertEqual(setup.type(), "ValueMap")
+        self.assertEqual(setup.config()["map"], [{"A": "a"}, {"B": "b"}])
+
+    def test_not_lookup_table(self):
+        self.assertIsNone(put_lookup_table("connection", 1, {"resource": {}}))
+
+    def test_setup_is_shared(self):
+        resource_json = self.__resource_json({"a": "A"})
+        first = put_lookup_table("connection", 1, resource_json)
+        second = put_lookup_table("connection", 1, resource_json)
+        assert first is not None and second is not None
+        self.assertIs(first.widget_setup, second.widget_setup)
+
+        changed = put_lookup_table(
+            "connection", 1, self.__resource_json({"a": "Z"})
+        )
+        assert changed is not None
+        self.assertIsNot(first.widget_setup, changed.widget_setup)
+
+    def test_put_refreshes_check_date(self):
+        resource_json = self.__resource_json({"a": "A"})
+        first = put_lookup_table("connection", 1, resource_json)
+        assert first is not None
+        key = ("domain", 1)
+        lookup_tables_cache._entries[key] = replace(
+            first, check_date=datetime.now() - LOOKUP_TABLE_TTL
+        )
+        self.assertIsNone(fresh_lookup_table("connection", 1))
+
+        second = put_lookup_table("connection", 1, resource_json)
+        assert second is not None
+        self.assertFalse(second.is_expired)
+        self.assertIs(second.widget_setup, first.widget_setup)
+
+        lookup_table = fresh_lookup_table("connection", 1)
+        assert lookup_table is not None
+        self.assertEqual(lookup_table.items, {"a": "A"})
+        self.assertIsNone(fresh_lookup_table("connection", 2))
+
+    def test_persistence(self):
+        put_lookup_table("connection", 1, self.__resource_json({"a": "A"}))
+        self.assertTrue(
+            (
+                self.cache_directory / "domain" / "lookup_tables" / "1.json"
+            ).exists()
+        )
+
+        # Imitate restart
+        lookup_tables_cache._entries.clear()
+
+        with patch.object(lookup_tables_cache, "_fetch_resource") as fetch:
+            lookup_table = cached_lookup_table("connection", 1)
+            fetch.assert_not_called()
+
+        assert lookup_table is not None
+        self.assertEqual(lookup_table.items, {"a": "A"})
+
+    def test_revalidation(self):
+        put_lookup_table("connection", 1, self.__resource_json({"a": "A"}))
+        key = ("domain", 1)
+        expired_date = datetime.now() - LOOKUP_TABLE_TTL - timedelta(1)
+        lookup_tables_cache._entries[key] = replace(
+            lookup_tables_cache._entries[key],
+            etag='"etag"',
+            check_date=expired_date,
+        )
+        cached = lookup_tables_cache._entries[key]
+
+        with patch.object(
+            lookup_tables_cache,
+            "_fetch_resource",
+            return_value=(None, '"etag"'),
+        ) as fetch:
+            lookup_table = cached_lookup_table("connection", 1)
+            fetch.assert_called_once_with("connection", 1, '"etag"')
+
+        assert lookup_table is not None
+        self.assertFalse(lookup_table.is_expired)
+        self.assertIs(lookup_table.widget_setup, cached.widget_setup)
+
+    def test_stale_table_on_network_error(self):
+        put_lookup_table("connection", 1, self.__resource_json({"a": "A"}))
+        key = ("domain", 1)
+        lookup_tables_cache._entries[key] = replace(
+            lookup_tables_cache._entries[key],
+            check_date=datetime.now() - LOOKUP_TABLE_TTL,
+        )
+
+        with patch.object(
+            lookup_tables_cache, "_fetch_resource", side_effect=OSError
+        ):
+            lookup_table = cached_lookup_table("connection", 1)
+
+        assert lookup_table is not None
+        self.assertEqual(lookup_table.items, {"a": "A"})
+
+    def __resource_json(self, items):
+        return {"resource": {}, "lookup_table": {"items": items}}
+
+
+if __name__ == "__main__":
+    unittest.main()